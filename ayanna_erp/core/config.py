@@ -26,6 +26,16 @@ class Config:
     # Configuration de la base de données
     DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR}/ayanna_erp.db")
     
+    # Profil de performance SQLite (appliqué à chaque nouvelle connexion)
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # valeur négative = Kio (64 Mo)
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # octets
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # Désactivé par défaut : des bases existantes contiennent des références orphelines
+    SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "False").lower() == "true"
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # millisecondes
+    
     # Configuration de la comptabilité
     DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "USD")
     ENABLE_ACCOUNTING = os.getenv("ENABLE_ACCOUNTING", "True").lower() == "true"
@@ -83,6 +93,19 @@ class Config:
         cls.LOGS_DIR.mkdir(exist_ok=True)
         cls.REPORTS_DIR.mkdir(exist_ok=True)
     
+    @classmethod
+    def get_sqlite_pragmas(cls):
+        """Retourne la liste ordonnée (nom, valeur) des PRAGMA SQLite à appliquer"""
+        return [
+            ("busy_timeout", cls.SQLITE_BUSY_TIMEOUT),
+            ("journal_mode", cls.SQLITE_JOURNAL_MODE),
+            ("synchronous", cls.SQLITE_SYNCHRONOUS),
+            ("cache_size", cls.SQLITE_CACHE_SIZE),
+            ("mmap_size", cls.SQLITE_MMAP_SIZE),
+            ("temp_store", cls.SQLITE_TEMP_STORE),
+            ("foreign_keys", "ON" if cls.SQLITE_FOREIGN_KEYS else "OFF"),
+        ]
+    
     @classmethod
     def get_database_path(cls):
         """Retourne le chemin vers la base de données"""
@@ -7,10 +7,15 @@ import sys
 import shutil
 import time
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from PIL import Image
 from io import BytesIO
 
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
 
 class ImageUtils:
     """Classe utilitaire pour la gestion des images"""
@@ -268,4 +273,162 @@ class ImageUtils:
             return str(dest_path)
         except Exception as e:
             print(f"Erreur save_uploaded_image: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def get_thumbnails_dir(app_name: str = 'Ayanna ERP') -> str:
+        """
+        Dossier du cache disque des miniatures : data/thumbnails du projet en développement,
+        LOCALAPPDATA (ou dossier utilisateur) pour l'application empaquetée.
+        """
+        try:
+            if getattr(sys, 'frozen', False):
+                base = Path(os.getenv('LOCALAPPDATA') or os.path.expanduser('~')) / app_name
+            else:
+                from ayanna_erp.core.config import Config
+                base = Config.DATA_DIR
+            thumbnails_dir = Path(base) / 'thumbnails'
+            thumbnails_dir.mkdir(parents=True, exist_ok=True)
+            return str(thumbnails_dir)
+        except Exception as e:
+            print(f"Erreur get_thumbnails_dir: {e}")
+            fallback = Path(os.path.expanduser('~')) / app_name / 'thumbnails'
+            fallback.mkdir(parents=True, exist_ok=True)
+            return str(fallback)
+
+    @staticmethod
+    def thumbnail_key(file_path, size, mtime_ns=None):
+        """Clé de miniature : chemin absolu + date de modification + taille"""
+        if mtime_ns is None:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        raw = f"{os.path.abspath(file_path)}|{mtime_ns}|{size[0]}x{size[1]}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def load_or_create_thumbnail(file_path, size, key=None):
+        """
+        Miniature PNG (bytes) d'une image, lue dans le cache disque ou construite avec Pillow
+        puis enregistrée. Sans dépendance Qt : utilisable depuis un thread de travail.
+
+        Returns:
+            bytes: miniature PNG, ou None si l'image est illisible
+        """
+        try:
+            key = key or ImageUtils.thumbnail_key(file_path, size)
+            cache_path = Path(ImageUtils.get_thumbnails_dir()) / f"{key}.png"
+            if cache_path.exists():
+                return cache_path.read_bytes()
+
+            with Image.open(file_path) as image:
+                image.draft('RGB', size)  # décodage JPEG réduit quand c'est possible
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                image.thumbnail(size, Image.Resampling.LANCZOS)
+                output = BytesIO()
+                image.save(output, format='PNG', optimize=True)
+            data = output.getvalue()
+
+            # Écriture atomique : un autre thread peut lire la même miniature
+            tmp_path = cache_path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, cache_path)
+            return data
+        except Exception as e:
+            print(f"Erreur lors de la création de miniature: {e}")
+            return None
+
+    @staticmethod
+    def thumbnail_cache():
+        """Cache de miniatures partagé par l'application (à utiliser depuis le thread GUI)"""
+        global _thumbnail_cache
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache()
+        return _thumbnail_cache
+
+
+_thumbnail_cache = None
+
+
+class _ThumbnailSignals(QObject):
+    done = pyqtSignal(str, object)  # clé, bytes PNG ou None
+
+
+class _ThumbnailTask(QRunnable):
+    """Construit une miniature hors du thread GUI"""
+
+    def __init__(self, file_path, size, key, signals):
+        super().__init__()
+        self.file_path = file_path
+        self.size = size
+        self.key = key
+        self.signals = signals
+
+    def run(self):
+        data = ImageUtils.load_or_create_thumbnail(self.file_path, self.size, self.key)
+        self.signals.done.emit(self.key, data)
+
+
+class ThumbnailCache(QObject):
+    """
+    Miniatures des images produits : LRU en mémoire (QPixmap) devant un cache disque (PNG).
+    `get` ne bloque jamais : en cas d'absence, la miniature est construite en arrière-plan
+    et `thumbnail_ready` est émis quand elle est disponible.
+    """
+
+    thumbnail_ready = pyqtSignal(str)  # chemin de l'image source
+
+    def __init__(self, max_items=512, parent=None):
+        super().__init__(parent)
+        self.max_items = max_items
+        self._pixmaps = OrderedDict()
+        self._pending = {}
+        self._failed = set()
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(2)
+        self._signals = _ThumbnailSignals()
+        self._signals.done.connect(self._on_done)
+
+    def get(self, file_path, size):
+        """
+        Miniature déjà prête pour (chemin, taille), sinon None et construction demandée.
+
+        Args:
+            file_path (str): chemin complet de l'image
+            size (tuple): taille maximale (largeur, hauteur)
+        """
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        except OSError:
+            return None
+        size = (int(size[0]), int(size[1]))
+        key = ImageUtils.thumbnail_key(file_path, size, mtime_ns)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            return pixmap
+        if key not in self._pending and key not in self._failed:
+            self._pending[key] = file_path
+            self._pool.start(_ThumbnailTask(file_path, size, key, self._signals))
+        return None
+
+    def _on_done(self, key, data):
+        file_path = self._pending.pop(key, None)
+        if not data:
+            self._failed.add(key)
+            return
+        from PyQt6.QtGui import QPixmap
+        pixmap = QPixmap()
+        pixmap.loadFromData(data, 'PNG')
+        if pixmap.isNull():
+            self._failed.add(key)
+            return
+        self._pixmaps[key] = pixmap
+        while len(self._pixmaps) > self.max_items:
+            self._pixmaps.popitem(last=False)
+        if file_path:
+            self.thumbnail_ready.emit(file_path)
+
+    def clear(self):
+        """Vide le cache mémoire (le cache disque est conservé)"""
+        self._pixmaps.clear()
+        self._failed.clear()
@@ -0,0 +1,177 @@
+"""
+Chargement des données hors du thread GUI
+
+QueryExecutor exécute des appels de contrôleur dans un QThreadPool partagé et livre
+résultats et erreurs dans le thread GUI (callbacks `on_result` / `on_error`). Chaque
+requête porte une clé (un tableau, un graphique...) : soumettre une nouvelle requête
+pour la même clé rend la précédente obsolète. Une requête encore en file est retirée,
+une requête déjà lancée va à son terme mais son résultat est ignoré.
+
+Avec `with_session=True`, la fonction reçoit en premier argument une session
+`session_scope()` propre au thread ; les objets ORM chargés sont détachés (expunge)
+avant la fermeture de la session pour rester lisibles dans le thread GUI (colonnes
+chargées uniquement, pas de relations paresseuses).
+
+BusyIndicator affiche une barre de progression indéterminée tant qu'un des exécuteurs
+qu'il suit travaille.
+"""
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtWidgets import QProgressBar
+
+from ayanna_erp.database.database_manager import DatabaseManager
+
+
+_pool = None
+
+
+def query_thread_pool():
+    """Pool de threads partagé par tous les exécuteurs de requêtes"""
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(4)
+    return _pool
+
+
+class _QuerySignals(QObject):
+    done = pyqtSignal(object, int, object)    # clé, génération, résultat
+    failed = pyqtSignal(object, int, object)  # clé, génération, exception
+
+
+class _QueryTask(QRunnable):
+    """Exécute un appel de contrôleur dans un thread du pool"""
+
+    def __init__(self, key, generation, fn, args, kwargs, with_session, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.with_session = with_session
+        self.signals = signals
+
+    def run(self):
+        try:
+            if self.with_session:
+                with DatabaseManager().session_scope() as session:
+                    result = self.fn(session, *self.args, **self.kwargs)
+                    session.expunge_all()
+            else:
+                result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            print(f"❌ Erreur lors du chargement '{self.key}': {e}")
+            self.signals.failed.emit(self.key, self.generation, e)
+            return
+        self.signals.done.emit(self.key, self.generation, result)
+
+
+class QueryExecutor(QObject):
+    """
+    Exécuteur de requêtes d'un écran.
+
+    Exemple :
+        self.executor = QueryExecutor(self)
+        self.executor.submit('commandes', controller.get_commandes_page,
+                             page_size=100, on_result=self.on_commandes_loaded)
+    """
+
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._generations = {}
+        self._pending = {}     # clé -> (tâche, on_result, on_error)
+        self._running = set()  # tâches lancées, gardées en vie jusqu'à leur fin
+        self._finished = []    # tâches terminées, libérées à la prochaine soumission
+        self._busy = False
+        self._signals = _QuerySignals()
+        self._signals.done.connect(self._on_done)
+        self._signals.failed.connect(self._on_failed)
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, with_session=False, **kwargs):
+        """
+        Lance `fn(*args, **kwargs)` dans un thread ; la requête précédente de même clé est annulée.
+
+        Args:
+            key: identifiant de la requête (une seule requête active par clé)
+            on_result: appelé dans le thread GUI avec le résultat
+            on_error: appelé dans le thread GUI avec l'exception (sinon l'erreur est seulement journalisée)
+            with_session: passer une session `session_scope()` en premier argument de `fn`
+        """
+        self._finished.clear()
+        self.cancel(key)
+        generation = self._generations.get(key, 0)
+        task = _QueryTask(key, generation, fn, args, kwargs, with_session, self._signals)
+        self._pending[key] = (task, on_result, on_error)
+        self._running.add(task)
+        query_thread_pool().start(task)
+        self._update_busy()
+
+    def cancel(self, key=None):
+        """Rend obsolète la requête d'une clé (ou toutes) : son résultat ne sera pas livré"""
+        keys = [key] if key is not None else list(self._pending)
+        for k in keys:
+            self._generations[k] = self._generations.get(k, 0) + 1
+            pending = self._pending.pop(k, None)
+            if pending is not None and query_thread_pool().tryTake(pending[0]):
+                self._running.discard(pending[0])
+        self._update_busy()
+
+    def is_busy(self):
+        return bool(self._pending)
+
+    def _take(self, key, generation):
+        """Callbacks de la requête si elle est toujours d'actualité, sinon None"""
+        for task in [t for t in self._running if t.key == key and t.generation == generation]:
+            # le thread du pool peut encore tenir la tâche : ne pas la libérer tout de suite
+            self._running.discard(task)
+            self._finished.append(task)
+        if generation != self._generations.get(key, 0) or key not in self._pending:
+            return None
+        _, on_result, on_error = self._pending.pop(key)
+        self._update_busy()
+        return on_result, on_error
+
+    def _on_done(self, key, generation, result):
+        callbacks = self._take(key, generation)
+        if callbacks and callbacks[0] is not None:
+            callbacks[0](result)
+
+    def _on_failed(self, key, generation, error):
+        callbacks = self._take(key, generation)
+        if callbacks and callbacks[1] is not None:
+            callbacks[1](error)
+
+    def _update_busy(self):
+        busy = bool(self._pending)
+        if busy != self._busy:
+            self._busy = busy
+            self.busy_changed.emit(busy)
+
+
+class BusyIndicator(QProgressBar):
+    """Barre de progression indéterminée, visible tant qu'un exécuteur suivi travaille"""
+
+    def __init__(self, parent=None, height=4):
+        super().__init__(parent)
+        self.setRange(0, 0)
+        self.setTextVisible(False)
+        self.setFixedHeight(height)
+        self.setToolTip("Chargement en cours...")
+        self._busy = set()
+        self.hide()
+
+    def track(self, executor):
+        """Suivre l'activité d'un QueryExecutor"""
+        executor.busy_changed.connect(lambda busy, ex=executor: self._on_busy_changed(ex, busy))
+        self._on_busy_changed(executor, executor.is_busy())
+
+    def _on_busy_changed(self, executor, busy):
+        if busy:
+            self._busy.add(id(executor))
+        else:
+            self._busy.discard(id(executor))
+        self.setVisible(bool(self._busy))
@@ -6,13 +6,15 @@ Utilise SQLAlchemy pour la gestion des modèles et des connexions
 
 import os
 import importlib
+import threading
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, LargeBinary
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool
 import bcrypt
 from contextlib import contextmanager
+from ayanna_erp.core.config import Config
 
 
 
@@ -74,20 +76,113 @@ except ImportError:
     pass
 
 
+DEFAULT_DATABASE_URL = "sqlite:///ayanna_erp.db"
+
+# Registre partagé (par URL) des engines et sessionmakers.
+# Chaque DatabaseManager() réutilise l'engine déjà créé pour son URL au lieu
+# d'ouvrir une nouvelle connexion SQLite à chaque instanciation.
+_engine_registry = {}
+_engine_registry_lock = threading.Lock()
+_engines_created = 0
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Appliquer le profil de PRAGMA SQLite (Config) à une nouvelle connexion"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in Config.get_sqlite_pragmas():
+            try:
+                cursor.execute(f"PRAGMA {name}={value}")
+            except Exception as e:
+                print(f"⚠️ PRAGMA {name}={value} non appliqué: {e}")
+    finally:
+        cursor.close()
+
+
+def _create_engine_for_url(database_url):
+    """Créer un engine SQLAlchemy adapté à l'URL donnée"""
+    if "sqlite" not in database_url:
+        return create_engine(database_url, echo=False)
+
+    connect_args = {"check_same_thread": False}
+    if ":memory:" in database_url or database_url.rstrip("/") in ("sqlite:", "sqlite:/"):
+        # Base en mémoire : une seule connexion doit être partagée sinon chaque
+        # connexion verrait une base vide
+        engine = create_engine(
+            database_url,
+            poolclass=StaticPool,
+            connect_args=connect_args,
+            echo=False
+        )
+    else:
+        # Base fichier : pool de connexions réutilisées par tout le processus, chaque
+        # session garde sa propre connexion (transactions isolées). Pas de plafond :
+        # des contrôleurs gardent une session ouverte toute leur vie (get_session),
+        # un pool borné finirait par bloquer l'interface. 5 connexions restent ouvertes
+        # au repos, les suivantes sont fermées à leur restitution.
+        engine = create_engine(
+            database_url,
+            poolclass=QueuePool,
+            pool_size=5,
+            max_overflow=-1,
+            connect_args=connect_args,
+            echo=False
+        )
+
+    # Les PRAGMA ne sont exécutés qu'à l'ouverture physique d'une connexion
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def get_shared_engine(database_url=None):
+    """
+    Retourne le couple (engine, sessionmaker) partagé pour une URL
+
+    L'engine n'est créé qu'une seule fois par URL et par processus.
+    """
+    global _engines_created
+    if database_url is None:
+        database_url = DEFAULT_DATABASE_URL
+
+    entry = _engine_registry.get(database_url)
+    if entry is not None:
+        return entry
+
+    with _engine_registry_lock:
+        entry = _engine_registry.get(database_url)
+        if entry is None:
+            engine = _create_engine_for_url(database_url)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            entry = (engine, session_factory)
+            _engine_registry[database_url] = entry
+            _engines_created += 1
+    return entry
+
+
+def get_engine_creation_count():
+    """Nombre d'engines créés depuis le démarrage du processus"""
+    return _engines_created
+
+
+def dispose_shared_engines():
+    """Fermer toutes les connexions et vider le registre des engines"""
+    with _engine_registry_lock:
+        for engine, _ in _engine_registry.values():
+            try:
+                engine.dispose()
+            except Exception:
+                pass
+        _engine_registry.clear()
+
 
 class DatabaseManager:
     """Gestionnaire principal de la base de données"""
     
     def __init__(self, database_url=None):
         if database_url is None:
-            database_url = "sqlite:///ayanna_erp.db"
-        self.engine = create_engine(
-            database_url,
-            poolclass=StaticPool,
-            connect_args={"check_same_thread": False} if "sqlite" in database_url else {},
-            echo=False
-        )
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            database_url = DEFAULT_DATABASE_URL
+        self.database_url = database_url
+        self.engine, self.SessionLocal = get_shared_engine(database_url)
         self.session = None
         self.current_enterprise_id = None
 
@@ -133,6 +228,29 @@ class DatabaseManager:
             except Exception:
                 pass
     
+    def wal_checkpoint(self, mode="PASSIVE"):
+        """
+        Exécuter un checkpoint du journal WAL (maintenance)
+
+        Args:
+            mode (str): PASSIVE (ne bloque personne), FULL, RESTART ou TRUNCATE
+
+        Returns:
+            tuple: (busy, pages_journal, pages_reportees) ou None si non applicable
+        """
+        if self.engine.dialect.name != "sqlite":
+            return None
+        mode = (mode or "PASSIVE").upper()
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Mode de checkpoint WAL invalide: {mode}")
+        try:
+            with self.engine.connect() as conn:
+                row = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").fetchone()
+                return tuple(row) if row else None
+        except Exception as e:
+            print(f"⚠️ Erreur lors du checkpoint WAL: {e}")
+            return None
+
     def initialize_database(self):
         """Initialiser la base de données avec les tables et données par défaut"""
         try:
@@ -147,6 +265,37 @@ class DatabaseManager:
             except Exception as e:
                 print(f"⚠️ Erreur lors de l'initialisation des modules : {e}")
             
+            # Ajouter les colonnes manquantes puis les index sur les bases existantes
+            try:
+                self.ensure_columns()
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'ajout des colonnes : {e}")
+            try:
+                self.ensure_indexes()
+            except Exception as e:
+                print(f"⚠️ Erreur lors de la création des index : {e}")
+
+            # Instantané mensuel des soldes comptables (triggers + reconstruction initiale)
+            try:
+                from ayanna_erp.modules.comptabilite.controller.soldes_controller import SoldesController
+                SoldesController().ensure_snapshot(self.engine)
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'initialisation de l'instantané des soldes : {e}")
+
+            # Soldes de stock mensuels (valorisation à date)
+            try:
+                from ayanna_erp.modules.stock.controllers.stock_valuation_controller import StockValuationController
+                StockValuationController().ensure_snapshot(self.engine)
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'initialisation des soldes de stock : {e}")
+
+            # Index plein texte du catalogue produits (FTS5 + triggers)
+            try:
+                from ayanna_erp.modules.core.controllers.product_search import ProductSearchController
+                ProductSearchController().ensure_index(self.engine)
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'initialisation de la recherche produits : {e}")
+            
             return True
         except Exception as e:
             print(f"Erreur lors de l'initialisation de la base de données: {e}")
@@ -359,6 +508,86 @@ class DatabaseManager:
 
         print(f"✅ Initialisation de modules terminée. Total de tables traitées: {created_count}")
     
+    def ensure_columns(self):
+        """Ajouter aux tables existantes les colonnes nullables déclarées dans les modèles.
+
+        `create_all` ne modifie pas une table déjà créée : une colonne ajoutée ensuite à un
+        modèle est ajoutée ici par `ALTER TABLE ... ADD COLUMN` (valeur NULL sur les lignes
+        existantes). Les colonnes NOT NULL demandent une migration manuelle (scripts/migrations).
+
+        Returns:
+            list: colonnes ajoutées ("table.colonne")
+        """
+        from sqlalchemy import inspect as sa_inspect
+
+        added = []
+        with self.engine.begin() as conn:
+            inspector = sa_inspect(conn)
+            existing_tables = set(inspector.get_table_names())
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns:
+                        continue
+                    if column.primary_key or not column.nullable:
+                        print(f"⚠️ Colonne '{table.name}.{column.name}' absente et NOT NULL : migration manuelle requise")
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    try:
+                        conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                        added.append(f"{table.name}.{column.name}")
+                    except Exception as e:
+                        print(f"⚠️ Colonne '{table.name}.{column.name}' non ajoutée: {e}")
+
+        if added:
+            print(f"✅ {len(added)} colonnes ajoutées: {', '.join(added)}")
+        return added
+
+    def ensure_indexes(self):
+        """Créer les index déclarés dans les modèles qui manquent dans la base.
+
+        `create_all` ne crée les index qu'avec les nouvelles tables : sur une base
+        existante, les index ajoutés ensuite aux modèles doivent être construits ici.
+        Seules les tables déjà présentes sont traitées.
+
+        Returns:
+            list: noms des index créés
+        """
+        from sqlalchemy import inspect as sa_inspect
+
+        created = []
+        with self.engine.begin() as conn:
+            inspector = sa_inspect(conn)
+            existing_tables = set(inspector.get_table_names())
+            is_sqlite = self.engine.dialect.name == "sqlite"
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables or not table.indexes:
+                    continue
+                if is_sqlite:
+                    # sqlite_master liste aussi les index sur expression, que la réflexion ignore
+                    existing_indexes = {row[0] for row in conn.execute(text(
+                        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"
+                    ), {"table": table.name})}
+                else:
+                    existing_indexes = {idx['name'] for idx in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in existing_indexes:
+                        continue
+                    try:
+                        index.create(bind=conn, checkfirst=not is_sqlite)
+                        created.append(index.name)
+                    except Exception as e:
+                        print(f"⚠️ Index '{index.name}' non créé sur '{table.name}': {e}")
+            if created and is_sqlite:
+                # Mettre à jour les statistiques utilisées par le planificateur
+                conn.exec_driver_sql("ANALYZE")
+
+        if created:
+            print(f"✅ {len(created)} index créés: {', '.join(created)}")
+        return created
+
     def _insert_default_accounting_data(self, session, enterprise_id):
         """Insérer les données comptables par défaut SYSCOHADA"""
         try:
@@ -11,8 +11,11 @@ from ayanna_erp.modules.achats.models import (
 )
 from ayanna_erp.modules.salle_fete.model import EventExpense
 from ayanna_erp.modules.core.models import CoreProduct
-from ayanna_erp.modules.stock.models import StockWarehouse, StockProduitEntrepot, StockMovement
+from ayanna_erp.modules.core.controllers.catalogue_cache import bump_catalogue_version
+from ayanna_erp.modules.stock.models import StockWarehouse
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 from ayanna_erp.modules.comptabilite.model.comptabilite import ComptaComptes, ComptaEcritures, ComptaJournaux, ComptaConfig
+from ayanna_erp.modules.comptabilite.controller.soldes_controller import SoldesController
 from ayanna_erp.core.entreprise_controller import EntrepriseController
 
 
@@ -262,18 +265,16 @@ class AchatController:
                 return True
             
             # Pour les autres comptes, calculer le solde actuel
-            # Récupérer toutes les écritures pour ce compte
-            ecritures = session.query(ComptaEcritures).filter_by(compte_comptable_id=compte_id).all()
+            # (mois clôturés lus dans l'instantané compta_soldes, mois en cours agrégé)
+            solde_debiteur = SoldesController().get_solde(session, compte_id)
             
             # Calculer le solde : Débit - Crédit pour les comptes d'actif
             # Crédit - Débit pour les comptes de passif
-            solde = Decimal('0')
-            for ecriture in ecritures:
-                # Traiter les comptes financiers (classe 5) comme comptes d'actif
-                if compte.numero.startswith(('1', '2', '3', '5', '6')):  # Comptes d'actif et charges (inclut classe 5)
-                    solde += (ecriture.debit or Decimal('0')) - (ecriture.credit or Decimal('0'))
-                else:  # Comptes de passif et produits
-                    solde += (ecriture.credit or Decimal('0')) - (ecriture.debit or Decimal('0'))
+            # Traiter les comptes financiers (classe 5) comme comptes d'actif
+            if compte.numero.startswith(('1', '2', '3', '5', '6')):  # Comptes d'actif et charges (inclut classe 5)
+                solde = Decimal(str(round(solde_debiteur, 2)))
+            else:  # Comptes de passif et produits
+                solde = -Decimal(str(round(solde_debiteur, 2)))
             
             # Comparaison explicite : si le montant demandé est strictement supérieur au solde disponible, refuser
             try:
@@ -562,59 +563,24 @@ class AchatController:
     # ================== INTÉGRATION STOCK ==================
     
     def create_mouvements_stock(self, session: Session, commande: AchatCommande):
-        """Crée les mouvements de stock pour une commande validée"""
-        for ligne in commande.lignes:
-            # Créer le mouvement d'entrée (achat)
-            # Pour les achats (ENTREE) : warehouse_id = entrepôt de destination, destination_warehouse_id = NULL
-            # Cela permet de distinguer achats (destination_warehouse_id=NULL) des transferts (destination_warehouse_id!=NULL)
-            movement = StockMovement(
-                product_id=ligne.produit_id,
-                warehouse_id=commande.entrepot_id,   # Entrepôt de destination (obligatoire)
-                destination_warehouse_id=None,      # NULL pour les achats (pas un transfert)
-                movement_type='ENTREE',
-                quantity=ligne.quantite,
-                unit_cost=ligne.prix_unitaire,
-                total_cost=ligne.quantite * ligne.prix_unitaire,
-                reference=commande.numero,
-                description=f'Achat - Commande {commande.numero}',
-                movement_date=self._local_now(),
-                user_id=commande.utilisateur_id
-            )
-            movement.created_at = self._local_now()
-            session.add(movement)
-            
-            # Mettre à jour ou créer l'entrée stock produit-entrepôt
-            stock_entry = session.query(StockProduitEntrepot).filter_by(
-                product_id=ligne.produit_id,
-                warehouse_id=commande.entrepot_id
-            ).first()
-            
-            if stock_entry:
-                # Mettre à jour la quantité existante
-                old_quantity = stock_entry.quantity
-                new_quantity = old_quantity + ligne.quantite
-                
-                # Mettre à jour le prix moyen pondéré
-                if new_quantity > 0:
-                    total_value = (old_quantity * stock_entry.unit_cost) + (ligne.quantite * ligne.prix_unitaire)
-                    stock_entry.unit_cost = total_value / new_quantity
-                
-                stock_entry.quantity = new_quantity
-                stock_entry.total_cost = new_quantity * stock_entry.unit_cost
-                stock_entry.last_movement_date = self._local_now()
-            else:
-                # Créer une nouvelle entrée stock
-                stock_entry = StockProduitEntrepot(
-                    product_id=ligne.produit_id,
-                    warehouse_id=commande.entrepot_id,
-                    quantity=ligne.quantite,
-                    reserved_quantity=Decimal('0'),
-                    unit_cost=ligne.prix_unitaire,
-                    total_cost=ligne.quantite * ligne.prix_unitaire,
-                    min_stock_level=Decimal('10'),  # Valeur par défaut
-                    last_movement_date=self._local_now()
-                )
-                session.add(stock_entry)
+        """Crée les mouvements de stock pour une commande validée (journal + projection par delta)"""
+        # Pour les achats (ENTREE) : warehouse_id = entrepôt de destination, destination_warehouse_id = NULL
+        # Cela permet de distinguer achats (destination_warehouse_id=NULL) des transferts (destination_warehouse_id!=NULL)
+        # Le coût moyen pondéré de l'entrepôt est recalculé avec le prix d'achat de chaque ligne
+        now = self._local_now()
+        StockLedgerController().post_movements(session, [{
+            'product_id': ligne.produit_id,
+            'warehouse_id': commande.entrepot_id,   # Entrepôt de destination (obligatoire)
+            'destination_warehouse_id': None,      # NULL pour les achats (pas un transfert)
+            'movement_type': 'ENTREE',
+            'quantity': ligne.quantite,
+            'unit_cost': ligne.prix_unitaire,
+            'total_cost': ligne.quantite * ligne.prix_unitaire,
+            'reference': commande.numero,
+            'description': f'Achat - Commande {commande.numero}',
+            'movement_date': now,
+            'user_id': commande.utilisateur_id
+        } for ligne in commande.lignes], default_min_stock_level=10)  # Valeur par défaut des nouvelles lignes
     
     def annuler_commande(self, session: Session, commande_id: int, motif: str = None):
         """Annule une commande d'achat avec gestion complète des conséquences
@@ -624,7 +590,6 @@ class AchatController:
         2. Met à zéro toutes les dépenses (AchatDepense) liées à cette commande
         3. Crée écritures comptables d'annulation
         """
-        from ayanna_erp.modules.stock.models import StockMovement
         from ayanna_erp.modules.achats.models.achats_models import AchatDepense
 
         commande = session.query(AchatCommande).get(commande_id)
@@ -636,53 +601,20 @@ class AchatController:
 
         # === 1. SI COMMANDE RÉCEPTIONNÉE : CRÉER MOUVEMENTS DE SORTIE ===
         if commande.etat == EtatCommande.RECEPTIONNE:
-            # Créer mouvements de sortie pour annuler l'entrée en stock
-            for ligne in commande.lignes:
-                if ligne.quantite > 0:
-                    # Trouver l'entrepôt de destination (entrepôt de la commande)
-                    entrepot_id = commande.entrepot_id
-
-                    mouvement_sortie = StockMovement(
-                        product_id=ligne.produit_id,
-                        warehouse_id=entrepot_id,
-                        movement_type="SORTIE",
-                        quantity=-ligne.quantite,  # Quantité négative pour sortie
-                        unit_cost=ligne.prix_unitaire,
-                        total_cost=-(ligne.prix_unitaire * ligne.quantite),
-                        reference=f"ANN-{commande.numero}",
-                        description=f"Annulation commande d'achat - {commande.numero}",
-                        user_id=getattr(commande, 'utilisateur_id', None),
-                        user_name=getattr(commande, 'utilisateur_nom', 'Système'),
-                        movement_date=self._local_now(),
-                        created_at=self._local_now()
-                    )
-                    session.add(mouvement_sortie)
-                    session.flush()  # Pour obtenir l'ID du mouvement
-
-                    # METTRE À JOUR LA QUANTITÉ EN STOCK
-                    produit_entrepot = session.query(StockProduitEntrepot).filter_by(
-                        product_id=ligne.produit_id,
-                        warehouse_id=entrepot_id
-                    ).first()
-
-                    if produit_entrepot:
-                        # Réduire la quantité en stock
-                        produit_entrepot.quantity = (produit_entrepot.quantity or Decimal('0')) - ligne.quantite
-                        # Recalculer le coût total
-                        produit_entrepot.total_cost = produit_entrepot.quantity * (produit_entrepot.unit_cost or Decimal('0'))
-                        produit_entrepot.last_movement_date = self._local_now()
-                        session.add(produit_entrepot)
-                    else:
-                        # Si l'entrée n'existe pas, la créer avec quantité négative (cas exceptionnel)
-                        nouveau_produit_entrepot = StockProduitEntrepot(
-                            product_id=ligne.produit_id,
-                            warehouse_id=entrepot_id,
-                            quantity=-ligne.quantite,
-                            unit_cost=ligne.prix_unitaire,
-                            total_cost=-(ligne.prix_unitaire * ligne.quantite),
-                            last_movement_date=self._local_now()
-                        )
-                        session.add(nouveau_produit_entrepot)
+            # Mouvements de sortie annulant l'entrée en stock (journal + projection)
+            StockLedgerController().post_movements(session, [{
+                'product_id': ligne.produit_id,
+                'warehouse_id': commande.entrepot_id,
+                'movement_type': "SORTIE",
+                'quantity': -ligne.quantite,  # Quantité négative pour sortie
+                'unit_cost': ligne.prix_unitaire,
+                'total_cost': -(ligne.prix_unitaire * ligne.quantite),
+                'reference': f"ANN-{commande.numero}",
+                'description': f"Annulation commande d'achat - {commande.numero}",
+                'user_id': getattr(commande, 'utilisateur_id', None),
+                'user_name': getattr(commande, 'utilisateur_nom', 'Système'),
+                'movement_date': self._local_now(),
+            } for ligne in commande.lignes if ligne.quantite > 0])
 
         # === 2. METTRE À ZÉRO TOUTES LES DÉPENSES LIÉES ===
         depenses = session.query(AchatDepense).filter_by(bon_commande_id=commande_id).all()
@@ -953,6 +885,7 @@ class AchatController:
                     if product:
                         product.cost = average_cost
                         session.commit()
+                        bump_catalogue_version(product.entreprise_id)
                         print(f"✅ Coût du produit {product.name} mis à jour (moyenne pondérée): {average_cost}")
                 else:
                     print(f"⚠️ Quantité totale nulle pour le produit {product_id}")
@@ -5,6 +5,7 @@ Gère la logique métier des produits, services, panier et paiements.
 
 from typing import List, Optional, Dict, Any, Tuple
 from decimal import Decimal
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from PyQt6.QtCore import QObject, pyqtSignal
 
@@ -13,7 +14,8 @@ from ayanna_erp.modules.core.models import CoreProduct, CoreProductCategory
 from ..model.models import (
     ShopClient, ShopService,
     ShopPanier, ShopPanierProduct, ShopPanierService,
-    ShopPayment, ShopExpense, ShopComptesConfig
+    ShopPayment, ShopExpense, ShopComptesConfig,
+    CLIENT_PHONE_NORM_SQL, CLIENT_NOM_LOWER_SQL, CLIENT_PRENOM_LOWER_SQL
 )
 from ..helpers.stock_helper import BoutiqueStockHelper
 
@@ -567,6 +569,56 @@ class BoutiqueController(QObject):
         
         return query.order_by(ShopClient.nom, ShopClient.prenom).all()
     
+    def search_clients(self, session: Session, search_text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Recherche client indexée pour la caisse : préfixe du téléphone normalisé (sans espaces,
+        tirets, points ni '+') si la saisie est un numéro, sinon préfixe du nom ou du prénom.
+        Chaque mot supplémentaire doit commencer le nom ou le prénom.
+
+        Returns:
+            List[Dict]: clients actifs {'id', 'nom', 'prenom', 'telephone'}, au plus `limit`
+        """
+        search_text = (search_text or '').strip()
+        if not search_text:
+            return []
+
+        digits = search_text
+        for sep in (' ', '-', '.', '+'):
+            digits = digits.replace(sep, '')
+        if digits.isdigit():
+            rows = session.execute(text(f"""
+                SELECT id, nom, prenom, telephone FROM shop_clients
+                WHERE {CLIENT_PHONE_NORM_SQL} >= :debut AND {CLIENT_PHONE_NORM_SQL} < :fin
+                  AND is_active = 1
+                ORDER BY {CLIENT_PHONE_NORM_SQL}
+                LIMIT :limit
+            """), {'debut': digits, 'fin': digits + '\U0010ffff', 'limit': limit}).mappings().all()
+            if rows:
+                return [dict(row) for row in rows]
+
+        mots = search_text.lower().split()
+        premier = mots[0]
+        # Deux parcours d'index (nom, prénom) fusionnés par UNION
+        rows = session.execute(text(f"""
+            SELECT id, nom, prenom, telephone FROM shop_clients
+            WHERE {CLIENT_NOM_LOWER_SQL} >= :debut AND {CLIENT_NOM_LOWER_SQL} < :fin AND is_active = 1
+            UNION
+            SELECT id, nom, prenom, telephone FROM shop_clients
+            WHERE {CLIENT_PRENOM_LOWER_SQL} >= :debut AND {CLIENT_PRENOM_LOWER_SQL} < :fin AND is_active = 1
+            ORDER BY nom, prenom
+            LIMIT :limit
+        """), {'debut': premier, 'fin': premier + '\U0010ffff',
+               'limit': limit if len(mots) == 1 else limit * 10}).mappings().all()
+
+        clients = []
+        for row in rows:
+            parts = f"{row['nom'] or ''} {row['prenom'] or ''}".lower().split()
+            if all(any(part.startswith(mot) for part in parts) for mot in mots[1:]):
+                clients.append(dict(row))
+                if len(clients) >= limit:
+                    break
+        return clients
+
     def create_client(self, session: Session, nom: str, prenom: str = None,
                      email: str = None, telephone: str = None, 
                      adresse: str = None) -> ShopClient:
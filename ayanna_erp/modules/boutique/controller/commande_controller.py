@@ -11,6 +11,7 @@ from sqlalchemy import text
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
 from ayanna_erp.core.session_manager import SessionManager
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 
 
 db = DatabaseManager()
@@ -19,6 +20,9 @@ db = DatabaseManager()
 class CommandeController:
     """Contrôleur pour la gestion des commandes"""
 
+    # Cache des tables existantes par URL de base (évite d'interroger sqlite_master à chaque appel)
+    _existing_tables_cache = {}
+
     def __init__(self):
         self.db_manager = DatabaseManager()
         self.entreprise_controller = EntrepriseController()
@@ -30,6 +34,19 @@ class CommandeController:
         except Exception:
             return "FC"  # Fallback
 
+    def _get_existing_tables(self, session, refresh=False) -> set:
+        """Retourne (avec cache) l'ensemble des tables présentes dans la base"""
+        key = getattr(self.db_manager, 'database_url', None)
+        tables = None if refresh else CommandeController._existing_tables_cache.get(key)
+        if tables is None:
+            try:
+                rows = session.execute(text("SELECT name FROM sqlite_master WHERE type='table'")).fetchall()
+                tables = {r[0] for r in rows}
+            except Exception:
+                tables = set()
+            CommandeController._existing_tables_cache[key] = tables
+        return tables
+
     def get_commandes(self, date_debut=None, date_fin=None, search_term=None,
                      payment_filter=None, limit=100) -> List[Dict[str, Any]]:
         """
@@ -40,284 +57,305 @@ class CommandeController:
             date_fin: Date de fin pour le filtrage
             search_term: Terme de recherche
             payment_filter: Filtre par méthode de paiement
-            limit: Nombre maximum de commandes à récupérer
+            limit: Nombre maximum de commandes à récupérer (boutique + restaurant)
+
+        Returns:
+            Liste des commandes avec leurs détails, les plus récentes d'abord
+        """
+        page = self.get_commandes_page(
+            date_debut=date_debut,
+            date_fin=date_fin,
+            search_term=search_term,
+            payment_filter=payment_filter,
+            page_size=limit
+        )
+        return page['commandes']
+
+    def get_commandes_page(self, date_debut=None, date_fin=None, search_term=None,
+                           payment_filter=None, page_size=100, cursor=None) -> Dict[str, Any]:
+        """
+        Récupérer une page de commandes (boutique + restaurant) triées par date décroissante
+
+        La pagination se fait par curseur (keyset) sur (created_at, source, id) : la page
+        suivante reprend strictement après la dernière commande renvoyée, sans OFFSET.
+        Les lignes et paiements ne sont agrégés que pour les commandes de la page.
+
+        Args:
+            date_debut: Date de début pour le filtrage
+            date_fin: Date de fin pour le filtrage
+            search_term: Terme de recherche
+            payment_filter: Filtre par méthode de paiement
+            page_size: Nombre de commandes par page
+            cursor: Curseur renvoyé par la page précédente (None pour la première page)
 
         Returns:
-            Liste des commandes avec leurs détails
+            dict: {'commandes': [...], 'next_cursor': dict ou None, 'has_more': bool}
         """
         try:
             with self.db_manager.session_scope() as session:
-                # Construction de la requête de base
-                base_query = """
-                    SELECT
-                        sp.id,
-                        sp.numero_commande,
-                        sp.created_at,
-                        COALESCE(sc.nom || ' ' || COALESCE(sc.prenom, ''), 'Client anonyme') as client_name,
-                        sp.subtotal,
-                        sp.remise_amount,
-                        sp.total_final,
-                        sp.payment_method,
-                        sp.status,
-                        (
-                            SELECT GROUP_CONCAT(cp.name || ' (x' || spp.quantity || ')')
-                            FROM shop_paniers_products spp
-                            JOIN core_products cp ON spp.product_id = cp.id
-                            WHERE spp.panier_id = sp.id
-                        ) as produits,
-                        (
-                            SELECT GROUP_CONCAT(ss.name || ' (x' || sps.quantity || ')')
-                            FROM shop_paniers_services sps
-                            JOIN event_services ss ON sps.service_id = ss.id
-                            WHERE sps.panier_id = sp.id
-                        ) as services,
-                        (
-                            COALESCE(
-                                (SELECT SUM(spp.quantity) FROM shop_paniers_products spp WHERE spp.panier_id = sp.id), 0
-                            ) + COALESCE(
-                                (SELECT SUM(sps.quantity) FROM shop_paniers_services sps WHERE sps.panier_id = sp.id), 0
-                            )
-                        ) as total_quantity,
-                        (
-                            COALESCE(
-                                (SELECT SUM(spay.amount) FROM shop_payments spay WHERE spay.panier_id = sp.id), 0
-                            )
-                        ) as montant_paye
-                    FROM shop_paniers sp
-                    LEFT JOIN shop_clients sc ON sp.client_id = sc.id
-                """
+                tables = self._get_existing_tables(session)
+                has_shop = 'shop_paniers' in tables
+                has_restau = 'restau_paniers' in tables
+                has_shop_clients = 'shop_clients' in tables
+                has_core_users = 'core_users' in tables
+                has_core_products = 'core_products' in tables
 
-                conditions = []
-                params = {}
+                page_size = int(page_size)
+                # Une ligne de plus que la page pour savoir s'il reste des commandes
+                params = {'fetch_limit': page_size + 1}
 
                 # Filtrage par dates
                 if date_debut:
                     # normalize date_debut to start of day for datetime comparisons
-                    date_debut_dt = datetime.combine(date_debut, datetime.min.time()) if not isinstance(date_debut, datetime) else date_debut
-                    conditions.append("sp.created_at >= :date_debut")
-                    params['date_debut'] = date_debut_dt
+                    params['date_debut'] = datetime.combine(date_debut, datetime.min.time()) if not isinstance(date_debut, datetime) else date_debut
                 if date_fin:
                     # Ajouter 23:59:59 à la date de fin pour inclure toute la journée
-                    date_fin_end = datetime.combine(date_fin, datetime.max.time())
-                    conditions.append("sp.created_at <= :date_fin")
-                    params['date_fin'] = date_fin_end
-
-                # Filtrage par méthode de paiement
+                    params['date_fin'] = date_fin if isinstance(date_fin, datetime) else datetime.combine(date_fin, datetime.max.time())
                 if payment_filter and payment_filter != "Tous":
-                    conditions.append("sp.payment_method = :payment_method")
                     params['payment_method'] = payment_filter
-
-                # Recherche textuelle
                 if search_term:
-                    search_conditions = [
-                        "sp.numero_commande LIKE :search",
-                        "sc.nom LIKE :search",
-                        "sc.prenom LIKE :search",
-                        "sp.payment_method LIKE :search",
-                        # Recherche dans les produits
-                        "EXISTS (SELECT 1 FROM shop_paniers_products spp JOIN core_products cp ON spp.product_id = cp.id WHERE spp.panier_id = sp.id AND cp.name LIKE :search)",
-                        # Recherche dans les services
-                        "EXISTS (SELECT 1 FROM shop_paniers_services sps JOIN shop_services ss ON sps.service_id = ss.id WHERE sps.panier_id = sp.id AND ss.name LIKE :search)"
-                        
-                    ]
-                    conditions.append("(" + " OR ".join(search_conditions) + ")")
                     params['search'] = f"%{search_term}%"
+                if cursor:
+                    params['c_created_at'] = cursor['created_at']
+                    params['c_src'] = int(cursor['src'])
+                    params['c_id'] = int(cursor['id'])
 
-                # Ajouter les conditions à la requête
-                if conditions:
-                    base_query += " WHERE " + " AND ".join(conditions)
-
-                # Tri et limite
-                base_query += " ORDER BY sp.created_at DESC LIMIT :limit"
-                params['limit'] = limit
-
-                query = text(base_query)
-                try:
-                    result = session.execute(query, params)
-                    commandes = result.fetchall()
-                except Exception as e:
-                    # Si la table shop_paniers n'existe pas ou autre erreur, log et continuer
-                    print(f"⚠️ shop_paniers query failed, continuing with restaurant only: {e}")
-                    commandes = []
-
-                # Post-process each row to combine products+services into a single items field
-                processed = []
-                for c in commandes:
-                    prod = c.produits or ''
-                    serv = c.services or ''
-                    if prod and serv:
-                        items = prod + ', ' + serv
-                    else:
-                        items = prod or serv or 'Aucun produit/service'
-
-                    # Créer un objet commande avec tous les attributs nécessaires
-                    commande = {
-                        'id': c.id,
-                        'numero_commande': c.numero_commande,
-                        'created_at': c.created_at,
-                        'client_name': c.client_name,
-                        'subtotal': c.subtotal,
-                        'remise_amount': c.remise_amount,
-                        'total_final': c.total_final,
-                        'payment_method': c.payment_method,
-                        'status': c.status,
-                        'produits': items,
-                        'services': c.services,  # Garder séparé pour populate_table
-                        'total_quantity': c.total_quantity,
-                        'montant_paye': c.montant_paye
-                    }
-                    processed.append(commande)
-
-                # --- Récupérer également les paniers du module Restaurant (avec mêmes filtres) ---
-                try:
-                    # Vérifier si certaines tables optionnelles existent (core_users, shop_clients)
-                    has_core_users = False
-                    has_shop_clients = False
+                if has_restau and cursor is None:
+                    # Si created_at absent dans restau_paniers, forcer l'horloge machine (une seule requête)
                     try:
-                        tbl = session.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name=:t"), {'t': 'core_users'}).fetchone()
-                        has_core_users = tbl is not None
+                        now = datetime.now()
+                        session.execute(text(
+                            "UPDATE restau_paniers SET created_at = :now, updated_at = :now WHERE created_at IS NULL"
+                        ), {'now': now})
                     except Exception:
-                        has_core_users = False
-
-                    try:
-                        tbl2 = session.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name=:t"), {'t': 'shop_clients'}).fetchone()
-                        has_shop_clients = tbl2 is not None
-                    except Exception:
-                        has_shop_clients = False
-
-                    # Construire dynamiquement la sélection et les jointures en fonction des tables disponibles
-                    client_name_expr = "COALESCE(sc.nom || ' ' || COALESCE(sc.prenom, ''), 'Client restaurant')" if has_shop_clients else "'Client restaurant'"
-                    serveuse_select = "su.name as serveuse_name, scu.name as comptoiriste_name" if has_core_users else "NULL as serveuse_name, NULL as comptoiriste_name"
-                    serveuse_joins = "LEFT JOIN core_users su ON rp.serveuse_id = su.id\n                        LEFT JOIN core_users scu ON rp.user_id = scu.id" if has_core_users else ""
-                    client_join = "LEFT JOIN shop_clients sc ON rp.client_id = sc.id" if has_shop_clients else ""
+                        pass
 
-                    restau_base = f"""
-                        SELECT
-                            rp.id,
-                            rp.id as numero_commande,
-                            rp.created_at,
-                            {client_name_expr} as client_name,
-                            rp.subtotal,
-                            rp.remise_amount,
-                            rp.total_final,
-                            rp.payment_method,
-                            rp.status,
-                            (
-                                SELECT GROUP_CONCAT(cp.name || ' (x' || rpp.quantity || ')')
-                                FROM restau_produit_panier rpp
-                                LEFT JOIN core_products cp ON rpp.product_id = cp.id
-                                WHERE rpp.panier_id = rp.id
-                            ) as produits,
-                            NULL as services,
-                            (
-                                COALESCE((SELECT SUM(rpp.quantity) FROM restau_produit_panier rpp WHERE rpp.panier_id = rp.id), 0)
-                            ) as total_quantity,
-                            (
-                                COALESCE((SELECT SUM(rpays.amount) FROM restau_payments rpays WHERE rpays.panier_id = rp.id), 0)
-                            ) as montant_paye,
-                            rt.number as table_number,
-                            rs.name as salle_name,
-                            {serveuse_select}
-                        FROM restau_paniers rp
-                        LEFT JOIN restau_tables rt ON rp.table_id = rt.id
-                        LEFT JOIN restau_salles rs ON rt.salle_id = rs.id
-                        {serveuse_joins}
-                        {client_join}
-                    """
-
-                    restau_conditions = []
-                    # réutiliser params construits plus haut
+                def _common_conditions(alias, src):
+                    conditions = []
                     if 'date_debut' in params:
-                        restau_conditions.append("rp.created_at >= :date_debut")
+                        conditions.append(f"{alias}.created_at >= :date_debut")
                     if 'date_fin' in params:
-                        restau_conditions.append("rp.created_at <= :date_fin")
-                    if payment_filter and payment_filter != "Tous":
-                        restau_conditions.append("rp.payment_method = :payment_method")
+                        conditions.append(f"{alias}.created_at <= :date_fin")
+                    if 'payment_method' in params:
+                        conditions.append(f"{alias}.payment_method = :payment_method")
+                    if cursor:
+                        # Keyset : (created_at, src, id) < curseur, écrit pour rester indexable sur created_at
+                        conditions.append(
+                            f"{alias}.created_at <= :c_created_at AND ({alias}.created_at < :c_created_at"
+                            f" OR {src} < :c_src OR ({src} = :c_src AND {alias}.id < :c_id))"
+                        )
+                    return conditions
+
+                branches = []
+                if has_shop:
+                    shop_conditions = _common_conditions('sp', 1)
+                    if search_term:
+                        search_conditions = [
+                            "sp.numero_commande LIKE :search",
+                            "sp.payment_method LIKE :search",
+                            # Recherche dans les produits
+                            "EXISTS (SELECT 1 FROM shop_paniers_products spp JOIN core_products cp ON spp.product_id = cp.id WHERE spp.panier_id = sp.id AND cp.name LIKE :search)",
+                            # Recherche dans les services
+                            "EXISTS (SELECT 1 FROM shop_paniers_services sps JOIN shop_services ss ON sps.service_id = ss.id WHERE sps.panier_id = sp.id AND ss.name LIKE :search)"
+                        ]
+                        if has_shop_clients:
+                            search_conditions[1:1] = ["sc.nom LIKE :search", "sc.prenom LIKE :search"]
+                        shop_conditions.append("(" + " OR ".join(search_conditions) + ")")
+                    shop_client_expr = "COALESCE(sc.nom || ' ' || COALESCE(sc.prenom, ''), 'Client anonyme')" if has_shop_clients else "'Client anonyme'"
+                    shop_client_join = "LEFT JOIN shop_clients sc ON sp.client_id = sc.id" if has_shop_clients else ""
+                    shop_where = (" WHERE " + " AND ".join(shop_conditions)) if shop_conditions else ""
+                    branches.append(f"""
+                        SELECT * FROM (
+                            SELECT 1 AS src, sp.id, sp.numero_commande, sp.created_at,
+                                   {shop_client_expr} AS client_name,
+                                   sp.subtotal, sp.remise_amount, sp.total_final, sp.payment_method, sp.status,
+                                   NULL AS table_number, NULL AS salle_name,
+                                   NULL AS serveuse_name, NULL AS comptoiriste_name
+                            FROM shop_paniers sp
+                            {shop_client_join}
+                            {shop_where}
+                            ORDER BY sp.created_at DESC, sp.id DESC
+                            LIMIT :fetch_limit
+                        )
+                    """)
+
+                if has_restau:
+                    restau_conditions = _common_conditions('rp', 0)
                     if search_term:
                         # rechercher par id panier, nom client ou produit dans les lignes restau
-                        restau_conditions.append(
-                            "(CAST(rp.id AS TEXT) LIKE :search OR sc.nom LIKE :search OR sc.prenom LIKE :search OR EXISTS (SELECT 1 FROM restau_produit_panier rpp LEFT JOIN core_products cp ON rpp.product_id = cp.id WHERE rpp.panier_id = rp.id AND (cp.name LIKE :search OR CAST(rpp.product_id AS TEXT) LIKE :search)))"
+                        product_name_cond = "cp.name LIKE :search OR " if has_core_products else ""
+                        product_join = "LEFT JOIN core_products cp ON rpp.product_id = cp.id" if has_core_products else ""
+                        search_conditions = [
+                            "CAST(rp.id AS TEXT) LIKE :search",
+                            f"EXISTS (SELECT 1 FROM restau_produit_panier rpp {product_join} WHERE rpp.panier_id = rp.id AND ({product_name_cond}CAST(rpp.product_id AS TEXT) LIKE :search))"
+                        ]
+                        if has_shop_clients:
+                            search_conditions[1:1] = ["sc.nom LIKE :search", "sc.prenom LIKE :search"]
+                        restau_conditions.append("(" + " OR ".join(search_conditions) + ")")
+
+                    # Construire dynamiquement la sélection et les jointures en fonction des tables disponibles
+                    client_name_expr = "COALESCE(sc.nom || ' ' || COALESCE(sc.prenom, ''), 'Client restaurant')" if has_shop_clients else "'Client restaurant'"
+                    serveuse_select = "su.name AS serveuse_name, scu.name AS comptoiriste_name" if has_core_users else "NULL AS serveuse_name, NULL AS comptoiriste_name"
+                    serveuse_joins = "LEFT JOIN core_users su ON rp.serveuse_id = su.id LEFT JOIN core_users scu ON rp.user_id = scu.id" if has_core_users else ""
+                    client_join = "LEFT JOIN shop_clients sc ON rp.client_id = sc.id" if has_shop_clients else ""
+                    restau_where = (" WHERE " + " AND ".join(restau_conditions)) if restau_conditions else ""
+                    branches.append(f"""
+                        SELECT * FROM (
+                            SELECT 0 AS src, rp.id, CAST(rp.id AS TEXT) AS numero_commande, rp.created_at,
+                                   {client_name_expr} AS client_name,
+                                   rp.subtotal, rp.remise_amount, rp.total_final, rp.payment_method, rp.status,
+                                   rt.number AS table_number, rs.name AS salle_name,
+                                   {serveuse_select}
+                            FROM restau_paniers rp
+                            LEFT JOIN restau_tables rt ON rp.table_id = rt.id
+                            LEFT JOIN restau_salles rs ON rt.salle_id = rs.id
+                            {serveuse_joins}
+                            {client_join}
+                            {restau_where}
+                            ORDER BY rp.created_at DESC, rp.id DESC
+                            LIMIT :fetch_limit
                         )
+                    """)
 
-                    if restau_conditions:
-                        restau_base += " WHERE " + " AND ".join(restau_conditions)
+                if not branches:
+                    return {'commandes': [], 'next_cursor': None, 'has_more': False}
+
+                # Agrégats pré-calculés (une seule passe GROUP BY) restreints aux commandes de la page
+                product_name_expr = "cp.name" if has_core_products else "('Produit #' || spp.product_id)"
+                product_join = "LEFT JOIN core_products cp ON spp.product_id = cp.id" if has_core_products else ""
+                restau_name_expr = "cp.name" if has_core_products else "('Produit #' || rpp.product_id)"
+                restau_product_join = "LEFT JOIN core_products cp ON rpp.product_id = cp.id" if has_core_products else ""
+
+                aggregates = []
+                agg_columns = []
+                if has_shop:
+                    agg_columns += [
+                        "sl.produits AS shop_produits", "sl.qty AS shop_products_qty",
+                        "sv.services AS shop_services", "sv.qty AS shop_services_qty",
+                        "spay.amount AS shop_paid",
+                    ]
+                    aggregates += [
+                        f"""LEFT JOIN (
+                            SELECT spp.panier_id,
+                                   GROUP_CONCAT({product_name_expr} || ' (x' || spp.quantity || ')') AS produits,
+                                   SUM(spp.quantity) AS qty
+                            FROM shop_paniers_products spp
+                            {product_join}
+                            WHERE spp.panier_id IN (SELECT id FROM page WHERE src = 1)
+                            GROUP BY spp.panier_id
+                        ) sl ON page.src = 1 AND sl.panier_id = page.id""",
+                        """LEFT JOIN (
+                            SELECT sps.panier_id,
+                                   GROUP_CONCAT(ss.name || ' (x' || sps.quantity || ')') AS services,
+                                   SUM(sps.quantity) AS qty
+                            FROM shop_paniers_services sps
+                            LEFT JOIN event_services ss ON sps.service_id = ss.id
+                            WHERE sps.panier_id IN (SELECT id FROM page WHERE src = 1)
+                            GROUP BY sps.panier_id
+                        ) sv ON page.src = 1 AND sv.panier_id = page.id""",
+                        """LEFT JOIN (
+                            SELECT panier_id, SUM(amount) AS amount
+                            FROM shop_payments
+                            WHERE panier_id IN (SELECT id FROM page WHERE src = 1)
+                            GROUP BY panier_id
+                        ) spay ON page.src = 1 AND spay.panier_id = page.id""",
+                    ]
+                if has_restau:
+                    agg_columns += [
+                        "rl.produits AS restau_produits", "rl.qty AS restau_qty",
+                        "rpay.amount AS restau_paid",
+                    ]
+                    aggregates += [
+                        f"""LEFT JOIN (
+                            SELECT rpp.panier_id,
+                                   GROUP_CONCAT({restau_name_expr} || ' (x' || rpp.quantity || ')') AS produits,
+                                   SUM(rpp.quantity) AS qty
+                            FROM restau_produit_panier rpp
+                            {restau_product_join}
+                            WHERE rpp.panier_id IN (SELECT id FROM page WHERE src = 0)
+                            GROUP BY rpp.panier_id
+                        ) rl ON page.src = 0 AND rl.panier_id = page.id""",
+                        """LEFT JOIN (
+                            SELECT panier_id, SUM(amount) AS amount
+                            FROM restau_payments
+                            WHERE panier_id IN (SELECT id FROM page WHERE src = 0)
+                            GROUP BY panier_id
+                        ) rpay ON page.src = 0 AND rpay.panier_id = page.id""",
+                    ]
 
-                    restau_base += " ORDER BY rp.created_at DESC LIMIT :limit"
-                    params['limit'] = limit
+                query = f"""
+                    WITH page AS (
+                        SELECT * FROM ({' UNION ALL '.join(branches)})
+                        ORDER BY created_at DESC, src DESC, id DESC
+                        LIMIT :fetch_limit
+                    )
+                    SELECT page.*, {', '.join(agg_columns)}
+                    FROM page
+                    {' '.join(aggregates)}
+                    ORDER BY page.created_at DESC, page.src DESC, page.id DESC
+                """
+                rows = session.execute(text(query), params).fetchall()
 
-                    # Vérifier si la table core_products existe (pour afficher les noms produits)
-                    has_core_products = False
-                    try:
-                        tbl3 = session.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name=:t"), {'t': 'core_products'}).fetchone()
-                        has_core_products = tbl3 is not None
-                    except Exception:
-                        has_core_products = False
+                has_more = len(rows) > page_size
+                rows = rows[:page_size]
 
-                    # Construire l'expression pour les produits (nom si core_products dispo, sinon id)
-                    if has_core_products:
-                        prod_concat_join = "LEFT JOIN core_products cp ON rpp.product_id = cp.id"
-                        prod_concat_expr = "cp.name"
+                processed = []
+                for r in rows:
+                    if r.src == 1:
+                        prod = r.shop_produits or ''
+                        serv = r.shop_services or ''
+                        total_quantity = float(r.shop_products_qty or 0) + float(r.shop_services_qty or 0)
+                        montant_paye = r.shop_paid or 0
                     else:
-                        prod_concat_join = ""
-                        prod_concat_expr = "('Produit #' || rpp.product_id)"
+                        prod = r.restau_produits or ''
+                        serv = ''
+                        total_quantity = r.restau_qty or 0
+                        montant_paye = r.restau_paid or 0
 
-                    # Injecter l'expression produit dans la requête
-                    restau_base = restau_base.replace("FROM restau_produit_panier rpp\n                                LEFT JOIN core_products cp ON rpp.product_id = cp.id\n                                WHERE rpp.panier_id = rp.id",
-                                                        f"FROM restau_produit_panier rpp\n                                {prod_concat_join}\n                                WHERE rpp.panier_id = rp.id")
-
-                    restau_base = restau_base.replace("SELECT GROUP_CONCAT(cp.name || ' (x' || rpp.quantity || ')')",
-                                                        f"SELECT GROUP_CONCAT({prod_concat_expr} || ' (x' || rpp.quantity || ')')")
+                    if prod and serv:
+                        items = prod + ', ' + serv
+                    else:
+                        items = prod or serv or 'Aucun produit/service'
 
-                    restau_query = text(restau_base)
-                    restau_rows = session.execute(restau_query, params).fetchall()
-                    for r in restau_rows:
-                        # Si created_at absent ou null dans la table, forcer l'horloge machine maintenant
-                        try:
-                            if not getattr(r, 'created_at', None):
-                                now = datetime.now()
-                                session.execute(text("UPDATE restau_paniers SET created_at = :now, updated_at = :now WHERE id = :id"), {'now': now, 'id': r.id})
-                                # recharger la valeur locale pour affichage
-                                r = session.execute(text("SELECT * FROM restau_paniers WHERE id = :id"), {'id': r.id}).fetchone()
-                        except Exception:
-                            # si la mise à jour échoue (schéma différent), continuer sans interrompre
-                            pass
-                        prod = r.produits or ''
-                        serv = r.services or ''
-                        if prod and serv:
-                            items = prod + ', ' + serv
-                        else:
-                            items = prod or serv or 'Aucun produit/service'
-
-                        commande = {
-                            'id': r.id,
-                            # For restaurant we use the panier id as "numero_commande"
-                            'numero_commande': str(r.numero_commande),
-                            'created_at': r.created_at,
-                            'client_name': r.client_name,
-                            'subtotal': r.subtotal,
-                            'remise_amount': r.remise_amount,
-                            'total_final': r.total_final,
-                            'payment_method': r.payment_method,
-                            'status': r.status,
-                            'produits': items,
-                            'services': r.services,
-                            'total_quantity': r.total_quantity,
-                            'montant_paye': r.montant_paye,
+                    commande = {
+                        'id': r.id,
+                        'numero_commande': r.numero_commande,
+                        'created_at': r.created_at,
+                        'client_name': r.client_name,
+                        'subtotal': r.subtotal,
+                        'remise_amount': r.remise_amount,
+                        'total_final': r.total_final,
+                        'payment_method': r.payment_method,
+                        'status': r.status,
+                        'produits': items,
+                        'services': serv or None,  # Garder séparé pour populate_table
+                        'total_quantity': total_quantity,
+                        'montant_paye': montant_paye
+                    }
+                    if r.src == 0:
+                        # For restaurant we use the panier id as "numero_commande"
+                        commande.update({
                             'module': 'restaurant',
-                            'table_number': getattr(r, 'table_number', None),
-                            'salle_name': getattr(r, 'salle_name', None),
-                            'serveuse_name': getattr(r, 'serveuse_name', None),
-                            'comptoiriste_name': getattr(r, 'comptoiriste_name', None)
-                        }
-                        processed.append(commande)
-                except Exception as e:
-                    # Si la table restau_* n'existe pas ou autre problème, on log l'erreur
-                    print(f"⚠️ restau_paniers query failed or other err: {e}")
+                            'table_number': r.table_number,
+                            'salle_name': r.salle_name,
+                            'serveuse_name': r.serveuse_name,
+                            'comptoiriste_name': r.comptoiriste_name
+                        })
+                    processed.append(commande)
+
+                next_cursor = None
+                if has_more and rows and rows[-1].created_at is not None:
+                    last = rows[-1]
+                    next_cursor = {'created_at': last.created_at, 'src': last.src, 'id': last.id}
 
-                return processed
+                return {
+                    'commandes': processed,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None
+                }
 
         except Exception as e:
-            print(f"❌ Erreur get_commandes: {e}")
+            print(f"❌ Erreur get_commandes_page: {e}")
             raise
 
     def get_commandes_statistics(self, commandes: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -406,7 +444,7 @@ class CommandeController:
             'panier_moyen': panier_moyen
         }
 
-    def get_period_commandes_stats(self, date_debut, date_fin) -> Dict[str, Any]:
+    def get_period_commandes_stats(self, date_debut, date_fin, breakdown=None) -> Dict[str, Any]:
         """
         Calculer les statistiques des commandes pour une période donnée (depuis la base).
 
@@ -416,6 +454,15 @@ class CommandeController:
         - total_paid = somme des paiements (shop_payments.amount) liés aux commandes de la période
         - total_unpaid = chiffre d'affaires - total_paid
         - total_creances = somme des montants restants pour les commandes où montant_paye < total_final
+
+        Toutes les valeurs proviennent d'un seul parcours des commandes de la période,
+        groupé par jour / module / POS puis consolidé en mémoire.
+
+        Args:
+            date_debut: Date de début (incluse)
+            date_fin: Date de fin (incluse)
+            breakdown: None, 'day', 'pos' ou 'day_pos' pour ajouter une ventilation
+                       dans result['breakdown']
         """
         try:
             # Normaliser les bornes (inclusives)
@@ -430,82 +477,66 @@ class CommandeController:
                 d2 = datetime.combine(date_fin, time.max)
 
             with self.db_manager.get_session() as session:
-                # Calculer CA total (shop + restau) en excluant les statuts annulés
-                q_ca = text("""
-                    SELECT
-                      COALESCE((SELECT SUM(total_final) FROM shop_paniers WHERE created_at >= :d1 AND created_at <= :d2 AND LOWER(COALESCE(status,'')) <> 'cancelled'),0)
-                      + COALESCE((SELECT SUM(total_final) FROM restau_paniers WHERE created_at >= :d1 AND created_at <= :d2 AND LOWER(COALESCE(status,'')) NOT IN ('annule','annulé', 'cancelled')),0)
-                      as total_ca
-                """)
-                ca_row = session.execute(q_ca, {'d1': d1, 'd2': d2}).fetchone()
-                total_ca = float(ca_row.total_ca or 0)
-
-                # Total payé : sommes des paiements shop + restau pour paniers valides
-                q_paid = text("""
-                    SELECT
-                      COALESCE((SELECT SUM(sp.amount) FROM shop_payments sp JOIN shop_paniers p ON sp.panier_id = p.id WHERE p.created_at >= :d1 AND p.created_at <= :d2 AND LOWER(COALESCE(p.status,'')) <> 'cancelled'),0)
-                      + COALESCE((SELECT SUM(rp.amount) FROM restau_payments rp JOIN restau_paniers r ON rp.panier_id = r.id WHERE r.created_at >= :d1 AND r.created_at <= :d2 AND LOWER(COALESCE(r.status,'')) NOT IN ('annule','annulé', 'cancelled')),0)
-                      as total_paid
-                """)
-                paid_row = session.execute(q_paid, {'d1': d1, 'd2': d2}).fetchone()
-                total_paid = float(paid_row.total_paid or 0)
-
-                # Total créances : somme des (total_final - montant_paye) pour les paniers (shop + restau) où montant_paye < total_final
-                q_creances = text("""
-                    SELECT COALESCE(SUM(t.total_final - COALESCE(t.montant_paye,0)),0) as total_creances
-                    FROM (
-                        SELECT pp.id, COALESCE(pp.total_final,0) as total_final,
-                               (SELECT COALESCE(SUM(sp.amount),0) FROM shop_payments sp WHERE sp.panier_id = pp.id) as montant_paye
-                        FROM shop_paniers pp
-                        WHERE pp.created_at >= :d1 AND pp.created_at <= :d2
-                        AND LOWER(COALESCE(pp.status,'')) <> 'cancelled'
-                        UNION ALL
-                        SELECT rp.id, COALESCE(rp.total_final,0) as total_final,
-                               (SELECT COALESCE(SUM(rpay.amount),0) FROM restau_payments rpay WHERE rpay.panier_id = rp.id) as montant_paye
-                        FROM restau_paniers rp
-                        WHERE rp.created_at >= :d1 AND rp.created_at <= :d2
-                        AND LOWER(COALESCE(rp.status,'')) NOT IN ('annule','annulé', 'cancelled')
-                    ) t
-                    WHERE COALESCE(t.montant_paye,0) < COALESCE(t.total_final,0)
-                """)
-                cre_row = session.execute(q_creances, {'d1': d1, 'd2': d2}).fetchone()
-                total_creances = float(cre_row.total_creances or 0)
-
-                # Nombre de créances (nombre de commandes où montant_paye < total_final)
-                q_nb_creances = text("""
-                    SELECT COALESCE(SUM(case when COALESCE(t.montant_paye,0) < COALESCE(t.total_final,0) then 1 else 0 end),0) as nb_creances
-                    FROM (
-                        SELECT pp.id, COALESCE(pp.total_final,0) as total_final,
-                               (SELECT COALESCE(SUM(sp.amount),0) FROM shop_payments sp WHERE sp.panier_id = pp.id) as montant_paye
-                        FROM shop_paniers pp
-                        WHERE pp.created_at >= :d1 AND pp.created_at <= :d2
-                        AND LOWER(COALESCE(pp.status,'')) <> 'cancelled'
-                        UNION ALL
-                        SELECT rp.id, COALESCE(rp.total_final,0) as total_final,
-                               (SELECT COALESCE(SUM(rpay.amount),0) FROM restau_payments rpay WHERE rpay.panier_id = rp.id) as montant_paye
-                        FROM restau_paniers rp
-                        WHERE rp.created_at >= :d1 AND rp.created_at <= :d2
-                        AND LOWER(COALESCE(rp.status,'')) NOT IN ('annule','annulé', 'cancelled')
-                    ) t
-                """)
-                nb_cre_row = session.execute(q_nb_creances, {'d1': d1, 'd2': d2}).fetchone()
-                nb_creances = int(nb_cre_row.nb_creances) if nb_cre_row and nb_cre_row.nb_creances is not None else 0
+                tables = self._get_existing_tables(session)
+
+                # Une branche par module : montant payé agrégé une fois par panier de la période
+                branches = []
+                if 'shop_paniers' in tables:
+                    branches.append("""
+                        SELECT DATE(p.created_at) AS jour, 'boutique' AS module, p.pos_id AS pos_id,
+                               COALESCE(p.total_final, 0) AS total_final,
+                               COALESCE(pay.amount, 0) AS montant_paye
+                        FROM shop_paniers p
+                        LEFT JOIN (
+                            SELECT sp.panier_id, SUM(sp.amount) AS amount
+                            FROM shop_payments sp
+                            WHERE sp.panier_id IN (SELECT id FROM shop_paniers WHERE created_at >= :d1 AND created_at <= :d2)
+                            GROUP BY sp.panier_id
+                        ) pay ON pay.panier_id = p.id
+                        WHERE p.created_at >= :d1 AND p.created_at <= :d2
+                        AND LOWER(COALESCE(p.status,'')) <> 'cancelled'
+                    """)
+                if 'restau_paniers' in tables:
+                    branches.append("""
+                        SELECT DATE(r.created_at) AS jour, 'restaurant' AS module, NULL AS pos_id,
+                               COALESCE(r.total_final, 0) AS total_final,
+                               COALESCE(pay.amount, 0) AS montant_paye
+                        FROM restau_paniers r
+                        LEFT JOIN (
+                            SELECT rpay.panier_id, SUM(rpay.amount) AS amount
+                            FROM restau_payments rpay
+                            WHERE rpay.panier_id IN (SELECT id FROM restau_paniers WHERE created_at >= :d1 AND created_at <= :d2)
+                            GROUP BY rpay.panier_id
+                        ) pay ON pay.panier_id = r.id
+                        WHERE r.created_at >= :d1 AND r.created_at <= :d2
+                        AND LOWER(COALESCE(r.status,'')) NOT IN ('annule','annulé', 'cancelled')
+                    """)
 
-                total_unpaid = total_ca - total_paid
+                groups = []
+                if branches:
+                    q_stats = text(f"""
+                        SELECT t.jour, t.module, t.pos_id,
+                               COUNT(1) AS nb_commandes,
+                               COALESCE(SUM(t.total_final), 0) AS total_ca,
+                               COALESCE(SUM(t.montant_paye), 0) AS total_paid,
+                               COALESCE(SUM(CASE WHEN t.montant_paye < t.total_final THEN t.total_final - t.montant_paye ELSE 0 END), 0) AS total_creances,
+                               COALESCE(SUM(CASE WHEN t.montant_paye < t.total_final THEN 1 ELSE 0 END), 0) AS nb_creances
+                        FROM ({' UNION ALL '.join(branches)}) t
+                        GROUP BY t.jour, t.module, t.pos_id
+                        ORDER BY t.jour, t.module, t.pos_id
+                    """)
+                    groups = session.execute(q_stats, {'d1': d1, 'd2': d2}).fetchall()
 
-                # Nombre total de commandes (shop + restau)
-                q_nb_cmd = text("""
-                    SELECT
-                      COALESCE((SELECT COUNT(1) FROM shop_paniers WHERE created_at >= :d1 AND created_at <= :d2 AND LOWER(COALESCE(status,'')) <> 'cancelled'),0)
-                      + COALESCE((SELECT COUNT(1) FROM restau_paniers WHERE created_at >= :d1 AND created_at <= :d2 AND LOWER(COALESCE(status,'')) NOT IN ('annule','annulé', 'cancelled')),0)
-                      as nb_commandes
-                """)
-                nb_row = session.execute(q_nb_cmd, {'d1': d1, 'd2': d2}).fetchone()
-                nb_commandes = int(nb_row.nb_commandes) if nb_row and nb_row.nb_commandes is not None else 0
+                total_ca = sum(float(g.total_ca or 0) for g in groups)
+                total_paid = sum(float(g.total_paid or 0) for g in groups)
+                total_creances = sum(float(g.total_creances or 0) for g in groups)
+                nb_creances = sum(int(g.nb_creances or 0) for g in groups)
+                nb_commandes = sum(int(g.nb_commandes or 0) for g in groups)
 
+                total_unpaid = total_ca - total_paid
                 panier_moyen = (total_ca / nb_commandes) if nb_commandes > 0 else 0
 
-                return {
+                stats = {
                     'total_ca': total_ca,
                     'total_paid': total_paid,
                     'total_unpaid': total_unpaid,
@@ -514,16 +545,56 @@ class CommandeController:
                     'nb_commandes': nb_commandes,
                     'panier_moyen': panier_moyen,
                 }
+                if breakdown:
+                    stats['breakdown'] = self._build_stats_breakdown(groups, breakdown)
+                return stats
         except Exception as e:
             print(f"❌ Erreur get_period_commandes_stats: {e}")
-            return {
+            stats = {
                 'total_ca': 0,
                 'total_paid': 0,
                 'total_unpaid': 0,
                 'total_creances': 0,
+                'nb_creances': 0,
                 'nb_commandes': 0,
                 'panier_moyen': 0,
             }
+            if breakdown:
+                stats['breakdown'] = []
+            return stats
+
+    def _build_stats_breakdown(self, groups, breakdown) -> List[Dict[str, Any]]:
+        """Consolider les groupes (jour, module, pos) selon la ventilation demandée"""
+        if breakdown == 'day':
+            key_fields = ('jour',)
+        elif breakdown == 'pos':
+            key_fields = ('module', 'pos_id')
+        elif breakdown == 'day_pos':
+            key_fields = ('jour', 'module', 'pos_id')
+        else:
+            raise ValueError(f"Ventilation inconnue: {breakdown}")
+
+        rows = {}
+        for g in groups:
+            key = tuple(getattr(g, f) for f in key_fields)
+            row = rows.get(key)
+            if row is None:
+                row = dict(zip(key_fields, key))
+                row.update({'nb_commandes': 0, 'total_ca': 0.0, 'total_paid': 0.0,
+                            'total_creances': 0.0, 'nb_creances': 0})
+                rows[key] = row
+            row['nb_commandes'] += int(g.nb_commandes or 0)
+            row['total_ca'] += float(g.total_ca or 0)
+            row['total_paid'] += float(g.total_paid or 0)
+            row['total_creances'] += float(g.total_creances or 0)
+            row['nb_creances'] += int(g.nb_creances or 0)
+
+        result = []
+        for row in rows.values():
+            row['total_unpaid'] = row['total_ca'] - row['total_paid']
+            row['panier_moyen'] = (row['total_ca'] / row['nb_commandes']) if row['nb_commandes'] > 0 else 0
+            result.append(row)
+        return result
 
     def format_period_stats(self, stats: Dict[str, Any], date_debut, date_fin) -> str:
         """
@@ -1767,45 +1838,21 @@ Panier moyen: {stats['panier_moyen']:.0f} {self.get_currency_symbol()}
                             # chercher l'entrepot POS_4 utilisé pour les sorties restaurant
                             wh_row = session.execute(text("SELECT id FROM stock_warehouses WHERE code = 'POS_4' AND is_active = 1 LIMIT 1")).fetchone()
                             warehouse_id = wh_row[0] if wh_row else None
-                            for p in produits:
-                                product_id = p.product_id
-                                qty = p.quantity or 0
-                                unit_price = p.price or 0
-                                total_cost = (unit_price * qty)
-
-                                if warehouse_id:
-                                    # Mettre à jour quantité en entrepot
-                                    stock_row = session.execute(text("SELECT quantity FROM stock_produits_entrepot WHERE product_id = :pid AND warehouse_id = :wid LIMIT 1"), {'pid': product_id, 'wid': warehouse_id}).fetchone()
-                                    current_stock = stock_row[0] if stock_row else 0
-                                    new_stock = int(current_stock) + int(qty)
-                                    if stock_row:
-                                        session.execute(text("UPDATE stock_produits_entrepot SET quantity = :new_quantity, updated_at = :updated_at WHERE product_id = :pid AND warehouse_id = :wid"), {'new_quantity': new_stock, 'updated_at': datetime.now(), 'pid': product_id, 'wid': warehouse_id})
-                                    else:
-                                        session.execute(text("INSERT INTO stock_produits_entrepot (product_id, warehouse_id, quantity, created_at, updated_at) VALUES (:pid, :wid, :qty, :created_at, :updated_at)"), {'pid': product_id, 'wid': warehouse_id, 'qty': new_stock, 'created_at': datetime.now(), 'updated_at': datetime.now()})
-
-                                    # Insérer un mouvement d'entrée pour annulation
-                                    session.execute(text("""
-                                        INSERT INTO stock_mouvements(
-                                            product_id, warehouse_id, movement_type, quantity, unit_cost, total_cost,
-                                            destination_warehouse_id, reference, description, user_id, movement_date, created_at
-                                        ) VALUES (
-                                            :product_id, :warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
-                                            :destination_warehouse_id, :reference, :description, :user_id, :movement_date, :created_at
-                                        )
-                                    """), {
-                                        'product_id': product_id,
-                                        'warehouse_id': warehouse_id,
-                                        'movement_type': 'ANNULATION',
-                                        'quantity': qty,
-                                        'unit_cost': unit_price,
-                                        'total_cost': total_cost,
-                                        'destination_warehouse_id': warehouse_id,
-                                        'reference': f"ANN-CMD-{panier_id}",
-                                        'description': f"Annulation vente CMD- {panier_id}",
-                                        'user_id': getattr(current_user, 'id', 1),
-                                        'movement_date': datetime.now(),
-                                        'created_at': datetime.now()
-                                    })
+                            if warehouse_id:
+                                # Mouvements d'entrée d'annulation : journal et projection via le ledger
+                                StockLedgerController().post_movements(session, [{
+                                    'product_id': p.product_id,
+                                    'warehouse_id': warehouse_id,
+                                    'movement_type': 'ANNULATION',
+                                    'quantity': abs(float(p.quantity or 0)),
+                                    'unit_cost': p.price or 0,
+                                    'total_cost': float(p.price or 0) * float(p.quantity or 0),
+                                    'destination_warehouse_id': warehouse_id,
+                                    'reference': f"ANN-CMD-{panier_id}",
+                                    'description': f"Annulation vente CMD- {panier_id}",
+                                    'user_id': getattr(current_user, 'id', 1),
+                                    'movement_date': datetime.now(),
+                                } for p in produits])
                     except Exception:
                         # Si les tables de stock ne sont pas présentes, ignorer la restauration
                         pass
@@ -3,15 +3,14 @@ Contrôleur de vente pour le module Boutique
 Gère toute la logique de paiement et comptabilité
 """
 
-from decimal import Decimal
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.orm import Session
 
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
-from ..model.models import ShopClient, ShopPanier, ShopService
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 
 
 class VenteController:
@@ -22,6 +21,7 @@ class VenteController:
         self.current_user = current_user
         self.db_manager = DatabaseManager()
         self.entreprise_controller = EntrepriseController()
+        self._pos_warehouse_id = None
 
     def get_currency_symbol(self):
         """Récupère le symbole de devise depuis l'entreprise"""
@@ -35,6 +35,9 @@ class VenteController:
         """
         Traite une vente complète avec logique comptable avancée
 
+        Toute la vente est écrite par lots : configuration et entrepôt résolus une fois,
+        lignes, mouvements de stock et écritures insérés en executemany.
+
         Args:
             sale_data: Données de la vente contenant cart_items, payment_data, client_id, etc.
 
@@ -44,7 +47,8 @@ class VenteController:
         try:
             with self.db_manager.get_session() as session:
                 # Validation des comptes comptables avant traitement
-                validation_result = self._validate_accounting_config(session)
+                config = self._get_accounting_config(session)
+                validation_result = self._validate_accounting_config(session, config)
                 if not validation_result[0]:
                     return validation_result[0], validation_result[1], None
 
@@ -62,7 +66,7 @@ class VenteController:
                 numero_commande = f"FAC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(100, 999)}"
 
                 # 1. Créer le panier (toujours, même si pas payé)
-                panier_result = session.execute(text("""
+                session.execute(text("""
                     INSERT INTO shop_paniers 
                     (pos_id, client_id, numero_commande, status, payment_method, 
                      subtotal, remise_amount, total_final, user_id, created_at, updated_at, notes)
@@ -89,47 +93,42 @@ class VenteController:
 
                 # 2. Créer les lignes de vente et gérer le stock
                 print(f"Debug items du panier {cart_items}")
+                product_lines = []
+                service_lines = []
                 for item in cart_items:
+                    line = {
+                        'panier_id': panier_id,
+                        'item_id': item.get('id'),
+                        'quantity': item.get('quantity'),
+                        'price_unit': float(item.get('unit_price')),
+                        'total_price': float(item.get('unit_price') * item.get('quantity'))
+                    }
                     if item.get('type') == 'product':
-                        product_id = item.get('id')
-                        quantity = item.get('quantity')
-                        unit_price = item.get('unit_price')
-                        line_total = unit_price * quantity
-
-                        # Créer la ligne de panier produits
-                        session.execute(text("""
-                            INSERT INTO shop_paniers_products
-                            (panier_id, product_id, quantity, price_unit, total_price)
-                            VALUES (:panier_id, :product_id, :quantity, :price_unit, :total_price)
-                        """), {
-                            'panier_id': panier_id,
-                            'product_id': product_id,
-                            'quantity': quantity,
-                            'price_unit': float(unit_price),
-                            'total_price': float(line_total)
-                        })
-
-                        # Mettre à jour le stock (toujours, même si pas payé)
-                        self._update_pos_stock(session, product_id, quantity, unit_price, line_total, numero_commande)
-
+                        product_lines.append(line)
                     elif item.get('type') == 'service':
-                        service_id = item.get('id')
-                        quantity = item.get('quantity')
-                        unit_price = item.get('unit_price')
-                        line_total = unit_price * quantity
-                        
-                        # Insérer la ligne de service
-                        session.execute(text("""
-                            INSERT INTO shop_paniers_services
-                            (panier_id, service_id, quantity, price_unit, total_price)
-                            VALUES (:panier_id, :service_id, :quantity, :price_unit, :total_price)
-                        """), {
-                            'panier_id': panier_id,
-                            'service_id': service_id,
-                            'quantity': quantity,
-                            'price_unit': float(unit_price),
-                            'total_price': float(line_total)
-                        })
+                        service_lines.append(line)
+
+                # Créer les lignes de panier produits
+                if product_lines:
+                    session.execute(text("""
+                        INSERT INTO shop_paniers_products
+                        (panier_id, product_id, quantity, price_unit, total_price)
+                        VALUES (:panier_id, :item_id, :quantity, :price_unit, :total_price)
+                    """), product_lines)
+
+                    # Mettre à jour le stock (toujours, même si pas payé)
+                    insufficient_stock = self._update_pos_stock(session, product_lines, numero_commande)
+                    if insufficient_stock:
+                        # Un autre poste a vendu ces articles entre-temps : la vente a été annulée
+                        return False, "Stock insuffisant:\n" + "\n".join(insufficient_stock), None
+
+                # Insérer les lignes de service
+                if service_lines:
+                    session.execute(text("""
+                        INSERT INTO shop_paniers_services
+                        (panier_id, service_id, quantity, price_unit, total_price)
+                        VALUES (:panier_id, :item_id, :quantity, :price_unit, :total_price)
+                    """), service_lines)
 
                 # 3. Créer TOUJOURS les écritures comptables de vente (même sans paiement)
                 accounting_data = {
@@ -146,7 +145,7 @@ class VenteController:
                 }
 
                 
-                success, message = self._create_advanced_sale_accounting_entries(session, accounting_data)
+                success, message = self._create_advanced_sale_accounting_entries(session, accounting_data, config)
                 if not success:
                     return False, f"Erreur comptable: {message}", None
 
@@ -181,7 +180,30 @@ class VenteController:
         except Exception as e:
             return False, f"Erreur lors du traitement de la vente: {str(e)}", None
 
-    def _validate_accounting_config(self, session: Session) -> Tuple[bool, str]:
+    def _get_accounting_config(self, session: Session) -> Optional[Dict]:
+        """Lit en une requête la configuration comptable du point de vente (None si absente)"""
+        config_row = session.execute(text("""
+            SELECT compte_vente_id, compte_caisse_id, compte_client_id, compte_remise_id,
+                   compte_stock_id, compte_variation_stock_id, compte_achat_id
+            FROM compta_config
+            WHERE pos_id = :pos_id
+            LIMIT 1
+        """), {'pos_id': self.pos_id}).mappings().fetchone()
+        return dict(config_row) if config_row else None
+
+    def _get_pos_warehouse_id(self, session: Session) -> Optional[int]:
+        """Retourne l'id de l'entrepôt boutique POS_2 (résolu une seule fois par contrôleur)"""
+        if self._pos_warehouse_id is None:
+            warehouse_row = session.execute(text("""
+                SELECT id FROM stock_warehouses
+                WHERE code = 'POS_2' AND is_active = 1
+                LIMIT 1
+            """)).fetchone()
+            if warehouse_row:
+                self._pos_warehouse_id = warehouse_row[0]
+        return self._pos_warehouse_id
+
+    def _validate_accounting_config(self, session: Session, config: Optional[Dict] = None) -> Tuple[bool, str]:
         """
         Valide la configuration comptable
 
@@ -189,30 +211,16 @@ class VenteController:
             Tuple[bool, str]: (valide, message_erreur)
         """
         try:
-            config_result = session.execute(text("""
-                SELECT compte_vente_id, compte_caisse_id, compte_client_id, compte_remise_id
-                FROM compta_config
-                WHERE pos_id = :pos_id
-                LIMIT 1
-            """), {'pos_id': self.pos_id})
+            if config is None:
+                config = self._get_accounting_config(session)
 
-            config_row = config_result.fetchone()
-
-            if not config_row or not config_row[0]:
+            if not config or not config['compte_vente_id']:
                 return False, "Configuration comptable manquante. Veuillez configurer les comptes de vente dans les paramètres comptables."
 
-            compte_vente_id = config_row[0]
-            compte_caisse_id = config_row[1]
-            compte_client_id = config_row[2]
-            compte_remise_id = config_row[3]
-
-            if not compte_vente_id:
-                return False, "Le compte de vente n'est pas configuré. Veuillez le définir dans les paramètres comptables."
-
-            if not compte_caisse_id:
+            if not config['compte_caisse_id']:
                 return False, "Le compte de caisse n'est pas configuré. Veuillez le définir dans les paramètres comptables."
 
-            if not compte_client_id:
+            if not config['compte_client_id']:
                 return False, "Le compte client n'est pas configuré. Veuillez le définir dans les paramètres comptables."
 
             return True, "Configuration valide"
@@ -220,7 +228,40 @@ class VenteController:
         except Exception as e:
             return False, f"Erreur lors de la validation de la configuration comptable: {str(e)}"
 
-    def _create_advanced_sale_accounting_entries(self, session: Session, sale_data: Dict) -> Tuple[bool, str]:
+    def _insert_journal(self, session: Session, data: Dict) -> int:
+        """Insère un journal comptable et retourne son id"""
+        session.execute(text("""
+            INSERT INTO compta_journaux
+            (date_operation, libelle, montant, type_operation, reference, description,
+             enterprise_id, user_id, date_creation, date_modification)
+            VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
+                    :description, :enterprise_id, :user_id, :date_creation, :date_modification)
+        """), {
+            'enterprise_id': 1,  # TODO: Récupérer dynamiquement
+            'user_id': getattr(self.current_user, 'id', 1),
+            'date_creation': datetime.now(),
+            'date_modification': datetime.now(),
+            **data
+        })
+        session.flush()
+        return session.execute(text("SELECT last_insert_rowid()")).fetchone()[0]
+
+    def _insert_ecritures(self, session: Session, journal_id: int, ecritures: List[Dict]):
+        """Insère en un seul executemany les écritures d'un journal (ordre = position dans la liste)"""
+        if not ecritures:
+            return
+        now = datetime.now()
+        session.execute(text("""
+            INSERT INTO compta_ecritures
+            (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
+            VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
+        """), [
+            {'journal_id': journal_id, 'ordre': ordre, 'date_creation': now, **ecriture}
+            for ordre, ecriture in enumerate(ecritures, start=1)
+        ])
+
+    def _create_advanced_sale_accounting_entries(self, session: Session, sale_data: Dict,
+                                                 config: Optional[Dict] = None) -> Tuple[bool, str]:
         """Crée les écritures comptables avancées avec répartition proportionnelle"""
         try:
             panier_id = sale_data['panier_id']
@@ -234,24 +275,18 @@ class VenteController:
             client_id = sale_data['client_id']
 
             # Récupérer la configuration comptable (incluant compte stock et compte charge pour inventaire permanent)
-            config_result = session.execute(text("""
-                SELECT compte_vente_id, compte_caisse_id, compte_client_id, compte_remise_id, compte_stock_id, compte_variation_stock_id, compte_achat_id
-                FROM compta_config
-                WHERE pos_id = :pos_id
-                LIMIT 1
-            """), {'pos_id': self.pos_id})
-
-            config_row = config_result.fetchone()
-            if not config_row:
+            if config is None:
+                config = self._get_accounting_config(session)
+            if not config:
                 return False, "Configuration comptable introuvable"
 
-            compte_vente_id = config_row[0]
-            compte_caisse_id = config_row[1]
-            compte_client_id = config_row[2]
-            compte_remise_id = config_row[3]
-            compte_stock_id = config_row[4]
-            compte_variation_stock_id = config_row[5]
-            compte_achat_id = config_row[6]
+            compte_vente_id = config['compte_vente_id']
+            compte_caisse_id = config['compte_caisse_id']
+            compte_client_id = config['compte_client_id']
+            compte_remise_id = config['compte_remise_id']
+            compte_stock_id = config['compte_stock_id']
+            compte_variation_stock_id = config['compte_variation_stock_id']
+            compte_achat_id = config['compte_achat_id']
 
             # Validation : si remise et pas de compte remise configuré, refuser
             if discount_amount > 0 and not compte_remise_id:
@@ -263,145 +298,97 @@ class VenteController:
             if has_product_items and (not compte_stock_id or not compte_variation_stock_id):
                 return False, "Inventaire permanent requis: configurez les comptes stock et compte_variation_stock_id (compte_stock_id, compte_variation_stock_id) dans la configuration comptable."
 
-            # 3. Créer les écritures de VENTE (journal de vente) - toujours, même si paiement partiel
-            # Journal de vente
-            journal_sale_result = session.execute(text("""
-                INSERT INTO compta_journaux
-                (date_operation, libelle, montant, type_operation, reference, description,
-                 enterprise_id, user_id, date_creation, date_modification)
-                VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                        :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-            """), {
-                'date_operation': sale_data['sale_date'],
-                'libelle': f"Vente -{numero_commande}",
-                'montant': total_amount,
-                'type_operation': 'vente',
-                'reference': numero_commande,
-                'description': f"Vente boutique - {len(cart_items)} articles",
-                'enterprise_id': 1,  # TODO: Récupérer dynamiquement
-                'user_id': getattr(self.current_user, 'id', 1),
-                'date_creation': datetime.now(),
-                'date_modification': datetime.now()
-            })
-
-            session.flush()
-            journal_sale_id_result = session.execute(text("SELECT last_insert_rowid()"))
-            journal_sale_id = journal_sale_id_result.fetchone()[0]
-
-            ordre = 1
+            # Métadonnées comptables de tous les articles du panier, une requête par table
+            product_ids = sorted({item['id'] for item in cart_items if item.get('type') == 'product'})
+            service_ids = sorted({item['id'] for item in cart_items if item.get('type') == 'service'})
+            products_meta = {}
+            avg_costs = {}
+            services_comptes = {}
+            if product_ids:
+                products_meta = {
+                    row.id: row for row in session.execute(text("""
+                        SELECT id, compte_produit_id, cost, name, compte_charge_id FROM core_products
+                        WHERE id IN :ids
+                    """).bindparams(bindparam('ids', expanding=True)), {'ids': product_ids})
+                }
+                # Coût d'achat moyen : moyenne des mouvements d'entrée
+                avg_costs = {
+                    row[0]: float(row[1]) for row in session.execute(text("""
+                        SELECT product_id, AVG(unit_cost) FROM stock_mouvements
+                        WHERE product_id IN :ids AND unit_cost IS NOT NULL AND unit_cost > 0 AND movement_type = 'ENTREE'
+                        GROUP BY product_id
+                    """).bindparams(bindparam('ids', expanding=True)), {'ids': product_ids})
+                    if row[1] is not None
+                }
+            if service_ids:
+                # Services provenant d'un évènement (table event_services) qui peut contenir compte_produit_id
+                services_comptes = {
+                    row[0]: row[1] for row in session.execute(text("""
+                        SELECT id, compte_produit_id FROM event_services
+                        WHERE id IN :ids
+                    """).bindparams(bindparam('ids', expanding=True)), {'ids': service_ids})
+                }
 
             # Écritures de vente : créditer les comptes produits/services (revenus)
+            sale_ecritures = []
             for item in cart_items:
-                item_total = item['unit_price'] * item['quantity']
                 # montant de la ligne (revenu) — garder en float pour insertion SQL
-                item_sale_amount = float(item_total)
+                item_sale_amount = float(item['unit_price'] * item['quantity'])
 
-
-                # Par défaut, utiliser le compte de vente général
+                # Par défaut, utiliser le compte de vente général,
+                # sauf si un compte spécifique est configuré sur le produit ou le service
                 compte_item_id = compte_vente_id
-
-                # Si c'est un produit et qu'un compte spécifique est configuré, l'utiliser
                 if item.get('type') == 'product':
-                    product_result = session.execute(text("""
-                        SELECT compte_produit_id FROM core_products
-                        WHERE id = :product_id
-                    """), {'product_id': item['id']})
-                    product_row = product_result.fetchone()
-                    if product_row and product_row[0]:
-                        compte_item_id = product_row[0]
-
-                # Si c'est un service, tenter de récupérer un compte spécifique (ex: table event_services)
+                    product_row = products_meta.get(item['id'])
+                    if product_row is not None and product_row.compte_produit_id:
+                        compte_item_id = product_row.compte_produit_id
                 elif item.get('type') == 'service':
-                    # Cas fréquent : services provenant d'un évènement (table event_services) qui peut contenir compte_produit_id
-                    evt_result = session.execute(text("""
-                        SELECT compte_produit_id FROM event_services
-                        WHERE id = :service_id
-                    """), {'service_id': item['id']})
-                    evt_row = evt_result.fetchone()
-                    if evt_row and evt_row[0]:
-                        compte_item_id = evt_row[0]
-                    print(f'Debugg Compte produit service {compte_item_id} pour service {item['id']}')
+                    compte_item_id = services_comptes.get(item['id']) or compte_item_id
 
                 # Vérification finale : s'il n'y a toujours pas de compte, erreur
                 if not compte_item_id:
                     return False, f"Article '{item.get('name', 'N/A')}' n'a pas de compte comptable configuré et aucun compte de vente par défaut n'est défini."
 
-                # Insérer l'écriture crédit (revenu)
-                session.execute(text("""
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                """), {
-                    'journal_id': journal_sale_id,
+                # Écriture crédit (revenu)
+                sale_ecritures.append({
                     'compte_id': compte_item_id,
                     'debit': 0,
                     'credit': item_sale_amount,
-                    'ordre': ordre,
-                    'libelle': f"Vente {item.get('name', 'Article')} (x{item['quantity']})",
-                    'date_creation': datetime.now()
+                    'libelle': f"Vente {item.get('name', 'Article')} (x{item['quantity']})"
                 })
-                ordre += 1
 
             # Écriture débit : Compte client (montant total de la vente)
             if compte_client_id:
-                session.execute(text("""
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                """), {
-                    'journal_id': journal_sale_id,
+                sale_ecritures.append({
                     'compte_id': compte_client_id,
                     'debit': total_amount,
                     'credit': 0,
-                    'ordre': ordre,
-                    'libelle': f"Client - Vente {numero_commande}",
-                    'date_creation': datetime.now()
+                    'libelle': f"Client - Vente {numero_commande}"
                 })
-                ordre += 1
 
             # Si remise, débiter le compte remise (validation déjà faite plus haut)
             if discount_amount > 0 and compte_remise_id:
-                session.execute(text("""
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                """), {
-                    'journal_id': journal_sale_id,
+                sale_ecritures.append({
                     'compte_id': compte_remise_id,
                     'debit': discount_amount,
                     'credit': 0,
-                    'ordre': ordre,
-                    'libelle': f"Remise accordée {numero_commande}",
-                    'date_creation': datetime.now()
+                    'libelle': f"Remise accordée {numero_commande}"
                 })
-                ordre += 1
+
+            # 3. Créer les écritures de VENTE (journal de vente) - toujours, même si paiement partiel
+            journal_sale_id = self._insert_journal(session, {
+                'date_operation': sale_data['sale_date'],
+                'libelle': f"Vente -{numero_commande}",
+                'montant': total_amount,
+                'type_operation': 'vente',
+                'reference': numero_commande,
+                'description': f"Vente boutique - {len(cart_items)} articles"
+            })
+            self._insert_ecritures(session, journal_sale_id, sale_ecritures)
 
             # 4. Créer un journal de sortie stock (inventaire permanent) et écrire les mouvements COGS / Stock
             if has_product_items:
-                journal_stock_result = session.execute(text("""
-                    INSERT INTO compta_journaux
-                    (date_operation, libelle, montant, type_operation, reference, description,
-                     enterprise_id, user_id, date_creation, date_modification)
-                    VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                            :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-                """), {
-                    'date_operation': sale_data['sale_date'],
-                    'libelle': f"Sortie stock -{numero_commande}",
-                    'montant': subtotal,
-                    'type_operation': 'stock',
-                    'reference': numero_commande,
-                    'description': f"Sortie stock (COGS) - {len([i for i in cart_items if i.get('type')=='product'])} produits",
-                    'enterprise_id': 1,
-                    'user_id': getattr(self.current_user, 'id', 1),
-                    'date_creation': datetime.now(),
-                    'date_modification': datetime.now()
-                })
-
-                session.flush()
-                journal_stock_id_result = session.execute(text("SELECT last_insert_rowid()"))
-                journal_stock_id = journal_stock_id_result.fetchone()[0]
-
-                ordre_stock = 1
+                stock_ecritures = []
                 # Pour chaque produit, débiter compte charge (COGS) et créditer compte stock
                 for item in cart_items:
                     if item.get('type') != 'product':
@@ -410,24 +397,13 @@ class VenteController:
                     product_id = item.get('id')
                     qty = item.get('quantity', 0)
 
-                    # Récupérer le prix d'achat (cost) et le compte charge du produit
-                    # Récupérer le coût d'achat moyen : privilégier la moyenne des mouvements d'entrée
-                    avg_cost_row = session.execute(text("""
-                        SELECT AVG(unit_cost) FROM stock_mouvements
-                        WHERE product_id = :product_id AND unit_cost IS NOT NULL AND unit_cost > 0 AND movement_type = 'ENTREE'
-                    """), {'product_id': product_id}).fetchone()
-                    avg_unit_cost = float(avg_cost_row[0]) if avg_cost_row and avg_cost_row[0] is not None else 0.0
-
-
-                    # Enfin fallback sur le champ cost du produit
-                    product_meta = session.execute(text("""
-                        SELECT cost, name, compte_charge_id FROM core_products
-                        WHERE id = :product_id
-                    """), {'product_id': product_id}).fetchone()
-                    product_cost_field = float(product_meta[0]) if product_meta and product_meta[0] is not None else 0.0
-                    product_name = product_meta[1] if product_meta and len(product_meta) > 1 else item.get('name', f'Produit {product_id}')
-                    product_compte_charge_id = product_meta[2] if product_meta and len(product_meta) > 2 and product_meta[2] is not None else None
+                    # Coût moyen d'achat, sinon fallback sur le champ cost du produit
+                    product_meta = products_meta.get(product_id)
+                    product_cost_field = float(product_meta.cost) if product_meta is not None and product_meta.cost is not None else 0.0
+                    product_name = product_meta.name if product_meta is not None else item.get('name', f'Produit {product_id}')
+                    product_compte_charge_id = product_meta.compte_charge_id if product_meta is not None else None
 
+                    avg_unit_cost = avg_costs.get(product_id, 0.0)
                     unit_cost = avg_unit_cost if avg_unit_cost > 0 else product_cost_field
 
                     # Déterminer le compte charge à utiliser (hiérarchie: compte_charge_id produit > compte_achat_id config > compte_variation_stock_id)
@@ -435,96 +411,60 @@ class VenteController:
 
                     # cogs basé sur coût moyen d'achat
                     cogs_amount = unit_cost * qty
-            
+
                     # Débit : Compte charge (COGS) - utiliser le compte déterminé selon la hiérarchie
-                    session.execute(text("""
-                        INSERT INTO compta_ecritures
-                        (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                        VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """), {
-                        'journal_id': journal_stock_id,
+                    stock_ecritures.append({
                         'compte_id': compte_charge_id,
                         'debit': cogs_amount,
                         'credit': 0,
-                        'ordre': ordre_stock,
-                        'libelle': f"Charge {product_name} (x{qty})",
-                        'date_creation': datetime.now()
+                        'libelle': f"Charge {product_name} (x{qty})"
                     })
-                    ordre_stock += 1
-
                     # Crédit : Compte stock (réduction de l'actif stock)
-                    session.execute(text("""
-                        INSERT INTO compta_ecritures
-                        (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                        VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """), {
-                        'journal_id': journal_stock_id,
+                    stock_ecritures.append({
                         'compte_id': compte_stock_id,
                         'debit': 0,
                         'credit': cogs_amount,
-                        'ordre': ordre_stock,
-                        'libelle': f"Sortie stock {product_name} (x{qty})",
-                        'date_creation': datetime.now()
+                        'libelle': f"Sortie stock {product_name} (x{qty})"
                     })
-                    ordre_stock += 1
+
+                journal_stock_id = self._insert_journal(session, {
+                    'date_operation': sale_data['sale_date'],
+                    'libelle': f"Sortie stock -{numero_commande}",
+                    'montant': subtotal,
+                    'type_operation': 'stock',
+                    'reference': numero_commande,
+                    'description': f"Sortie stock (COGS) - {len([i for i in cart_items if i.get('type')=='product'])} produits"
+                })
+                self._insert_ecritures(session, journal_stock_id, stock_ecritures)
 
             # 4. Créer les écritures de PAIEMENT (seulement si paiement reçu)
             payment_method = sale_data.get('payment_method')
             if amount_received > 0 and payment_method:
                 # Journal de paiement
-                journal_payment_result = session.execute(text("""
-                    INSERT INTO compta_journaux
-                    (date_operation, libelle, montant, type_operation, reference, description,
-                     enterprise_id, user_id, date_creation, date_modification)
-                    VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                            :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-                """), {
+                journal_payment_id = self._insert_journal(session, {
                     'date_operation': sale_data['sale_date'],
                     'libelle': f"Paiement {numero_commande}",
                     'montant': amount_received,
                     'type_operation': 'paiement',
                     'reference': f"PAI-{numero_commande}",
-                    'description': f"Paiement vente - {sale_data['payment_method']}",
-                    'enterprise_id': 1,
-                    'user_id': getattr(self.current_user, 'id', 1),
-                    'date_creation': datetime.now(),
-                    'date_modification': datetime.now()
+                    'description': f"Paiement vente - {sale_data['payment_method']}"
                 })
 
-                session.flush()
-                journal_payment_id_result = session.execute(text("SELECT last_insert_rowid()"))
-                journal_payment_id = journal_payment_id_result.fetchone()[0]
-
-                # Écriture débit : Compte de caisse
-                session.execute(text("""
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                """), {
-                    'journal_id': journal_payment_id,
+                # Écriture débit : Compte de caisse, crédit : Compte client
+                payment_ecritures = [{
                     'compte_id': compte_caisse_id,
                     'debit': amount_received,
                     'credit': 0,
-                    'ordre': 1,
-                    'libelle': f"Encaissement {sale_data['payment_method']} - {numero_commande}",
-                    'date_creation': datetime.now()
-                })
-
-                # Écriture crédit : Compte client
+                    'libelle': f"Encaissement {sale_data['payment_method']} - {numero_commande}"
+                }]
                 if compte_client_id:
-                    session.execute(text("""
-                        INSERT INTO compta_ecritures
-                        (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                        VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """), {
-                        'journal_id': journal_payment_id,
+                    payment_ecritures.append({
                         'compte_id': compte_client_id,
                         'debit': 0,
                         'credit': amount_received,
-                        'ordre': 2,
-                        'libelle': f"Règlement client - {numero_commande}",
-                        'date_creation': datetime.now()
+                        'libelle': f"Règlement client - {numero_commande}"
                     })
+                self._insert_ecritures(session, journal_payment_id, payment_ecritures)
 
             return True, f"Écritures comptables créées - Vente: {journal_sale_id}" + \
                         (f", Paiement: {journal_payment_id}" if amount_received > 0 else "")
@@ -532,95 +472,91 @@ class VenteController:
         except Exception as e:
             return False, f"Erreur écritures comptables avancées: {str(e)}"
 
-    def _update_pos_stock(self, session: Session, product_id: int, quantity_sold: int, unit_price, line_total, numero_commande):
-        """Met à jour le stock POS (soustraction automatique depuis l'entrepôt POS_2)"""
-        try:
-            # Chercher l'entrepôt avec le code POS_2 (entrepôt boutique)
-            warehouse_result = session.execute(text("""
-                SELECT id FROM stock_warehouses
-                WHERE code = 'POS_2' AND is_active = 1
-                LIMIT 1
-            """))
-
-            warehouse_row = warehouse_result.fetchone()
-            if not warehouse_row:
-                print(f"⚠️ Entrepôt POS_2 non trouvé pour le produit {product_id}")
-                return
-
-            warehouse_id = warehouse_row[0]
-
-            # Récupérer le stock actuel
-            stock_result = session.execute(text("""
-                SELECT quantity FROM stock_produits_entrepot
-                WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                LIMIT 1
-            """), {'product_id': product_id, 'warehouse_id': warehouse_id})
+    def _update_pos_stock(self, session: Session, product_lines: List[Dict], numero_commande: str) -> List[str]:
+        """
+        Met à jour le stock POS pour toutes les lignes produits d'une vente
+        (soustraction automatique depuis l'entrepôt POS_2).
 
-            stock_row = stock_result.fetchone()
-            current_stock = stock_row[0] if stock_row else 0
+        Les sorties passent par le journal de stock (StockLedgerController) ; le décrément est
+        conditionnel : sous le verrou d'écriture de la transaction, deux postes ne peuvent pas
+        vendre la même dernière unité.
 
-            # Calculer le nouveau stock (ne pas aller en négatif)
-            new_stock = max(0, current_stock - quantity_sold)
+        Args:
+            product_lines: lignes {'item_id', 'quantity', 'price_unit', 'total_price'}
 
-            # Mettre à jour ou insérer le stock
-            if stock_row:
-                # Mettre à jour
-                session.execute(text("""
-                    UPDATE stock_produits_entrepot
-                    SET quantity = :new_quantity, updated_at = :updated_at
-                    WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                """), {
-                    'product_id': product_id,
-                    'new_quantity': new_stock,
-                    'warehouse_id': warehouse_id,
-                    'updated_at': datetime.now()
-                })
-            else:
-                # Insérer (si pas de stock existant)
-                session.execute(text("""
-                    INSERT INTO stock_produits_entrepot
-                    (product_id, warehouse_id, quantity, created_at, updated_at)
-                    VALUES (:product_id, :warehouse_id, :quantity, :created_at, :updated_at)
-                """), {
-                    'product_id': product_id,
-                    'warehouse_id': warehouse_id,
-                    'quantity': new_stock,
-                    'created_at': datetime.now(),
-                    'updated_at': datetime.now()
-                })
-            #insertion dans mouvement stock
-            session.execute(text("""
-                        INSERT INTO stock_mouvements(
-                            product_id, warehouse_id, movement_type, quantity, unit_cost, total_cost, 
-                            destination_warehouse_id, reference, description, user_id, movement_date, created_at
-                        )VALUES(
-                            :product_id, :warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
-                            :destination_warehouse_id, :reference, :description, :user_id, :movement_date, :created_at
-                        )"""), {
-                            'product_id': product_id,
-                            'warehouse_id': 2,
-                            'movement_type': 'SORTIE',
-                            'quantity':quantity_sold,
-                            'unit_cost': unit_price,
-                            'total_cost':line_total,
-                            'destination_warehouse_id':warehouse_id,
-                            'reference':numero_commande,
-                            'description':"Vente Commande - " + numero_commande,
-                            'user_id':1, # TODO A implemnter
-                            'movement_date':datetime.now(),
-                            'created_at': datetime.now()
-                            
-                        })
+        Returns:
+            List[str]: articles en rupture (vide si le stock a été décrémenté)
+        """
+        # Quantités vendues par produit (un produit peut apparaître sur plusieurs lignes)
+        quantities = {}
+        for line in product_lines:
+            quantities[line['item_id']] = quantities.get(line['item_id'], 0) + line['quantity']
+
+        # Chercher l'entrepôt avec le code POS_2 (entrepôt boutique)
+        warehouse_id = self._get_pos_warehouse_id(session)
+        if not warehouse_id:
+            session.rollback()
+            return self._get_insufficient_stock(session, quantities) or ["Entrepôt POS_2 introuvable"]
+
+        # Mouvements de sortie signés : journal + décrément conditionnel de la projection
+        ok = StockLedgerController().post_movements(session, [{
+            'product_id': line['item_id'],
+            'warehouse_id': warehouse_id,
+            'movement_type': 'SORTIE',
+            'quantity': -line['quantity'],
+            'unit_cost': line['price_unit'],
+            'total_cost': line['total_price'],
+            'destination_warehouse_id': warehouse_id,
+            'reference': numero_commande,
+            'description': "Vente Commande - " + numero_commande,
+            'user_id': 1,  # TODO A implemnter
+        } for line in product_lines], check_available=True)
+        if not ok:
+            # Au moins un décrément refusé : annuler la vente avant de relire le stock
+            session.rollback()
+            return self._get_insufficient_stock(session, quantities) or ["Stock modifié par un autre poste"]
+
+        print(f"📦 Stock mis à jour - {len(quantities)} produits ({numero_commande})")
+        return []
+
+    def _get_insufficient_stock(self, session: Session, quantities: Dict[int, float],
+                                names: Optional[Dict[int, str]] = None) -> List[str]:
+        """
+        Compare en une seule requête les quantités demandées au stock de l'entrepôt POS_2.
 
-            print(f"📦 Stock mis à jour - Produit {product_id}: {current_stock} → {new_stock}")
+        Args:
+            quantities: {product_id: quantité demandée}
+            names: libellés à afficher (sinon le nom du produit)
 
-        except Exception as e:
-            print(f"❌ Erreur mise à jour stock: {e}")
-            # Ne pas faire échouer la vente pour un problème de stock
+        Returns:
+            List[str]: un message par produit en rupture
+        """
+        if not quantities:
+            return []
+        warehouse_id = self._get_pos_warehouse_id(session)
+        rows = session.execute(text("""
+            SELECT p.id, p.name, COALESCE(spe.quantity, 0)
+            FROM core_products p
+            LEFT JOIN stock_produits_entrepot spe
+                   ON spe.product_id = p.id AND spe.warehouse_id = :warehouse_id
+            WHERE p.id IN :product_ids
+        """).bindparams(bindparam('product_ids', expanding=True)),
+            {'warehouse_id': warehouse_id, 'product_ids': list(quantities)}).fetchall()
+        available = {row[0]: (row[1], row[2] or 0) for row in rows}
+
+        insufficient_stock = []
+        for product_id, requested_quantity in quantities.items():
+            product_name, available_stock = available.get(product_id, (None, 0))
+            if available_stock < requested_quantity:
+                product_name = (names or {}).get(product_id) or product_name or f'Produit {product_id}'
+                insufficient_stock.append(
+                    f"{product_name}: {available_stock} disponible, {requested_quantity} demandé"
+                )
+        return insufficient_stock
 
     def validate_stock_availability(self, cart_items: List[Dict]) -> Tuple[bool, str]:
         """
-        Valide que tous les produits du panier sont disponibles en stock
+        Valide que tous les produits du panier sont disponibles en stock (une seule requête)
 
         Args:
             cart_items: Liste des articles du panier
@@ -630,33 +566,16 @@ class VenteController:
         """
         try:
             with self.db_manager.get_session() as session:
-                insufficient_stock = []
-
+                quantities = {}
+                names = {}
                 for item in cart_items:
                     if item.get('type') == 'product':
-                        product_id = item['id']
-                        requested_quantity = item['quantity']
-
-                        # Récupérer le stock disponible
-                        stock_result = session.execute(text("""
-                            SELECT quantity FROM stock_produits_entrepot
-                            WHERE product_id = :product_id AND warehouse_id = (
-                                SELECT id FROM stock_warehouses WHERE code = 'POS_2' LIMIT 1
-                            )
-                            LIMIT 1
-                        """), {'product_id': product_id})
-
-                        stock_row = stock_result.fetchone()
-                        available_stock = stock_row[0] if stock_row else 0
-
-                        if available_stock < requested_quantity:
-                            product_name = item.get('name', f'Produit {product_id}')
-                            insufficient_stock.append(
-                                f"{product_name}: {available_stock} disponible, {requested_quantity} demandé"
-                            )
+                        quantities[item['id']] = quantities.get(item['id'], 0) + item['quantity']
+                        names.setdefault(item['id'], item.get('name'))
 
+                insufficient_stock = self._get_insufficient_stock(session, quantities, names)
                 if insufficient_stock:
-                    return False, "Stock insuffisant:\\n" + "\\n".join(insufficient_stock)
+                    return False, "Stock insuffisant:\n" + "\n".join(insufficient_stock)
 
                 return True, "Stock disponible"
 
@@ -1038,69 +957,21 @@ class VenteController:
 
             warehouse_id = warehouse_row[0]
 
-            # Récupérer le stock actuel
-            stock_result = session.execute(text("""
-                SELECT quantity FROM stock_produits_entrepot
-                WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                LIMIT 1
-            """), {'product_id': product_id, 'warehouse_id': warehouse_id})
-
-            stock_row = stock_result.fetchone()
-            current_stock = stock_row[0] if stock_row else 0
-
-            # Remettre le stock (ajouter la quantité)
-            new_stock = current_stock + quantity_returned
-
-            # Mettre à jour ou insérer le stock
-            if stock_row:
-                session.execute(text("""
-                    UPDATE stock_produits_entrepot
-                    SET quantity = :new_quantity, updated_at = :updated_at
-                    WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                """), {
-                    'product_id': product_id,
-                    'new_quantity': new_stock,
-                    'warehouse_id': warehouse_id,
-                    'updated_at': datetime.now()
-                })
-            else:
-                session.execute(text("""
-                    INSERT INTO stock_produits_entrepot
-                    (product_id, warehouse_id, quantity, created_at, updated_at)
-                    VALUES (:product_id, :warehouse_id, :quantity, :created_at, :updated_at)
-                """), {
-                    'product_id': product_id,
-                    'warehouse_id': warehouse_id,
-                    'quantity': new_stock,
-                    'created_at': datetime.now(),
-                    'updated_at': datetime.now()
-                })
-
-            # Mouvement de stock pour annulation
-            session.execute(text("""
-                        INSERT INTO stock_mouvements(
-                            product_id, warehouse_id, movement_type, quantity, unit_cost, total_cost,
-                            destination_warehouse_id, reference, description, user_id, movement_date, created_at
-                        )VALUES(
-                            :product_id, :warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
-                            :destination_warehouse_id, :reference, :description, :user_id, :movement_date, :created_at
-                        )"""), {
-                            'product_id': product_id,
-                            'warehouse_id': warehouse_id,
-                            'movement_type': 'ANNULATION',
-                            'quantity': quantity_returned,
-                            'unit_cost': 0,  # Pas de coût pour l'annulation
-                            'total_cost': 0,
-                            'destination_warehouse_id': warehouse_id,
-                            'reference': "ANN-FAC- " + numero_commande,
-                            'description': "Annulation vente - " + numero_commande,
-                            'user_id': 1,
-                            'movement_date': datetime.now(),
-                            'created_at': datetime.now()
-
-                        })
-
-            print(f"📦 Stock remis - Produit {product_id}: {current_stock} → {new_stock}")
+            # Mouvement d'annulation : le stock revient dans l'entrepôt (journal + projection)
+            StockLedgerController().post_movements(session, [{
+                'product_id': product_id,
+                'warehouse_id': warehouse_id,
+                'movement_type': 'ANNULATION',
+                'quantity': quantity_returned,
+                'unit_cost': 0,  # Pas de coût pour l'annulation
+                'total_cost': 0,
+                'destination_warehouse_id': warehouse_id,
+                'reference': "ANN-FAC- " + numero_commande,
+                'description': "Annulation vente - " + numero_commande,
+                'user_id': 1,
+            }])
+
+            print(f"📦 Stock remis - Produit {product_id}: +{quantity_returned}")
 
         except Exception as e:
             print(f"❌ Erreur remise stock annulation: {e}")
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Recherche client asynchrone pour la caisse boutique
+
+La saisie est temporisée (une requête quand la frappe s'arrête) et la requête indexée
+`BoutiqueController.search_clients` s'exécute hors du thread GUI via un QueryExecutor :
+seul le résultat de la dernière saisie est livré.
+"""
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from ayanna_erp.core.utils.query_executor import QueryExecutor
+
+
+class ClientLookup(QObject):
+    """
+    Recherche client temporisée et annulable.
+    `lookup(texte)` à chaque frappe ; `results_ready(texte, clients)` pour la dernière saisie seulement.
+    """
+
+    results_ready = pyqtSignal(str, list)
+
+    DELAY_MS = 250
+
+    def __init__(self, boutique_controller, limit=20, parent=None):
+        super().__init__(parent)
+        self.boutique_controller = boutique_controller
+        self.limit = limit
+        self._search_text = ""
+        self.executor = QueryExecutor(self)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DELAY_MS)
+        self._timer.timeout.connect(self._start)
+
+    def lookup(self, search_text):
+        """Planifie une recherche ; toute recherche précédente devient obsolète"""
+        self.cancel()
+        self._search_text = search_text
+        self._timer.start()
+
+    def cancel(self):
+        """Abandonne la recherche planifiée ou en cours (son résultat ne sera pas livré)"""
+        self._timer.stop()
+        self.executor.cancel('clients')
+
+    def _start(self):
+        search_text = self._search_text
+        self.executor.submit(
+            'clients', self.boutique_controller.search_clients, search_text, self.limit,
+            with_session=True,
+            on_result=lambda clients: self.results_ready.emit(search_text, clients),
+        )
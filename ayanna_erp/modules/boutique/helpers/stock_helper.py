@@ -7,7 +7,8 @@ from typing import List, Optional, Dict, Any
 from decimal import Decimal
 from datetime import datetime
 from sqlalchemy.orm import Session
-from ayanna_erp.modules.stock.models import StockWarehouse, StockProduitEntrepot, StockMovement
+from ayanna_erp.modules.stock.models import StockWarehouse, StockProduitEntrepot
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 
 
 class BoutiqueStockHelper:
@@ -62,51 +63,18 @@ class BoutiqueStockHelper:
             return False
         
         try:
-            # Récupérer ou créer l'entrée stock produit-entrepôt
-            stock = session.query(StockProduitEntrepot).filter(
-                StockProduitEntrepot.product_id == product_id,
-                StockProduitEntrepot.warehouse_id == warehouse_id
-            ).first()
-            
-            if not stock:
-                # Créer nouvelle entrée
-                stock = StockProduitEntrepot(
-                    product_id=product_id,
-                    warehouse_id=warehouse_id,
-                    quantity=quantite,
-                    unit_cost=prix_unitaire,
-                    total_cost=quantite * prix_unitaire,
-                    last_movement_date=datetime.now()
-                )
-                session.add(stock)
-            else:
-                # Mettre à jour stock existant (moyenne pondérée pour le coût)
-                old_total_cost = stock.quantity * stock.unit_cost
-                new_total_cost = quantite * prix_unitaire
-                total_quantity = stock.quantity + quantite
-                
-                if total_quantity > 0:
-                    stock.unit_cost = (old_total_cost + new_total_cost) / total_quantity
-                
-                stock.quantity = total_quantity
-                stock.total_cost = total_quantity * stock.unit_cost
-                stock.last_movement_date = datetime.now()
-            
-            # Créer mouvement de stock
-            movement = StockMovement(
-                product_id=product_id,
-                warehouse_id=warehouse_id,
-                product_warehouse_id=stock.id,
-                movement_type='ENTREE',
-                quantity=quantite,
-                unit_cost=prix_unitaire,
-                total_cost=quantite * prix_unitaire,
-                description=description,
-                user_name="Système Boutique",
-                movement_date=datetime.now()
-            )
-            session.add(movement)
-            
+            # Entrée valorisée : journal + projection (coût moyen pondéré) via le ledger
+            StockLedgerController().post_movements(session, [{
+                'product_id': product_id,
+                'warehouse_id': warehouse_id,
+                'movement_type': 'ENTREE',
+                'quantity': quantite,
+                'unit_cost': prix_unitaire,
+                'total_cost': float(quantite) * float(prix_unitaire),
+                'description': description,
+                'user_name': "Système Boutique",
+                'movement_date': datetime.now(),
+            }])
             session.flush()
             return True
             
@@ -127,30 +95,25 @@ class BoutiqueStockHelper:
                 StockProduitEntrepot.warehouse_id == warehouse_id
             ).first()
             
-            if not stock or stock.quantity < quantite:
+            if not stock:
                 return False  # Stock insuffisant
+            unit_cost = stock.unit_cost or Decimal('0')
             
-            # Mettre à jour le stock
-            stock.quantity -= quantite
-            stock.total_cost = stock.quantity * stock.unit_cost
-            stock.last_movement_date = datetime.now()
-            
-            # Créer mouvement de stock
-            movement = StockMovement(
-                product_id=product_id,
-                warehouse_id=warehouse_id,
-                product_warehouse_id=stock.id,
-                movement_type='SORTIE',
-                quantity=-quantite,  # Négatif pour sortie
-                unit_cost=stock.unit_cost,
-                total_cost=-(quantite * stock.unit_cost),
-                description=description,
-                user_name="Système Boutique",
-                movement_date=datetime.now()
-            )
-            session.add(movement)
+            # Sortie signée : décrément conditionnel (jamais négatif) + journal via le ledger
+            if not StockLedgerController().post_movements(session, [{
+                'product_id': product_id,
+                'warehouse_id': warehouse_id,
+                'movement_type': 'SORTIE',
+                'quantity': -quantite,
+                'unit_cost': unit_cost,
+                'total_cost': -(float(quantite) * float(unit_cost)),
+                'description': description,
+                'user_name': "Système Boutique",
+                'movement_date': datetime.now(),
+            }], check_available=True):
+                return False  # Stock insuffisant
             
-            session.flush()
+            session.expire(stock)
             return True
             
         except Exception as e:
@@ -167,6 +130,7 @@ class BoutiqueStockHelper:
                 StockWarehouse.is_active == True
             ).all()
             
+            mouvements = []
             for warehouse in warehouses:
                 # Vérifier si l'entrée existe déjà
                 existing_stock = session.query(StockProduitEntrepot).filter(
@@ -175,35 +139,34 @@ class BoutiqueStockHelper:
                 ).first()
                 
                 if not existing_stock:
-                    # Créer entrée avec quantité 0 (ou initial_stock si spécifié)
+                    # Créer l'entrée à 0 : le stock initial est journalisé ci-dessous
                     stock_entry = StockProduitEntrepot(
                         product_id=product_id,
                         warehouse_id=warehouse.id,
-                        quantity=initial_stock,
+                        quantity=Decimal('0'),
                         reserved_quantity=Decimal('0'),
                         unit_cost=Decimal('0'),
                         total_cost=Decimal('0'),
-                        min_stock_level=Decimal('0'),
-                        last_movement_date=datetime.now() if initial_stock > 0 else None
+                        min_stock_level=Decimal('0')
                     )
                     session.add(stock_entry)
                     
                     # Si stock initial > 0, créer un mouvement d'entrée
-                    if initial_stock > 0 and warehouse.id == self.get_boutique_warehouse_id(session):
-                        movement = StockMovement(
-                            product_id=product_id,
-                            warehouse_id=warehouse.id,
-                            product_warehouse_id=stock_entry.id,
-                            movement_type='ENTREE',
-                            quantity=initial_stock,
-                            unit_cost=Decimal('0'),
-                            total_cost=Decimal('0'),
-                            description=f"Stock initial produit ID {product_id}",
-                            user_name="Système Boutique",
-                            movement_date=datetime.now()
-                        )
-                        session.add(movement)
+                    if initial_stock > 0:
+                        mouvements.append({
+                            'product_id': product_id,
+                            'warehouse_id': warehouse.id,
+                            'movement_type': 'ENTREE',
+                            'quantity': initial_stock,
+                            'unit_cost': Decimal('0'),
+                            'total_cost': Decimal('0'),
+                            'description': f"Stock initial produit ID {product_id}",
+                            'user_name': "Système Boutique",
+                            'movement_date': datetime.now(),
+                        })
             
+            session.flush()
+            StockLedgerController().post_movements(session, mouvements)
             session.flush()
             return True
             
@@ -4,7 +4,6 @@ Crée les tables et ajoute des données de base au premier lancement
 """
 
 import logging
-from datetime import datetime
 from decimal import Decimal
 
 # Configuration du logging
@@ -277,7 +276,8 @@ def _initialize_product_stocks(db_session, products_created):
         db_session: Session de base de données
         products_created: Liste de tuples (product, initial_stock, min_stock)
     """
-    from ayanna_erp.modules.stock.models import StockWarehouse, StockProduitEntrepot, StockMovement
+    from ayanna_erp.modules.stock.models import StockWarehouse, StockProduitEntrepot
+    from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
     from decimal import Decimal
     
     try:
@@ -289,40 +289,39 @@ def _initialize_product_stocks(db_session, products_created):
             return
         
         # Initialiser les stocks pour chaque produit uniquement sur l'entrepôt POS Boutique
+        mouvements = []
         for product, initial_stock, min_stock in products_created:
-            # Créer l'entrée stock produit-entrepôt
+            # Créer l'entrée stock produit-entrepôt (quantité apportée par le mouvement d'entrée)
             stock_quantity = Decimal(str(initial_stock))
             unit_cost = Decimal(str(product.cost)) if product.cost else Decimal('0.0')
             
             stock_entry = StockProduitEntrepot(
                 product_id=product.id,
                 warehouse_id=pos_warehouse.id,
-                quantity=stock_quantity,
+                quantity=Decimal('0.0'),
                 reserved_quantity=Decimal('0.0'),
-                unit_cost=unit_cost,
-                total_cost=stock_quantity * unit_cost,
-                min_stock_level=Decimal(str(min_stock)),
-                last_movement_date=datetime.now()
+                unit_cost=Decimal('0.0'),
+                total_cost=Decimal('0.0'),
+                min_stock_level=Decimal(str(min_stock))
             )
             db_session.add(stock_entry)
             
             # Si il y a un stock initial, créer un mouvement d'entrée
             if initial_stock > 0:
-                movement = StockMovement(
-                    product_id=product.id,
-                    warehouse_id=pos_warehouse.id,
-                    movement_type='ENTREE',
-                    quantity=stock_quantity,
-                    unit_cost=unit_cost,
-                    total_cost=stock_quantity * unit_cost,
-                    reference=f'INIT-{product.id}',
-                    description=f'Stock initial pour {product.name}',
-                    movement_date=datetime.now(),
-                    user_id=1  # Utilisateur système
-                )
-                db_session.add(movement)
+                mouvements.append({
+                    'product_id': product.id,
+                    'warehouse_id': pos_warehouse.id,
+                    'movement_type': 'ENTREE',
+                    'quantity': stock_quantity,
+                    'unit_cost': unit_cost,
+                    'total_cost': stock_quantity * unit_cost,
+                    'reference': f'INIT-{product.id}',
+                    'description': f'Stock initial pour {product.name}',
+                    'user_id': 1  # Utilisateur système
+                })
         
         db_session.flush()
+        StockLedgerController().post_movements(db_session, mouvements)
         logger.info(f"Stocks initialisés pour tous les produits sur l'entrepôt POS Boutique (ID: {pos_warehouse.id})")
         
     except Exception as e:
@@ -4,9 +4,9 @@ Modèles de données pour le module Boutique
 Utilise maintenant core_products (centralisé) au lieu de shop_products
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, Float, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from datetime import datetime
 import sys
 import os
@@ -15,10 +15,22 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 from ayanna_erp.database.base import Base
 
+# Expressions indexées de la recherche client : les requêtes doivent les reprendre à l'identique
+# pour que SQLite utilise les index (téléphone sans séparateurs, noms en minuscules)
+CLIENT_PHONE_NORM_SQL = "replace(replace(replace(replace(telephone, ' ', ''), '-', ''), '.', ''), '+', '')"
+CLIENT_NOM_LOWER_SQL = "lower(nom)"
+CLIENT_PRENOM_LOWER_SQL = "lower(prenom)"
+
+
 class ShopClient(Base):
     """Table des clients pour la boutique"""
     __tablename__ = 'shop_clients'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_shop_clients_telephone_norm', text(CLIENT_PHONE_NORM_SQL)),
+        Index('idx_shop_clients_nom_lower', text(CLIENT_NOM_LOWER_SQL)),
+        Index('idx_shop_clients_prenom_lower', text(CLIENT_PRENOM_LOWER_SQL)),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     pos_id = Column(Integer, nullable=False)  # Référence au POS
@@ -63,7 +75,12 @@ class ShopService(Base):
 class ShopPanier(Base):
     """Table des paniers (équivalent des réservations en Salle de Fête)"""
     __tablename__ = 'shop_paniers'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_shop_paniers_created_at', 'created_at'),
+        Index('idx_shop_paniers_status', 'status'),
+        Index('idx_shop_paniers_pos_created', 'pos_id', 'created_at'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     pos_id = Column(Integer, nullable=False)  # Référence au POS
@@ -97,7 +114,10 @@ class ShopPanier(Base):
 class ShopPanierProduct(Base):
     """Table pivot : Produits dans un panier - UTILISE CORE_PRODUCTS"""
     __tablename__ = 'shop_paniers_products'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_shop_paniers_products_panier', 'panier_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     panier_id = Column(Integer, ForeignKey('shop_paniers.id'), nullable=False)
@@ -113,7 +133,10 @@ class ShopPanierProduct(Base):
 class ShopPanierService(Base):
     """Table pivot : Services dans un panier"""
     __tablename__ = 'shop_paniers_services'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_shop_paniers_services_panier', 'panier_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     panier_id = Column(Integer, ForeignKey('shop_paniers.id'), nullable=False)
@@ -129,7 +152,10 @@ class ShopPanierService(Base):
 class ShopPayment(Base):
     """Table des paiements pour les paniers"""
     __tablename__ = 'shop_payments'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_shop_payments_panier', 'panier_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     panier_id = Column(Integer, ForeignKey('shop_paniers.id'), nullable=False)
@@ -16,6 +16,7 @@ from ayanna_erp.modules.boutique.controller.commande_controller import CommandeC
 from ayanna_erp.modules.boutique.controller.vente_controller import VenteController
 from ayanna_erp.modules.boutique.view.modern_supermarket_widget import PaymentDialog
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
+from ayanna_erp.core.utils.query_executor import QueryExecutor, BusyIndicator
 
 class CommandesIndexWidget(QWidget):
     """Widget principal pour l'affichage et gestion des commandes"""
@@ -40,6 +41,14 @@ class CommandesIndexWidget(QWidget):
         # Initialiser le contrôleur entreprise pour les devises
         self.entreprise_controller = EntrepriseController()
         
+        # Pagination par curseur (défilement infini du tableau)
+        self.page_size = 100
+        self.loaded_commandes = []
+        self.next_cursor = None
+        self.has_more_commandes = False
+        self.executor = QueryExecutor(self)
+        self._loading_page = False
+        
         self.init_ui()
         self.load_commandes()
 
@@ -68,6 +77,11 @@ class CommandesIndexWidget(QWidget):
         # Zone de filtres et recherche
         self.create_filters_section(layout)
         
+        # Indicateur de chargement (requêtes exécutées en arrière-plan)
+        self.busy_indicator = BusyIndicator(self)
+        self.busy_indicator.track(self.executor)
+        layout.addWidget(self.busy_indicator)
+        
         # Splitter principal : tableau à gauche, détails à droite
         main_splitter = QSplitter(Qt.Orientation.Horizontal)
         layout.addWidget(main_splitter)
@@ -220,6 +234,8 @@ class CommandesIndexWidget(QWidget):
         
         # Connecter les signaux
         self.commandes_table.itemSelectionChanged.connect(self.on_commande_selected)
+        # Charger la page suivante quand on arrive en bas du tableau
+        self.commandes_table.verticalScrollBar().valueChanged.connect(self.on_table_scrolled)
         
         return self.commandes_table
     
@@ -429,39 +445,85 @@ class CommandesIndexWidget(QWidget):
         
         return details_widget
         
+    def get_current_filters(self):
+        """Retourne les filtres actuellement saisis"""
+        return {
+            'date_debut': self.date_debut.date().toPyDate() if hasattr(self, 'date_debut') else None,
+            'date_fin': self.date_fin.date().toPyDate() if hasattr(self, 'date_fin') else None,
+            'search_term': self.search_input.text().strip() if hasattr(self, 'search_input') and self.search_input.text().strip() else None,
+            'payment_filter': self.payment_filter.currentText() if hasattr(self, 'payment_filter') else None,
+        }
+
     def load_commandes(self):
-        """Charger les commandes depuis le contrôleur"""
+        """Charger la première page des commandes en arrière-plan (la requête précédente est abandonnée)"""
+        self.executor.cancel('commandes_suite')
+        self._loading_page = False
+        self.executor.submit(
+            'commandes', self.commande_controller.get_commandes_page,
+            page_size=self.page_size,
+            **self.get_current_filters(),
+            on_result=self.on_commandes_loaded,
+            on_error=self.on_commandes_error
+        )
+
+    def on_commandes_loaded(self, page):
+        """Afficher la première page reçue du contrôleur"""
         try:
-            # Récupérer les filtres actuels
-            date_debut = self.date_debut.date().toPyDate() if hasattr(self, 'date_debut') else None
-            date_fin = self.date_fin.date().toPyDate() if hasattr(self, 'date_fin') else None
-            search_term = self.search_input.text().strip() if hasattr(self, 'search_input') and self.search_input.text().strip() else None
-            payment_filter = self.payment_filter.currentText() if hasattr(self, 'payment_filter') else None
-            
-            # Utiliser le contrôleur pour récupérer les commandes
-            commandes = self.commande_controller.get_commandes(
-                date_debut=date_debut,
-                date_fin=date_fin,
-                search_term=search_term,
-                payment_filter=payment_filter
-            )
+            self.loaded_commandes = list(page['commandes'])
+            self.next_cursor = page['next_cursor']
+            self.has_more_commandes = page['has_more']
             
-            self.populate_table(commandes)
-            self.update_statistics(commandes)
+            self.commandes_table.setRowCount(0)  # Vider le tableau proprement
+            self.populate_table(self.loaded_commandes)
+            self.update_statistics(self.loaded_commandes)
             
         except Exception as e:
             QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des commandes: {e}")
             print(f"❌ Erreur load_commandes: {e}")
-                
+
+    def on_commandes_error(self, error):
+        QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des commandes: {error}")
+
+    def load_more_commandes(self):
+        """Charger la page suivante en arrière-plan et l'ajouter à la fin du tableau"""
+        if self._loading_page or not self.has_more_commandes or not self.next_cursor:
+            return
+        self._loading_page = True
+        self.executor.submit(
+            'commandes_suite', self.commande_controller.get_commandes_page,
+            page_size=self.page_size,
+            cursor=self.next_cursor,
+            **self.get_current_filters(),
+            on_result=self.on_more_commandes_loaded,
+            on_error=self.on_more_commandes_error
+        )
+
+    def on_more_commandes_loaded(self, page):
+        self._loading_page = False
+        try:
+            self.next_cursor = page['next_cursor']
+            self.has_more_commandes = page['has_more']
+            if page['commandes']:
+                self.loaded_commandes.extend(page['commandes'])
+                self.populate_table(page['commandes'], append=True)
         except Exception as e:
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des commandes: {e}")
-            print(f"❌ Erreur load_commandes: {e}")
+            print(f"❌ Erreur load_more_commandes: {e}")
+
+    def on_more_commandes_error(self, error):
+        self._loading_page = False
+
+    def on_table_scrolled(self, value):
+        """Déclencher le chargement de la page suivante près du bas du tableau"""
+        scrollbar = self.commandes_table.verticalScrollBar()
+        if self.has_more_commandes and value >= scrollbar.maximum() - 5:
+            self.load_more_commandes()
             
-    def populate_table(self, commandes):
-        """Remplir le tableau avec les commandes"""
-        self.commandes_table.setRowCount(len(commandes))
+    def populate_table(self, commandes, append=False):
+        """Remplir le tableau avec les commandes (ou les ajouter à la suite si append=True)"""
+        start_row = self.commandes_table.rowCount() if append else 0
+        self.commandes_table.setRowCount(start_row + len(commandes))
         
-        for row, commande in enumerate(commandes):
+        for row, commande in enumerate(commandes, start=start_row):
             # N° Commande
             self.commandes_table.setItem(row, 0, QTableWidgetItem(str(commande.get('numero_commande') or f"CMD-{commande.get('id')}")))
 
@@ -556,30 +618,8 @@ Montant Espèces: {stats.get('total_paid', 0):.0f} {self.get_currency_symbol()}
             print(f"❌ Erreur update_period_stats: {e}")
         
     def filter_commandes(self):
-        """Filtrer les commandes selon les critères actuels"""
-        try:
-            # Récupérer les filtres actuels
-            date_debut = self.date_debut.date().toPyDate() if hasattr(self, 'date_debut') else None
-            date_fin = self.date_fin.date().toPyDate() if hasattr(self, 'date_fin') else None
-            search_term = self.search_input.text().strip() if hasattr(self, 'search_input') and self.search_input.text().strip() else None
-            payment_filter = self.payment_filter.currentText() if hasattr(self, 'payment_filter') else None
-
-            # Utiliser le contrôleur pour récupérer les commandes filtrées
-            commandes = self.commande_controller.get_commandes(
-                date_debut=date_debut,
-                date_fin=date_fin,
-                search_term=search_term,
-                payment_filter=payment_filter
-            )
-
-            # Mettre à jour le tableau sans déclencher de signaux problématiques
-            self.commandes_table.setRowCount(0)  # Vider le tableau proprement
-            self.populate_table(commandes)
-            self.update_statistics(commandes)
-
-        except Exception as e:
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du filtrage des commandes: {e}")
-            print(f"❌ Erreur filter_commandes: {e}")
+        """Filtrer les commandes selon les critères actuels (repart de la première page)"""
+        self.load_commandes()
         
     def on_commande_selected(self):
         """Gérer la sélection d'une commande dans le tableau"""
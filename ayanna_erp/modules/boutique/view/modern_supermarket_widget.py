@@ -3,7 +3,6 @@ Interface moderne de type supermarché pour le module Boutique
 Design épuré avec catalogue de produits et panier de vente
 """
 
-import os
 from decimal import Decimal
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -12,19 +11,24 @@ from PyQt6.QtWidgets import (
     QFrame, QLabel, QPushButton, QLineEdit, QComboBox, QSpinBox,
     QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox,
     QSplitter, QGroupBox, QFormLayout, QDoubleSpinBox, QTextEdit,
-    QDialog, QDialogButtonBox
+    QDialog, QDialogButtonBox, QCompleter
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer
-from PyQt6.QtGui import QFont, QPixmap, QIcon, QPalette, QColor
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize, QModelIndex
+from PyQt6.QtGui import QFont, QIcon, QPalette, QColor, QStandardItem, QStandardItemModel
 
 from ayanna_erp.database.database_manager import DatabaseManager
-from ayanna_erp.modules.core.models import CoreProduct, CoreProductCategory
+from ayanna_erp.modules.core.models import CoreProductCategory
+from ayanna_erp.modules.core.controllers.catalogue_cache import get_catalogue_cache, bump_catalogue_version
+from ayanna_erp.modules.core.controllers.product_controller import CoreProductController
+from ayanna_erp.modules.core.controllers.product_search import ProductSearchController
+from ayanna_erp.modules.core.views.product_grid import ProductGridView
 from ..model.models import ShopClient, ShopPanier, ShopService
 from ayanna_erp.modules.salle_fete.model.salle_fete import EventService
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
 from ..utils.invoice_printer import InvoicePrintManager
 from .client_index import ClientFormDialog
 from ..controller.vente_controller import VenteController
+from ..helpers.client_lookup import ClientLookup
 
 
 class ModernSupermarketWidget(QWidget):
@@ -34,6 +38,9 @@ class ModernSupermarketWidget(QWidget):
     product_added_to_cart = pyqtSignal(int, int)  # product_id, quantity
     cart_updated = pyqtSignal()
     sale_completed = pyqtSignal(int)  # sale_id
+
+    # Clients proposés dans le combo sans recherche (les plus récents)
+    RECENT_CLIENTS_LIMIT = 50
     
     def __init__(self, boutique_controller, current_user, pos_id=1):
         super().__init__()
@@ -67,6 +74,7 @@ class ModernSupermarketWidget(QWidget):
         except Exception:
             eid = self.pos_id or 1
 
+        self.enterprise_id = eid
         self.invoice_printer = InvoicePrintManager(enterprise_id=eid)
         self.vente_controller = VenteController(self.pos_id, self.current_user)
         
@@ -167,7 +175,20 @@ class ModernSupermarketWidget(QWidget):
         search_label = QLabel("🔍 Rechercher:")
         self.search_edit = QLineEdit()
         self.search_edit.setPlaceholderText("Nom du produit...")
-        self.search_edit.textChanged.connect(self.filter_products)
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
+        self.search_edit.returnPressed.connect(self.on_search_return_pressed)
+
+        # Recherche différée : la grille n'est filtrée qu'après une pause de frappe
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(250)
+        self._search_timer.timeout.connect(self.apply_search)
+
+        # Mode scan : chaque code-barres validé (Entrée) ajoute directement le produit au panier
+        self.scan_mode_btn = QPushButton("📷 Scan")
+        self.scan_mode_btn.setCheckable(True)
+        self.scan_mode_btn.setToolTip("Mode scan : lecture des codes-barres sans recharger la grille")
+        self.scan_mode_btn.toggled.connect(self.on_scan_mode_toggled)
         
         # Filtre par catégorie
         category_label = QLabel("📂 Catégorie:")
@@ -176,6 +197,7 @@ class ModernSupermarketWidget(QWidget):
         
         filters_layout.addWidget(search_label)
         filters_layout.addWidget(self.search_edit, 2)
+        filters_layout.addWidget(self.scan_mode_btn)
 
         # Toggle produits / services
         self.products_radio = QPushButton("Produits")
@@ -207,6 +229,21 @@ class ModernSupermarketWidget(QWidget):
         
         scroll_area.setWidget(self.products_grid_widget)
         catalog_layout.addWidget(scroll_area)
+        # La grille de cartes ne sert plus qu'aux services
+        self.services_scroll_area = scroll_area
+        self.services_scroll_area.hide()
+
+        # Produits : grille virtualisée (seules les tuiles visibles sont dessinées)
+        self.products_view = ProductGridView(
+            spacing=8,
+            tile_size=QSize(220, 280),
+            image_size=QSize(180, 140),
+            price_text_fn=lambda product: f"{float(product.price_unit or 0):.0f} {self._currency_symbol}",
+            show_code=True,
+            button_text="➕ Ajouter",
+        )
+        self.products_view.product_clicked.connect(self.add_to_cart)
+        catalog_layout.addWidget(self.products_view)
         
         return catalog_widget
 
@@ -260,6 +297,8 @@ class ModernSupermarketWidget(QWidget):
 
     def display_services(self, services):
         """Affiche les services dans la grille (cards)."""
+        self.products_view.hide()
+        self.services_scroll_area.show()
         # Vider la grille existante
         for i in reversed(range(self.products_grid_layout.count())):
             child = self.products_grid_layout.itemAt(i).widget()
@@ -487,6 +526,15 @@ class ModernSupermarketWidget(QWidget):
         self.client_search.textChanged.connect(self.on_client_search_changed)
         client_layout.addWidget(self.client_search)
 
+        # Recherche client temporisée hors du thread GUI ; suggestions dans un completer
+        self.client_lookup = ClientLookup(self.boutique_controller, parent=self)
+        self.client_lookup.results_ready.connect(self.on_client_results_ready)
+        self.client_completer = QCompleter(self)
+        self.client_completer.setModel(QStandardItemModel(self.client_completer))
+        self.client_completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.client_completer.activated[QModelIndex].connect(self.on_client_completion_activated)
+        self.client_search.setCompleter(self.client_completer)
+
         # ComboBox pour afficher les résultats (non éditable)
         self.client_combo = QComboBox()
         self.client_combo.setMinimumWidth(150)
@@ -705,157 +753,6 @@ class ModernSupermarketWidget(QWidget):
 
         return actions_frame
     
-    def create_product_card(self, product):
-        """Crée une carte produit moderne avec image haute résolution"""
-        card = QFrame()
-        card.setFrameStyle(QFrame.Shape.StyledPanel)
-        card.setStyleSheet("""
-            QFrame {
-                background-color: white;
-                border: 1px solid #E0E0E0;
-                border-radius: 8px;
-                padding: 10px;
-            }
-            QFrame:hover {
-                border-color: #2196F3;
-                background-color: #F3F9FF;
-            }
-        """)
-        card.setFixedSize(220, 280)  # Augmenté pour meilleure visibilité
-        
-        card_layout = QVBoxLayout(card)
-        card_layout.setSpacing(8)
-        
-        # Image produit avec haute résolution
-        image_label = QLabel()
-        image_label.setFixedSize(180, 140)  # Résolution améliorée
-        image_label.setStyleSheet("""
-            QLabel {
-                background-color: #F8F9FA;
-                border: 1px solid #E0E0E0;
-                border-radius: 6px;
-            }
-        """)
-        image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # Charger l'image du produit selon la logique spécifiée
-        image_loaded = False
-        if hasattr(product, 'image') and product.image and product.image.strip():
-            try:
-                # Le champ image contient le chemin relatif ou nom du fichier
-                image_filename = product.image.strip()
-                
-                # Construire le chemin complet de l'image (même logique que produit_index.py)
-                if os.path.isabs(image_filename):
-                    # Chemin absolu
-                    full_path = image_filename
-                else:
-                    # Chemin relatif depuis la racine du projet
-                    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-                    full_path = os.path.join(project_root, image_filename.replace("/", os.sep))
-                
-                if os.path.exists(full_path):
-                    # Charger l'image avec PyQt6
-                    pixmap = QPixmap(full_path)
-                    if not pixmap.isNull():
-                        # Redimensionner l'image pour s'adapter au label tout en gardant les proportions
-                        scaled_pixmap = pixmap.scaled(
-                            image_label.size(),  # Utiliser la taille du label comme dans produit_index.py
-                            Qt.AspectRatioMode.KeepAspectRatio,
-                            Qt.TransformationMode.SmoothTransformation  # Haute qualité
-                        )
-                        image_label.setPixmap(scaled_pixmap)
-                        image_loaded = True
-                        print(f"✅ Image chargée avec succès pour {product.name}: {full_path}")
-                    else:
-                        print(f"❌ Image corrompue: {full_path}")
-                else:
-                    print(f"❌ Image introuvable: {full_path}")
-                        
-            except Exception as e:
-                print(f"❌ Erreur chargement image '{product.image}': {e}")
-        
-        # Si pas d'image chargée, afficher une image par défaut moderne
-        if not image_loaded:
-            image_label.setText("📦\nProduit")
-            image_label.setStyleSheet("""
-                QLabel {
-                    background-color: #F8F9FA;
-                    border: 2px dashed #DEE2E6;
-                    border-radius: 6px;
-                    color: #6C757D;
-                    font-size: 12px;
-                    font-weight: bold;
-                }
-            """)
-        
-        card_layout.addWidget(image_label, 0, Qt.AlignmentFlag.AlignCenter)
-        
-        # Nom du produit
-        name_label = QLabel(product.name[:30] + "..." if len(product.name) > 30 else product.name)
-        name_label.setStyleSheet("""
-            QLabel {
-                font-weight: bold;
-                color: #212529;
-                background: transparent;
-                font-size: 11px;
-            }
-        """)
-        name_label.setWordWrap(True)
-        name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        card_layout.addWidget(name_label)
-        
-        # Prix avec meilleure mise en forme
-        price = getattr(product, 'price_unit', getattr(product, 'sale_price', 0))
-        price_label = QLabel(f"{price:.0f} {self.get_currency_symbol()}")
-        price_label.setStyleSheet("""
-            QLabel {
-                font-size: 13px;
-                font-weight: bold;
-                color: #28A745;
-                background: transparent;
-            }
-        """)
-        price_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        card_layout.addWidget(price_label)
-        
-        # Informations supplémentaires (code produit si disponible)
-        if hasattr(product, 'code') and product.code:
-            code_label = QLabel(f"Code: {product.code}")
-            code_label.setStyleSheet("""
-                QLabel {
-                    font-size: 9px;
-                    color: #6C757D;
-                    background: transparent;
-                }
-            """)
-            code_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            card_layout.addWidget(code_label)
-        
-        # Bouton d'ajout au panier
-        add_btn = QPushButton("➕ Ajouter")
-        add_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2196F3;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px 12px;
-                font-weight: bold;
-                font-size: 11px;
-            }
-            QPushButton:hover {
-                background-color: #1976D2;
-            }
-            QPushButton:pressed {
-                background-color: #1565C0;
-            }
-        """)
-        add_btn.clicked.connect(lambda: self.add_to_cart(product))
-        card_layout.addWidget(add_btn)
-        
-        return card
-    
     def apply_modern_style(self):
         """Applique le style moderne général"""
         self.setStyleSheet("""
@@ -931,92 +828,86 @@ class ModernSupermarketWidget(QWidget):
             QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des catégories: {e}")
     
     def load_clients(self):
-        """Charge la liste des clients dans le combo"""
+        """Charge dans le combo l'option anonyme et les clients les plus récents (les autres via la recherche)"""
         try:
             with self.db_manager.get_session() as session:
-                # Charger tous les clients actifs, peu importe leur pos_id
-                # pour permettre le partage des clients entre modules
+                # Clients actifs, peu importe leur pos_id, pour permettre le partage des clients entre modules
                 clients = session.query(ShopClient).filter_by(
                     is_active=True
-                ).all()
+                ).order_by(ShopClient.id.desc()).limit(self.RECENT_CLIENTS_LIMIT).all()
+                self._recent_clients = [
+                    {'id': c.id, 'nom': c.nom, 'prenom': c.prenom, 'telephone': c.telephone}
+                    for c in clients
+                ]
 
-                self.client_combo.clear()
-                self.client_combo.addItem("Client anonyme", None)
-
-                for client in clients:
-                    display_name = f"{client.nom} {client.prenom or ''}".strip()
-                    self.client_combo.addItem(display_name, client.id)
+            self.client_combo.clear()
+            self.client_combo.addItem("Client anonyme", None)
+            for client in self._recent_clients:
+                self.client_combo.addItem(self._client_display_name(client), client['id'])
 
         except Exception as e:
             QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des clients: {e}")
-    
+
+    @staticmethod
+    def _client_display_name(client, with_phone=False):
+        display_name = f"{client['nom']} {client['prenom'] or ''}".strip()
+        if with_phone and client.get('telephone'):
+            display_name += f" ({client['telephone']})"
+        return display_name
+
     def on_client_search_changed(self, text):
-        """Gestionnaire de changement de texte dans la recherche client"""
+        """Gestionnaire de changement de texte dans la recherche client (recherche temporisée, asynchrone)"""
         text = text.strip()
+        if not text:
+            # Champ vidé : retour à la liste initiale sans requête
+            self.client_lookup.cancel()
+            self.client_completer.model().clear()
+            self.client_combo.clear()
+            self.client_combo.addItem("Client anonyme", None)
+            for client in getattr(self, '_recent_clients', []):
+                self.client_combo.addItem(self._client_display_name(client), client['id'])
+            return
+        self.client_lookup.lookup(text)
 
-        try:
-            with self.db_manager.get_session() as session:
-                # Vider le combo
-                self.client_combo.clear()
-
-                if not text:
-                    # Si le texte est vide, commencer par l'option anonyme puis tous les clients
-                    self.client_combo.addItem("Client anonyme", None)
-                    clients = session.query(ShopClient).filter_by(
-                        is_active=True
-                    ).all()
-
-                    for client in clients:
-                        display_name = f"{client.nom} {client.prenom or ''}".strip()
-                        self.client_combo.addItem(display_name, client.id)
-                    return
-
-                # Recherche par téléphone (priorité)
-                client_by_phone = session.query(ShopClient).filter(
-                    ShopClient.is_active == True,
-                    ShopClient.telephone.like(f"%{text}%")
-                ).first()
-
-                if client_by_phone:
-                    # Si trouvé par téléphone, afficher ce client en premier (sans client anonyme)
-                    display_name = f"{client_by_phone.nom} {client_by_phone.prenom or ''}".strip()
-                    full_display = f"{display_name} ({client_by_phone.telephone})"
-                    self.client_combo.addItem(full_display, client_by_phone.id)
-                    self.selected_client = client_by_phone
-                    return
+    def on_client_results_ready(self, text, clients):
+        """Affiche les clients trouvés pour la saisie `text` dans le combo et le completer"""
+        if text != self.client_search.text().strip():
+            return
 
-                # Recherche par nom/prénom
-                clients_by_name = session.query(ShopClient).filter(
-                    ShopClient.is_active == True,
-                    (ShopClient.nom.like(f"%{text}%") | ShopClient.prenom.like(f"%{text}%"))
-                ).limit(10).all()
-
-                if clients_by_name:
-                    # Afficher les clients trouvés en premier (sans client anonyme)
-                    for client in clients_by_name:
-                        display_name = f"{client.nom} {client.prenom or ''}".strip()
-                        if client.telephone:
-                            display_name += f" ({client.telephone})"
-                        self.client_combo.addItem(display_name, client.id)
-
-                    self.selected_client = clients_by_name[0]
-                else:
-                    # Aucun client trouvé - commencer par anonyme puis proposer de créer
-                    self.client_combo.addItem("Client anonyme", None)
-                    self.client_combo.addItem(f"➕ Créer client '{text}'", -1)  # -1 pour indiquer création
-                    self.selected_client = None
+        model = self.client_completer.model()
+        model.clear()
+        for client in clients:
+            item = QStandardItem(self._client_display_name(client, with_phone=True))
+            item.setData(client, Qt.ItemDataRole.UserRole)
+            model.appendRow(item)
+
+        self.client_combo.clear()
+        if clients:
+            # Afficher les clients trouvés en premier (sans client anonyme)
+            for client in clients:
+                self.client_combo.addItem(self._client_display_name(client, with_phone=True), client['id'])
+            if self.client_search.hasFocus():
+                self.client_completer.complete()
+        else:
+            # Aucun client trouvé - commencer par anonyme puis proposer de créer
+            self.client_combo.addItem("Client anonyme", None)
+            self.client_combo.addItem(f"➕ Créer client '{text}'", -1)  # -1 pour indiquer création
+            self.selected_client = None
+
+    def on_client_completion_activated(self, index):
+        """Client choisi dans les suggestions : le sélectionner dans le combo"""
+        client = index.data(Qt.ItemDataRole.UserRole)
+        if not client:
+            return
+        # Le completer vient de remplacer le texte : ne pas relancer de recherche
+        self.client_lookup.cancel()
+        row = self.client_combo.findData(client['id'])
+        if row < 0:
+            self.client_combo.clear()
+            self.client_combo.addItem(self._client_display_name(client, with_phone=True), client['id'])
+            row = 0
+        self.client_combo.setCurrentIndex(row)
 
-        except Exception as e:
-            print(f"Erreur lors de la recherche client: {e}")
-            import traceback
-            traceback.print_exc()
-            # En cas d'erreur, s'assurer qu'on a au moins l'option anonyme
-            try:
-                if self.client_combo.count() == 0:
-                    self.client_combo.addItem("Client anonyme", None)
-            except:
-                pass
-    
     def on_client_selected(self, index):
         """Gestionnaire de sélection de client"""
         if index >= 0:
@@ -1145,21 +1036,13 @@ class ModernSupermarketWidget(QWidget):
             return
 
         try:
-            with self.db_manager.get_session() as session:
-                query = session.query(CoreProduct).filter_by(is_active=True)
-
-                # Appliquer le filtre de catégorie si sélectionné
-                category_id = self.category_combo.currentData()
-                if category_id:
-                    query = query.filter_by(category_id=category_id)
-
-                # Appliquer le filtre de recherche
-                search_text = self.search_edit.text().strip()
-                if search_text:
-                    query = query.filter(CoreProduct.name.ilike(f'%{search_text}%'))
-
-                products = query.all()
-                self.display_products(products)
+            # Catalogue de la catégorie depuis le cache mémoire ;
+            # la recherche se contente ensuite de filtrer / réordonner le modèle
+            category_id = self.category_combo.currentData()
+            products = get_catalogue_cache(self.enterprise_id).search(category_id=category_id, active_only=True)
+            self.display_products(products)
+            if self.search_edit.text().strip() and not self.scan_mode_btn.isChecked():
+                self.apply_search()
 
         except Exception as e:
             QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des produits: {e}")
@@ -1265,27 +1148,115 @@ class ModernSupermarketWidget(QWidget):
     
     def display_products(self, products):
         """Affiche les produits dans la grille"""
-        # Vider la grille existante
-        for i in reversed(range(self.products_grid_layout.count())):
-            child = self.products_grid_layout.itemAt(i).widget()
-            if child:
-                child.setParent(None)
-        
-        # Ajouter les nouveaux produits
-        cols = 3  # 3 colonnes de produits
-        for i, product in enumerate(products):
-            row = i // cols
-            col = i % cols
-            
-            product_card = self.create_product_card(product)
-            self.products_grid_layout.addWidget(product_card, row, col)
-        
-        # Ajouter un stretch pour pousser les cartes vers le haut
-        self.products_grid_layout.setRowStretch(len(products) // cols + 1, 1)
-    
+        self.services_scroll_area.hide()
+        self.products_view.show()
+        self._currency_symbol = self.get_currency_symbol()
+        self.products_view.product_model.set_products(products)
+
+    def on_search_text_changed(self, _text=None):
+        """Relance le délai de recherche à chaque frappe"""
+        # En mode scan, la saisie est un code-barres : la grille n'est pas filtrée
+        if self.scan_mode_btn.isChecked():
+            return
+        self._search_timer.start()
+
+    def apply_search(self):
+        """Filtre la grille selon la recherche : résultats classés, sans recréer les tuiles"""
+        if getattr(self, 'catalog_mode', 'products') == 'services':
+            self.load_services()
+            return
+        try:
+            search_text = self.search_edit.text().strip()
+            model = self.products_view.product_model
+            if not search_text:
+                model.show_all()
+                return
+            resultats = ProductSearchController().search(
+                self.enterprise_id, search_text,
+                category_id=self.category_combo.currentData(), active_only=True
+            )
+            model.show_ids([p.id for p in resultats])
+        except Exception as e:
+            print(f"❌ Erreur recherche produits: {e}")
+
     def filter_products(self):
         """Filtre les produits selon les critères de recherche"""
         self.load_products()
+
+    def on_scan_mode_toggled(self, checked):
+        """Active/désactive le mode scan du champ de recherche"""
+        self.search_edit.blockSignals(True)
+        self.search_edit.clear()
+        self.search_edit.blockSignals(False)
+        self.search_edit.setPlaceholderText("Scanner un code-barres..." if checked else "Nom du produit...")
+        self._search_timer.stop()
+        self.apply_search()
+        self.search_edit.setFocus()
+
+    def on_search_return_pressed(self):
+        """Validation du champ de recherche : en mode scan, ajoute le produit scanné"""
+        if not self.scan_mode_btn.isChecked():
+            return
+        barcode = self.search_edit.text().strip()
+        self.search_edit.clear()
+        if barcode:
+            self.add_scanned_barcode(barcode)
+
+    def _lookup_barcode_in_db(self, barcode):
+        """Recherche indexée du code-barres en base lorsque le cache ne le connaît pas"""
+        try:
+            if not hasattr(self, '_core_product_ctrl'):
+                self._core_product_ctrl = CoreProductController(self.pos_id)
+            with self.db_manager.session_scope() as session:
+                product = self._core_product_ctrl.lookup_by_barcode(session, barcode)
+                product_id = product.id if product else None
+            if product_id is None:
+                return None
+            # Produit absent du cache : il a été créé ou modifié ailleurs
+            bump_catalogue_version(self.enterprise_id)
+            return get_catalogue_cache(self.enterprise_id).get(product_id)
+        except Exception as e:
+            print(f"❌ Erreur recherche code-barres {barcode}: {e}")
+            return None
+
+    def add_scanned_barcode(self, barcode):
+        """Ajoute une unité du produit scanné au panier, sans dialogue ni rechargement de la grille"""
+        product = get_catalogue_cache(self.enterprise_id).by_barcode(barcode)
+        if product is None:
+            product = self._lookup_barcode_in_db(barcode)
+        if product is None:
+            QMessageBox.warning(self, "Code-barres inconnu", f"Aucun produit actif pour le code-barres {barcode}")
+            return False
+
+        existing_item = None
+        for item in self.current_cart:
+            if item.get('type') == 'product' and item.get('id') == product.id and item.get('source') is None:
+                existing_item = item
+                break
+
+        in_cart = existing_item['quantity'] if existing_item else 0
+        available_stock = self.get_available_stock(product.id)
+        if available_stock is not None and in_cart + 1 > available_stock:
+            QMessageBox.warning(self, "Stock insuffisant", f"Stock disponible pour {product.name}: {available_stock:g}")
+            return False
+
+        if existing_item:
+            existing_item['quantity'] += 1
+        else:
+            self.current_cart.append({
+                'type': 'product',
+                'id': product.id,
+                'name': product.name,
+                'unit_price': float(product.price_unit or 0),
+                'quantity': 1,
+                'source': None
+            })
+
+        self.update_cart_display()
+        self.update_totals()
+        self.product_added_to_cart.emit(product.id, 1)
+        self.cart_updated.emit()
+        return True
     
     def add_to_cart(self, product, item_type='product', source=None):
         print(f"DEBUGG ADD TO CART {product}")
@@ -5,11 +5,12 @@ Gère les requêtes SQLAlchemy, calculs de soldes, transferts, et fournit les do
 """
 
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func, or_
+from sqlalchemy import or_
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.modules.comptabilite.model.comptabilite import (
     ComptaClasses, ComptaComptes, ComptaJournaux, ComptaEcritures, ComptaConfig
 )
+from ayanna_erp.modules.comptabilite.controller.soldes_controller import SoldesController
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
 
 # Alias pour compatibilité avec l'ancien code
@@ -28,6 +29,7 @@ class ComptabiliteController:
         self.db_manager = DatabaseManager()
         self.session = self.db_manager.get_session()
         self.entreprise_controller = EntrepriseController()
+        self.soldes_controller = SoldesController()
         # Ajout du contrôleur utilisateur pour récupérer l'utilisateur connecté
         self.user_controller = user_controller
     
@@ -108,55 +110,34 @@ class ComptabiliteController:
             print(f"Erreur lors de la récupération du compte ID {compte_id}: {e}")
             return None
 
-    def get_bilan_comptable(self, entreprise_id, date_debut, date_fin):
+    def _get_soldes_par_compte(self, entreprise_id, periodes):
         """
-        Retourne un bilan comptable structuré pour une entreprise donnée.
-        Structure :
-        {
-            "actifs": [{"compte": "101", "nom": "Banque", "solde": 20000}, ...],
-            "passifs": [{"compte": "201", "nom": "Capital", "solde": 50000}, ...],
-            "total_actifs": 35000,
-            "total_passifs": 58000
-        }
-        """
-        from sqlalchemy import func
-        # Import d�j� fait en haut du fichier
-        import datetime
-        # Inclure toute la journée de la date de fin si c'est un objet date
-        if isinstance(date_fin, datetime.date) and not isinstance(date_fin, datetime.datetime):
-            date_fin = datetime.datetime.combine(date_fin, datetime.time.max)
+        Totaux débit/crédit par compte pour plusieurs périodes.
+        Les mois clôturés sont lus dans l'instantané compta_soldes (voir SoldesController).
 
-        # Récupérer tous les comptes actifs/passifs de l'entreprise
-        comptes = (
-            self.session.query(ComptaComptes, ComptaClasses)
-            .join(ComptaClasses, ComptaComptes.classe_comptable_id == ComptaClasses.id)
-            # Inclure les classes appartenant à l'entreprise OU les classes globales (enterprise_id IS NULL)
-            .filter(or_(ComptaClasses.enterprise_id == entreprise_id, ComptaClasses.enterprise_id == None))
-            .filter(ComptaClasses.type.in_(["actif", "passif", "mixte"]))
-            .all()
-        )
+        Args:
+            entreprise_id: ID de l'entreprise
+            periodes (dict): {cle: (date_debut, date_fin)} bornes inclusives
 
+        Returns:
+            dict: {cle: {compte_id: (total_debit, total_credit)}}
+        """
+        return {
+            cle: self.soldes_controller.get_mouvements(self.session, entreprise_id, debut, fin)
+            for cle, (debut, fin) in periodes.items()
+        }
+
+    def _construire_bilan(self, comptes, soldes, entreprise_id):
+        """Répartit les soldes des comptes entre actif et passif et ajoute le résultat net"""
         actifs = []
         passifs = []
         total_actifs = 0.0
         total_passifs = 0.0
+        total_charges = 0.0
+        total_produits = 0.0
 
         for compte, classe in comptes:
-            # Agréger les écritures sur la période et l'entreprise
-            res = (
-                self.session.query(
-                    func.sum(ComptaEcritures.debit).label("total_debit"),
-                    func.sum(ComptaEcritures.credit).label("total_credit")
-                )
-                .join(ComptaJournaux, ComptaEcritures.journal_id == ComptaJournaux.id)
-                .filter(ComptaEcritures.compte_comptable_id == compte.id)
-                .filter(ComptaJournaux.enterprise_id == entreprise_id)
-                .filter(ComptaJournaux.date_operation >= date_debut)
-                .filter(ComptaJournaux.date_operation <= date_fin)
-                .first()
-            )
-            total_debit = float(res.total_debit or 0)
-            total_credit = float(res.total_credit or 0)
+            total_debit, total_credit = soldes.get(compte.id, (0.0, 0.0))
             if classe.type == "actif":
                 solde = total_debit - total_credit
                 if solde != 0:
@@ -175,12 +156,15 @@ class ComptabiliteController:
                     total_passifs += solde
                 elif solde > 0:
                     actifs.append({"compte": compte.numero, "nom": compte.nom, "solde": solde})
-                    total_passifs += solde
-                
+                    total_actifs += solde
+            # Résultat : mêmes règles que get_compte_resultat (classes de l'entreprise uniquement)
+            elif classe.type == "charge" and classe.enterprise_id == entreprise_id:
+                total_charges += total_debit
+            elif classe.type == "produit" and classe.enterprise_id == entreprise_id:
+                total_produits += total_credit
 
         # Ajout du résultat net dans le passif
-        resultat = self.get_compte_resultat(entreprise_id, date_debut, date_fin)
-        resultat_net = resultat.get("resultat_net", 0)
+        resultat_net = total_produits - total_charges
         passifs.append({"compte": "Résultat Net", "nom": "Résultat de l'exercice", "solde": resultat_net})
         total_passifs += resultat_net
 
@@ -190,6 +174,73 @@ class ComptabiliteController:
             "total_actifs": total_actifs,
             "total_passifs": total_passifs
         }
+
+    def get_bilan_comptable(self, entreprise_id, date_debut, date_fin, comparatif=False,
+                            date_debut_precedent=None, date_fin_precedent=None):
+        """
+        Retourne un bilan comptable structuré pour une entreprise donnée.
+        Structure :
+        {
+            "actifs": [{"compte": "101", "nom": "Banque", "solde": 20000}, ...],
+            "passifs": [{"compte": "201", "nom": "Capital", "solde": 50000}, ...],
+            "total_actifs": 35000,
+            "total_passifs": 58000
+        }
+
+        Tous les soldes (bilan et résultat net) proviennent d'un seul GROUP BY sur les écritures.
+        En mode comparatif, la même requête calcule aussi la période précédente (par défaut la
+        même période un an plus tôt) : chaque ligne reçoit "solde_precedent" et le bilan
+        précédent complet est renvoyé sous la clé "precedent".
+        """
+        import datetime
+        # Inclure toute la journée de la date de fin si c'est un objet date
+        if isinstance(date_debut, datetime.date) and not isinstance(date_debut, datetime.datetime):
+            date_debut = datetime.datetime.combine(date_debut, datetime.time.min)
+        if isinstance(date_fin, datetime.date) and not isinstance(date_fin, datetime.datetime):
+            date_fin = datetime.datetime.combine(date_fin, datetime.time.max)
+
+        periodes = {"courant": (date_debut, date_fin)}
+        if comparatif:
+            def _annee_precedente(d):
+                try:
+                    return d.replace(year=d.year - 1)
+                except ValueError:
+                    # 29 février
+                    return d.replace(year=d.year - 1, day=28)
+            date_debut_precedent = date_debut_precedent or _annee_precedente(date_debut)
+            date_fin_precedent = date_fin_precedent or _annee_precedente(date_fin)
+            if isinstance(date_debut_precedent, datetime.date) and not isinstance(date_debut_precedent, datetime.datetime):
+                date_debut_precedent = datetime.datetime.combine(date_debut_precedent, datetime.time.min)
+            if isinstance(date_fin_precedent, datetime.date) and not isinstance(date_fin_precedent, datetime.datetime):
+                date_fin_precedent = datetime.datetime.combine(date_fin_precedent, datetime.time.max)
+            periodes["precedent"] = (date_debut_precedent, date_fin_precedent)
+
+        # Récupérer tous les comptes de l'entreprise (bilan + résultat) en une requête
+        comptes = (
+            self.session.query(ComptaComptes, ComptaClasses)
+            .join(ComptaClasses, ComptaComptes.classe_comptable_id == ComptaClasses.id)
+            # Inclure les classes appartenant à l'entreprise OU les classes globales (enterprise_id IS NULL)
+            .filter(or_(ComptaClasses.enterprise_id == entreprise_id, ComptaClasses.enterprise_id == None))
+            .filter(ComptaClasses.type.in_(["actif", "passif", "mixte", "charge", "produit"]))
+            .all()
+        )
+
+        soldes = self._get_soldes_par_compte(entreprise_id, periodes)
+        bilan = self._construire_bilan(comptes, soldes["courant"], entreprise_id)
+
+        if comparatif:
+            precedent = self._construire_bilan(comptes, soldes["precedent"], entreprise_id)
+            for section in ("actifs", "passifs"):
+                anciens = {ligne["compte"]: ligne["solde"] for ligne in precedent[section]}
+                for ligne in bilan[section]:
+                    ligne["solde_precedent"] = anciens.get(ligne["compte"], 0.0)
+            precedent["date_debut"] = date_debut_precedent
+            precedent["date_fin"] = date_fin_precedent
+            bilan["precedent"] = precedent
+            bilan["total_actifs_precedent"] = precedent["total_actifs"]
+            bilan["total_passifs_precedent"] = precedent["total_passifs"]
+
+        return bilan
     def export_detail_compte_pdf(self, data, file_path, entreprise_id=None):
         """Export PDF des détails d'un compte avec style uniforme, logo BLOB, infos école, titre et tableau aligné à gauche."""
         from reportlab.lib.pagesizes import A4
@@ -464,11 +515,7 @@ class ComptabiliteController:
         """
         Calcule le solde d'un compte (total débit - total crédit)
         """
-        # Import remplac� par les nouveaux mod�les
-        ecritures = self.session.query(EcritureComptable).filter_by(compte_comptable_id=compte_id).all()
-        total_debit = sum(float(e.debit or 0) for e in ecritures)
-        total_credit = sum(float(e.credit or 0) for e in ecritures)
-        return total_debit - total_credit
+        return self.soldes_controller.get_solde(self.session, compte_id)
 
 
     def transfert_journal(self, entreprise_id, compte_debit_id, compte_credit_id, montant, libelle, user_id=None):
@@ -536,16 +583,17 @@ class ComptabiliteController:
 
     # À compléter : méthodes pour journal, grand livre, balance, bilan, etc.
 
-    def get_journaux_comptables(self, entreprise_id):
+    def get_journaux_comptables(self, entreprise_id, session=None):
         """
         Retourne la liste des journaux comptables pour une entreprise donnée.
         Args:
             entreprise_id (int): ID de l'entreprise
+            session: session à utiliser (chargement en arrière-plan), sinon celle du contrôleur
         Returns:
             list: Liste des objets JournalComptable
         """
         # Import remplac� par les nouveaux mod�les
-        journaux = self.session.query(JournalComptable).filter_by(enterprise_id=entreprise_id).order_by(JournalComptable.date_operation.desc()).all()
+        journaux = (session or self.session).query(JournalComptable).filter_by(enterprise_id=entreprise_id).order_by(JournalComptable.date_operation.desc()).all()
         return journaux
 
     def get_ecritures_du_journal(self, journal_id):
@@ -584,52 +632,176 @@ class ComptabiliteController:
     Classe centrale pour la logique métier et l'accès aux données comptables.
     """
  # Grand Livre
-    def get_grand_livre(self, entreprise_id):
+    def _borne_periode(self, valeur, fin=False):
+        """Convertit une date en datetime (début ou fin de journée) pour borner une période"""
+        if isinstance(valeur, datetime.date) and not isinstance(valeur, datetime.datetime):
+            return datetime.datetime.combine(valeur, datetime.time.max if fin else datetime.time.min)
+        return valeur
+
+    def get_grand_livre(self, entreprise_id, date_debut=None, date_fin=None,
+                        compte_debut=None, compte_fin=None):
         """
-        Retourne une liste de dicts pour l'entreprise donnée.
+        Retourne une liste de dicts pour l'entreprise donnée (un par compte, triés par numéro).
+
+        Les totaux sont agrégés côté base (instantané mensuel compta_soldes + écritures
+        des mois non clôturés, voir SoldesController) :
+        - solde_ouverture : débit - crédit des écritures antérieures à date_debut (report à nouveau)
+        - total_debit / total_credit : mouvements de la période [date_debut, date_fin]
+        - solde : solde_ouverture + total_debit - total_credit
+
+        Args:
+            entreprise_id: ID de l'entreprise
+            date_debut, date_fin: bornes inclusives de la période (None = sans borne)
+            compte_debut, compte_fin: plage optionnelle de numéros de compte (inclusive)
         """
-        # Import remplac� par les nouveaux mod�les
-        comptes = self.session.query(CompteComptable).join(ClasseComptable).filter(ClasseComptable.enterprise_id == entreprise_id).all()
+        date_debut = self._borne_periode(date_debut)
+        date_fin = self._borne_periode(date_fin, fin=True)
+
+        query = (
+            self.session.query(CompteComptable.id, CompteComptable.numero, CompteComptable.nom)
+            .join(ClasseComptable, CompteComptable.classe_comptable_id == ClasseComptable.id)
+            .filter(ClasseComptable.enterprise_id == entreprise_id)
+        )
+        if compte_debut:
+            query = query.filter(CompteComptable.numero >= str(compte_debut))
+        if compte_fin:
+            query = query.filter(CompteComptable.numero <= str(compte_fin))
+        comptes = query.order_by(CompteComptable.numero).all()
+        compte_ids = [c.id for c in comptes] if (compte_debut or compte_fin) else None
+
+        mouvements = self.soldes_controller.get_mouvements(
+            self.session, entreprise_id, date_debut, date_fin, compte_ids=compte_ids
+        )
+        ouvertures = {}
+        if date_debut is not None:
+            ouvertures = self.soldes_controller.get_mouvements(
+                self.session, entreprise_id,
+                date_fin=date_debut - datetime.timedelta(microseconds=1), compte_ids=compte_ids
+            )
+
         result = []
-        for compte in comptes:
-            ecritures = self.session.query(EcritureComptable).filter(EcritureComptable.compte_comptable_id == compte.id).all()
-            total_debit = sum(e.debit for e in ecritures)
-            total_credit = sum(e.credit for e in ecritures)
-            solde = total_debit - total_credit
+        for row in comptes:
+            debit_ouverture, credit_ouverture = ouvertures.get(row.id, (0.0, 0.0))
+            solde_ouverture = debit_ouverture - credit_ouverture
+            total_debit, total_credit = mouvements.get(row.id, (0.0, 0.0))
             result.append({
-                "numero": compte.numero,
-                "nom": compte.nom,
+                "numero": row.numero,
+                "nom": row.nom,
+                "solde_ouverture": solde_ouverture,
                 "total_debit": total_debit,
                 "total_credit": total_credit,
-                "solde": solde,
-                "id": compte.id
+                "solde": solde_ouverture + total_debit - total_credit,
+                "id": row.id
             })
         return result
 
-    def get_ecritures_compte(self, compte_id, entreprise_id):
+    def get_ecritures_compte_page(self, compte_id, entreprise_id, date_debut=None, date_fin=None,
+                                  curseur=None, page_size=500):
         """
-        Retourne la liste des écritures d’un compte pour l'entreprise donnée.
+        Retourne une page d'écritures d'un compte avec le solde progressif.
+
+        Pagination par curseur (keyset) sur (date_operation, id) : seule la page demandée est lue.
+        Le curseur renvoyé transporte aussi le solde courant, ce qui évite de recalculer
+        le report d'une page à l'autre.
+
+        Returns:
+            dict: {
+                "ecritures": [...],          # date, journal, journal_id, libelle, debit, credit, solde
+                "solde_ouverture": float,    # solde reporté avant la première ligne de la page
+                "curseur_suivant": tuple | None
+            }
         """
-        # Import remplac� par les nouveaux mod�les
-        ecritures = (
-            self.session.query(EcritureComptable, JournalComptable)
+        date_debut = self._borne_periode(date_debut)
+        date_fin = self._borne_periode(date_fin, fin=True)
+
+        if curseur is None:
+            # Report à nouveau : solde des écritures antérieures à la période
+            solde = 0.0
+            if date_debut is not None:
+                solde = self.soldes_controller.get_solde(
+                    self.session, compte_id, entreprise_id,
+                    date_fin=date_debut - datetime.timedelta(microseconds=1)
+                )
+        else:
+            derniere_date, dernier_id, solde = curseur
+
+        query = (
+            self.session.query(
+                EcritureComptable.id,
+                EcritureComptable.journal_id,
+                EcritureComptable.libelle,
+                EcritureComptable.debit,
+                EcritureComptable.credit,
+                JournalComptable.date_operation,
+                JournalComptable.libelle.label("journal_libelle"),
+            )
             .join(JournalComptable, EcritureComptable.journal_id == JournalComptable.id)
             .filter(EcritureComptable.compte_comptable_id == compte_id)
             .filter(JournalComptable.enterprise_id == entreprise_id)
-            .order_by(JournalComptable.date_operation)
+        )
+        if date_debut is not None:
+            query = query.filter(JournalComptable.date_operation >= date_debut)
+        if date_fin is not None:
+            query = query.filter(JournalComptable.date_operation <= date_fin)
+        if curseur is not None:
+            query = query.filter(or_(
+                JournalComptable.date_operation > derniere_date,
+                (JournalComptable.date_operation == derniere_date) & (EcritureComptable.id > dernier_id)
+            ))
+        rows = (
+            query.order_by(JournalComptable.date_operation, EcritureComptable.id)
+            .limit(page_size + 1)
             .all()
         )
-        result = []
-        for ecriture, journal in ecritures:
-            result.append({
-                "date": journal.date_operation.strftime("%d/%m/%Y"),
-                "journal": getattr(journal, 'nom', ''),
-                "journal_id": ecriture.journal_id,
-                "libelle": getattr(ecriture, 'libelle', ''),
-                "debit": float(ecriture.debit),
-                "credit": float(ecriture.credit)
-            })               
-        return result
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        solde_ouverture = solde
+        ecritures = []
+        for row in rows:
+            debit = float(row.debit or 0)
+            credit = float(row.credit or 0)
+            solde += debit - credit
+            ecritures.append({
+                "id": row.id,
+                "date": row.date_operation.strftime("%d/%m/%Y"),
+                "journal": row.journal_libelle or '',
+                "journal_id": row.journal_id,
+                "libelle": row.libelle or '',
+                "debit": debit,
+                "credit": credit,
+                "solde": solde
+            })
+
+        curseur_suivant = None
+        if has_more and rows:
+            curseur_suivant = (rows[-1].date_operation, rows[-1].id, solde)
+
+        return {
+            "ecritures": ecritures,
+            "solde_ouverture": solde_ouverture,
+            "curseur_suivant": curseur_suivant
+        }
+
+    def iter_ecritures_compte(self, compte_id, entreprise_id, date_debut=None, date_fin=None, page_size=500):
+        """Itère sur les écritures d'un compte page par page (voir get_ecritures_compte_page)"""
+        curseur = None
+        while True:
+            page = self.get_ecritures_compte_page(
+                compte_id, entreprise_id, date_debut, date_fin, curseur=curseur, page_size=page_size
+            )
+            yield from page["ecritures"]
+            curseur = page["curseur_suivant"]
+            if curseur is None:
+                break
+
+    def get_ecritures_compte(self, compte_id, entreprise_id, date_debut=None, date_fin=None):
+        """
+        Retourne la liste des écritures d’un compte pour l'entreprise donnée,
+        avec le solde progressif de chaque ligne.
+        """
+        return list(self.iter_ecritures_compte(compte_id, entreprise_id, date_debut, date_fin))
 
     def export_grand_livre_pdf(self, data, file_path):
         """Génère un PDF formaté du grand livre complet avec charte graphique uniforme"""
@@ -943,49 +1115,34 @@ class ComptabiliteController:
         except Exception:
             pass
 
-        # Charges (classe 6, type 'charge')
-        charges_query = (
-            self.session.query(
-                CompteComptable.numero.label("compte"),
-                CompteComptable.nom.label("nom"),
-                func.sum(EcritureComptable.debit).label("total")
-            )
+        comptes = (
+            self.session.query(CompteComptable.id, CompteComptable.numero, CompteComptable.nom, ClasseComptable.type)
             .join(ClasseComptable, CompteComptable.classe_comptable_id == ClasseComptable.id)
-            .join(EcritureComptable, EcritureComptable.compte_comptable_id == CompteComptable.id)
-            .join(JournalComptable, EcritureComptable.journal_id == JournalComptable.id)
             .filter(ClasseComptable.enterprise_id == entreprise_id)
-            .filter(ClasseComptable.type == "charge")
-            .filter(JournalComptable.enterprise_id == entreprise_id)
-            .filter(JournalComptable.date_operation >= date_debut)
-            .filter(JournalComptable.date_operation <= date_fin)
-            .group_by(CompteComptable.numero, CompteComptable.nom)
+            .filter(ClasseComptable.type.in_(("charge", "produit")))
+            .all()
         )
+        mouvements = self.soldes_controller.get_mouvements(
+            self.session, entreprise_id, date_debut, date_fin, compte_ids=[c.id for c in comptes]
+        )
+
+        # Charges (classe 6, type 'charge') au débit, produits (classe 7, type 'produit') au crédit,
+        # regroupés par (numéro, nom) pour les seuls comptes mouvementés sur la période
+        totaux = {"charge": {}, "produit": {}}
+        for compte in comptes:
+            if compte.id not in mouvements:
+                continue
+            total_debit, total_credit = mouvements[compte.id]
+            cle = (compte.numero, compte.nom)
+            montant = total_debit if compte.type == "charge" else total_credit
+            totaux[compte.type][cle] = totaux[compte.type].get(cle, 0.0) + montant
         charges = [
-            {"compte": row.compte, "nom": row.nom, "total": float(row.total or 0)}
-            for row in charges_query
+            {"compte": numero, "nom": nom, "total": total}
+            for (numero, nom), total in sorted(totaux["charge"].items())
         ]
-        # ...debug supprimé...
-
-        # Produits (classe 7, type 'produit')
-        produits_query = (
-            self.session.query(
-                CompteComptable.numero.label("compte"),
-                CompteComptable.nom.label("nom"),
-                func.sum(EcritureComptable.credit).label("total")
-            )
-            .join(ClasseComptable, CompteComptable.classe_comptable_id == ClasseComptable.id)
-            .join(EcritureComptable, EcritureComptable.compte_comptable_id == CompteComptable.id)
-            .join(JournalComptable, EcritureComptable.journal_id == JournalComptable.id)
-            .filter(ClasseComptable.enterprise_id == entreprise_id)
-            .filter(ClasseComptable.type == "produit")
-            .filter(JournalComptable.enterprise_id == entreprise_id)
-            .filter(JournalComptable.date_operation >= date_debut)
-            .filter(JournalComptable.date_operation <= date_fin)
-            .group_by(CompteComptable.numero, CompteComptable.nom)
-        )
         produits = [
-            {"compte": row.compte, "nom": row.nom, "total": float(row.total or 0)}
-            for row in produits_query
+            {"compte": numero, "nom": nom, "total": total}
+            for (numero, nom), total in sorted(totaux["produit"].items())
         ]
         # ...debug supprimé...
 
@@ -0,0 +1,295 @@
+"""
+Instantané des soldes comptables (table compta_soldes)
+
+Tient à jour les totaux débit/crédit par compte et par mois et s'en sert pour
+calculer les soldes sans ré-agréger compta_ecritures depuis l'origine :
+les mois clôturés sont lus dans l'instantané, seul le reste de la période
+(mois en cours et mois entamés aux bornes) est agrégé sur les écritures.
+
+L'instantané est alimenté par des triggers SQLite sur compta_ecritures et
+compta_journaux : toutes les insertions (ventes, paiements, achats, inventaires,
+ORM ou SQL brut) le mettent à jour dans la même transaction.
+"""
+
+import datetime
+
+from sqlalchemy import text
+
+
+# Triggers de maintien de compta_soldes (SQLite)
+_UPSERT_ECRITURE = """
+    INSERT INTO compta_soldes (enterprise_id, compte_comptable_id, periode, total_debit, total_credit)
+    SELECT j.enterprise_id, {row}.compte_comptable_id, substr(j.date_operation, 1, 7),
+           COALESCE({row}.debit, 0), COALESCE({row}.credit, 0)
+    FROM compta_journaux j WHERE j.id = {row}.journal_id
+    ON CONFLICT(enterprise_id, compte_comptable_id, periode) DO UPDATE SET
+        total_debit = total_debit + excluded.total_debit,
+        total_credit = total_credit + excluded.total_credit;
+"""
+
+_RETRAIT_ECRITURE = """
+    UPDATE compta_soldes SET
+        total_debit = total_debit - COALESCE(OLD.debit, 0),
+        total_credit = total_credit - COALESCE(OLD.credit, 0)
+    WHERE compte_comptable_id = OLD.compte_comptable_id
+      AND enterprise_id = (SELECT enterprise_id FROM compta_journaux WHERE id = OLD.journal_id)
+      AND periode = (SELECT substr(date_operation, 1, 7) FROM compta_journaux WHERE id = OLD.journal_id);
+"""
+
+_RETRAIT_JOURNAL = """
+    UPDATE compta_soldes SET
+        total_debit = total_debit - (
+            SELECT COALESCE(SUM(e.debit), 0) FROM compta_ecritures e
+            WHERE e.journal_id = OLD.id AND e.compte_comptable_id = compta_soldes.compte_comptable_id),
+        total_credit = total_credit - (
+            SELECT COALESCE(SUM(e.credit), 0) FROM compta_ecritures e
+            WHERE e.journal_id = OLD.id AND e.compte_comptable_id = compta_soldes.compte_comptable_id)
+    WHERE enterprise_id = OLD.enterprise_id
+      AND periode = substr(OLD.date_operation, 1, 7)
+      AND compte_comptable_id IN (SELECT compte_comptable_id FROM compta_ecritures WHERE journal_id = OLD.id);
+"""
+
+_AJOUT_JOURNAL = """
+    INSERT INTO compta_soldes (enterprise_id, compte_comptable_id, periode, total_debit, total_credit)
+    SELECT NEW.enterprise_id, e.compte_comptable_id, substr(NEW.date_operation, 1, 7),
+           COALESCE(SUM(e.debit), 0), COALESCE(SUM(e.credit), 0)
+    FROM compta_ecritures e WHERE e.journal_id = NEW.id
+    GROUP BY e.compte_comptable_id
+    ON CONFLICT(enterprise_id, compte_comptable_id, periode) DO UPDATE SET
+        total_debit = total_debit + excluded.total_debit,
+        total_credit = total_credit + excluded.total_credit;
+"""
+
+SOLDES_TRIGGERS = {
+    "trg_compta_soldes_ecriture_insert": (
+        "AFTER INSERT ON compta_ecritures",
+        _UPSERT_ECRITURE.format(row="NEW"),
+    ),
+    "trg_compta_soldes_ecriture_delete": (
+        "AFTER DELETE ON compta_ecritures",
+        _RETRAIT_ECRITURE,
+    ),
+    "trg_compta_soldes_ecriture_update": (
+        "AFTER UPDATE OF debit, credit, compte_comptable_id, journal_id ON compta_ecritures",
+        _RETRAIT_ECRITURE + _UPSERT_ECRITURE.format(row="NEW"),
+    ),
+    # Supprimer un journal retire ses écritures restantes ; leur suppression ultérieure
+    # ne trouve plus le journal et n'est donc pas décomptée deux fois.
+    "trg_compta_soldes_journal_delete": (
+        "BEFORE DELETE ON compta_journaux",
+        _RETRAIT_JOURNAL,
+    ),
+    "trg_compta_soldes_journal_update": (
+        "AFTER UPDATE OF date_operation, enterprise_id ON compta_journaux "
+        "WHEN substr(OLD.date_operation, 1, 7) IS NOT substr(NEW.date_operation, 1, 7) "
+        "OR OLD.enterprise_id IS NOT NEW.enterprise_id",
+        _RETRAIT_JOURNAL + _AJOUT_JOURNAL,
+    ),
+}
+
+# Bases (URL d'engine) dont les triggers ont été vérifiés
+_snapshot_actif_cache = set()
+
+
+def _en_datetime(d, fin=False):
+    if d is None or isinstance(d, datetime.datetime):
+        return d
+    return datetime.datetime.combine(d, datetime.time.max if fin else datetime.time.min)
+
+
+def _sql_datetime(d):
+    # Même format que le type DateTime de SQLAlchemy sous SQLite (comparaison de chaînes)
+    return d.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _debut_mois(d):
+    return datetime.datetime(d.year, d.month, 1)
+
+
+def _mois_suivant(d):
+    if d.month == 12:
+        return datetime.datetime(d.year + 1, 1, 1)
+    return datetime.datetime(d.year, d.month + 1, 1)
+
+
+class SoldesController:
+    """Lecture et maintenance de l'instantané mensuel des soldes (compta_soldes)"""
+
+    def ensure_snapshot(self, engine):
+        """
+        Crée les triggers de maintien de compta_soldes s'ils manquent.
+        Lors de la première création, l'instantané est reconstruit depuis les écritures
+        existantes dans la même transaction.
+
+        Returns:
+            bool: True si l'instantané est actif sur cette base
+        """
+        if engine.dialect.name != "sqlite":
+            return False
+
+        with engine.begin() as conn:
+            tables = {row[0] for row in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('compta_soldes', 'compta_ecritures', 'compta_journaux')"
+            ))}
+            if len(tables) < 3:
+                return False
+
+            existants = {row[0] for row in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_compta_soldes_%'"
+            ))}
+            manquants = [nom for nom in SOLDES_TRIGGERS if nom not in existants]
+            if manquants:
+                for nom, (evenement, corps) in SOLDES_TRIGGERS.items():
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nom}")
+                    conn.exec_driver_sql(f"CREATE TRIGGER {nom} {evenement}\nBEGIN{corps}END")
+                nb = self._reconstruire(conn)
+                print(f"✅ Instantané des soldes comptables initialisé ({nb} lignes)")
+
+        _snapshot_actif_cache.add(str(engine.url))
+        return True
+
+    def rebuild(self, session, entreprise_id=None):
+        """
+        Reconstruit compta_soldes depuis compta_ecritures (commande de maintenance).
+
+        Args:
+            session: session SQLAlchemy (le commit est laissé à l'appelant)
+            entreprise_id: limiter la reconstruction à une entreprise (None = toutes)
+
+        Returns:
+            int: nombre de lignes (compte, mois) écrites
+        """
+        return self._reconstruire(session, entreprise_id)
+
+    def _reconstruire(self, conn, entreprise_id=None):
+        filtre = "WHERE j.enterprise_id = :entreprise_id" if entreprise_id is not None else ""
+        params = {"entreprise_id": entreprise_id}
+        conn.execute(text(
+            "DELETE FROM compta_soldes"
+            + (" WHERE enterprise_id = :entreprise_id" if entreprise_id is not None else "")
+        ), params)
+        result = conn.execute(text(f"""
+            INSERT INTO compta_soldes (enterprise_id, compte_comptable_id, periode, total_debit, total_credit)
+            SELECT j.enterprise_id, e.compte_comptable_id, substr(j.date_operation, 1, 7),
+                   COALESCE(SUM(e.debit), 0), COALESCE(SUM(e.credit), 0)
+            FROM compta_ecritures e
+            JOIN compta_journaux j ON j.id = e.journal_id
+            {filtre}
+            GROUP BY j.enterprise_id, e.compte_comptable_id, substr(j.date_operation, 1, 7)
+        """), params)
+        return result.rowcount
+
+    def snapshot_actif(self, session):
+        """Indique si les triggers de l'instantané sont en place sur la base de la session"""
+        bind = session.get_bind()
+        cle = str(bind.url)
+        if cle in _snapshot_actif_cache:
+            return True
+        if bind.dialect.name != "sqlite":
+            return False
+        nb = session.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_compta_soldes_%'"
+        )).scalar()
+        if nb == len(SOLDES_TRIGGERS):
+            _snapshot_actif_cache.add(cle)
+            return True
+        return False
+
+    def get_mouvements(self, session, entreprise_id=None, date_debut=None, date_fin=None, compte_ids=None):
+        """
+        Totaux débit/crédit par compte sur une période (bornes inclusives, None = sans borne).
+
+        Les mois entièrement compris dans la période et antérieurs au mois en cours
+        sont lus dans compta_soldes ; le reste est agrégé sur les écritures.
+
+        Returns:
+            dict: {compte_id: (total_debit, total_credit)}
+        """
+        date_debut = _en_datetime(date_debut)
+        date_fin = _en_datetime(date_fin, fin=True)
+        if compte_ids is not None:
+            compte_ids = [int(c) for c in compte_ids]
+            if not compte_ids:
+                return {}
+
+        # Plage de mois clôturés [premier_mois, fin_mois[ servie par l'instantané
+        premier_mois = fin_mois = None
+        if self.snapshot_actif(session):
+            if date_debut is not None:
+                premier_mois = _debut_mois(date_debut)
+                if date_debut > premier_mois:
+                    premier_mois = _mois_suivant(premier_mois)
+            fin_mois = _debut_mois(datetime.datetime.now())
+            if date_fin is not None:
+                mois_fin = _mois_suivant(date_fin)
+                if date_fin + datetime.timedelta(microseconds=1) < mois_fin:
+                    mois_fin = _debut_mois(date_fin)
+                fin_mois = min(fin_mois, mois_fin)
+            if premier_mois is not None and premier_mois >= fin_mois:
+                premier_mois = fin_mois = None
+
+        totaux = {}
+
+        def _ajouter(rows):
+            for compte_id, debit, credit in rows:
+                d, c = totaux.get(compte_id, (0.0, 0.0))
+                totaux[compte_id] = (d + float(debit or 0), c + float(credit or 0))
+
+        filtres_compte = ""
+        params = {}
+        if compte_ids is not None:
+            noms = [f"c{i}" for i in range(len(compte_ids))]
+            filtres_compte = f" AND {{col}} IN ({', '.join(':' + n for n in noms)})"
+            params.update(dict(zip(noms, compte_ids)))
+
+        if fin_mois is not None:
+            conditions = ["periode < :periode_fin"]
+            params["periode_fin"] = fin_mois.strftime("%Y-%m")
+            if premier_mois is not None:
+                conditions.append("periode >= :periode_debut")
+                params["periode_debut"] = premier_mois.strftime("%Y-%m")
+            if entreprise_id is not None:
+                conditions.append("enterprise_id = :entreprise_id")
+            _ajouter(session.execute(text(f"""
+                SELECT compte_comptable_id, SUM(total_debit), SUM(total_credit)
+                FROM compta_soldes
+                WHERE {' AND '.join(conditions)}{filtres_compte.format(col='compte_comptable_id')}
+                GROUP BY compte_comptable_id
+            """), {**params, "entreprise_id": entreprise_id}))
+
+        # Écritures hors des mois servis par l'instantané
+        conditions = []
+        live = {"entreprise_id": entreprise_id}
+        if entreprise_id is not None:
+            conditions.append("j.enterprise_id = :entreprise_id")
+        if date_debut is not None:
+            conditions.append("j.date_operation >= :date_debut")
+            live["date_debut"] = _sql_datetime(date_debut)
+        if date_fin is not None:
+            conditions.append("j.date_operation <= :date_fin")
+            live["date_fin"] = _sql_datetime(date_fin)
+        if fin_mois is not None:
+            if premier_mois is not None:
+                conditions.append("(j.date_operation < :live_avant OR j.date_operation >= :live_apres)")
+                live["live_avant"] = _sql_datetime(premier_mois)
+            else:
+                conditions.append("j.date_operation >= :live_apres")
+            live["live_apres"] = _sql_datetime(fin_mois)
+        where = " AND ".join(conditions) if conditions else "1 = 1"
+        _ajouter(session.execute(text(f"""
+            SELECT e.compte_comptable_id, SUM(e.debit), SUM(e.credit)
+            FROM compta_ecritures e
+            JOIN compta_journaux j ON j.id = e.journal_id
+            WHERE {where}{filtres_compte.format(col='e.compte_comptable_id')}
+            GROUP BY e.compte_comptable_id
+        """), {**params, **live}))
+
+        return totaux
+
+    def get_solde(self, session, compte_id, entreprise_id=None, date_fin=None):
+        """Solde débit - crédit d'un compte jusqu'à date_fin incluse (None = toutes les écritures)"""
+        debit, credit = self.get_mouvements(
+            session, entreprise_id, date_fin=date_fin, compte_ids=[compte_id]
+        ).get(int(compte_id), (0.0, 0.0))
+        return debit - credit
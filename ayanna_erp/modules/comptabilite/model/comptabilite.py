@@ -60,6 +60,9 @@ class ComptaComptes(Base):
 class ComptaJournaux(Base):
     """Modèle représentant un journal comptable"""
     __tablename__ = 'compta_journaux'
+    __table_args__ = (
+        Index('idx_compta_journaux_enterprise_date', 'enterprise_id', 'date_operation'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     date_operation = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -85,6 +88,10 @@ class ComptaJournaux(Base):
 class ComptaEcritures(Base):
     """Modèle représentant une écriture comptable"""
     __tablename__ = 'compta_ecritures'
+    __table_args__ = (
+        Index('idx_compta_ecritures_compte', 'compte_comptable_id'),
+        Index('idx_compta_ecritures_journal', 'journal_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     journal_id = Column(Integer, ForeignKey('compta_journaux.id'), nullable=False)
@@ -103,6 +110,25 @@ class ComptaEcritures(Base):
         return f"<ComptaEcritures(journal_id={self.journal_id}, compte={self.compte_comptable_id}, debit={self.debit}, credit={self.credit})>"
 
 
+class ComptaSoldes(Base):
+    """Totaux mensuels débit/crédit par compte (instantané maintenu par triggers, voir SoldesController)"""
+    __tablename__ = 'compta_soldes'
+    __table_args__ = (
+        UniqueConstraint('enterprise_id', 'compte_comptable_id', 'periode', name='uq_compta_soldes_compte_periode'),
+        Index('idx_compta_soldes_compte_periode', 'compte_comptable_id', 'periode'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    enterprise_id = Column(Integer, ForeignKey('core_enterprises.id'), nullable=False)
+    compte_comptable_id = Column(Integer, ForeignKey('compta_comptes.id'), nullable=False)
+    periode = Column(String(7), nullable=False)  # Mois 'AAAA-MM' de la date d'opération du journal
+    total_debit = Column(Numeric(15, 2), nullable=False, default=0)
+    total_credit = Column(Numeric(15, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ComptaSoldes(compte={self.compte_comptable_id}, periode='{self.periode}', debit={self.total_debit}, credit={self.total_credit})>"
+
+
 class ComptaConfig(Base):
     """Configuration comptable par point de vente"""
     __tablename__ = 'compta_config'
@@ -14,8 +14,12 @@ Affiche tous les comptes ave        # Largeurs par défaut
             # Appliquer Stretch sur la dernière colonne
             header.setSectionResizeMode(col_count-1, QHeaderView.ResizeMode.Stretch)aux débit, crédit, solde. Double-clic = détail écritures.
 """
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTableView, QPushButton, QHBoxLayout, QDialog, QLabel, QFrame, QLineEdit
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTableView, QPushButton, QHBoxLayout, QDialog, QLabel, QFrame, QLineEdit, QDateEdit
 from PyQt6.QtGui import QStandardItemModel
+from PyQt6.QtCore import QDate
+
+# Nombre d'écritures lues par page dans le détail d'un compte
+DETAIL_PAGE_SIZE = 200
 class GrandLivreWidget(QWidget):
     def __init__(self, controller, parent=None):
         super().__init__(parent)
@@ -59,6 +63,21 @@ class GrandLivreWidget(QWidget):
             self.search_input.setPlaceholderText("Rechercher compte, libellé...")
             self.search_input.textChanged.connect(self.load_data)
             filter_layout.addWidget(self.search_input)
+            # Période du grand livre (report à nouveau avant la date de début)
+            filter_layout.addWidget(QLabel("Du"))
+            self.date_debut = QDateEdit()
+            self.date_debut.setCalendarPopup(True)
+            self.date_debut.setDate(QDate(QDate.currentDate().year(), 1, 1))
+            filter_layout.addWidget(self.date_debut)
+            filter_layout.addWidget(QLabel("Au"))
+            self.date_fin = QDateEdit()
+            self.date_fin.setCalendarPopup(True)
+            self.date_fin.setDate(QDate.currentDate())
+            filter_layout.addWidget(self.date_fin)
+            filter_btn = QPushButton("Filtrer")
+            filter_btn.setStyleSheet("background-color:#8E44AD; color:white; padding:6px 12px; border-radius:6px;")
+            filter_btn.clicked.connect(self.load_data)
+            filter_layout.addWidget(filter_btn)
             refresh_btn = QPushButton("🔄 Rafraîchir")
             refresh_btn.setStyleSheet("background-color:#8E44AD; color:white; padding:6px 12px; border-radius:6px;")
             refresh_btn.clicked.connect(self.load_data)
@@ -112,11 +131,13 @@ class GrandLivreWidget(QWidget):
         """Charge les données du grand livre via le controller"""
         if not self.entreprise_id:
             return
-        data = self.controller.get_grand_livre(self.entreprise_id)
+        date_debut, date_fin = self._periode()
+        data = self.controller.get_grand_livre(self.entreprise_id, date_debut, date_fin)
         headers = ["Numéro", "Libellé", "Total Débit", "Total Crédit", "Solde"]
         self.model.clear()
         self.model.setHorizontalHeaderLabels(headers)
         self._id_map = []  # Pour retrouver l'id du compte au double-clic
+        self._rows = []  # Totaux de la période par ligne (pied du détail)
         for row in data:
             items = [
                 self._item(str(row.get("numero", ""))),
@@ -129,6 +150,7 @@ class GrandLivreWidget(QWidget):
                 item.setEditable(False)
             self.model.appendRow(items)
             self._id_map.append(row.get("id"))
+            self._rows.append(row)
         # Largeurs par défaut
         self.table.setColumnWidth(0, 120)
         self.table.setColumnWidth(1, 300)
@@ -136,6 +158,10 @@ class GrandLivreWidget(QWidget):
         self.table.setColumnWidth(3, 120)
         self.table.setColumnWidth(4, 120)
 
+    def _periode(self):
+        """Période sélectionnée (dates de début et de fin incluses)"""
+        return self.date_debut.date().toPyDate(), self.date_fin.date().toPyDate()
+
     def _item(self, value):
         from PyQt6.QtGui import QStandardItem
         return QStandardItem(value)
@@ -169,7 +195,8 @@ class GrandLivreWidget(QWidget):
         if not path:
             return
 
-        data = self.controller.get_grand_livre(self.entreprise_id)
+        date_debut, date_fin = self._periode()
+        data = self.controller.get_grand_livre(self.entreprise_id, date_debut, date_fin)
         doc = SimpleDocTemplate(path, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
         elements = []
         styles = getSampleStyleSheet()
@@ -224,48 +251,53 @@ class GrandLivreWidget(QWidget):
         from PyQt6.QtGui import QStandardItemModel, QStandardItem
         row = index.row()
         compte_id = self._id_map[row]
-        ecritures = self.controller.get_ecritures_compte(compte_id, self.entreprise_id)
+        totaux = self._rows[row]
+        date_debut, date_fin = self._periode()
         dialog = QDialog(self)
         dialog.setWindowTitle("Détail des écritures")
         dialog.resize(900, 600)  # Agrandissement de la fenêtre modale
         layout = QVBoxLayout(dialog)
         table = QTableView()
         model = QStandardItemModel()
-        headers = ["Date", "Libellé", "Débit", "Crédit"]
+        headers = ["Date", "Libellé", "Débit", "Crédit", "Solde"]
         model.setHorizontalHeaderLabels(headers)
-        export_data = []
-        # Import du modèle JournalComptable
-        from ayanna_erp.modules.comptabilite.model.comptabilite import ComptaJournaux as JournalComptable
-        total_debit = 0
-        total_credit = 0
-        for e in ecritures:
-            journal_libelle = ""
-            journal = self.session.query(JournalComptable).filter_by(id=e['journal_id']).first()
-            debit = float(e.get("debit", 0))
-            credit = float(e.get("credit", 0))
-            total_debit += debit
-            total_credit += credit
-            # privilégier le libellé de l'écriture s'il existe, sinon le libellé du journal
-            item_libelle = str(e.get('libelle', '')) if isinstance(e, dict) else ''
-            if not item_libelle:
-                item_libelle = str(journal.libelle if journal else '')
-            items = [
-                QStandardItem(str(e.get("date", ""))),
-                QStandardItem(item_libelle),
-                QStandardItem(self._format_currency(debit)),
-                QStandardItem(self._format_currency(credit)),
-            ]
-            for item in items:
-                item.setEditable(False)
-            model.appendRow(items)
-            export_data.append({
-                "date": str(e.get("date", "")),
-                "libelle": journal_libelle or str(e.get("libelle", "")),
-                "debit": self._format_currency(debit),
-                "credit": self._format_currency(credit),
-            })
+        # Curseur de la page suivante (None quand tout est chargé)
+        etat = {"curseur": None, "fin": False}
+
+        def charger_page():
+            """Ajoute la page suivante d'écritures au tableau"""
+            if etat["fin"]:
+                return
+            page = self.controller.get_ecritures_compte_page(
+                compte_id, self.entreprise_id, date_debut, date_fin,
+                curseur=etat["curseur"], page_size=DETAIL_PAGE_SIZE
+            )
+            for e in page["ecritures"]:
+                # privilégier le libellé de l'écriture s'il existe, sinon le libellé du journal
+                item_libelle = str(e.get('libelle', '')) or str(e.get('journal', ''))
+                items = [
+                    QStandardItem(str(e.get("date", ""))),
+                    QStandardItem(item_libelle),
+                    QStandardItem(self._format_currency(float(e.get("debit", 0)))),
+                    QStandardItem(self._format_currency(float(e.get("credit", 0)))),
+                    QStandardItem(self._format_currency(e.get("solde", 0))),
+                ]
+                for item in items:
+                    item.setEditable(False)
+                model.appendRow(items)
+            etat["curseur"] = page["curseur_suivant"]
+            etat["fin"] = etat["curseur"] is None
+
+        def au_defilement(valeur):
+            # Charger la page suivante à l'approche du bas du tableau
+            barre = table.verticalScrollBar()
+            if not etat["fin"] and valeur >= barre.maximum() - 5:
+                charger_page()
+
+        charger_page()
         table.setModel(model)
         table.resizeColumnsToContents()
+        table.verticalScrollBar().valueChanged.connect(au_defilement)
         # Style détail
         table.setSelectionBehavior(table.SelectionBehavior.SelectRows)
         table.setEditTriggers(table.EditTrigger.NoEditTriggers)
@@ -290,8 +322,13 @@ class GrandLivreWidget(QWidget):
 
         # Ajout des totaux en bas
         from PyQt6.QtWidgets import QLabel
-        solde = total_debit - total_credit
+        # Totaux de la période calculés côté base (toutes les pages)
+        total_debit = float(totaux.get("total_debit", 0))
+        total_credit = float(totaux.get("total_credit", 0))
+        solde = float(totaux.get("solde", total_debit - total_credit))
         total_layout = QHBoxLayout()
+        if totaux.get("solde_ouverture"):
+            total_layout.addWidget(QLabel(f"Report : <b>{self._format_currency(totaux['solde_ouverture'])}</b>"))
         total_debit_label = QLabel(f"Total Débit : <b>{self._format_currency(total_debit)}</b>")
         total_credit_label = QLabel(f"Total Crédit : <b>{self._format_currency(total_credit)}</b>")
         solde_label = QLabel(f"Solde : <b>{self._format_currency(solde)}</b>")
@@ -312,6 +349,13 @@ class GrandLivreWidget(QWidget):
             path, _ = QFileDialog.getSaveFileName(dialog, "Exporter le détail du compte en PDF", "detail_compte.pdf", "PDF Files (*.pdf)")
             if path:
                 try:
+                    # Toutes les écritures de la période, lues page par page
+                    export_data = [{
+                        "date": str(e.get("date", "")),
+                        "libelle": str(e.get("libelle", "")),
+                        "debit": self._format_currency(float(e.get("debit", 0))),
+                        "credit": self._format_currency(float(e.get("credit", 0))),
+                    } for e in self.controller.iter_ecritures_compte(compte_id, self.entreprise_id, date_debut, date_fin)]
                     # On passe l'entreprise_id pour un export PDF uniforme
                     self.controller.export_detail_compte_pdf(export_data, path, self.entreprise_id)
                     QMessageBox.information(dialog, "Export PDF", "Export PDF réussi !")
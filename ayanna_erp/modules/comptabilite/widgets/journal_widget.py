@@ -24,6 +24,7 @@ from PyQt6.QtCore import Qt, QDate
 import datetime
 
 from ayanna_erp.modules.comptabilite.controller.comptabilite_controller import ComptabiliteController
+from ayanna_erp.core.utils.query_executor import QueryExecutor, BusyIndicator
 class JournalWidget(QWidget):
 
     def __init__(self, controller, parent=None):
@@ -174,18 +175,31 @@ class JournalWidget(QWidget):
 
         self.journaux = []
         self.ecritures_rows = {}  # journal_id: row index of ecritures
+        # Chargement en arrière-plan : un changement de filtre abandonne la requête en cours
+        self.executor = QueryExecutor(self)
+        self.busy_indicator = BusyIndicator(self)
+        self.busy_indicator.track(self.executor)
+        self.layout.insertWidget(1, self.busy_indicator)
         # remplir les données
         self.load_data()
 
     def load_data(self):
-        """Charge les journaux comptables filtrés"""
+        """Charge les journaux comptables filtrés (requête exécutée en arrière-plan)"""
         if not self.controller or not self.entreprise_id:
             return
         debut = self.debut_date.date().toPyDate()
         fin = self.fin_date.date().toPyDate()
         search = self.search_input.text().strip().lower()
-        # Récupérer tous les journaux disponibles
-        journaux_all = self.controller.get_journaux_comptables(self.entreprise_id)
+        # Récupérer tous les journaux disponibles, sur une session propre au thread
+        self.executor.submit(
+            'journaux',
+            lambda session: self.controller.get_journaux_comptables(self.entreprise_id, session=session),
+            with_session=True,
+            on_result=lambda journaux_all: self.on_journaux_loaded(journaux_all, debut, fin, search)
+        )
+
+    def on_journaux_loaded(self, journaux_all, debut, fin, search):
+        """Applique les filtres aux journaux reçus et rafraîchit le tableau"""
         # Filtrer par date
         journaux = [j for j in journaux_all if debut <= j.date_operation.date() <= fin]
         # Filtrer par recherche texte
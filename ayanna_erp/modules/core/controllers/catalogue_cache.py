@@ -0,0 +1,199 @@
+"""
+Cache mémoire du catalogue produits (core_products) partagé par les écrans POS
+(Boutique, Restaurant).
+
+Chaque entreprise dispose d'un instantané compact des produits, chargé en une seule
+requête et rechargé lorsque son tampon de version change. Les écritures passant par
+CoreProductController incrémentent ce tampon via `bump_catalogue_version` ; les
+modifications faites hors de ce contrôleur (autre processus, autre module) sont
+reprises au plus tard après `CatalogueCache.MAX_AGE` secondes.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from ayanna_erp.database.database_manager import DatabaseManager
+
+
+CatalogueProduct = namedtuple('CatalogueProduct', [
+    'id', 'entreprise_id', 'code', 'name', 'price_unit', 'cost', 'unit',
+    'category_id', 'category_name', 'barcode', 'image',
+    'compte_produit_id', 'compte_charge_id', 'is_active',
+])
+
+# Tampons de version par entreprise (None = toutes les entreprises)
+_versions: Dict[Optional[int], int] = {}
+_versions_lock = threading.Lock()
+
+_caches: Dict[int, 'CatalogueCache'] = {}
+_caches_lock = threading.Lock()
+
+
+def bump_catalogue_version(entreprise_id: Optional[int] = None) -> None:
+    """Invalide le catalogue d'une entreprise (ou de toutes si entreprise_id est None)"""
+    with _versions_lock:
+        _versions[entreprise_id] = _versions.get(entreprise_id, 0) + 1
+
+
+def _version_courante(entreprise_id: int):
+    with _versions_lock:
+        return (_versions.get(entreprise_id, 0), _versions.get(None, 0))
+
+
+def get_catalogue_cache(entreprise_id: int) -> 'CatalogueCache':
+    """Retourne le cache partagé du catalogue pour une entreprise"""
+    entreprise_id = int(entreprise_id or 1)
+    with _caches_lock:
+        cache = _caches.get(entreprise_id)
+        if cache is None:
+            cache = CatalogueCache(entreprise_id)
+            _caches[entreprise_id] = cache
+        return cache
+
+
+class CatalogueCache:
+    """
+    Instantané en mémoire des produits d'une entreprise.
+    Recherches par id, code-barres, catégorie et préfixe de nom sans accès à la base.
+    """
+
+    MAX_AGE = 300  # secondes
+
+    def __init__(self, entreprise_id: int):
+        self.entreprise_id = entreprise_id
+        self._lock = threading.Lock()
+        self._version = None
+        self._charge_le = 0.0
+        self._par_id: Dict[int, CatalogueProduct] = {}
+        self._par_code_barre: Dict[str, CatalogueProduct] = {}
+        self._tries: List[CatalogueProduct] = []
+        self._noms: List[tuple] = []  # (nom en minuscules, id) triés, pour la recherche par préfixe
+        self._par_categorie: Dict[Optional[int], List[CatalogueProduct]] = {}
+        self._textes: Dict[int, str] = {}
+        self._categories: Dict[int, str] = {}
+
+    def _charger(self):
+        """Recharge l'instantané si le tampon de version a changé ou s'il est trop ancien"""
+        version = _version_courante(self.entreprise_id)
+        if self._version == version and time.monotonic() - self._charge_le < self.MAX_AGE:
+            return
+        with self._lock:
+            version = _version_courante(self.entreprise_id)
+            if self._version == version and time.monotonic() - self._charge_le < self.MAX_AGE:
+                return
+
+            db_manager = DatabaseManager()
+            with db_manager.session_scope() as session:
+                categories = session.execute(text("""
+                    SELECT id, name FROM core_product_categories
+                    WHERE entreprise_id = :eid
+                """), {"eid": self.entreprise_id}).fetchall()
+                rows = session.execute(text("""
+                    SELECT p.id, p.entreprise_id, p.code, p.name, p.price_unit, p.cost, p.unit,
+                           p.category_id, c.name, p.barcode, p.image,
+                           p.compte_produit_id, p.compte_charge_id, p.is_active, p.description
+                    FROM core_products p
+                    LEFT JOIN core_product_categories c ON c.id = p.category_id
+                    WHERE p.entreprise_id = :eid
+                """), {"eid": self.entreprise_id}).fetchall()
+
+            par_id = {}
+            textes = {}
+            for row in rows:
+                produit = CatalogueProduct(
+                    id=row[0], entreprise_id=row[1], code=row[2], name=row[3] or '',
+                    price_unit=row[4], cost=row[5], unit=row[6],
+                    category_id=row[7], category_name=row[8], barcode=row[9], image=row[10],
+                    compte_produit_id=row[11], compte_charge_id=row[12],
+                    is_active=bool(row[13]) if row[13] is not None else True,
+                )
+                par_id[produit.id] = produit
+                textes[produit.id] = f"{produit.name}\n{row[14] or ''}".lower()
+
+            tries = sorted(par_id.values(), key=lambda p: (p.name, p.id))
+            par_categorie = {}
+            par_code_barre = {}
+            for produit in tries:
+                par_categorie.setdefault(produit.category_id, []).append(produit)
+                code_barre = (produit.barcode or '').strip()
+                if code_barre and (code_barre not in par_code_barre or not par_code_barre[code_barre].is_active):
+                    par_code_barre[code_barre] = produit
+
+            self._par_id = par_id
+            self._par_code_barre = par_code_barre
+            self._tries = tries
+            self._noms = sorted((p.name.lower(), p.id) for p in tries)
+            self._par_categorie = par_categorie
+            self._textes = textes
+            self._categories = {row[0]: row[1] for row in categories}
+            self._version = version
+            self._charge_le = time.monotonic()
+            print(f"📦 Catalogue entreprise {self.entreprise_id} chargé: {len(tries)} produits")
+
+    def invalidate(self):
+        """Force le rechargement au prochain accès"""
+        self._version = None
+
+    def get(self, product_id: int) -> Optional[CatalogueProduct]:
+        """Produit par id (actif ou non)"""
+        self._charger()
+        try:
+            return self._par_id.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_barcode(self, barcode: str, active_only: bool = True) -> Optional[CatalogueProduct]:
+        """Produit par code-barres exact"""
+        self._charger()
+        produit = self._par_code_barre.get((barcode or '').strip())
+        if produit is None or (active_only and not produit.is_active):
+            return None
+        return produit
+
+    def category_name(self, category_id: Optional[int]) -> Optional[str]:
+        self._charger()
+        return self._categories.get(category_id)
+
+    def by_category(self, category_id: Optional[int], active_only: Optional[bool] = True) -> List[CatalogueProduct]:
+        """Produits d'une catégorie, triés par nom"""
+        self._charger()
+        produits = self._par_categorie.get(category_id, [])
+        return [p for p in produits if active_only is None or p.is_active == active_only]
+
+    def by_prefix(self, prefix: str, active_only: Optional[bool] = True) -> List[CatalogueProduct]:
+        """Produits dont le nom commence par `prefix` (insensible à la casse), triés par nom"""
+        self._charger()
+        prefix = (prefix or '').lower()
+        debut = bisect_left(self._noms, (prefix, 0))
+        resultats = []
+        for i in range(debut, len(self._noms)):
+            nom, product_id = self._noms[i]
+            if not nom.startswith(prefix):
+                break
+            produit = self._par_id[product_id]
+            if active_only is None or produit.is_active == active_only:
+                resultats.append(produit)
+        return resultats
+
+    def search(self, search_term: Optional[str] = None, category_id: Optional[int] = None,
+               active_only: Optional[bool] = True) -> List[CatalogueProduct]:
+        """
+        Équivalent en mémoire de CoreProductController.get_products :
+        filtre catégorie, texte contenu dans le nom ou la description, statut actif.
+        """
+        self._charger()
+        produits = self._par_categorie.get(category_id, []) if category_id else self._tries
+        terme = (search_term or '').strip().lower()
+        resultats = []
+        for produit in produits:
+            if active_only is not None and produit.is_active != active_only:
+                continue
+            if terme and terme not in self._textes.get(produit.id, ''):
+                continue
+            resultats.append(produit)
+        return resultats
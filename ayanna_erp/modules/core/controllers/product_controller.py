@@ -1,6 +1,7 @@
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.modules.core.models import CoreProduct, CoreProductCategory
 from ayanna_erp.core.entreprise_controller import EntrepriseController
+from ayanna_erp.modules.core.controllers.catalogue_cache import bump_catalogue_version
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -49,6 +50,21 @@ class CoreProductController:
     def get_product_by_id(self, session: Session, product_id: int) -> Optional[CoreProduct]:
         return session.query(CoreProduct).filter(CoreProduct.id == product_id, CoreProduct.entreprise_id == self.entreprise_id).first()
 
+    def lookup_by_barcode(self, session: Session, barcode: str, active_only: bool = True) -> Optional[CoreProduct]:
+        """Recherche d'un produit par code-barres (index idx_core_products_entreprise_barcode)"""
+        barcode = (barcode or '').strip()
+        if not barcode:
+            return None
+        # La condition barcode <> '' reprend celle de l'index partiel pour que SQLite l'utilise
+        query = session.query(CoreProduct).filter(
+            CoreProduct.entreprise_id == self.entreprise_id,
+            CoreProduct.barcode == barcode,
+            CoreProduct.barcode != ''
+        )
+        if active_only:
+            query = query.filter(CoreProduct.is_active == True)
+        return query.first()
+
     def create_product(self, session: Session, nom: str, prix, category_id: int, description: Optional[str] = None, unit: str = "pièce", stock_initial: float = 0.0, cost: float = 0.0, barcode: Optional[str] = None, image: Optional[str] = None, stock_min: float = 0.0, compte_produit_id: Optional[int] = None, compte_charge_id: Optional[int] = None, is_active: bool = True) -> CoreProduct:
         """
         Créer un produit et initialiser son stock sur l'entrepôt correspondant au POS
@@ -70,6 +86,7 @@ class CoreProductController:
         )
         session.add(product)
         session.commit()
+        bump_catalogue_version(self.entreprise_id)
         
         # Initialiser le stock à 0 avec le seuil minimum
         self._initialize_product_stock(session, product, 0.0, stock_min)
@@ -125,6 +142,7 @@ class CoreProductController:
             if hasattr(product, key):
                 setattr(product, key, value)
         session.commit()
+        bump_catalogue_version(self.entreprise_id)
         return product
 
     def delete_product(self, session: Session, product_id: int) -> bool:
@@ -133,6 +151,7 @@ class CoreProductController:
             return False
         session.delete(product)
         session.commit()
+        bump_catalogue_version(self.entreprise_id)
         return True
 
     def get_categories(self, session: Session) -> List[CoreProductCategory]:
@@ -0,0 +1,184 @@
+"""
+Recherche plein texte du catalogue produits (SQLite FTS5)
+
+La table virtuelle `core_products_fts` indexe le nom, le code, la description et le
+code-barres des produits. Elle utilise core_products comme contenu externe et est
+tenue à jour par des triggers : toute écriture (ORM ou SQL brut) la met à jour
+dans la même transaction.
+
+Les recherches renvoient des produits du cache catalogue classés par pertinence,
+chaque mot saisi étant traité comme un préfixe ("coca" trouve "Coca-Cola 33cl").
+Sans FTS5 (autre moteur, SQLite compilé sans), la recherche par sous-chaîne du
+cache prend le relais.
+"""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.modules.core.controllers.catalogue_cache import get_catalogue_cache, CatalogueProduct
+
+
+_COLONNES = "name, code, description, barcode"
+
+PRODUCT_FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_products_fts USING fts5("
+    f"{_COLONNES}, content='core_products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+_AJOUT = f"""
+    INSERT INTO core_products_fts (rowid, {_COLONNES})
+    VALUES (NEW.id, NEW.name, NEW.code, NEW.description, NEW.barcode);
+"""
+
+_RETRAIT = f"""
+    INSERT INTO core_products_fts (core_products_fts, rowid, {_COLONNES})
+    VALUES ('delete', OLD.id, OLD.name, OLD.code, OLD.description, OLD.barcode);
+"""
+
+PRODUCT_FTS_TRIGGERS = {
+    "trg_core_products_fts_insert": ("AFTER INSERT ON core_products", _AJOUT),
+    "trg_core_products_fts_delete": ("AFTER DELETE ON core_products", _RETRAIT),
+    "trg_core_products_fts_update": (
+        "AFTER UPDATE OF name, code, description, barcode ON core_products",
+        _RETRAIT + _AJOUT,
+    ),
+}
+
+# Poids bm25 des colonnes (nom, code, description, code-barres)
+_CLASSEMENT = "bm25(core_products_fts, 10.0, 5.0, 1.0, 5.0)"
+
+# Bases (URL d'engine) dont l'index plein texte a été vérifié : True = actif
+_fts_actif_cache = {}
+
+
+def _requete_fts(search_term: str) -> str:
+    """Transforme la saisie en requête FTS5 : chaque mot devient un préfixe, tous requis"""
+    mots = re.findall(r"\w+", (search_term or "").lower())
+    return " ".join(f'"{mot}"*' for mot in mots)
+
+
+class ProductSearchController:
+    """Recherche classée dans le catalogue produits d'une entreprise"""
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+
+    def ensure_index(self, engine):
+        """
+        Crée la table FTS5 et ses triggers s'ils manquent, puis indexe les produits existants.
+
+        Returns:
+            bool: True si la recherche plein texte est active sur cette base
+        """
+        if engine.dialect.name != "sqlite":
+            return False
+
+        try:
+            with engine.begin() as conn:
+                table = conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'core_products'"
+                )).fetchone()
+                if not table:
+                    return False
+
+                existants = {row[0] for row in conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE name = 'core_products_fts' "
+                    "OR (type = 'trigger' AND name LIKE 'trg_core_products_fts_%')"
+                ))}
+                manquants = [nom for nom in PRODUCT_FTS_TRIGGERS if nom not in existants]
+                if manquants or 'core_products_fts' not in existants:
+                    conn.exec_driver_sql(PRODUCT_FTS_TABLE)
+                    for nom, (evenement, corps) in PRODUCT_FTS_TRIGGERS.items():
+                        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nom}")
+                        conn.exec_driver_sql(f"CREATE TRIGGER {nom} {evenement}\nBEGIN{corps}END")
+                    self._reconstruire(conn)
+                    print("✅ Index plein texte des produits initialisé")
+        except Exception as e:
+            print(f"⚠️ Recherche plein texte indisponible (FTS5) : {e}")
+            _fts_actif_cache[str(engine.url)] = False
+            return False
+
+        _fts_actif_cache[str(engine.url)] = True
+        return True
+
+    def rebuild(self, session):
+        """Réindexe tous les produits (commande de maintenance, commit laissé à l'appelant)"""
+        self._reconstruire(session)
+
+    def _reconstruire(self, conn):
+        conn.execute(text("INSERT INTO core_products_fts (core_products_fts) VALUES ('rebuild')"))
+
+    def fts_actif(self, session):
+        """Indique si la table FTS5 et ses triggers sont en place sur la base de la session"""
+        bind = session.get_bind()
+        cle = str(bind.url)
+        if cle in _fts_actif_cache:
+            return _fts_actif_cache[cle]
+        if bind.dialect.name != "sqlite":
+            _fts_actif_cache[cle] = False
+            return False
+        nb = session.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'core_products_fts' "
+            "OR (type = 'trigger' AND name LIKE 'trg_core_products_fts_%')"
+        )).scalar()
+        _fts_actif_cache[cle] = nb == len(PRODUCT_FTS_TRIGGERS) + 1
+        return _fts_actif_cache[cle]
+
+    def search_ids(self, session, entreprise_id: int, search_term: str, limit: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Ids des produits correspondant à la saisie, du plus pertinent au moins pertinent.
+
+        Returns:
+            list ou None si la recherche plein texte n'est pas disponible
+        """
+        if not self.fts_actif(session):
+            return None
+        requete = _requete_fts(search_term)
+        if not requete:
+            return None
+        sql = f"""
+            SELECT p.id FROM core_products_fts f
+            JOIN core_products p ON p.id = f.rowid
+            WHERE core_products_fts MATCH :requete AND p.entreprise_id = :entreprise_id
+            ORDER BY {_CLASSEMENT}, p.name
+        """
+        params = {"requete": requete, "entreprise_id": entreprise_id}
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = int(limit)
+        return [row[0] for row in session.execute(text(sql), params)]
+
+    def search(self, entreprise_id: int, search_term: Optional[str] = None, category_id: Optional[int] = None,
+               active_only: Optional[bool] = True) -> List[CatalogueProduct]:
+        """
+        Produits du cache catalogue correspondant à la saisie, classés par pertinence.
+        Sans saisie, renvoie le catalogue (filtré par catégorie) trié par nom.
+        """
+        cache = get_catalogue_cache(entreprise_id)
+        if not (search_term or '').strip():
+            return cache.search(category_id=category_id, active_only=active_only)
+
+        try:
+            with self.db_manager.session_scope() as session:
+                ids = self.search_ids(session, entreprise_id, search_term)
+        except Exception as e:
+            print(f"⚠️ Recherche plein texte en échec, recherche simple utilisée : {e}")
+            ids = None
+        if ids is None:
+            return cache.search(search_term=search_term, category_id=category_id, active_only=active_only)
+
+        resultats = []
+        for product_id in ids:
+            produit = cache.get(product_id)
+            if produit is None:
+                continue
+            if category_id and produit.category_id != category_id:
+                continue
+            if active_only is not None and produit.is_active != active_only:
+                continue
+            resultats.append(produit)
+        return resultats
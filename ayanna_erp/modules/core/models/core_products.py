@@ -4,7 +4,7 @@ Modèle des produits centralisés de l'entreprise
 Remplace shop_products avec une logique centralisée par entreprise
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ayanna_erp.database.base import Base
@@ -13,6 +13,11 @@ from ayanna_erp.database.base import Base
 class CoreProduct(Base):
     """Table centralisée des produits pour toute l'entreprise"""
     __tablename__ = "core_products"
+    __table_args__ = (
+        # Code-barres unique par entreprise (les produits sans code-barres ne sont pas indexés)
+        Index('idx_core_products_entreprise_barcode', 'entreprise_id', 'barcode', unique=True,
+              sqlite_where=text("barcode IS NOT NULL AND barcode <> ''")),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     entreprise_id = Column(Integer, ForeignKey('core_enterprises.id'), nullable=False)  # Changé de pos_id vers entreprise_id
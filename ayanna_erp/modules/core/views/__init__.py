@@ -0,0 +1 @@
+# Vues centralisées partagées par les modules (écrans POS)
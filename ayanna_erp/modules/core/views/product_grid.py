@@ -0,0 +1,287 @@
+"""
+Grille de produits virtualisée (modèle/vue) partagée par les écrans POS
+
+Un QListView en mode icônes affiche les produits d'un ProductListModel ; le délégué
+ProductTileDelegate dessine chaque tuile (image, nom, prix, pastille panier, bande
+de catégorie) au moment de l'affichage. Seules les tuiles visibles sont peintes et
+aucun widget n'est créé par produit : la mémoire et le temps de chargement ne
+dépendent plus de la taille du catalogue. Les images passent par le cache de
+miniatures d'ImageUtils (décodage en arrière-plan, placeholder en attendant).
+"""
+
+import os
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen
+from PyQt6.QtWidgets import QAbstractItemView, QListView, QStyle, QStyledItemDelegate
+
+from ayanna_erp.core.utils.image_utils import ImageUtils
+
+
+PRODUCT_ROLE = Qt.ItemDataRole.UserRole + 1
+BADGE_ROLE = Qt.ItemDataRole.UserRole + 2
+
+# Racine des chemins d'images relatifs (même logique que produit_index.py)
+_IMAGES_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+
+def resolve_image_path(image):
+    """Chemin complet d'une image produit (absolu ou relatif à la racine du projet), None si non renseignée"""
+    if not image or not str(image).strip():
+        return None
+    image_filename = str(image).strip()
+    if os.path.isabs(image_filename):
+        full_path = image_filename
+    else:
+        full_path = os.path.join(_IMAGES_ROOT, image_filename.replace("/", os.sep))
+    return full_path
+
+
+class ProductListModel(QAbstractListModel):
+    """Liste des produits affichés : catalogue chargé + ordre/filtre de la recherche + pastilles"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._products = {}
+        self._all_ids = []
+        self._ids = []
+        self._rows = {}
+        self._badges = {}
+        self.tooltip_fn = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._ids):
+            return None
+        product = self._products[self._ids[index.row()]]
+        if role == PRODUCT_ROLE:
+            return product
+        if role == Qt.ItemDataRole.DisplayRole:
+            return getattr(product, 'name', '')
+        if role == BADGE_ROLE:
+            return self._badges.get(product.id, 0)
+        if role == Qt.ItemDataRole.ToolTipRole and self.tooltip_fn:
+            try:
+                return self.tooltip_fn(product)
+            except Exception:
+                return None
+        return None
+
+    def set_products(self, products):
+        """Remplace le catalogue affiché (ordre conservé)"""
+        self.beginResetModel()
+        self._products = {p.id: p for p in products}
+        self._all_ids = list(self._products)
+        self._set_ids(self._all_ids)
+        self.endResetModel()
+
+    def show_ids(self, product_ids):
+        """N'affiche que les produits donnés, dans cet ordre (résultats de recherche)"""
+        self.beginResetModel()
+        self._set_ids([pid for pid in product_ids if pid in self._products])
+        self.endResetModel()
+
+    def show_all(self):
+        self.show_ids(self._all_ids)
+
+    def _set_ids(self, ids):
+        self._ids = list(ids)
+        self._rows = {pid: row for row, pid in enumerate(self._ids)}
+
+    def set_badges(self, badges):
+        """Met à jour les pastilles {product_id: quantité} ; seules les tuiles modifiées sont repeintes"""
+        changed = {pid for pid in set(self._badges) | set(badges) if self._badges.get(pid, 0) != badges.get(pid, 0)}
+        self._badges = dict(badges)
+        for pid in changed:
+            row = self._rows.get(pid)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [BADGE_ROLE])
+
+    def product_ids(self):
+        return list(self._ids)
+
+    def product(self, product_id):
+        return self._products.get(product_id)
+
+
+class ProductTileDelegate(QStyledItemDelegate):
+    """Dessine une tuile produit ; la présentation est réglée par les paramètres du constructeur"""
+
+    def __init__(self, parent=None, tile_size=QSize(220, 280), image_size=QSize(180, 140),
+                 name_max_chars=30, name_font_size=11, name_bold=True,
+                 price_text_fn=None, show_code=False, button_text=None,
+                 band_color_fn=None, placeholder="📦\nProduit", border_color='#E0E0E0'):
+        super().__init__(parent)
+        self.tile_size = tile_size
+        self.image_size = image_size
+        self.name_max_chars = name_max_chars
+        self.name_font_size = name_font_size
+        self.name_bold = name_bold
+        self.price_text_fn = price_text_fn
+        self.show_code = show_code
+        self.button_text = button_text
+        self.band_color_fn = band_color_fn
+        self.placeholder = placeholder
+        self.border_color = border_color
+
+    def sizeHint(self, option, index):
+        return self.tile_size
+
+    def _pixmap(self, image):
+        """Miniature de l'image produit si elle est prête ; sinon construite en arrière-plan"""
+        full_path = resolve_image_path(image)
+        if not full_path:
+            return None
+        return ImageUtils.thumbnail_cache().get(full_path, (self.image_size.width(), self.image_size.height()))
+
+    def paint(self, painter, option, index):
+        product = index.data(PRODUCT_ROLE)
+        if product is None:
+            return
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        hover = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        painter.setPen(QPen(QColor('#2196F3' if hover else self.border_color)))
+        painter.setBrush(QColor('#F3F9FF' if hover else 'white'))
+        painter.drawRoundedRect(QRectF(rect), 8, 8)
+
+        padding = 6
+        y = rect.top() + padding
+
+        # ---- Pastille quantité panier ----
+        badge = index.data(BADGE_ROLE) or 0
+        if self.band_color_fn is not None:
+            # Ligne réservée à la pastille (style restaurant)
+            badge_rect = QRect(rect.right() - padding - 24, y, 24, 18)
+            y += 18 + 4
+        else:
+            badge_rect = QRect(rect.right() - padding - 24, rect.top() + padding, 24, 18)
+        if badge:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor('#1976D2'))
+            painter.drawRoundedRect(QRectF(badge_rect), 9, 9)
+            font = QFont(option.font)
+            font.setPointSize(8)
+            font.setBold(True)
+            painter.setFont(font)
+            painter.setPen(QColor('white'))
+            painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, str(int(badge)))
+
+        # ---- Image ----
+        image_rect = QRect(rect.left() + (rect.width() - self.image_size.width()) // 2, y,
+                           self.image_size.width(), self.image_size.height())
+        pixmap = self._pixmap(getattr(product, 'image', None))
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor('#F8F9FA'))
+        painter.drawRoundedRect(QRectF(image_rect), 6, 6)
+        if pixmap is not None:
+            x = image_rect.left() + (image_rect.width() - pixmap.width()) // 2
+            py = image_rect.top() + (image_rect.height() - pixmap.height()) // 2
+            painter.drawPixmap(x, py, pixmap)
+        else:
+            painter.setPen(QPen(QColor('#DEE2E6'), 2, Qt.PenStyle.DashLine))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(QRectF(image_rect.adjusted(1, 1, -1, -1)), 6, 6)
+            painter.setPen(QColor('#6C757D'))
+            painter.drawText(image_rect, Qt.AlignmentFlag.AlignCenter, self.placeholder)
+        y = image_rect.bottom() + 6
+
+        # ---- Bas de tuile : bande de catégorie et bouton ----
+        bottom = rect.bottom() - padding
+        if self.band_color_fn is not None:
+            band_rect = QRect(rect.left() + 1, rect.bottom() - 8, rect.width() - 2, 8)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(self.band_color_fn(product)))
+            painter.drawRoundedRect(QRectF(band_rect), 4, 4)
+            bottom = band_rect.top() - 2
+        if self.button_text:
+            button_rect = QRect(rect.left() + padding, bottom - 30, rect.width() - 2 * padding, 30)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor('#1976D2' if hover else '#2196F3'))
+            painter.drawRoundedRect(QRectF(button_rect), 4, 4)
+            font = QFont(option.font)
+            font.setPointSize(9)
+            font.setBold(True)
+            painter.setFont(font)
+            painter.setPen(QColor('white'))
+            painter.drawText(button_rect, Qt.AlignmentFlag.AlignCenter, self.button_text)
+            bottom = button_rect.top() - 4
+
+        # ---- Code produit ----
+        code = getattr(product, 'code', None) if self.show_code else None
+        if code:
+            font = QFont(option.font)
+            font.setPointSize(7)
+            painter.setFont(font)
+            painter.setPen(QColor('#6C757D'))
+            code_rect = QRect(rect.left() + padding, bottom - 14, rect.width() - 2 * padding, 14)
+            painter.drawText(code_rect, Qt.AlignmentFlag.AlignCenter, f"Code: {code}")
+            bottom = code_rect.top() - 2
+
+        # ---- Prix ----
+        if self.price_text_fn is not None:
+            font = QFont(option.font)
+            font.setPointSize(10)
+            font.setBold(True)
+            painter.setFont(font)
+            painter.setPen(QColor('#28A745'))
+            price_rect = QRect(rect.left() + padding, bottom - 18, rect.width() - 2 * padding, 18)
+            painter.drawText(price_rect, Qt.AlignmentFlag.AlignCenter, self.price_text_fn(product))
+            bottom = price_rect.top() - 2
+
+        # ---- Nom ----
+        name = str(getattr(product, 'name', '') or 'Produit')
+        if len(name) > self.name_max_chars:
+            name = name[:self.name_max_chars] + "..."
+        font = QFont(option.font)
+        font.setPointSize(self.name_font_size)
+        font.setBold(self.name_bold)
+        painter.setFont(font)
+        painter.setPen(QColor('#212529'))
+        name_rect = QRect(rect.left() + padding, y, rect.width() - 2 * padding, max(bottom - y, 14))
+        painter.drawText(name_rect, Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap, name)
+
+        painter.restore()
+
+
+class ProductGridView(QListView):
+    """Grille de tuiles produits : seules les tuiles visibles sont dessinées"""
+
+    product_clicked = pyqtSignal(object)
+
+    def __init__(self, parent=None, spacing=10, **tile_options):
+        super().__init__(parent)
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setWrapping(True)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(200)
+        self.setSpacing(spacing)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setMouseTracking(True)
+        self.setStyleSheet("QListView { background-color: transparent; border: none; }")
+
+        self.product_model = ProductListModel(self)
+        self.setModel(self.product_model)
+        self.tile_delegate = ProductTileDelegate(self, **tile_options)
+        self.setItemDelegate(self.tile_delegate)
+        self.clicked.connect(self._on_clicked)
+        # Repeindre quand une miniature demandée par le délégué est prête
+        ImageUtils.thumbnail_cache().thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    def _on_thumbnail_ready(self, _path):
+        self.viewport().update()
+
+    def _on_clicked(self, index):
+        product = index.data(PRODUCT_ROLE)
+        if product is not None:
+            self.product_clicked.emit(product)
@@ -1,9 +1,13 @@
 from typing import List, Optional
 from ayanna_erp.database.database_manager import get_database_manager
 from ayanna_erp.modules.core.controllers.product_controller import CoreProductController
+from ayanna_erp.modules.core.controllers.catalogue_cache import get_catalogue_cache
+from ayanna_erp.modules.core.controllers.product_search import ProductSearchController
 from ayanna_erp.modules.restaurant.controllers.vente_controller import VenteController
 from ayanna_erp.modules.restaurant.models.restaurant import RestauProduitPanier, RestauPanier
 from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import text
 
 
 class CatalogueController:
@@ -14,23 +18,18 @@ class CatalogueController:
         self.pos_id = pos_id
         # Core product controller expects a pos_id
         self.core_ctrl = CoreProductController(pos_id)
+        self.search_ctrl = ProductSearchController()
         self.vente_ctrl = VenteController(entreprise_id=entreprise_id)
+        # In-memory cart quantities per open panier: {panier_id: {product_id: quantity}}
+        self._cart_quantities = {}
 
     def list_products(self, search: Optional[str] = None, category_id: Optional[int] = None, active_only: Optional[bool] = True):
-        session = self.db.get_session()
-        try:
-            prods = self.core_ctrl.get_products(session=session, category_id=category_id, search_term=search, active_only=active_only)
-            return prods
-        finally:
-            self.db.close_session()
+        """Produits du catalogue servis depuis le cache mémoire de l'entreprise.
+        Avec une saisie, résultats classés par la recherche plein texte (préfixes)."""
+        return self.search_ctrl.search(self.core_ctrl.entreprise_id, search, category_id=category_id, active_only=active_only)
 
     def get_product(self, product_id: int):
-        session = self.db.get_session()
-        try:
-            p = self.core_ctrl.get_product_by_id(session, product_id)
-            return p
-        finally:
-            self.db.close_session()
+        return get_catalogue_cache(self.core_ctrl.entreprise_id).get(product_id)
 
     def list_categories(self):
         """Retourne la liste des catégories CoreProductCategory pour l'entreprise du POS."""
@@ -50,71 +49,131 @@ class CatalogueController:
         return self.vente_ctrl.create_panier(table_id=table_id, client_id=client_id, serveuse_id=serveuse_id, user_id=user_id)
 
     def add_product_to_panier(self, panier_id: int, product_id: int, quantity: float, price: float):
-        # If the product already exists in the panier, increment its quantity instead of creating a new line
-        session = self.db.get_session()
-        try:
-            existing = session.query(RestauProduitPanier).filter_by(panier_id=panier_id, product_id=product_id).first()
+        """Add a product to the panier; an existing line for the same product is incremented.
+        Returns the updated line with the new panier totals (see _cart_line)."""
+        with self.db.session_scope() as session:
+            existing = session.execute(text("""
+                SELECT id, quantity, price, total FROM restau_produit_panier
+                WHERE panier_id = :panier_id AND product_id = :product_id
+                ORDER BY id LIMIT 1
+            """), {"panier_id": panier_id, "product_id": product_id}).fetchone()
             if existing:
-                existing.quantity = float(existing.quantity) + float(quantity)
-                existing.total = float(existing.quantity) * float(existing.price)
-                session.flush()
-                panier = session.query(RestauPanier).filter_by(id=panier_id).first()
-                if panier:
-                    panier.subtotal = sum([p.total for p in panier.produits]) if panier.produits else 0.0
-                    panier.total_final = panier.subtotal - (panier.remise_amount or 0.0)
-                    panier.updated_at = datetime.utcnow()
-                session.commit()
-                session.refresh(existing)
-                return existing
+                line_id, line_price = existing.id, float(existing.price or 0.0)
+                new_quantity = float(existing.quantity or 0) + float(quantity)
+                new_total = new_quantity * line_price
+                delta = new_total - float(existing.total or 0.0)
+                session.execute(text("""
+                    UPDATE restau_produit_panier SET quantity = :quantity, total = :total WHERE id = :id
+                """), {"quantity": new_quantity, "total": new_total, "id": line_id})
             else:
-                # Delegate to VenteController to create a new line
-                return self.vente_ctrl.add_product(panier_id, product_id, quantity, price)
-        finally:
-            self.db.close_session()
+                line_price = float(price)
+                new_quantity = float(quantity)
+                new_total = new_quantity * line_price
+                delta = new_total
+                line_id = session.execute(text("""
+                    INSERT INTO restau_produit_panier (panier_id, product_id, quantity, price, total)
+                    VALUES (:panier_id, :product_id, :quantity, :price, :total)
+                """), {"panier_id": panier_id, "product_id": product_id, "quantity": new_quantity,
+                       "price": line_price, "total": new_total}).lastrowid
+            totals = self._apply_subtotal_delta(session, panier_id, delta)
+        self._adjust_cart_quantity(panier_id, product_id, quantity)
+        return self._cart_line(line_id, panier_id, product_id, new_quantity, line_price, new_total, totals)
 
     def remove_product_from_panier(self, panier_id: int, produit_panier_id: int):
-        session = self.db.get_session()
-        try:
-            lp = session.query(RestauProduitPanier).filter_by(id=produit_panier_id, panier_id=panier_id).first()
-            if not lp:
-                raise ValueError('Ligne introuvable')
-            session.delete(lp)
-            # Recalculate totals
-            session.flush()
-            panier = session.query(RestauPanier).filter_by(id=panier_id).first()
-            if panier:
-                panier.subtotal = sum([p.total for p in panier.produits]) if panier.produits else 0.0
-                panier.total_final = panier.subtotal - (panier.remise_amount or 0.0)
-                panier.updated_at = datetime.utcnow()
-            session.commit()
-            return True
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            self.db.close_session()
+        """Delete a panier line. Returns the removed line (quantity 0) with the new panier totals."""
+        with self.db.session_scope() as session:
+            lp = self._get_line(session, panier_id, produit_panier_id)
+            session.execute(text("DELETE FROM restau_produit_panier WHERE id = :id"), {"id": lp.id})
+            totals = self._apply_subtotal_delta(session, panier_id, -float(lp.total or 0.0))
+        self._adjust_cart_quantity(panier_id, lp.product_id, -float(lp.quantity or 0))
+        return self._cart_line(lp.id, panier_id, lp.product_id, 0, float(lp.price or 0.0), 0.0, totals)
 
     def update_product_quantity(self, panier_id: int, produit_panier_id: int, new_quantity: float):
-        session = self.db.get_session()
-        try:
-            lp = session.query(RestauProduitPanier).filter_by(id=produit_panier_id, panier_id=panier_id).first()
-            if not lp:
-                raise ValueError('Ligne introuvable')
-            lp.quantity = new_quantity
-            lp.total = float(new_quantity) * float(lp.price)
-            session.flush()
-            panier = session.query(RestauPanier).filter_by(id=panier_id).first()
-            if panier:
-                panier.subtotal = sum([p.total for p in panier.produits]) if panier.produits else 0.0
-                panier.total_final = panier.subtotal - (panier.remise_amount or 0.0)
-                panier.updated_at = datetime.utcnow()
-            session.commit()
-            return lp
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            self.db.close_session()
+        """Set the quantity of a panier line. Returns the updated line with the new panier totals."""
+        with self.db.session_scope() as session:
+            lp = self._get_line(session, panier_id, produit_panier_id)
+            new_total = float(new_quantity) * float(lp.price or 0.0)
+            session.execute(text("""
+                UPDATE restau_produit_panier SET quantity = :quantity, total = :total WHERE id = :id
+            """), {"quantity": new_quantity, "total": new_total, "id": lp.id})
+            totals = self._apply_subtotal_delta(session, panier_id, new_total - float(lp.total or 0.0))
+        self._adjust_cart_quantity(panier_id, lp.product_id, float(new_quantity) - float(lp.quantity or 0))
+        return self._cart_line(lp.id, panier_id, lp.product_id, new_quantity, float(lp.price or 0.0), new_total, totals)
+
+    def _get_line(self, session, panier_id: int, produit_panier_id: int):
+        lp = session.execute(text("""
+            SELECT id, product_id, quantity, price, total FROM restau_produit_panier
+            WHERE id = :id AND panier_id = :panier_id
+        """), {"id": produit_panier_id, "panier_id": panier_id}).fetchone()
+        if not lp:
+            raise ValueError('Ligne introuvable')
+        return lp
+
+    def _apply_subtotal_delta(self, session, panier_id: int, delta: float):
+        """Shift the panier subtotal by the change of one line instead of re-summing every line.
+        Returns (subtotal, remise_amount, total_final) as stored after the update."""
+        updated = session.execute(text("""
+            UPDATE restau_paniers
+            SET subtotal = COALESCE(subtotal, 0) + :delta,
+                total_final = COALESCE(subtotal, 0) + :delta - COALESCE(remise_amount, 0),
+                updated_at = :now
+            WHERE id = :panier_id
+        """), {"delta": float(delta), "now": datetime.utcnow(), "panier_id": panier_id})
+        if not updated.rowcount:
+            raise ValueError('Panier introuvable')
+        row = session.execute(text("""
+            SELECT subtotal, remise_amount, total_final FROM restau_paniers WHERE id = :panier_id
+        """), {"panier_id": panier_id}).fetchone()
+        return float(row[0] or 0.0), float(row[1] or 0.0), float(row[2] or 0.0)
+
+    @staticmethod
+    def _cart_line(line_id, panier_id, product_id, quantity, price, total, totals):
+        subtotal, remise_amount, total_final = totals
+        return SimpleNamespace(
+            id=line_id,
+            panier_id=panier_id,
+            product_id=product_id,
+            quantity=quantity,
+            price=price,
+            total=total,
+            panier_subtotal=subtotal,
+            panier_remise_amount=remise_amount,
+            panier_total_final=total_final,
+        )
+
+    def cart_quantities(self, panier_id: int):
+        """Quantities per product in the panier, kept in memory and updated by the cart mutations.
+        Loaded with one grouped query the first time a panier is seen."""
+        quantities = self._cart_quantities.get(panier_id)
+        if quantities is None:
+            session = self.db.get_session()
+            try:
+                rows = session.execute(text("""
+                    SELECT product_id, SUM(quantity) FROM restau_produit_panier
+                    WHERE panier_id = :panier_id GROUP BY product_id
+                """), {"panier_id": panier_id}).fetchall()
+                quantities = {row[0]: float(row[1] or 0) for row in rows}
+            finally:
+                self.db.close_session()
+            self._cart_quantities[panier_id] = quantities
+        return quantities
+
+    def forget_cart(self, panier_id: Optional[int] = None):
+        """Drop the in-memory quantities (one panier, or all) so they are reloaded on next use."""
+        if panier_id is None:
+            self._cart_quantities.clear()
+        else:
+            self._cart_quantities.pop(panier_id, None)
+
+    def _adjust_cart_quantity(self, panier_id: int, product_id: int, delta: float):
+        quantities = self._cart_quantities.get(panier_id)
+        if quantities is None:
+            return
+        qty = quantities.get(product_id, 0.0) + float(delta)
+        if qty > 0:
+            quantities[product_id] = qty
+        else:
+            quantities.pop(product_id, None)
 
     def list_cart_items(self, panier_id: int):
         session = self.db.get_session()
@@ -5,8 +5,9 @@ from decimal import Decimal
 from datetime import datetime
 from types import SimpleNamespace
 from ayanna_erp.database.database_manager import get_database_manager
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.orm.exc import DetachedInstanceError
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 from ayanna_erp.modules.restaurant.models.restaurant import (
     RestauPanier, RestauProduitPanier, RestauPayment, RestauTable
 )
@@ -16,6 +17,7 @@ class VenteController:
     def __init__(self, entreprise_id=1):
         self.db = get_database_manager()
         self.entreprise_id = entreprise_id
+        self._pos_warehouse_id = None
 
     def create_panier(self, table_id=None, client_id=None, serveuse_id=None, user_id=None):
         with self.db.session_scope() as session:
@@ -72,9 +74,9 @@ class VenteController:
             except Exception:
                 # si le modèle n'expose pas ces champs, on ignore
                 pass
-            # Recalculer totaux
+            # Mettre à jour les totaux avec le montant de la nouvelle ligne
             session.flush()
-            subtotal = sum([p.total for p in panier.produits])
+            subtotal = float(panier.subtotal or 0.0) + total
             panier.subtotal = subtotal
             panier.total_final = subtotal - (panier.remise_amount or 0.0)
             panier.updated_at = datetime.now()
@@ -93,40 +95,17 @@ class VenteController:
             panier = session.query(RestauPanier).filter_by(id=panier_id).first()
             if not panier:
                 raise ValueError("Panier introuvable")
-            # Vérifier disponibilité du stock dans l'entrepôt POS_4 avant d'enregistrer le paiement
+            # Vérifier disponibilité du stock dans l'entrepôt POS_4 avant d'enregistrer le paiement (une requête)
             insufficient = []
             try:
-                for ligne in getattr(panier, 'produits', []) or []:
-                    pid = getattr(ligne, 'product_id', None)
-                    qty_needed = float(getattr(ligne, 'quantity', 0) or 0)
-                    if not pid:
-                        continue
-                    stock_row = session.execute(
-                        text("""
-                        SELECT spe.quantity FROM stock_produits_entrepot spe
-                        JOIN stock_warehouses w ON w.id = spe.warehouse_id
-                        WHERE spe.product_id = :pid AND w.code = 'POS_4' AND w.is_active = 1
-                        LIMIT 1
-                        """),
-                        {'pid': pid}
-                    ).fetchone()
-                    available = float(stock_row[0]) if stock_row else 0.0
-                    if qty_needed > available:
-                        insufficient.append((pid, qty_needed, available))
+                insufficient = self._get_insufficient_stock(
+                    self._load_sale_lines(session, panier_id, self._get_pos_warehouse_id(session)))
             except Exception:
                 # si la vérification échoue pour une raison technique, ne pas bloquer le paiement
                 insufficient = []
 
             if insufficient:
-                msgs = []
-                for p, q, a in insufficient:
-                    try:
-                        prod_row = session.execute(text("SELECT name FROM core_products WHERE id = :pid LIMIT 1"), {'pid': p}).fetchone()
-                        prod_name = prod_row[0] if prod_row and prod_row[0] else f'Produit {p}'
-                    except Exception:
-                        prod_name = f'Produit {p}'
-                    msgs.append(f"{prod_name}: demandé {q}, disponible {a}")
-                raise ValueError("Stock insuffisant: " + "; ".join(msgs))
+                raise ValueError("Stock insuffisant: " + "; ".join(insufficient))
             pay = RestauPayment(
                 panier_id=panier_id,
                 amount=amount,
@@ -181,21 +160,11 @@ class VenteController:
                         user_id=user_id,
                         created_at=datetime.now()
                     )
-            # after successful commit, if panier is now 'valide' (paid or partial), finalize sale (accounting & stock)
-            try:
-                # compute total paid
-                total_paid = sum([p.amount for p in panier.payments]) if panier.payments else 0.0
-                # call finalize_sale in a safe way (it opens its own session)
-                if getattr(panier, 'status', None) == 'valide':
-                    try:
-                        ok, msg = self.finalize_sale(panier_id, amount_received=total_paid, payment_method=payment_method, user_id=user_id)
-                        print(f"DEBUG: finalize_sale result for panier {panier_id}: {ok} - {msg}")
-                    except Exception as e:
-                        print(f"DEBUG: Erreur finalize_sale pour panier {panier_id}: {e}")
-            except Exception:
-                pass
+            # compute total paid; finalize once the payment is committed (see below)
+            total_paid = sum([p.amount for p in panier.payments]) if panier.payments else 0.0
+            finalize = getattr(panier, 'status', None) == 'valide'
 
-            return SimpleNamespace(
+            result = SimpleNamespace(
                 id=pay.id if pay is not None else pay_id,
                 panier_id=pay.panier_id if pay is not None else panier_id,
                 amount=pay.amount if pay is not None else amount,
@@ -204,6 +173,17 @@ class VenteController:
                 created_at=pay.created_at if pay is not None else datetime.now()
             )
 
+        # after successful commit, if panier is now 'valide' (paid or partial), finalize sale (accounting & stock).
+        # finalize_sale opens its own session: calling it while this transaction still holds the
+        # SQLite write lock would wait for the busy timeout and fail with "database is locked".
+        if finalize:
+            try:
+                ok, msg = self.finalize_sale(panier_id, amount_received=total_paid, payment_method=payment_method, user_id=user_id)
+                print(f"DEBUG: finalize_sale result for panier {panier_id}: {ok} - {msg}")
+            except Exception as e:
+                print(f"DEBUG: Erreur finalize_sale pour panier {panier_id}: {e}")
+        return result
+
     def get_panier(self, panier_id):
         with self.db.session_scope() as session:
             panier = session.query(RestauPanier).filter_by(id=panier_id).first()
@@ -272,6 +252,10 @@ class VenteController:
         Finalise une vente: vérifie le stock dans l'entrepôt POS_4, crée les écritures comptables
         (journal de vente, journal stock, journal encaissement si paiement), et met à jour le stock.
 
+        Le traitement est ensembliste : lignes, noms, comptes et disponibilités sont lus en une
+        requête, le coût moyen en une requête groupée, puis décréments de stock, mouvements et
+        écritures sont insérés par lots (executemany).
+
         Retourne (True, message) si succès ou (False, message) si échec (par ex. stock insuffisant).
         """
         session = self.db.get_session()
@@ -281,39 +265,16 @@ class VenteController:
             if not panier:
                 return False, f"Panier {panier_id} introuvable"
 
-            # Rassembler les lignes
-            lignes = getattr(panier, 'produits', []) or []
+            # Rassembler les lignes avec produit et stock POS_4 (une requête)
+            warehouse_id = self._get_pos_warehouse_id(session)
+            lignes = self._load_sale_lines(session, panier_id, warehouse_id)
             if not lignes:
                 return False, "Panier vide"
 
             # Vérifier disponibilité stock dans POS_4
-            insufficient = []
-            for ligne in lignes:
-                pid = getattr(ligne, 'product_id', None)
-                qty_needed = float(getattr(ligne, 'quantity', 0) or 0)
-                if not pid:
-                    continue
-                # récupérer quantité disponible dans stock_produits_entrepot pour entrepôt code 'POS_4'
-                stock_row = session.execute(text("""
-                    SELECT spe.quantity FROM stock_produits_entrepot spe
-                    JOIN stock_warehouses w ON w.id = spe.warehouse_id
-                    WHERE spe.product_id = :pid AND w.code = 'POS_4' AND w.is_active = 1
-                    LIMIT 1
-                """), {'pid': pid}).fetchone()
-                available = float(stock_row[0]) if stock_row else 0.0
-                if qty_needed > available:
-                    insufficient.append((pid, qty_needed, available))
-
+            insufficient = self._get_insufficient_stock(lignes)
             if insufficient:
-                msgs = []
-                for p, q, a in insufficient:
-                    try:
-                        prod_row = session.execute(text("SELECT name FROM core_products WHERE id = :pid LIMIT 1"), {'pid': p}).fetchone()
-                        prod_name = prod_row[0] if prod_row and prod_row[0] else f'Produit {p}'
-                    except Exception:
-                        prod_name = f'Produit {p}'
-                    msgs.append(f"{prod_name}: demandé {q}, disponible {a}")
-                return False, "Stock insuffisant: " + "; ".join(msgs)
+                return False, "Stock insuffisant: " + "; ".join(insufficient)
 
             # user id fallback: prefer provided user_id, then controller.user_id, then panier.user_id, else 1
             uid = user_id or getattr(self, 'user_id', None) or getattr(panier, 'user_id', None) or 1
@@ -333,275 +294,118 @@ class VenteController:
             if existing and existing[0] and int(existing[0]) > 0:
                 return True, f"Vente CMD-{panier.id} déjà traitée"
 
+            # Décrémenter le stock réel de POS_4 (refusé si un autre poste a vendu entre-temps)
+            insufficient = self._update_pos_stock_restaurant(session, warehouse_id, panier.id, lignes, f"CMD-{panier.id}", uid)
+            if insufficient:
+                return False, "Stock insuffisant: " + "; ".join(insufficient)
+
             # 1) Journal de vente
             total_amount = float(panier.total_final or 0.0)
-            journal_sale = session.execute(text(
-                """
-                INSERT INTO compta_journaux
-                (date_operation, libelle, montant, type_operation, reference, description,
-                 enterprise_id, user_id, date_creation, date_modification)
-                VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                        :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-                """),
-                {
-                    'date_operation': datetime.now(),
-                    'libelle': f"Vente - CMD-{panier.id}",
-                    'montant': total_amount,
-                    'type_operation': 'vente',
-                    'reference': f"CMD-{panier.id}",
-                    'description': f"Vente - {len(lignes)} articles",
-                    'enterprise_id': self.entreprise_id,
-                    'user_id': uid,
-                    'date_creation': datetime.now(),
-                    'date_modification': datetime.now()
-                }
-            )
-            session.flush()
-            journal_sale_id = session.execute(text("SELECT last_insert_rowid()")).fetchone()[0]
+            journal_sale_id = self._insert_journal(session, uid, {
+                'libelle': f"Vente - CMD-{panier.id}",
+                'montant': total_amount,
+                'type_operation': 'vente',
+                'reference': f"CMD-{panier.id}",
+                'description': f"Vente - {len(lignes)} articles",
+            })
 
-            ordre = 1
             # Écritures produits (crédit revenus)
-            for ligne in lignes:
-                item_total = float(getattr(ligne, 'total', 0.0) or 0.0)
-                compte_item = compte_vente_id or None
-                pid = getattr(ligne, 'product_id', None)
-                
-                product_result = session.execute(text("""
-                        SELECT compte_produit_id FROM core_products
-                        WHERE id = :product_id
-                    """), {'product_id':pid})
-                product_row = product_result.fetchone()
-                if product_row and product_row[0]:
-                    compte_item = product_row[0]
-                    
-                # Debug log
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_sale_id,
-                        'compte_id': compte_item,
-                        'debit': 0,
-                        'credit': item_total,
-                        'ordre': ordre,
-                        'libelle': f"Vente produit {getattr(ligne, 'product_id', '')} (x{getattr(ligne, 'quantity', 0)})",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-                ordre += 1
+            sale_ecritures = [{
+                'compte_id': ligne.compte_produit_id or compte_vente_id or None,
+                'debit': 0,
+                'credit': float(ligne.total or 0.0),
+                'libelle': f"Vente produit {ligne.product_id} (x{ligne.quantity or 0})",
+            } for ligne in lignes]
 
             # Débit compte client
             if compte_client_id:
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_sale_id,
-                        'compte_id': compte_client_id,
-                        'debit': total_amount,
-                        'credit': 0,
-                        'ordre': ordre,
-                        'libelle': f"Client - Vente CMD-{panier.id}",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-                ordre += 1
+                sale_ecritures.append({
+                    'compte_id': compte_client_id,
+                    'debit': total_amount,
+                    'credit': 0,
+                    'libelle': f"Client - Vente CMD-{panier.id}",
+                })
 
             # Remise si applicable
             remise_val = float(getattr(panier, 'remise_amount', 0.0) or 0.0)
             if remise_val and compte_remise_id:
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_sale_id,
-                        'compte_id': compte_remise_id,
-                        'debit': remise_val,
-                        'credit': 0,
-                        'ordre': ordre,
-                        'libelle': f"Remise CMD-{panier.id}",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-                print(f"DEBUG: Created remise entry amount {remise_val} in journal {journal_sale_id}")
-                ordre += 1
+                sale_ecritures.append({
+                    'compte_id': compte_remise_id,
+                    'debit': remise_val,
+                    'credit': 0,
+                    'libelle': f"Remise CMD-{panier.id}",
+                })
+            self._insert_ecritures(session, journal_sale_id, sale_ecritures)
 
             # 2) Journal stock (déduction de stock)
-            journal_stock = session.execute(text(
-                """
-                INSERT INTO compta_journaux
-                (date_operation, libelle, montant, type_operation, reference, description,
-                 enterprise_id, user_id, date_creation, date_modification)
-                VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                        :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-                """),
-                {
-                    'date_operation': datetime.now(),
-                    'libelle': f"Sortie stock - CMD-{panier.id}",
-                    'montant': total_amount,
-                    'type_operation': 'stock',
-                    'reference': f"CMD-{panier.id}",
-                    'description': f"Sortie stock  - {len(lignes)} articles",
-                    'enterprise_id': self.entreprise_id,
-                    'user_id': uid,
-                    'date_creation': datetime.now(),
-                    'date_modification': datetime.now()
-                }
-            )
-            session.flush()
-            journal_stock_id = session.execute(text("SELECT last_insert_rowid()")).fetchone()[0]
-
-            ordre_stock = 1
+            journal_stock_id = self._insert_journal(session, uid, {
+                'libelle': f"Sortie stock - CMD-{panier.id}",
+                'montant': total_amount,
+                'type_operation': 'stock',
+                'reference': f"CMD-{panier.id}",
+                'description': f"Sortie stock  - {len(lignes)} articles",
+            })
+
+            # Coût moyen d'achat depuis les mouvements d'entrée, une requête groupée pour tous les produits
+            product_ids = sorted({ligne.product_id for ligne in lignes})
+            avg_costs = {
+                row[0]: float(row[1]) for row in session.execute(text("""
+                    SELECT product_id, AVG(unit_cost) FROM stock_mouvements
+                    WHERE product_id IN :ids AND unit_cost IS NOT NULL AND unit_cost > 0 AND movement_type = 'ENTREE'
+                    GROUP BY product_id
+                """).bindparams(bindparam('ids', expanding=True)), {'ids': product_ids})
+                if row[1] is not None
+            }
+
+            stock_ecritures = []
             for ligne in lignes:
-                item_total = float(getattr(ligne, 'total', 0.0) or 0.0)
-                qty = float(getattr(ligne, 'quantity', 0) or 0)
-                pid = getattr(ligne, 'product_id', None)
-
-                # Calculer coût moyen d'achat depuis mouvements d'entrée pour ce produit (POS_4 env.)
-                avg_cost_row = session.execute(text("""
-                    SELECT AVG(unit_cost) FROM stock_mouvements
-                    WHERE product_id = :product_id AND unit_cost IS NOT NULL AND unit_cost > 0 AND movement_type = 'ENTREE'
-                """), {'product_id': pid}).fetchone()
-                avg_unit_cost = float(avg_cost_row[0]) if avg_cost_row and avg_cost_row[0] is not None else 0.0
-
-
+                qty = float(ligne.quantity or 0)
                 # Enfin fallback sur le champ cost du produit
-                product_meta = session.execute(text("""
-                    SELECT cost, name, compte_charge_id FROM core_products
-                    WHERE id = :product_id
-                """), {'product_id': pid}).fetchone()
-
-                product_cost_field = float(product_meta[0]) if product_meta and product_meta[0] is not None else 0.0
-                product_name = product_meta[1]
-                product_compte_charge_id = product_meta[2] if product_meta and len(product_meta) > 2 and product_meta[2] is not None else None
-
-                unit_cost = avg_unit_cost if avg_unit_cost > 0 else product_cost_field
-
+                avg_unit_cost = avg_costs.get(ligne.product_id, 0.0)
+                unit_cost = avg_unit_cost if avg_unit_cost > 0 else float(ligne.cost or 0.0)
                 # Déterminer le compte charge à utiliser (hiérarchie: compte_charge_id produit > compte_achat_id config > compte_variation_stock_id)
-                compte_charge_id = product_compte_charge_id or compte_achat_id
-                
-
-                # débit: compte achat (COGS), crédit: compte stock — utiliser unité moyenne            
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_stock_id,
-                        'compte_id': compte_charge_id,
-                        'debit': unit_cost * qty,
-                        'credit': 0,
-                        'ordre': ordre_stock,
-                        'libelle': f"COGS {product_name} (x{qty})",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-                ordre_stock += 1
-            
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_stock_id,
-                        'compte_id': compte_stock_id,
-                        'debit': 0,
-                        'credit': unit_cost * qty,
-                        'ordre': ordre_stock,
-                        'libelle': f"Sortie stock {product_name} (x{qty})",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-                ordre_stock += 1
-
-                # Mettre à jour le stock réel dans l'entrepôt POS_4 (pour chaque ligne)
-                try:
-                    self._update_pos_stock_restaurant(session, getattr(ligne, 'product_id', None), int(qty), getattr(ligne, 'price', 0.0), item_total, f"CMD-{panier.id}")
-                except Exception as e:
-                    print(f"DEBUG: Erreur mise à jour stock pour produit {getattr(ligne, 'product_id', None)}: {e}")
+                compte_charge_id = ligne.compte_charge_id or compte_achat_id
+
+                # débit: compte achat (COGS), crédit: compte stock — utiliser unité moyenne
+                stock_ecritures.append({
+                    'compte_id': compte_charge_id,
+                    'debit': unit_cost * qty,
+                    'credit': 0,
+                    'libelle': f"COGS {ligne.name} (x{qty})",
+                })
+                stock_ecritures.append({
+                    'compte_id': compte_stock_id,
+                    'debit': 0,
+                    'credit': unit_cost * qty,
+                    'libelle': f"Sortie stock {ligne.name} (x{qty})",
+                })
+            self._insert_ecritures(session, journal_stock_id, stock_ecritures)
 
             # 3) Journal encaissement (si paiement)
             if float(amount_received or 0.0) > 0 and compte_caisse_id:
-                journal_pay = session.execute(text(
-                    """
-                    INSERT INTO compta_journaux
-                    (date_operation, libelle, montant, type_operation, reference, description,
-                     enterprise_id, user_id, date_creation, date_modification)
-                    VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
-                            :description, :enterprise_id, :user_id, :date_creation, :date_modification)
-                    """),
-                    {
-                        'date_operation': datetime.now(),
-                        'libelle': f"Paiement CMD-{panier.id}",
-                        'montant': float(amount_received),
-                        'type_operation': 'paiement',
-                        'reference': f"CMD-{panier.id}",
-                        'description': f"Encaissement vente - {payment_method}",
-                        'enterprise_id': self.entreprise_id,
-                        'user_id': uid,
-                        'date_creation': datetime.now(),
-                        'date_modification': datetime.now()
-                    }
-                )
-                session.flush()
-                journal_pay_id = session.execute(text("SELECT last_insert_rowid()")).fetchone()[0]
-
-                # Débit caisse
-                session.execute(text(
-                    """
-                    INSERT INTO compta_ecritures
-                    (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                    VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                    """),
-                    {
-                        'journal_id': journal_pay_id,
-                        'compte_id': compte_caisse_id,
-                        'debit': float(amount_received),
-                        'credit': 0,
-                        'ordre': 1,
-                        'libelle': f"Encaissement {payment_method} CMD-{panier.id}",
-                        'date_creation': datetime.now()
-                    }
-                )
-                session.flush()
-
-                # Crédit client
+                journal_pay_id = self._insert_journal(session, uid, {
+                    'libelle': f"Paiement CMD-{panier.id}",
+                    'montant': float(amount_received),
+                    'type_operation': 'paiement',
+                    'reference': f"CMD-{panier.id}",
+                    'description': f"Encaissement vente - {payment_method}",
+                })
+
+                # Débit caisse, crédit client
+                pay_ecritures = [{
+                    'compte_id': compte_caisse_id,
+                    'debit': float(amount_received),
+                    'credit': 0,
+                    'libelle': f"Encaissement {payment_method} CMD-{panier.id}",
+                }]
                 if compte_client_id:
-                    session.execute(text(
-                        """
-                        INSERT INTO compta_ecritures
-                        (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
-                        VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
-                        """),
-                        {
-                            'journal_id': journal_pay_id,
-                            'compte_id': compte_client_id,
-                            'debit': 0,
-                            'credit': float(amount_received),
-                            'ordre': 2,
-                            'libelle': f"Règlement client CMD-{panier.id}",
-                            'date_creation': datetime.now()
-                        }
-                    )
-                    session.flush()
+                    pay_ecritures.append({
+                        'compte_id': compte_client_id,
+                        'debit': 0,
+                        'credit': float(amount_received),
+                        'libelle': f"Règlement client CMD-{panier.id}",
+                    })
+                self._insert_ecritures(session, journal_pay_id, pay_ecritures)
 
             # Mettre à jour le statut du panier
             try:
@@ -632,65 +436,113 @@ class VenteController:
             except Exception:
                 pass
 
-    def _update_pos_stock_restaurant(self, session, product_id, quantity_sold, unit_price, line_total, numero_commande):
+    def _get_pos_warehouse_id(self, session):
+        """Id de l'entrepôt restaurant POS_4 (résolu une seule fois par contrôleur), None si absent"""
+        if self._pos_warehouse_id is None:
+            warehouse_row = session.execute(text("SELECT id FROM stock_warehouses WHERE code = 'POS_4' AND is_active = 1 LIMIT 1")).fetchone()
+            self._pos_warehouse_id = warehouse_row[0] if warehouse_row else None
+        return self._pos_warehouse_id
+
+    def _load_sale_lines(self, session, panier_id, warehouse_id):
         """
-        Met à jour le stock pour le module restaurant en utilisant l'entrepôt code 'POS_4'.
-        Ce helper reçoit la session SQLAlchemy déjà ouverte.
+        Lignes du panier avec, en une seule requête, le nom, le coût, les comptes du produit
+        et la quantité disponible dans l'entrepôt POS_4.
         """
-        try:
-            # Chercher l'entrepôt POS_4
-            warehouse_row = session.execute(text("SELECT id FROM stock_warehouses WHERE code = 'POS_4' AND is_active = 1 LIMIT 1")).fetchone()
-            if not warehouse_row:
-                print(f"⚠️ Entrepôt POS_4 non trouvé pour le produit {product_id}")
-                return
-            warehouse_id = warehouse_row[0]
-
-            # Récupérer le stock actuel
-            stock_row = session.execute(
-                text("SELECT quantity FROM stock_produits_entrepot WHERE product_id = :product_id AND warehouse_id = :warehouse_id LIMIT 1"),
-                {'product_id': product_id, 'warehouse_id': warehouse_id}
-            ).fetchone()
-            current_stock = stock_row[0] if stock_row else 0
-
-            new_stock = max(0, int(current_stock) - int(quantity_sold))
-
-            if stock_row:
-                session.execute(
-                    text("UPDATE stock_produits_entrepot SET quantity = :new_quantity, updated_at = :updated_at WHERE product_id = :product_id AND warehouse_id = :warehouse_id"),
-                    {'product_id': product_id, 'new_quantity': new_stock, 'warehouse_id': warehouse_id, 'updated_at': datetime.now()}
-                )
-            else:
-                session.execute(
-                    text("INSERT INTO stock_produits_entrepot (product_id, warehouse_id, quantity, created_at, updated_at) VALUES (:product_id, :warehouse_id, :quantity, :created_at, :updated_at)"),
-                    {'product_id': product_id, 'warehouse_id': warehouse_id, 'quantity': new_stock, 'created_at': datetime.now(), 'updated_at': datetime.now()}
-                )
-
-            # Insert mouvement stock
-            session.execute(
-                text("""
-                INSERT INTO stock_mouvements(
-                    product_id, warehouse_id, movement_type, quantity, unit_cost, total_cost,
-                    destination_warehouse_id, reference, description, user_id, movement_date, created_at
-                ) VALUES (
-                    :product_id, :warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
-                    :destination_warehouse_id, :reference, :description, :user_id, :movement_date, :created_at
-                )
-                """),
-                {
-                    'product_id': product_id,
-                    'warehouse_id': warehouse_id,
-                    'movement_type': 'SORTIE',
-                    'quantity': quantity_sold,
-                    'unit_cost': unit_price,
-                    'total_cost': line_total,
-                    'destination_warehouse_id': warehouse_id,
-                    'reference': numero_commande,
-                    'description': "Vente Restaurant - " + str(numero_commande),
-                    'user_id': 1,
-                    'movement_date': datetime.now(),
-                    'created_at': datetime.now()
-                }
-            )
-            print(f"📦 Stock mis à jour (POS_4) - Produit {product_id}: {current_stock} → {new_stock}")
-        except Exception as e:
-            print(f"❌ Erreur mise à jour stock (POS_4): {e}")
+        return session.execute(text("""
+            SELECT l.id, l.product_id, l.quantity, l.price, l.total,
+                   p.name, p.cost, p.compte_produit_id, p.compte_charge_id,
+                   COALESCE(spe.quantity, 0) AS available
+            FROM restau_produit_panier l
+            LEFT JOIN core_products p ON p.id = l.product_id
+            LEFT JOIN stock_produits_entrepot spe
+                   ON spe.product_id = l.product_id AND spe.warehouse_id = :warehouse_id
+            WHERE l.panier_id = :panier_id AND l.product_id IS NOT NULL
+            ORDER BY l.id
+        """), {'panier_id': panier_id, 'warehouse_id': warehouse_id}).fetchall()
+
+    @staticmethod
+    def _sold_quantities(lignes):
+        """Quantités vendues par produit (un produit peut apparaître sur plusieurs lignes)"""
+        quantities = {}
+        for ligne in lignes:
+            quantities[ligne.product_id] = quantities.get(ligne.product_id, 0) + float(ligne.quantity or 0)
+        return quantities
+
+    def _get_insufficient_stock(self, lignes):
+        """Un message par produit dont la quantité demandée dépasse le stock POS_4 chargé avec les lignes"""
+        names = {ligne.product_id: ligne.name for ligne in lignes}
+        available = {ligne.product_id: float(ligne.available or 0) for ligne in lignes}
+        msgs = []
+        for pid, qty_needed in self._sold_quantities(lignes).items():
+            if qty_needed > available[pid]:
+                msgs.append(f"{names[pid] or f'Produit {pid}'}: demandé {qty_needed}, disponible {available[pid]}")
+        return msgs
+
+    def _insert_journal(self, session, user_id, data):
+        """Insère un journal comptable daté de maintenant et retourne son id"""
+        now = datetime.now()
+        session.execute(text("""
+            INSERT INTO compta_journaux
+            (date_operation, libelle, montant, type_operation, reference, description,
+             enterprise_id, user_id, date_creation, date_modification)
+            VALUES (:date_operation, :libelle, :montant, :type_operation, :reference,
+                    :description, :enterprise_id, :user_id, :date_creation, :date_modification)
+        """), {
+            'date_operation': now,
+            'enterprise_id': self.entreprise_id,
+            'user_id': user_id,
+            'date_creation': now,
+            'date_modification': now,
+            **data
+        })
+        session.flush()
+        return session.execute(text("SELECT last_insert_rowid()")).fetchone()[0]
+
+    def _insert_ecritures(self, session, journal_id, ecritures):
+        """Insère en un seul executemany les écritures d'un journal (ordre = position dans la liste)"""
+        if not ecritures:
+            return
+        now = datetime.now()
+        session.execute(text("""
+            INSERT INTO compta_ecritures
+            (journal_id, compte_comptable_id, debit, credit, ordre, libelle, date_creation)
+            VALUES (:journal_id, :compte_id, :debit, :credit, :ordre, :libelle, :date_creation)
+        """), [
+            {'journal_id': journal_id, 'ordre': ordre, 'date_creation': now, **ecriture}
+            for ordre, ecriture in enumerate(ecritures, start=1)
+        ])
+
+    def _update_pos_stock_restaurant(self, session, warehouse_id, panier_id, lignes, numero_commande, user_id=1):
+        """
+        Décrémente le stock de l'entrepôt POS_4 pour toutes les lignes d'une vente et
+        enregistre les mouvements de sortie, par lots, via le journal de stock.
+
+        Le décrément est conditionnel : sous le verrou d'écriture de la transaction, deux
+        postes ne peuvent pas vendre la même dernière unité.
+
+        Returns:
+            list: articles en rupture (vide si le stock a été décrémenté)
+        """
+        if not warehouse_id:
+            return ["Entrepôt POS_4 introuvable"]
+
+        quantities = self._sold_quantities(lignes)
+        ok = StockLedgerController().post_movements(session, [{
+            'product_id': ligne.product_id,
+            'warehouse_id': warehouse_id,
+            'movement_type': 'SORTIE',
+            'quantity': -ligne.quantity,
+            'unit_cost': ligne.price,
+            'total_cost': ligne.total,
+            'destination_warehouse_id': warehouse_id,
+            'reference': numero_commande,
+            'description': "Vente Restaurant - " + str(numero_commande),
+            'user_id': user_id,
+        } for ligne in lignes], check_available=True)
+        if not ok:
+            # At least one decrement was refused: roll back before re-reading stock
+            session.rollback()
+            return self._get_insufficient_stock(self._load_sale_lines(session, panier_id, warehouse_id)) or ["Stock modifié par un autre poste"]
+
+        print(f"📦 Stock mis à jour (POS_4) - {len(quantities)} produits ({numero_commande})")
+        return []
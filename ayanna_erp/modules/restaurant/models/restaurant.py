@@ -2,7 +2,7 @@
 ORM models for the Restaurant module
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from ayanna_erp.database.base import Base
 
@@ -39,6 +39,10 @@ class RestauTable(Base):
 
 class RestauPanier(Base):
     __tablename__ = 'restau_paniers'
+    __table_args__ = (
+        Index('idx_restau_paniers_created_at', 'created_at'),
+        Index('idx_restau_paniers_table_status', 'table_id', 'status'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     entreprise_id = Column(Integer, nullable=False)
@@ -62,6 +66,9 @@ class RestauPanier(Base):
 
 class RestauProduitPanier(Base):
     __tablename__ = 'restau_produit_panier'
+    __table_args__ = (
+        Index('idx_restau_produit_panier_panier', 'panier_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     panier_id = Column(Integer, ForeignKey('restau_paniers.id'), nullable=False)
@@ -75,6 +82,9 @@ class RestauProduitPanier(Base):
 
 class RestauPayment(Base):
     __tablename__ = 'restau_payments'
+    __table_args__ = (
+        Index('idx_restau_payments_panier', 'panier_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     panier_id = Column(Integer, ForeignKey('restau_paniers.id'), nullable=False)
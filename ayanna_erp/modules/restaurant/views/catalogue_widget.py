@@ -1,14 +1,15 @@
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QScrollArea,
+    QWidget, QVBoxLayout, QHBoxLayout,
     QFrame, QLabel, QPushButton, QLineEdit, QSpinBox, QTableWidget,
     QTableWidgetItem, QHeaderView, QMessageBox, QComboBox, QDialog,
     QSplitter, QTextEdit, QDoubleSpinBox
 )
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize
 from PyQt6.QtGui import QFont, QPixmap
 
 
 from ayanna_erp.modules.restaurant.controllers.catalogue_controller import CatalogueController
+from ayanna_erp.modules.core.views.product_grid import ProductGridView
 from ayanna_erp.modules.restaurant.controllers.vente_controller import VenteController
 from ayanna_erp.database.database_manager import get_database_manager, User
 from sqlalchemy import text
@@ -127,23 +128,37 @@ class CatalogueWidget(QWidget):
         left_l = QVBoxLayout(left)
         search_h = QHBoxLayout()
         self.search_edit = QLineEdit(); self.search_edit.setPlaceholderText('Rechercher...')
-        self.search_edit.textChanged.connect(self.load_products)
+        # Recherche différée : les cartes existantes sont filtrées après une pause de frappe
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(250)
+        self._search_timer.timeout.connect(self.apply_search)
+        self.search_edit.textChanged.connect(lambda _text: self._search_timer.start())
         search_h.addWidget(self.search_edit)
         # Refresh button to reload products / cart quickly
         try:
             refresh_btn = QPushButton('🔄 Rafraîchir')
-            refresh_btn.clicked.connect(lambda: (self.load_products(), self.refresh_cart()))
+            refresh_btn.clicked.connect(self._on_refresh_clicked)
             search_h.addWidget(refresh_btn)
         except Exception:
             pass
         left_l.addLayout(search_h)
 
-        self.products_area = QScrollArea(); self.products_area.setWidgetResizable(True)
-        self.products_container = QWidget()
-        self.products_layout = QGridLayout(self.products_container)
-        self.products_layout.setSpacing(8)
-        self.products_area.setWidget(self.products_container)
-        left_l.addWidget(self.products_area)
+        # virtualized product grid: tiles are painted by a delegate, only the visible ones
+        self.products_view = ProductGridView(
+            spacing=4,
+            tile_size=QSize(110, 135),
+            image_size=QSize(80, 70),
+            name_max_chars=18,
+            name_font_size=9,
+            name_bold=False,
+            band_color_fn=self._card_band_color,
+            placeholder='🧾',
+            border_color='white',
+        )
+        self.products_view.product_model.tooltip_fn = self._card_tooltip
+        self.products_view.product_clicked.connect(self._on_product_clicked)
+        left_l.addWidget(self.products_view)
         splitter.addWidget(left)
 
         # Right: cart
@@ -347,291 +362,94 @@ class CatalogueWidget(QWidget):
         except Exception:
             pass
 
+    def _on_refresh_clicked(self):
+        # reload cart quantities from the database (changes made from another terminal)
+        if self.panier:
+            self.controller.forget_cart(self.panier.id)
+        self.load_products()
+        self.refresh_cart()
+
     def load_products(self):
-        search = self.search_edit.text() if hasattr(self, 'search_edit') else None
+        # catalogue of the selected category; the search then only filters / reorders the model
         cat_id = self.selected_category
-        products = self.controller.list_products(search=search, category_id=cat_id)
-        # clear
-        for i in reversed(range(self.products_layout.count())):
-            it = self.products_layout.itemAt(i)
-            if it:
-                w = it.widget()
-                if w:
-                    w.setParent(None)
-
-        cols = 6
-        for idx, prod in enumerate(products):
-            card = self.create_product_card(prod)
-            r = idx // cols; c = idx % cols
-            self.products_layout.addWidget(card, r, c)
-
-        # ensure some stretch so cards align top
-        self.products_layout.setRowStretch((len(products) // cols) + 1, 1)
-
-    def create_product_card(self, product):
-        """
-        Crée une carte produit visuellement proche du style Ayanna Cloud :
-        - Fond blanc, coins arrondis, bordure colorée selon la catégorie
-        - Image centrée avec fond clair
-        - Nom du produit centré
-        - Badge quantité/commande en haut à droite
-        """
-        from PyQt6.QtCore import Qt
-        from PyQt6.QtWidgets import QFrame, QVBoxLayout, QLabel, QHBoxLayout, QWidget, QMessageBox
-        from PyQt6.QtGui import QPixmap
-        import os
-
-        # ---- Déterminer la couleur de bordure selon la catégorie ----
-        # Use the central category color helper so buttons and cards match.
-        # If product doesn't expose category name, resolve it via category_id
-        category = None
-        cat_id = getattr(product, 'category_id', None) if hasattr(product, 'category_id') else None
+        products = self.controller.list_products(category_id=cat_id)
+        self._pos_stock = self._load_pos_stock()
+        self.products_view.product_model.set_products(products)
+        self._update_badges()
+        if hasattr(self, 'search_edit') and self.search_edit.text().strip():
+            self.apply_search()
+
+    def apply_search(self):
+        """Filtre la grille selon la recherche (résultats classés, préfixes)"""
         try:
-            if getattr(product, 'category_name', None):
-                category = getattr(product, 'category_name')
-            elif cat_id:
-                # lookup in core_product_categories using the core model
-                db = get_database_manager()
-                session = db.get_session()
-                try:
-                    from ayanna_erp.modules.core.models.core_products import CoreProductCategory
-                    # Ensure we only pick categories for the current enterprise
-                    cat_obj = session.query(CoreProductCategory).filter_by(id=cat_id, entreprise_id=self.entreprise_id).first()
-                    if cat_obj:
-                        category = getattr(cat_obj, 'name', None)
-                finally:
-                    try:
-                        session.close()
-                    except Exception:
-                        pass
-        except Exception:
-            category = None
-
-        if not category:
-            category = 'Autres'
-
-        border_color = self._category_color(category, cat_id)
-
-        # ---- Créer le cadre principal ----
-        card = QFrame()
-        card.setFixedSize(110, 135)
-        card.setStyleSheet(f"""
-            QFrame {{
-                background-color: white;
-                border-radius: 10px;
-                /* no outer border as requested */
-            }}
-            QFrame:hover {{
-                box-shadow: 0 0 8px rgba(0,0,0,0.06);
-                background-color: #F8FAFF;
-            }}
-        """)
-
-        layout = QVBoxLayout(card)
-        layout.setContentsMargins(4, 4, 4, 4)
-        layout.setSpacing(4)
-
-        # ---- Ligne du haut (badge) ----
-        top_row = QWidget()
-        top_layout = QHBoxLayout(top_row)
-        top_layout.setContentsMargins(0, 0, 0, 0)
-        top_layout.addStretch()
-
-        badge = QLabel('')
-        badge.setObjectName('cart_badge')
-        badge.setFixedSize(24, 18)
-        badge.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        badge.setStyleSheet("""
-            background-color: #1976D2;
-            color: white;
-            border-radius: 9px;
-            font-size: 10px;
-            font-weight: bold;
-            padding: 0px 4px;
-        """)
-        # show/hide badge according to current cart quantity for this product
-        try:
-            pid = getattr(product, 'id', None)
-            qty = int(self._get_cart_quantity_for_product(pid) or 0)
-            if qty and qty > 0:
-                badge.setText(str(int(qty)))
-                badge.show()
-            else:
-                badge.hide()
-        except Exception:
-            # safe fallback: hide badge
-            badge.hide()
-        top_layout.addWidget(badge)
-        layout.addWidget(top_row)
-
-        # ---- Image produit ----
-        image_label = QLabel()
-        image_label.setFixedSize(80, 70)
-        image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        image_label.setStyleSheet("""
-            background-color: #F9FAFB;
-            border: none;
-            border-radius: 6px;
-        """)
-
-        image_loaded = False
-        if hasattr(product, 'image') and product.image:
-            try:
-                image_filename = product.image.strip()
-                if os.path.isabs(image_filename):
-                    full_path = image_filename
-                else:
-                    base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-                    full_path = os.path.join(base_path, image_filename.replace("/", os.sep))
-                if os.path.exists(full_path):
-                    pixmap = QPixmap(full_path)
-                    if not pixmap.isNull():
-                        scaled = pixmap.scaled(image_label.size(), Qt.AspectRatioMode.KeepAspectRatio,
-                                            Qt.TransformationMode.SmoothTransformation)
-                        image_label.setPixmap(scaled)
-                        image_loaded = True
-            except Exception as e:
-                print("Erreur image:", e)
-
-        if not image_loaded:
-            image_label.setText("🧾")
-            image_label.setStyleSheet("""
-                background-color: #F8F9FA;
-                border: 2px dashed #DEE2E6;
-                color: #9E9E9E;
-                border-radius: 6px;
-                font-size: 18px;
-            """)
-
-        layout.addWidget(image_label, 0, Qt.AlignmentFlag.AlignHCenter)
+            model = self.products_view.product_model
+            search = self.search_edit.text().strip()
+            if not search:
+                model.show_all()
+                return
+            products = self.controller.list_products(search=search, category_id=self.selected_category)
+            model.show_ids([p.id for p in products])
+        except Exception as e:
+            print(f"❌ Erreur recherche produits: {e}")
 
-        # ---- Nom du produit ----
-        name = getattr(product, 'name', 'Produit')
-        # keep the raw product name only (no counters appended)
-        name_label = QLabel(name if len(name) < 20 else name[:18] + '…')
-        name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        name_label.setWordWrap(True)
-        name_label.setStyleSheet("""
-            color: #212529;
-            font-weight: 400;
-            font-size: 12px;
-        """)
-        layout.addWidget(name_label)
-
-        # ---- Info bulle ----
-        price = float(getattr(product, 'price_unit', getattr(product, 'price', 0)))
-        # Attempt to resolve available stock in POS_4 for restaurant (best-effort)
-        avail_text = ''
+    def _load_pos_stock(self):
+        """Quantités disponibles en POS_4 pour tous les produits, en une requête (info-bulles des cartes)."""
+        db = get_database_manager()
+        session = db.get_session()
         try:
-            pid = getattr(product, 'id', None)
-            if pid is not None:
-                db = get_database_manager()
-                session = db.get_session()
-                try:
-                    row = session.execute(text("""
-                        SELECT spe.quantity FROM stock_produits_entrepot spe
-                        JOIN stock_warehouses w ON w.id = spe.warehouse_id
-                        WHERE spe.product_id = :pid AND w.code = 'POS_4' AND w.is_active = 1
-                        LIMIT 1
-                    """), {'pid': pid}).fetchone()
-                    available = int(row[0]) if row and row[0] is not None else 0
-                    avail_text = f"\nDisponible (POS): {available}"
-                except Exception:
-                    avail_text = ''
-                finally:
-                    try:
-                        session.close()
-                    except Exception:
-                        pass
+            rows = session.execute(text("""
+                SELECT spe.product_id, spe.quantity FROM stock_produits_entrepot spe
+                JOIN stock_warehouses w ON w.id = spe.warehouse_id
+                WHERE w.code = 'POS_4' AND w.is_active = 1
+            """)).fetchall()
+            stock = {}
+            for product_id, quantity in rows:
+                stock.setdefault(product_id, quantity)
+            return stock
         except Exception:
-            avail_text = ''
-
-        card.setToolTip(f"{name}\nPrix: {format_amount(price)} {get_currency(self.entreprise_id)}{avail_text}")
-
-        # ---- bande de couleur de la catégorie (en bas de la carte) ----
-        try:
-            cat_name = getattr(product, 'category_name', None) or category
-            cat_id = getattr(product, 'category_id', None) if hasattr(product, 'category_id') else None
-            # prefer the color assigned in the category bar mapping so button and card match
-            band_color = None
+            return None
+        finally:
             try:
-                if cat_id is not None and cat_id in self._category_color_map:
-                    band_color = self._category_color_map.get(cat_id)
-                elif cat_name in self._category_color_map:
-                    band_color = self._category_color_map.get(cat_name)
+                session.close()
             except Exception:
-                band_color = None
-            if not band_color:
-                band_color = self._category_color(cat_name, cat_id)
-            band = QWidget()
-            band.setFixedHeight(8)
-            band.setStyleSheet(f'background-color: {band_color}; border-bottom-left-radius: 8px; border-bottom-right-radius: 8px;')
-            layout.addWidget(band)
-        except Exception:
-            pass
-
-        # ---- Clic sur la carte ----
-        def _on_click(prod_id=getattr(product, 'id', None)):
-            try:
-                self.add_product(prod_id)
-                self._update_badges()
-            except Exception as e:
-                QMessageBox.critical(self, 'Erreur', str(e))
+                pass
 
-        card.mousePressEvent = lambda event: _on_click()
-        # store product id on card so badges can be updated in-place
+    def _card_band_color(self, product):
+        """Couleur de la bande de catégorie d'une tuile (même couleur que le bouton de catégorie)"""
+        cat_name = getattr(product, 'category_name', None) or 'Autres'
+        cat_id = getattr(product, 'category_id', None)
         try:
-            card.setProperty('product_id', getattr(product, 'id', None))
+            if cat_id is not None and cat_id in self._category_color_map:
+                return self._category_color_map.get(cat_id)
+            if cat_name in self._category_color_map:
+                return self._category_color_map.get(cat_name)
         except Exception:
             pass
+        return self._category_color(cat_name, cat_id)
 
-        return card
+    def _card_tooltip(self, product):
+        name = getattr(product, 'name', 'Produit')
+        price = float(getattr(product, 'price_unit', None) or 0)
+        avail_text = ''
+        stock = getattr(self, '_pos_stock', None)
+        if stock is not None:
+            quantity = stock.get(product.id)
+            avail_text = f"\nDisponible (POS): {int(quantity) if quantity is not None else 0}"
+        return f"{name}\nPrix: {format_amount(price)} {get_currency(self.entreprise_id)}{avail_text}"
 
-    def _get_cart_quantity_for_product(self, product_id):
-        if not self.panier:
-            return 0
+    def _on_product_clicked(self, product):
         try:
-            items = self.controller.list_cart_items(self.panier.id)
-            total = 0
-            for it in items:
-                if getattr(it, 'product_id', None) == product_id:
-                    total += float(getattr(it, 'quantity', 0))
-            return total
-        except Exception:
-            return 0
+            self.add_product(product.id)
+        except Exception as e:
+            QMessageBox.critical(self, 'Erreur', str(e))
 
     def _update_badges(self):
-        # iterate product cards and update badge labels in-place (avoid full reload)
+        # in-memory cart quantities (no query per tap); only the changed tiles are repainted
         try:
-            for i in range(self.products_layout.count()):
-                it = self.products_layout.itemAt(i)
-                if not it:
-                    continue
-                w = it.widget()
-                if not w:
-                    continue
-                badge = w.findChild(QLabel, 'cart_badge')
-                if not badge:
-                    continue
-                try:
-                    pid = w.property('product_id') if hasattr(w, 'property') else None
-                    qty = int(self._get_cart_quantity_for_product(pid) or 0)
-                    if qty and qty > 0:
-                        badge.setText(str(int(qty)))
-                        badge.show()
-                    else:
-                        badge.hide()
-                except Exception:
-                    try:
-                        badge.hide()
-                    except Exception:
-                        pass
-        except Exception:
-            # fallback: if anything goes wrong, do a full reload
-            try:
-                self.load_products()
-            except Exception:
-                pass
+            quantities = self.controller.cart_quantities(self.panier.id) if self.panier else {}
+            self.products_view.product_model.set_badges({pid: int(qty) for pid, qty in quantities.items() if int(qty) > 0})
+        except Exception as e:
+            print(f"Erreur mise à jour des pastilles: {e}")
 
     def _populate_category_buttons(self):
         # Clear existing buttons
@@ -739,8 +557,8 @@ class CatalogueWidget(QWidget):
             self.ensure_panier()
             # add with default qty 1 and product price
             price = float(getattr(prod, 'price_unit', getattr(prod, 'price', 0)))
-            self.controller.add_product_to_panier(self.panier.id, product_id, 1, price)
-            self.refresh_cart()
+            line = self.controller.add_product_to_panier(self.panier.id, product_id, 1, price)
+            self.apply_cart_line(line)
         except Exception as e:
             QMessageBox.critical(self, 'Erreur', f"Impossible d'ajouter le produit: {e}")
 
@@ -799,11 +617,56 @@ class CatalogueWidget(QWidget):
                 self.selected_cart_row = None
                 self.selected_line_id = None
 
-        # update total label after refreshing rows
+        # update total label and product badges after refreshing rows
         try:
             self._update_total_label()
         except Exception:
             pass
+        self._update_badges()
+
+    def apply_cart_line(self, line):
+        """Apply one mutated cart line to the table (insert, update or remove that row only)
+        and show the panier total returned by the controller, without reloading the cart."""
+        if line is None:
+            return
+        row = self._find_cart_row(line.id)
+        if float(line.quantity or 0) <= 0:
+            if row is not None:
+                self.cart_table.removeRow(row)
+            if getattr(self, 'selected_line_id', None) == line.id:
+                self.selected_line_id = None
+                self.selected_cart_row = None
+                self.cart_table.clearSelection()
+            elif self.selected_cart_row is not None and row is not None and self.selected_cart_row > row:
+                self.selected_cart_row -= 1
+        else:
+            if row is None:
+                row = self.cart_table.rowCount()
+                self.cart_table.insertRow(row)
+                id_item = QTableWidgetItem(str(line.id))
+                id_item.setData(Qt.ItemDataRole.UserRole, line.id)
+                self.cart_table.setItem(row, 0, id_item)
+                prod = self.controller.get_product(line.product_id)
+                self.cart_table.setItem(row, 1, QTableWidgetItem(str(getattr(prod, 'name', line.product_id))))
+                self.cart_table.setItem(row, 3, QTableWidgetItem(format_amount(line.price)))
+                self.cart_table.setItem(row, 2, QTableWidgetItem())
+                self.cart_table.setItem(row, 4, QTableWidgetItem())
+            self.cart_table.item(row, 2).setText(str(int(line.quantity)))
+            self.cart_table.item(row, 4).setText(format_amount(line.total))
+            if getattr(self, 'selected_line_id', None) == line.id:
+                self.selected_cart_row = row
+                self.cart_table.selectRow(row)
+                self.qty_spin.setValue(int(line.quantity))
+
+        self._set_total_label(line.panier_total_final)
+        self._update_badges()
+
+    def _find_cart_row(self, line_id):
+        for row in range(self.cart_table.rowCount()):
+            item = self.cart_table.item(row, 0)
+            if item and item.data(Qt.ItemDataRole.UserRole) == line_id:
+                return row
+        return None
 
     def on_cart_row_clicked(self, row, col):
         self.selected_cart_row = row
@@ -827,8 +690,8 @@ class CatalogueWidget(QWidget):
         current = int(self.qty_spin.value())
         newq = current + 1
         try:
-            self.controller.update_product_quantity(self.panier.id, lp_id, newq)
-            self.refresh_cart()
+            line = self.controller.update_product_quantity(self.panier.id, lp_id, newq)
+            self.apply_cart_line(line)
         except Exception as e:
             QMessageBox.critical(self, 'Erreur', str(e))
 
@@ -840,8 +703,8 @@ class CatalogueWidget(QWidget):
         current = int(self.qty_spin.value())
         newq = max(1, current - 1)
         try:
-            self.controller.update_product_quantity(self.panier.id, lp_id, newq)
-            self.refresh_cart()
+            line = self.controller.update_product_quantity(self.panier.id, lp_id, newq)
+            self.apply_cart_line(line)
         except Exception as e:
             QMessageBox.critical(self, 'Erreur', str(e))
 
@@ -851,9 +714,8 @@ class CatalogueWidget(QWidget):
         row = self.selected_cart_row
         lp_id = int(self.cart_table.item(row, 0).text())
         try:
-            self.controller.remove_product_from_panier(self.panier.id, lp_id)
-            self.selected_cart_row = None
-            self.refresh_cart()
+            line = self.controller.remove_product_from_panier(self.panier.id, lp_id)
+            self.apply_cart_line(line)
         except Exception as e:
             QMessageBox.critical(self, 'Erreur', str(e))
 
@@ -866,8 +728,8 @@ class CatalogueWidget(QWidget):
             newq = int(self.qty_spin.value())
             # remember selected_line_id so refresh preserves focus
             self.selected_line_id = lp_id
-            self.controller.update_product_quantity(self.panier.id, lp_id, newq)
-            self.refresh_cart()
+            line = self.controller.update_product_quantity(self.panier.id, lp_id, newq)
+            self.apply_cart_line(line)
         except Exception as e:
             QMessageBox.critical(self, 'Erreur', f"Impossible d'appliquer la quantité: {e}")
 
@@ -951,8 +813,8 @@ class CatalogueWidget(QWidget):
         try:
             newq = int(self.qty_spin.value())
             lp_id = int(self.cart_table.item(self.selected_cart_row, 0).text())
-            self.controller.update_product_quantity(self.panier.id, lp_id, newq)
-            self.refresh_cart()
+            line = self.controller.update_product_quantity(self.panier.id, lp_id, newq)
+            self.apply_cart_line(line)
             # reset buffer
             self._keypad_buffer = ""
         except Exception as e:
@@ -1532,10 +1394,13 @@ class CatalogueWidget(QWidget):
             subtotal = float(getattr(p, 'subtotal', 0.0) or 0.0)
             remise = float(getattr(p, 'remise_amount', 0.0) or 0.0)
             total_final = float(getattr(p, 'total_final', subtotal - remise))
-            self.total_label.setText(f"Total: {format_amount(total_final)} {get_currency(self.entreprise_id)}")
+            self._set_total_label(total_final)
         except Exception:
             pass
 
+    def _set_total_label(self, total_final):
+        self.total_label.setText(f"Total: {format_amount(total_final)} {get_currency(self.entreprise_id)}")
+
     def _populate_serveuse_combo(self):
         try:
             # tenter de lister les utilisateurs de l'entreprise
@@ -262,12 +262,15 @@ class EntreSortieController(QObject):
         finally:
             db_manager.close_session()
 
-    def load_account_journal(self, account_id, date_from=None, date_to=None):
+    def load_account_journal(self, account_id, date_from=None, date_to=None, session=None):
         """
         Charger les écritures comptables liées à un compte (id) sur une plage de dates.
         Retourne une liste d'entrées mappées pour l'interface: debit -> Entrée, credit -> Sortie
         Chaque entrée est un dict contenant : id, datetime, type, libelle, categorie, montant_entree, montant_sortie, utilisateur, description
+        `session` : session fournie par l'appelant (chargement en arrière-plan), sinon session globale
         """
+        db_manager = get_database_manager()
+        own_session = session is None
         try:
             from ayanna_erp.modules.comptabilite.model.comptabilite import (
                 ComptaEcritures as EcritureComptable,
@@ -275,8 +278,8 @@ class EntreSortieController(QObject):
                 ComptaComptes as CompteComptable
             )
 
-            db_manager = get_database_manager()
-            session = db_manager.get_session()
+            if own_session:
+                session = db_manager.get_session()
 
             # Construire bornes temporelles si fournies
             start_dt = None
@@ -338,7 +341,8 @@ class EntreSortieController(QObject):
             return []
 
         finally:
-            db_manager.close_session()
+            if own_session:
+                db_manager.close_session()
             
     def update_expense(self, expense_id, expense_data):
         """Mettre à jour une dépense existante"""
@@ -4,7 +4,7 @@ Gestion des événements, réservations, services, produits et paiements
 """
 
 import os
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, ForeignKey, inspect
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, ForeignKey, Index, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -87,7 +87,10 @@ class EventProduct(Base):
 class EventReservation(Base):
     """Table des réservations d'événements"""
     __tablename__ = 'event_reservations'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_event_reservations_pos_date', 'pos_id', 'event_date'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     pos_id = Column(Integer, nullable=False)  # Référence à l'entreprise
@@ -183,7 +186,10 @@ class EventReservationProduct(Base):
 class EventPayment(Base):
     """Table des paiements pour les réservations"""
     __tablename__ = 'event_payments'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_event_payments_reservation', 'reservation_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     reservation_id = Column(Integer, ForeignKey('event_reservations.id'), nullable=False)
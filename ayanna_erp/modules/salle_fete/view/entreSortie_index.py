@@ -21,8 +21,8 @@ import json
 
 # Import des contrôleurs
 from ..controller.entre_sortie_controller import EntreSortieController
-from ..controller.paiement_controller import PaiementController
 from ayanna_erp.core.controllers.entreprise_controller import EntrepriseController
+from ayanna_erp.core.utils.query_executor import QueryExecutor, BusyIndicator
 from ayanna_erp.utils.formatting import format_amount_for_pdf
 from ayanna_erp.modules.boutique.model.models import ShopPayment, ShopPanier, ShopClient
 from ayanna_erp.modules.restaurant.models.restaurant import RestauPanier, RestauPayment, RestauProduitPanier
@@ -233,6 +233,8 @@ class EntreeSortieIndex(QWidget):
         from ayanna_erp.modules.salle_fete.controller.entre_sortie_controller import EntreSortieController
         pos_id = getattr(main_controller, 'pos_id', 1)
         self.expense_controller = EntreSortieController(pos_id=pos_id)
+        # Chargement du journal en arrière-plan
+        self.executor = QueryExecutor(self)
         # Connecter le signal d'erreur du contrôleur à un affichage utilisateur convivial
         try:
             self.expense_controller.error_occurred.connect(lambda msg: QMessageBox.critical(self, 'Erreur', str(msg)))
@@ -301,6 +303,11 @@ class EntreeSortieIndex(QWidget):
         header_layout.addWidget(self.date_label)
         layout.addLayout(header_layout)
         
+        # Indicateur de chargement du journal
+        self.busy_indicator = BusyIndicator(self)
+        self.busy_indicator.track(self.executor)
+        layout.addWidget(self.busy_indicator)
+        
         # === BARRE D'OUTILS ===
         toolbar_layout = QHBoxLayout()
         
@@ -739,7 +746,8 @@ class EntreeSortieIndex(QWidget):
         Charger les données du journal depuis les tables métier
         - event_expenses (sorties)
         - event_payments (entrées)
-        Filtrées par POS courant et plage de dates sélectionnée
+        Filtrées par POS courant et plage de dates sélectionnée.
+        Les requêtes s'exécutent en arrière-plan ; un nouveau chargement abandonne le précédent.
         """
         try:
             # Obtenir les dates de début et fin sélectionnées
@@ -752,247 +760,219 @@ class EntreeSortieIndex(QWidget):
                 # Valeurs par défaut si les filtres n'existent pas
                 end_date = date.today()
                 start_date = end_date
-            
-            # Définir les bornes de la période pour les requêtes SQL
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-            
-            # Initialiser la liste des données
-            self.journal_data = []
-            # Réinitialiser l'affichage du solde global par défaut
-            try:
+
+            # Compte financier sélectionné (différent de -- Tous --)
+            selected_account_id = None
+            if hasattr(self, 'financial_account_combo') and self.financial_account_combo.currentIndex() > 0:
+                selected_account_id = self.financial_account_combo.currentData()
+
+            pos_id = getattr(self.main_controller, 'pos_id', 1)
+            self.executor.submit(
+                'journal', self._fetch_journal_data, start_date, end_date, selected_account_id, pos_id,
+                with_session=True,
+                on_result=self.on_journal_data_loaded,
+                on_error=lambda e: QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement du journal: {str(e)}")
+            )
+
+        except Exception as e:
+            print(f"Erreur lors du chargement du journal: {e}")
+            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement du journal: {str(e)}")
+
+    def on_journal_data_loaded(self, result):
+        """Afficher les écritures chargées en arrière-plan"""
+        entries, global_balance = result
+        self.journal_data = entries
+
+        # Solde global du compte sélectionné (vide si aucun compte)
+        try:
+            if global_balance is None:
                 self.global_balance_label.setText("")
-            except Exception:
-                pass
+            else:
+                self.global_balance_label.setText(f"Solde global compte: {self.format_amount(global_balance)}")
+        except Exception:
+            pass
+
+        # Trier par date/heure décroissante
+        self.journal_data.sort(key=lambda x: x['datetime'], reverse=True)
 
-            # Si un compte financier est sélectionné (différent de -- Tous --), charger ses écritures comptables
+        # Mettre à jour l'affichage
+        self.update_journal_display()
+
+    def _fetch_journal_data(self, session, start_date, end_date, selected_account_id, pos_id):
+        """
+        Requêtes du journal (thread de travail, session fournie par le QueryExecutor).
+        Retourne (entrées, solde global du compte sélectionné ou None).
+        """
+        # Définir les bornes de la période pour les requêtes SQL
+        start_datetime = datetime.combine(start_date, datetime.min.time())
+        end_datetime = datetime.combine(end_date, datetime.max.time())
+
+        # Si un compte financier est sélectionné, charger ses écritures comptables
+        if selected_account_id:
             try:
-                if hasattr(self, 'financial_account_combo') and self.financial_account_combo.currentIndex() > 0:
-                    selected_account_id = self.financial_account_combo.currentData()
-                    if selected_account_id:
-                        pos_id = getattr(self.main_controller, 'pos_id', 1)
-                        entre_sortie_controller = EntreSortieController(pos_id=pos_id)
-                        entries = entre_sortie_controller.load_account_journal(selected_account_id, start_date, end_date)
-                        self.journal_data = entries or []
-                        self.journal_data.sort(key=lambda x: x['datetime'], reverse=True)
-                        self.update_journal_display()
-                        # Mettre à jour le solde global du compte sélectionné
-                        try:
-                            global_balance = self.get_account_global_balance(selected_account_id)
-                            if global_balance is None:
-                                self.global_balance_label.setText("")
-                            else:
-                                self.global_balance_label.setText(f"Solde global compte: {self.format_amount(global_balance)}")
-                        except Exception:
-                            self.global_balance_label.setText("")
-                        return
+                entre_sortie_controller = EntreSortieController(pos_id=pos_id)
+                entries = entre_sortie_controller.load_account_journal(
+                    selected_account_id, start_date, end_date, session=session
+                )
+                return entries or [], self.get_account_global_balance(selected_account_id, session=session)
             except Exception as e:
                 print(f"Erreur filtre compte financier: {e}")
+
+        entries = []
+
+        # Charger les sorties (dépenses) depuis event_expenses
+        try:
+            # Récupérer les dépenses pour la plage de dates
+            from ayanna_erp.modules.salle_fete.model.salle_fete import EventExpense
+            expenses = session.query(EventExpense)\
+                .filter(
+                    # EventExpense.pos_id == pos_id,
+                    EventExpense.expense_date.between(start_datetime, end_datetime)
+                )\
+                .all()
             
-            # Charger les sorties (dépenses) depuis event_expenses
-            try:
-                pos_id = getattr(self.main_controller, 'pos_id', 1)
-                entre_sortie_controller = EntreSortieController(pos_id=pos_id)
-                # Utiliser une requête directe avec plage de dates
-                from ayanna_erp.database.database_manager import DatabaseManager
-                db_manager = DatabaseManager()
-                session = db_manager.get_session()
-                
-                # Récupérer les dépenses pour la plage de dates
-                from ayanna_erp.modules.salle_fete.model.salle_fete import EventExpense
-                expenses = session.query(EventExpense)\
-                    .filter(
-                        # EventExpense.pos_id == pos_id,
-                        EventExpense.expense_date.between(start_datetime, end_datetime)
-                    )\
-                    .all()
-                
-                for expense in expenses:
-                    entry = {
-                        'id': f'EXP_{expense.id}',
-                        'datetime': expense.expense_date,
-                        'type': 'Sortie',
-                        'libelle': expense.description,
-                        'categorie': expense.expense_type,
-                        'montant_entree': 0.0,
-                        'montant_sortie': float(expense.amount),
-                        'utilisateur': getattr(expense, 'created_by', 'Utilisateur'),
-                        'description': ''
-                    }
-                    self.journal_data.append(entry)
-                
-                session.close()
-                    
-            except Exception as e:
-                print(f"Erreur lors du chargement des dépenses: {e}")
+            for expense in expenses:
+                entry = {
+                    'id': f'EXP_{expense.id}',
+                    'datetime': expense.expense_date,
+                    'type': 'Sortie',
+                    'libelle': expense.description,
+                    'categorie': expense.expense_type,
+                    'montant_entree': 0.0,
+                    'montant_sortie': float(expense.amount),
+                    'utilisateur': getattr(expense, 'created_by', 'Utilisateur'),
+                    'description': ''
+                }
+                entries.append(entry)
+        except Exception as e:
+            print(f"Erreur lors du chargement des dépenses: {e}")
+        
+        # Charger les entrées (paiements) depuis event_payments
+        try:
+            # Récupérer les paiements pour la plage de dates
+            from ayanna_erp.modules.salle_fete.model.salle_fete import EventPayment
+            payments = session.query(EventPayment)\
+                .join(EventPayment.reservation)\
+                .filter(
+                    EventPayment.reservation.has(pos_id=pos_id),
+                    EventPayment.payment_date.between(start_datetime, end_datetime)
+                )\
+                .all()
             
-            # Charger les entrées (paiements) depuis event_payments
-            try:
-                pos_id = getattr(self.main_controller, 'pos_id', 1)
-                paiement_controller = PaiementController(pos_id=pos_id)
-                # Utiliser une requête directe avec plage de dates
-                from ayanna_erp.database.database_manager import DatabaseManager
-                db_manager = DatabaseManager()
-                session = db_manager.get_session()
-                
-                # Récupérer les paiements pour la plage de dates
-                from ayanna_erp.modules.salle_fete.model.salle_fete import EventPayment
-                payments = session.query(EventPayment)\
-                    .join(EventPayment.reservation)\
-                    .filter(
-                        EventPayment.reservation.has(pos_id=pos_id),
-                        EventPayment.payment_date.between(start_datetime, end_datetime)
-                    )\
-                    .all()
-                
-                for payment in payments:
-                    entry = {
-                        'id': f'PAY_{payment.id}',
-                        'datetime': payment.payment_date,
-                        'type': 'Entrée',
-                        'libelle': f'Paiement {payment.payment_method}',
-                        'categorie': 'Paiement client',
-                        'montant_entree': float(payment.amount),
-                        'montant_sortie': 0.0,
-                        'utilisateur': getattr(payment, 'user_id', 'Utilisateur'),
-                        'description': f'Réservation #{payment.reservation_id}' if payment.reservation_id else ''
-                    }
-                    self.journal_data.append(entry)
-                
-                session.close()
-                    
-            except Exception as e:
-                print(f"Erreur lors du chargement des paiements: {e}")
+            for payment in payments:
+                entry = {
+                    'id': f'PAY_{payment.id}',
+                    'datetime': payment.payment_date,
+                    'type': 'Entrée',
+                    'libelle': f'Paiement {payment.payment_method}',
+                    'categorie': 'Paiement client',
+                    'montant_entree': float(payment.amount),
+                    'montant_sortie': 0.0,
+                    'utilisateur': getattr(payment, 'user_id', 'Utilisateur'),
+                    'description': f'Réservation #{payment.reservation_id}' if payment.reservation_id else ''
+                }
+                entries.append(entry)
+        except Exception as e:
+            print(f"Erreur lors du chargement des paiements: {e}")
+        
+        # Charger les sorties (dépenses) depuis achat_expenses (boutique)
+        try:
+            # Récupérer les dépenses de boutique pour la date sélectionnée
+            achat_expenses = session.query(AchatDepense)\
+                .filter(
+                    AchatDepense.date_paiement.between(start_datetime, end_datetime)
+                )\
+                .all()
             
-            # Charger les sorties (dépenses) depuis achat_expenses (boutique)
-            try:
-                from ayanna_erp.database.database_manager import DatabaseManager
-                db_manager = DatabaseManager()
-                session = db_manager.get_session()
-                
-                # Récupérer les dépenses de boutique pour la date sélectionnée
-                achat_expenses = session.query(AchatDepense)\
-                    .filter(
-                        AchatDepense.date_paiement.between(start_datetime, end_datetime)
-                    )\
-                    .all()
-                
-                for expense in achat_expenses:
-                    entry = {
-                        'id': f'SHOP_EXP_{expense.id}',
-                        'datetime': expense.date_paiement,
-                        'type': 'Sortie',
-                        'libelle': expense.description,
-                        'categorie': 'Achat',
-                        'montant_entree': 0.0,
-                        'montant_sortie': float(expense.montant),
-                        'utilisateur': 'Système',  # Pas d'info utilisateur pour les dépenses boutique
-                        'description': f'Référence: {expense.reference or ""}'
-                    }
-                    self.journal_data.append(entry)
-                    
-                session.close()
-                    
-            except Exception as e:
-                print(f"Erreur lors du chargement des dépenses boutique: {e}")
+            for expense in achat_expenses:
+                entry = {
+                    'id': f'SHOP_EXP_{expense.id}',
+                    'datetime': expense.date_paiement,
+                    'type': 'Sortie',
+                    'libelle': expense.description,
+                    'categorie': 'Achat',
+                    'montant_entree': 0.0,
+                    'montant_sortie': float(expense.montant),
+                    'utilisateur': 'Système',  # Pas d'info utilisateur pour les dépenses boutique
+                    'description': f'Référence: {expense.reference or ""}'
+                }
+                entries.append(entry)
+        except Exception as e:
+            print(f"Erreur lors du chargement des dépenses boutique: {e}")
+        
+        # Charger les entrées (paiements) depuis shop_payments (boutique)
+        try:
+            # Récupérer les paiements de boutique pour la date sélectionnée
+            shop_payments = session.query(ShopPayment)\
+                .join(ShopPanier)\
+                .outerjoin(ShopClient)\
+                .filter(
+                    # ShopPanier.pos_id == pos_id,
+                    ShopPayment.payment_date.between(start_datetime, end_datetime),
+                    ShopPanier.status.in_(['validé', 'payé', 'completed', 'pending'])
+                )\
+                .all()
             
-            # Charger les entrées (paiements) depuis shop_payments (boutique)
-            try:
-                from ayanna_erp.database.database_manager import DatabaseManager
-                db_manager = DatabaseManager()
-                session = db_manager.get_session()
-                
-                # Récupérer les paiements de boutique pour la date sélectionnée
-                shop_payments = session.query(ShopPayment)\
-                    .join(ShopPanier)\
-                    .outerjoin(ShopClient)\
-                    .filter(
-                        # ShopPanier.pos_id == pos_id,
-                        ShopPayment.payment_date.between(start_datetime, end_datetime),
-                        ShopPanier.status.in_(['validé', 'payé', 'completed', 'pending'])
-                    )\
-                    .all()
-                
-                for payment in shop_payments:
-                    # Récupérer le nom du client
-                    client_name = "Client anonyme"
-                    if payment.panier.client:
-                        client_name = f"{payment.panier.client.nom or ''} {payment.panier.client.prenom or ''}".strip()
-                        if not client_name:
-                            client_name = f"Client #{payment.panier.client.id}"
-                    
-                    entry = {
-                        'id': f'SHOP_PAY_{payment.id}',
-                        'datetime': payment.payment_date,
-                        'type': 'Entrée',
-                        'libelle': f'[VENTE] Encaissement Facture - {payment.reference}',
-                        'categorie': 'VENTE',
-                        'montant_entree': float(payment.amount),
-                        'montant_sortie': 0.0,
-                        'utilisateur': 'Système',  # Pas d'info utilisateur pour les paiements boutique
-                        'description': f'Panier #{payment.panier.numero_commande or payment.panier.id}'
-                    }
-                    self.journal_data.append(entry)
-                    
-                session.close()
-                    
-            except Exception as e:
-                print(f"Erreur lors du chargement des paiements boutique: {e}")
-                
-                
-            # Charger les entrées (paiements) depuis restau_payments
-            try:
-                from ayanna_erp.database.database_manager import DatabaseManager
-                db_manager = DatabaseManager()
-                session = db_manager.get_session()
+            for payment in shop_payments:
+                # Récupérer le nom du client
+                client_name = "Client anonyme"
+                if payment.panier.client:
+                    client_name = f"{payment.panier.client.nom or ''} {payment.panier.client.prenom or ''}".strip()
+                    if not client_name:
+                        client_name = f"Client #{payment.panier.client.id}"
                 
-                # Récupérer les paiements de boutique pour la date sélectionnée
-                restau_payments = session.query(RestauPayment)\
-                    .join(RestauPanier)\
-                    .filter(
-                        # ShopPanier.pos_id == pos_id,
-                        RestauPayment.created_at.between(start_datetime, end_datetime),
-                        RestauPanier.status.in_(['valide', 'en_cours'])
-                    )\
-                    .all()
-                
-                for payment in restau_payments:
-                    # Récupérer le nom du client
-                    client_name = "Client anonyme"
-                    if payment.panier.client_id:
-                        # client_name = f"{payment.panier.client.nom or ''} {payment.panier.client.prenom or ''}".strip()
-                        if not client_name:
-                            client_name = f"Client #{payment.panier.client.id}"
-                    
-                    entry = {
-                        'id': f'RESTAU_PAY_{payment.id}',
-                        'datetime': payment.created_at,
-                        'type': 'Entrée',
-                        'libelle': f'[VENTE] Encaissement Panier - {payment.panier_id} - {client_name}',
-                        'categorie': 'RESTAU_BAR',
-                        'montant_entree': float(payment.amount),
-                        'montant_sortie': 0.0,
-                        'utilisateur': 'Système',  # Pas d'info utilisateur pour les paiements boutique
-                        'description': f'Panier #{payment.panier.id or payment.panier.id}'
-                    }
-                    self.journal_data.append(entry)
-                    
-                session.close()
-                    
-            except Exception as e:
-                print(f"Erreur lors du chargement des paiements restaurant: {e}")
-            
-            # Trier par date/heure décroissante
-            self.journal_data.sort(key=lambda x: x['datetime'], reverse=True)
-            
-            # Mettre à jour l'affichage
-            self.update_journal_display()
+                entry = {
+                    'id': f'SHOP_PAY_{payment.id}',
+                    'datetime': payment.payment_date,
+                    'type': 'Entrée',
+                    'libelle': f'[VENTE] Encaissement Facture - {payment.reference}',
+                    'categorie': 'VENTE',
+                    'montant_entree': float(payment.amount),
+                    'montant_sortie': 0.0,
+                    'utilisateur': 'Système',  # Pas d'info utilisateur pour les paiements boutique
+                    'description': f'Panier #{payment.panier.numero_commande or payment.panier.id}'
+                }
+                entries.append(entry)
+        except Exception as e:
+            print(f"Erreur lors du chargement des paiements boutique: {e}")
+
+        # Charger les entrées (paiements) depuis restau_payments
+        try:
+            # Récupérer les paiements de boutique pour la date sélectionnée
+            restau_payments = session.query(RestauPayment)\
+                .join(RestauPanier)\
+                .filter(
+                    # ShopPanier.pos_id == pos_id,
+                    RestauPayment.created_at.between(start_datetime, end_datetime),
+                    RestauPanier.status.in_(['valide', 'en_cours'])
+                )\
+                .all()
             
+            for payment in restau_payments:
+                # Récupérer le nom du client
+                client_name = "Client anonyme"
+                if payment.panier.client_id:
+                    # client_name = f"{payment.panier.client.nom or ''} {payment.panier.client.prenom or ''}".strip()
+                    if not client_name:
+                        client_name = f"Client #{payment.panier.client.id}"
+                
+                entry = {
+                    'id': f'RESTAU_PAY_{payment.id}',
+                    'datetime': payment.created_at,
+                    'type': 'Entrée',
+                    'libelle': f'[VENTE] Encaissement Panier - {payment.panier_id} - {client_name}',
+                    'categorie': 'RESTAU_BAR',
+                    'montant_entree': float(payment.amount),
+                    'montant_sortie': 0.0,
+                    'utilisateur': 'Système',  # Pas d'info utilisateur pour les paiements boutique
+                    'description': f'Panier #{payment.panier.id or payment.panier.id}'
+                }
+                entries.append(entry)
         except Exception as e:
-            print(f"Erreur lors du chargement du journal: {e}")
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement du journal: {str(e)}")
-    
-    
+            print(f"Erreur lors du chargement des paiements restaurant: {e}")
+
+        return entries, None
+
     def update_journal_display(self):
         """Mettre à jour l'affichage du tableau et des statistiques"""
         # Filtrer les données selon les critères
@@ -1109,15 +1089,17 @@ class EntreeSortieIndex(QWidget):
                 }
             """)
 
-    def get_account_global_balance(self, account_id):
+    def get_account_global_balance(self, account_id, session=None):
         """Retourne le solde global (débit - crédit) pour un compte comptable donné."""
+        own_session = session is None
         try:
             from ayanna_erp.database.database_manager import DatabaseManager
             from ayanna_erp.modules.comptabilite.model.comptabilite import ComptaEcritures
             from sqlalchemy import func
 
-            db_manager = DatabaseManager()
-            session = db_manager.get_session()
+            if own_session:
+                db_manager = DatabaseManager()
+                session = db_manager.get_session()
 
             balance_expr = (func.coalesce(func.sum(ComptaEcritures.debit), 0) - func.coalesce(func.sum(ComptaEcritures.credit), 0))
             bal = session.query(balance_expr).filter(ComptaEcritures.compte_comptable_id == account_id).scalar()
@@ -1128,10 +1110,11 @@ class EntreeSortieIndex(QWidget):
         except Exception:
             return None
         finally:
-            try:
-                session.close()
-            except Exception:
-                pass
+            if own_session:
+                try:
+                    session.close()
+                except Exception:
+                    pass
     
     def filter_journal(self):
         """Appliquer les filtres et mettre à jour l'affichage"""
@@ -19,6 +19,8 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np
 
+from ayanna_erp.core.utils.query_executor import QueryExecutor, BusyIndicator
+
 try:
     from ayanna_erp.modules.salle_fete.controller.rapport_controller import RapportController
     from ayanna_erp.modules.salle_fete.utils.pdf_exporter import PDFExporter
@@ -37,6 +39,8 @@ class RapportIndex(QWidget):
         # Utiliser le pos_id du contrôleur principal
         pos_id = getattr(main_controller, 'pos_id', 1)
         self.rapport_controller = RapportController(pos_id=pos_id)
+        # Requêtes des tableaux de bord exécutées en arrière-plan
+        self.executor = QueryExecutor(self)
         
         # Importer le SessionManager
         from ayanna_erp.core.session_manager import SessionManager
@@ -78,6 +82,11 @@ class RapportIndex(QWidget):
         title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(title_label)
         
+        # Indicateur de chargement des tableaux de bord
+        self.busy_indicator = BusyIndicator(self)
+        self.busy_indicator.track(self.executor)
+        layout.addWidget(self.busy_indicator)
+        
         # Création des onglets
         self.tab_widget = QTabWidget()
         self.tab_widget.setStyleSheet("""
@@ -354,15 +363,29 @@ class RapportIndex(QWidget):
         
         return tab
     
+    def _report_controller(self):
+        """Contrôleur propre à une requête d'arrière-plan (sa session n'est partagée avec aucun thread)"""
+        return RapportController(pos_id=self.rapport_controller.pos_id)
+
+    def _on_load_error(self, error):
+        QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des données: {str(error)}")
+
     def load_monthly_data(self):
-        """Charger les données mensuelles"""
+        """Charger les données mensuelles (en arrière-plan)"""
+        month = self.month_combo.currentIndex() + 1
+        year = self.year_spin.value()
+        self.executor.submit('mensuel', self._fetch_monthly_data, year, month,
+                             on_result=self.on_monthly_data_loaded, on_error=self._on_load_error)
+
+    def _fetch_monthly_data(self, year, month):
+        controller = self._report_controller()
+        data = controller.get_monthly_events_data(year, month)
+        comparison = controller.get_comparison_data(year, month)
+        return data, comparison
+
+    def on_monthly_data_loaded(self, result):
         try:
-            month = self.month_combo.currentIndex() + 1
-            year = self.year_spin.value()
-            
-            # Récupérer les données
-            data = self.rapport_controller.get_monthly_events_data(year, month)
-            comparison = self.rapport_controller.get_comparison_data(year, month)
+            data, comparison = result
             
             # Mettre à jour le graphique
             self.update_monthly_chart(data)
@@ -371,16 +394,23 @@ class RapportIndex(QWidget):
             self.update_monthly_stats(data, comparison)
             
         except Exception as e:
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des données: {str(e)}")
+            self._on_load_error(e)
     
     def load_yearly_data(self):
-        """Charger les données annuelles"""
+        """Charger les données annuelles (en arrière-plan)"""
+        year = self.yearly_year_spin.value()
+        self.executor.submit('annuel', self._fetch_yearly_data, year,
+                             on_result=self.on_yearly_data_loaded, on_error=self._on_load_error)
+
+    def _fetch_yearly_data(self, year):
+        controller = self._report_controller()
+        data = controller.get_yearly_events_data(year)
+        prev_year_data = controller.get_yearly_events_data(year - 1)
+        return data, prev_year_data
+
+    def on_yearly_data_loaded(self, result):
         try:
-            year = self.yearly_year_spin.value()
-            
-            # Récupérer les données
-            data = self.rapport_controller.get_yearly_events_data(year)
-            prev_year_data = self.rapport_controller.get_yearly_events_data(year - 1)
+            data, prev_year_data = result
             
             # Calculer les comparaisons
             comparison = {
@@ -401,26 +431,28 @@ class RapportIndex(QWidget):
             self.update_yearly_stats(data, comparison)
             
         except Exception as e:
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des données: {str(e)}")
+            self._on_load_error(e)
     
     def load_financial_data(self):
-        """Charger les données financières"""
+        """Charger les données financières (en arrière-plan)"""
+        # Convertir QDate en date Python
+        start_qdate = self.start_date_edit.date()
+        end_qdate = self.end_date_edit.date()
+        
+        # Méthode compatible PyQt6
+        start_date = date(start_qdate.year(), start_qdate.month(), start_qdate.day())
+        end_date = date(end_qdate.year(), end_qdate.month(), end_qdate.day())
+        
+        # Convertir en datetime
+        start_datetime = datetime.combine(start_date, datetime.min.time())
+        end_datetime = datetime.combine(end_date, datetime.max.time())
+        
+        self.executor.submit('financier',
+                             lambda: self._report_controller().get_financial_report_data(start_datetime, end_datetime),
+                             on_result=self.on_financial_data_loaded, on_error=self._on_load_error)
+
+    def on_financial_data_loaded(self, data):
         try:
-            # Convertir QDate en date Python
-            start_qdate = self.start_date_edit.date()
-            end_qdate = self.end_date_edit.date()
-            
-            # Méthode compatible PyQt6
-            start_date = date(start_qdate.year(), start_qdate.month(), start_qdate.day())
-            end_date = date(end_qdate.year(), end_qdate.month(), end_qdate.day())
-            
-            # Convertir en datetime
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-            
-            # Récupérer les données
-            data = self.rapport_controller.get_financial_report_data(start_datetime, end_datetime)
-            
             # Mettre à jour le graphique
             self.update_financial_chart(data)
             
@@ -428,7 +460,7 @@ class RapportIndex(QWidget):
             self.update_financial_stats(data)
             
         except Exception as e:
-            QMessageBox.warning(self, "Erreur", f"Erreur lors du chargement des données: {str(e)}")
+            self._on_load_error(e)
     
     def update_monthly_chart(self, data):
         """Mettre à jour le graphique mensuel"""
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, text
 
 from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.modules.stock.controllers.stock_valuation_controller import StockValuationController
 
 
 class EntrepotController:
@@ -228,8 +229,18 @@ class EntrepotController:
         session.commit()
         return True
     
-    def get_warehouse_detailed_stats(self, session: Session, warehouse_id: int) -> Dict[str, Any]:
-        """Obtenir les statistiques détaillées d'un entrepôt avec valeurs d'achat et de vente"""
+    def get_warehouse_detailed_stats(self, session: Session, warehouse_id: int,
+                                     as_of=None, valuation: str = 'average') -> Dict[str, Any]:
+        """
+        Obtenir les statistiques détaillées d'un entrepôt avec valeurs d'achat et de vente
+
+        Args:
+            as_of: date de valorisation (None = stock actuel), stock recalculé depuis le journal
+            valuation: 'average' (coût moyen pondéré) ou 'fifo', utilisé avec as_of
+        """
+        if as_of is not None:
+            return self._warehouse_stats_as_of(session, warehouse_id, as_of, valuation)
+        
         # Statistiques de base
         result = session.execute(text("""
             SELECT 
@@ -278,6 +289,31 @@ class EntrepotController:
         
         return stats
     
+    def _warehouse_stats_as_of(self, session: Session, warehouse_id: int, as_of, valuation: str) -> Dict[str, Any]:
+        """Statistiques de get_warehouse_detailed_stats calculées sur le stock à la date"""
+        historique = StockValuationController().stock_as_of(session, as_of, [warehouse_id], valuation)
+        quantites = {product_id: ligne['quantity'] for (product_id, _), ligne in historique.items()}
+        
+        # Produits référencés dans l'entrepôt, avec leurs prix actuels
+        produits = session.execute(text("""
+            SELECT spe.product_id, COALESCE(cp.price_unit, 0), COALESCE(cp.cost, 0)
+            FROM stock_produits_entrepot spe
+            LEFT JOIN core_products cp ON spe.product_id = cp.id
+            WHERE spe.warehouse_id = :warehouse_id
+        """), {"warehouse_id": warehouse_id}).fetchall()
+        
+        stats = {
+            'total_products': len(produits),
+            'products_with_stock': sum(1 for row in produits if quantites.get(row[0], 0) > 0),
+            'out_of_stock': sum(1 for row in produits if quantites.get(row[0], 0) == 0),
+            'total_quantity': sum(quantites.get(row[0], 0) for row in produits),
+            'total_cost_value': sum(historique[(row[0], warehouse_id)]['value']
+                                    for row in produits if (row[0], warehouse_id) in historique),
+            'total_sale_value': sum(quantites.get(row[0], 0) * float(row[1]) for row in produits),
+            'total_purchase_value': sum(quantites.get(row[0], 0) * float(row[2]) for row in produits),
+        }
+        return stats
+    
     def get_warehouse_products_details(self, session: Session, warehouse_id: int) -> List[Dict[str, Any]]:
         """Obtenir les détails des produits dans un entrepôt"""
         result = session.execute(text("""
@@ -7,10 +7,11 @@ from typing import List, Optional, Dict, Any
 from decimal import Decimal
 from datetime import datetime, date
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, text
+from sqlalchemy import and_, or_, func, text, bindparam
 
 from ayanna_erp.database.database_manager import DatabaseManager
-from ayanna_erp.modules.stock.models import StockInventaire, StockInventaireItem, StockMovement, StockProduitEntrepot
+from ayanna_erp.modules.stock.models import StockInventaire, StockInventaireItem
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 
 
 class InventaireController:
@@ -167,46 +168,43 @@ class InventaireController:
             print(f"Erreur lors de la récupération des produits: {e}")
             return []
 
+    def _next_reference(self, session: Session) -> str:
+        """Référence lisible INV-AAAAMMJJHHMMSS, suffixée -2, -3... si la seconde est déjà prise"""
+        base = f"INV-{self._local_now().strftime('%Y%m%d%H%M%S')}"
+        existantes = {row[0] for row in session.execute(text(
+            "SELECT reference FROM stock_inventaire WHERE reference = :base OR reference LIKE :motif"
+        ), {'base': base, 'motif': f"{base}-%"})}
+        reference, numero = base, 1
+        while reference in existantes:
+            numero += 1
+            reference = f"{base}-{numero}"
+        return reference
+
     def create_inventory_session(self, session: Session, inventory_data: Dict[str, Any]) -> Optional[StockInventaire]:
         """
         Créer et persister une session d'inventaire. Retourne l'objet StockInventaire créé.
+
+        Les éléments sont copiés côté base par un seul INSERT ... SELECT depuis core_products
+        et stock_produits_entrepot (liste de produits pour un inventaire partiel, produits à
+        stock nul exclus si include_zero_stock est faux). Avec auto_freeze_stock, l'id du
+        dernier mouvement de stock est mémorisé comme point de gel.
         """
         try:
-            # Générer un ID simple (timestamp-based) et une référence lisible
-            reference = f"INV-{self._local_now().strftime('%Y%m%d%H%M%S')}"
+            reference = self._next_reference(session)
 
             warehouse_id = inventory_data.get('warehouse_id')
+            include_zero_stock = bool(inventory_data.get('include_zero_stock', True))
+            auto_freeze_stock = bool(inventory_data.get('auto_freeze_stock'))
+            partiel = (inventory_data.get('inventory_type') or '').lower().startswith('inventaire partiel')
 
-            # Récupérer la liste initiale des produits selon le type (complet/partiel)
-            products = []
-            all_products = self.get_products_for_inventory(warehouse_id)
-
-            if inventory_data.get('inventory_type', '').lower().startswith('inventaire partiel'):
-                # Si l'appelant a fourni product_ids, filtrer
-                selected = inventory_data.get('product_ids') or []
-                for p in all_products:
-                    if p['product_id'] in selected:
-                        products.append({
-                            'product_id': p['product_id'],
-                            'product_name': p.get('product_name'),
-                            'product_code': p.get('product_code'),
-                            'system_stock': p.get('current_quantity') if 'current_quantity' in p else p.get('quantity', 0),
-                            'unit_cost': p.get('unit_cost', 0),
-                            'location': p.get('location', '')
-                        })
-            else:
-                # Inventaire complet ou par défaut: inclure tous
-                for p in all_products:
-                    products.append({
-                        'product_id': p['product_id'],
-                        'product_name': p.get('product_name'),
-                        'product_code': p.get('product_code'),
-                        'system_stock': p.get('current_quantity') if 'current_quantity' in p else p.get('quantity', 0),
-                        'unit_cost': p.get('unit_cost', 0),
-                        'location': p.get('location', '')
-                    })
+            freeze_movement_id = None
+            if auto_freeze_stock:
+                freeze_movement_id = session.execute(text(
+                    "SELECT COALESCE(MAX(id), 0) FROM stock_mouvements"
+                )).scalar()
 
             # Créer la session d'inventaire
+            now = self._local_now()
             inventory = StockInventaire(
                 entreprise_id=self.entreprise_id,
                 reference=reference,
@@ -216,30 +214,49 @@ class InventaireController:
                 status='DRAFT',
                 scheduled_date=inventory_data.get('scheduled_date'),
                 notes=inventory_data.get('notes'),
-                total_items=len(products),
-                include_zero_stock=bool(inventory_data.get('include_zero_stock')),
-                auto_freeze_stock=bool(inventory_data.get('auto_freeze_stock')),
-                send_notifications=bool(inventory_data.get('send_notifications'))
-                ,
-                created_at=self._local_now()
+                include_zero_stock=include_zero_stock,
+                auto_freeze_stock=auto_freeze_stock,
+                send_notifications=bool(inventory_data.get('send_notifications')),
+                freeze_movement_id=freeze_movement_id,
+                created_at=now
             )
             
             session.add(inventory)
             session.flush()  # Pour obtenir l'ID
-            
-            # Créer les éléments d'inventaire
-            for p in products:
-                item = StockInventaireItem(
-                    inventory_id=inventory.id,
-                    product_id=p['product_id'],
-                    product_name=p['product_name'],
-                    product_code=p['product_code'],
-                    system_stock=float(p['system_stock']),
-                    unit_cost=float(p['unit_cost']),
-                    location=p.get('location')
+
+            # Créer les éléments d'inventaire (instantané du stock système)
+            filtres = []
+            params = {
+                'inventory_id': inventory.id,
+                'warehouse_id': warehouse_id,
+                'entreprise_id': self.entreprise_id,
+                'now': now,
+            }
+            if partiel:
+                filtres.append("AND p.id IN :product_ids")
+                params['product_ids'] = list(inventory_data.get('product_ids') or []) or [-1]
+            if not include_zero_stock:
+                filtres.append("AND COALESCE(spe.quantity, 0) != 0")
+            requete = text(f"""
+                INSERT INTO stock_inventaire_item (
+                    inventory_id, product_id, product_name, product_code, system_stock,
+                    counted_stock, variance, variance_value, variance_value_sale,
+                    unit_cost, location, created_at, updated_at
                 )
-                session.add(item)
-            
+                SELECT :inventory_id, p.id, COALESCE(p.name, 'Produit ' || p.id), COALESCE(p.code, ''),
+                       COALESCE(spe.quantity, 0), 0, 0, 0, 0,
+                       COALESCE(spe.unit_cost, p.cost, 0), COALESCE(spe.location, ''), :now, :now
+                FROM core_products p
+                JOIN stock_warehouses sw ON sw.id = :warehouse_id AND sw.entreprise_id = :entreprise_id
+                LEFT JOIN stock_produits_entrepot spe ON spe.product_id = p.id AND spe.warehouse_id = sw.id
+                WHERE p.entreprise_id = :entreprise_id
+                AND p.is_active = 1
+                {' '.join(filtres)}
+            """)
+            if partiel:
+                requete = requete.bindparams(bindparam('product_ids', expanding=True))
+            inventory.total_items = session.execute(requete, params).rowcount
+
             return inventory
         except Exception as e:
             print(f"Erreur lors de la création de l'inventaire: {e}")
@@ -296,46 +313,50 @@ class InventaireController:
     def save_inventory_counts(self, session: Session, inventory_id: int, counting_data: List[Dict[str, Any]]) -> bool:
         """Sauvegarder les comptages pour une session (met à jour les éléments d'inventaire).
         Met aussi à jour les statistiques de l'inventaire.
+
+        Les comptages sont écrits en une seule requête (executemany sur (inventory_id, product_id)),
+        valeurs d'écart comprises ; les statistiques sont recalculées par une requête agrégée.
         """
         try:
-            # Récupérer les prix de vente pour tous les produits concernés
-            product_ids = [cd.get('product_id') for cd in counting_data if cd.get('product_id')]
-            if product_ids:
-                placeholders = ','.join([f":id{i}" for i in range(len(product_ids))])
-                query = f"""
-                    SELECT id, price_unit FROM core_products 
-                    WHERE id IN ({placeholders})
-                """
-                params = {f"id{i}": pid for i, pid in enumerate(product_ids)}
-                price_result = session.execute(text(query), params).fetchall()
-                price_map = {row[0]: float(row[1] or 0) for row in price_result}
-            else:
-                price_map = {}
+            now = self._local_now()
+            lignes = [{
+                'inventory_id': inventory_id,
+                'product_id': cd.get('product_id'),
+                'counted_stock': float(cd.get('counted_stock', 0) or 0),
+                'variance': float(cd.get('variance', 0) or 0),
+                'notes': cd.get('notes', ''),
+                'location': cd.get('location') or None,
+                'now': now,
+            } for cd in counting_data if cd.get('product_id')]
             
-            # Mettre à jour les éléments
-            for cd in counting_data:
-                pid = cd.get('product_id')
-                item = session.query(StockInventaireItem).filter(
-                    StockInventaireItem.inventory_id == inventory_id,
-                    StockInventaireItem.product_id == pid
-                ).first()
-                
-                if item:
-                    item.counted_stock = float(cd.get('counted_stock', 0) or 0)
-                    item.variance = float(cd.get('variance', 0) or 0)
-                    item.variance_value = float(item.variance) * float(item.unit_cost)
-                    item.variance_value_sale = float(item.variance) * price_map.get(pid, 0.0)
-                    item.notes = cd.get('notes', '')
-                    item.counted_at = self._local_now()
+            # Mettre à jour les éléments (écart à la vente au prix de vente actuel du produit)
+            if lignes:
+                session.execute(text("""
+                    UPDATE stock_inventaire_item
+                    SET counted_stock = :counted_stock,
+                        variance = :variance,
+                        variance_value = :variance * COALESCE(unit_cost, 0),
+                        variance_value_sale = :variance * COALESCE(
+                            (SELECT price_unit FROM core_products WHERE id = stock_inventaire_item.product_id), 0),
+                        notes = :notes,
+                        location = COALESCE(:location, location),
+                        counted_at = :now,
+                        updated_at = :now
+                    WHERE inventory_id = :inventory_id AND product_id = :product_id
+                """), lignes)
+                # Les éléments déjà chargés dans la session ne reflètent pas la mise à jour SQL
+                for obj in list(session.identity_map.values()):
+                    if isinstance(obj, StockInventaireItem):
+                        session.expire(obj)
             
             # Recalculer les statistiques de l'inventaire
-            items = session.query(StockInventaireItem).filter(
-                StockInventaireItem.inventory_id == inventory_id
-            ).all()
-            
-            total_counted = sum(1 for item in items if item.counted_stock > 0)
-            total_discrepancies = sum(1 for item in items if item.variance != 0)
-            total_variance_value = sum(item.variance_value for item in items)
+            total_counted, total_discrepancies, total_variance_value = session.execute(text("""
+                SELECT COALESCE(SUM(CASE WHEN counted_stock > 0 THEN 1 ELSE 0 END), 0),
+                       COALESCE(SUM(CASE WHEN variance != 0 THEN 1 ELSE 0 END), 0),
+                       COALESCE(SUM(variance_value), 0)
+                FROM stock_inventaire_item
+                WHERE inventory_id = :inventory_id
+            """), {'inventory_id': inventory_id}).fetchone()
             
             inventory = session.query(StockInventaire).filter(StockInventaire.id == inventory_id).first()
             if inventory:
@@ -351,52 +372,60 @@ class InventaireController:
 
     
 
-    def get_inventories(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_inventories(self, status: Optional[str] = None, session: Session = None) -> List[Dict[str, Any]]:
         """
         Récupérer la liste des inventaires
         
         Args:
             status: Statut à filtrer (optionnel)
+            session: Session à utiliser (chargement en arrière-plan), sinon session du gestionnaire
             
         Returns:
             Liste des inventaires
         """
         try:
+            if session is not None:
+                return self._list_inventories(session, status)
             with self.db_manager.get_session() as session:
-                query = session.query(StockInventaire).filter(
-                    StockInventaire.entreprise_id == self.entreprise_id
-                )
-                
-                if status:
-                    query = query.filter(StockInventaire.status == status)
-                
-                inventories = query.order_by(StockInventaire.created_at.desc()).all()
-                
-                result = []
-                for inv in inventories:
-                    result.append({
-                        'id': inv.id,
-                        'reference': inv.reference,
-                        'session_name': inv.session_name,
-                        'warehouse_id': inv.warehouse_id,
-                        'inventory_type': inv.inventory_type,
-                        'status': inv.status,
-                        'scheduled_date': inv.scheduled_date.isoformat() if inv.scheduled_date else None,
-                        'completed_date': inv.completed_date.isoformat() if inv.completed_date else None,
-                        'notes': inv.notes,
-                        'total_items': inv.total_items,
-                        'counted_items': inv.counted_items,
-                        'total_discrepancies': inv.total_discrepancies,
-                        'total_variance_value': float(inv.total_variance_value),
-                        'progress_percentage': (inv.counted_items / inv.total_items * 100) if inv.total_items > 0 else 0,
-                        'created_at': inv.created_at.isoformat() if inv.created_at else None
-                    })
-                
-                return result
+                return self._list_inventories(session, status)
                 
         except Exception as e:
             print(f"Erreur lors de la récupération des inventaires: {e}")
             return []
+
+    def _list_inventories(self, session: Session, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Inventaires de l'entreprise sous forme de dictionnaires"""
+        query = session.query(StockInventaire).filter(
+            StockInventaire.entreprise_id == self.entreprise_id
+        )
+        
+        if status:
+            query = query.filter(StockInventaire.status == status)
+        
+        inventories = query.order_by(StockInventaire.created_at.desc()).all()
+        
+        result = []
+        for inv in inventories:
+            result.append({
+                'id': inv.id,
+                'reference': inv.reference,
+                'session_name': inv.session_name,
+                'warehouse_id': inv.warehouse_id,
+                'inventory_type': inv.inventory_type,
+                'status': inv.status,
+                'scheduled_date': inv.scheduled_date.isoformat() if inv.scheduled_date else None,
+                'completed_date': inv.completed_date.isoformat() if inv.completed_date else None,
+                'notes': inv.notes,
+                'total_items': inv.total_items,
+                'counted_items': inv.counted_items,
+                'total_discrepancies': inv.total_discrepancies,
+                'total_variance_value': float(inv.total_variance_value),
+                'progress_percentage': (inv.counted_items / inv.total_items * 100) if inv.total_items > 0 else 0,
+                'created_at': inv.created_at.isoformat() if inv.created_at else None
+            })
+        
+        return result
+
     def get_all_inventories(self, session: Session = None) -> List[Dict[str, Any]]:
         """Alias compatible: accepte une session optionnelle et retourne toutes les sessions."""
         # Ignorer la session fournie et utiliser la méthode principale
@@ -411,47 +440,48 @@ class InventaireController:
             if not inventory:
                 raise ValueError("Session d'inventaire introuvable")
             
-            # Récupérer les éléments avec écarts
-            items_with_variance = session.query(StockInventaireItem).filter(
-                StockInventaireItem.inventory_id == inventory_id,
-                StockInventaireItem.variance != 0
-            ).all()
+            # Récupérer les éléments avec écarts (colonnes utiles seulement)
+            items_with_variance = session.execute(text("""
+                SELECT product_id, variance, unit_cost, variance_value
+                FROM stock_inventaire_item
+                WHERE inventory_id = :inventory_id AND variance != 0
+            """), {'inventory_id': inventory_id}).fetchall()
             
-            # Créer les mouvements de stock pour les ajustements
-            for item in items_with_variance:
-                # Trouver ou créer la liaison produit-entrepôt
-                product_warehouse = session.query(StockProduitEntrepot).filter(
-                    StockProduitEntrepot.product_id == item.product_id,
-                    StockProduitEntrepot.warehouse_id == inventory.warehouse_id
-                ).first()
-                
-                if product_warehouse:
-                    # Créer le mouvement d'ajustement
-                    movement = StockMovement(
-                        product_id=item.product_id,
-                        warehouse_id=inventory.warehouse_id,
-                        product_warehouse_id=product_warehouse.id,
-                        movement_type='AJUSTEMENT',
-                        quantity=item.variance,  # Quantité positive ou négative
-                        unit_cost=item.unit_cost,
-                        total_cost=item.variance_value,
-                        reference=f"INV-{inventory.reference}",
-                        description=f"Ajustement inventaire {inventory.session_name}",
-                        user_name=performed_by,
-                        movement_date=self._local_now(),
-                        created_at=self._local_now()
-                    )
-                    session.add(movement)
-                    
-                    # Mettre à jour le stock
-                    product_warehouse.quantity += item.variance
-                    product_warehouse.total_cost = product_warehouse.quantity * product_warehouse.unit_cost
-                    product_warehouse.last_movement_date = self._local_now()
+            # Mouvements enregistrés depuis le gel sur les produits de la session : les
+            # ajustements restent calculés par rapport au stock gelé (delta), on le signale
+            mouvements_pendant_gel = 0
+            if inventory.freeze_movement_id is not None:
+                mouvements_pendant_gel = session.execute(text("""
+                    SELECT COUNT(*)
+                    FROM stock_mouvements m
+                    JOIN stock_inventaire_item i ON i.inventory_id = :inventory_id AND i.product_id = m.product_id
+                    WHERE m.id > :freeze_movement_id
+                    AND (m.warehouse_id = :warehouse_id OR m.destination_warehouse_id = :warehouse_id)
+                """), {
+                    'inventory_id': inventory_id,
+                    'freeze_movement_id': inventory.freeze_movement_id,
+                    'warehouse_id': inventory.warehouse_id,
+                }).scalar() or 0
+
+            # Créer les mouvements d'ajustement : journal et projection en une requête chacun
+            movement_date = self._local_now()
+            StockLedgerController().post_movements(session, [{
+                'product_id': product_id,
+                'warehouse_id': inventory.warehouse_id,
+                'movement_type': 'AJUSTEMENT',
+                'quantity': variance,  # Quantité positive ou négative
+                'unit_cost': unit_cost,
+                'total_cost': variance_value,
+                'reference': f"INV-{inventory.reference}",
+                'description': f"Ajustement inventaire {inventory.session_name}",
+                'user_name': performed_by,
+                'movement_date': movement_date,
+            } for product_id, variance, unit_cost, variance_value in items_with_variance])
 
             # Comptabiliser la variation totale (création d'une écriture comptable)
             try:
                 # Calculer la valeur totale des écarts (à l'achat)
-                total_variance_value = sum(float(it.variance_value or 0) for it in items_with_variance)
+                total_variance_value = sum(float(row[3] or 0) for row in items_with_variance)
                 # Importer le contrôleur / modèles comptables localement pour éviter dépendances circulaires
                 from ayanna_erp.modules.comptabilite.controller.comptabilite_controller import ComptabiliteController
                 from ayanna_erp.modules.comptabilite.model.comptabilite import ComptaJournaux as JournalComptable, ComptaEcritures as EcritureComptable
@@ -525,6 +555,10 @@ class InventaireController:
                     warn = None
             else:
                 warn = None
+            if mouvements_pendant_gel:
+                gel = (f"{mouvements_pendant_gel} mouvement(s) de stock enregistré(s) pendant l'inventaire gelé "
+                       f"sur des produits comptés : les ajustements portent sur l'écart au stock gelé.")
+                warn = f"{warn}\n{gel}" if warn else gel
 
             return True, warn
         except Exception as e:
@@ -0,0 +1,297 @@
+"""
+Import et export des comptages d'inventaire (fichiers CSV, vidages de terminaux de saisie)
+
+Le fichier est lu ligne à ligne : chaque ligne donne un code produit ou un code-barres,
+une quantité comptée (1 si absente : une ligne par lecture du terminal) et éventuellement
+un emplacement. Les codes sont résolus par un index en mémoire (codes et codes-barres)
+construit en une requête ; les quantités d'un même produit sont cumulées puis appliquées
+par paquets via InventaireController.save_inventory_counts. Les codes non reconnus et
+les lignes invalides sont détaillés dans le rapport d'import.
+
+L'export écrit les lignes d'une session au fil de la lecture, dans un format que
+l'import relit tel quel.
+"""
+
+import csv
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ayanna_erp.modules.core.controllers.catalogue_cache import get_catalogue_cache
+from ayanna_erp.modules.stock.controllers.inventaire_controller import InventaireController
+from ayanna_erp.modules.stock.models import StockInventaire
+
+
+# En-têtes reconnus (comparés en minuscules)
+CODE_COLUMNS = ('code', 'code_produit', 'code produit', 'reference', 'référence', 'sku')
+BARCODE_COLUMNS = ('code_barre', 'code_barres', 'code-barres', 'code barre', 'barcode', 'ean')
+QUANTITY_COLUMNS = ('quantite', 'quantité', 'qte', 'qté', 'qty', 'quantity', 'counted_stock', 'stock_compte')
+LOCATION_COLUMNS = ('emplacement', 'location')
+
+EXPORT_COLUMNS = ['code', 'code_barre', 'produit', 'emplacement', 'stock_systeme', 'quantite',
+                  'ecart', 'cout_unitaire', 'valeur_ecart']
+
+# Nombre maximal de lignes invalides détaillées dans le rapport
+MAX_REPORTED_ERRORS = 200
+
+
+def _cle(code) -> str:
+    return str(code or '').strip().upper()
+
+
+def build_code_index(products: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> Dict[str, int]:
+    """Index {code ou code-barres normalisé: product_id} ; en cas de doublon, le code produit l'emporte"""
+    index = {}
+    codes_barres = {}
+    for product_id, code, barcode in products:
+        if _cle(code):
+            index.setdefault(_cle(code), product_id)
+        if _cle(barcode):
+            codes_barres.setdefault(_cle(barcode), product_id)
+    for code_barre, product_id in codes_barres.items():
+        index.setdefault(code_barre, product_id)
+    return index
+
+
+class InventaireImportController:
+    """Import de comptages dans une session d'inventaire, correction en lot et export"""
+
+    def __init__(self, entreprise_id: int):
+        self.entreprise_id = entreprise_id
+        self.inventaire_controller = InventaireController(entreprise_id)
+
+    def read_counts(self, file_path: str, index: Dict[str, int]) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, Any]]:
+        """
+        Lit un fichier de comptages et cumule les quantités par produit.
+
+        Returns:
+            tuple: ({product_id: {'quantity', 'location'}}, rapport) ; le rapport contient
+            'lines', 'invalid' [(ligne, motif)], 'invalid_count' et 'unmatched' {code: nb lignes}
+        """
+        comptes = {}
+        rapport = {'lines': 0, 'invalid': [], 'invalid_count': 0, 'unmatched': {}}
+
+        def _invalide(numero, motif):
+            rapport['invalid_count'] += 1
+            if len(rapport['invalid']) < MAX_REPORTED_ERRORS:
+                rapport['invalid'].append((numero, motif))
+
+        with open(file_path, newline='', encoding='utf-8-sig', errors='replace') as fichier:
+            echantillon = fichier.read(4096)
+            fichier.seek(0)
+            try:
+                delimiteur = csv.Sniffer().sniff(echantillon, delimiters=';,\t|').delimiter
+            except csv.Error:
+                # Une seule colonne (un code par lecture) ou échantillon ambigu
+                delimiteur = ';' if ';' in echantillon else ','
+            lecteur = csv.reader(fichier, delimiter=delimiteur)
+
+            entete = None
+            premiere = True
+            for numero, ligne in enumerate(lecteur, start=1):
+                cellules = [c.strip() for c in ligne]
+                if not any(cellules):
+                    continue
+                if premiere:
+                    premiere = False
+                    entete = self._entete(cellules)
+                    if entete is not None:
+                        continue
+                rapport['lines'] += 1
+                # Sans en-tête, la disposition dépend de chaque ligne (un vidage de terminal
+                # mélange lectures simples « code » et lignes « code;quantité;emplacement »)
+                colonnes = entete if entete is not None else self._positions(cellules)
+
+                def _cellule(nom):
+                    i = colonnes.get(nom)
+                    return cellules[i] if i is not None and i < len(cellules) else ''
+
+                code, code_barre = _cellule('code'), _cellule('barcode')
+                if not code and not code_barre:
+                    _invalide(numero, "code manquant")
+                    continue
+                product_id = index.get(_cle(code)) if code else None
+                if product_id is None and code_barre:
+                    product_id = index.get(_cle(code_barre))
+
+                brute = _cellule('quantity')
+                if not brute and (entete is None or 'quantity' not in colonnes):
+                    # Lecture simple : une unité
+                    quantite = 1.0
+                else:
+                    try:
+                        quantite = float(brute.replace(' ', '').replace(',', '.'))
+                    except ValueError:
+                        _invalide(numero, f"quantité invalide '{brute}'")
+                        continue
+                    if not math.isfinite(quantite) or quantite < 0:
+                        _invalide(numero, f"quantité invalide '{brute}'")
+                        continue
+
+                if product_id is None:
+                    inconnu = code or code_barre
+                    rapport['unmatched'][inconnu] = rapport['unmatched'].get(inconnu, 0) + 1
+                    continue
+                compte = comptes.setdefault(product_id, {'quantity': 0.0, 'location': None})
+                compte['quantity'] += quantite
+                compte['location'] = _cellule('location') or compte['location']
+
+        return comptes, rapport
+
+    @staticmethod
+    def _entete(cellules):
+        """Position des colonnes d'après une ligne d'en-tête, None si la ligne n'en est pas une"""
+        noms = [c.lower() for c in cellules]
+        colonnes = {}
+        for nom, acceptes in (('code', CODE_COLUMNS), ('barcode', BARCODE_COLUMNS),
+                              ('quantity', QUANTITY_COLUMNS), ('location', LOCATION_COLUMNS)):
+            for i, valeur in enumerate(noms):
+                if valeur in acceptes:
+                    colonnes[nom] = i
+                    break
+        return colonnes or None
+
+    @staticmethod
+    def _positions(cellules):
+        """Disposition d'une ligne sans en-tête : code ; quantité ; emplacement"""
+        colonnes = {'code': 0}
+        if len(cellules) > 1:
+            colonnes['quantity'] = 1
+        if len(cellules) > 2:
+            colonnes['location'] = 2
+        return colonnes
+
+    def import_counts(self, session: Session, inventory_id: int, file_path: str,
+                      cumulative: bool = False, chunk_size: int = 500) -> Dict[str, Any]:
+        """
+        Importe un fichier de comptages dans une session d'inventaire ouverte
+        (commit laissé à l'appelant).
+
+        Args:
+            cumulative: ajouter les quantités lues aux comptages existants au lieu de les remplacer
+            chunk_size: nombre de produits écrits par appel à save_inventory_counts
+
+        Returns:
+            dict: rapport de read_counts complété de 'applied' (produits mis à jour)
+        """
+        inventory = session.query(StockInventaire).filter(StockInventaire.id == inventory_id).first()
+        if not inventory:
+            raise ValueError("Session d'inventaire introuvable")
+        if inventory.status not in ('DRAFT', 'IN_PROGRESS'):
+            raise ValueError("Seule une session d'inventaire en cours peut recevoir des comptages")
+
+        lignes = session.execute(text("""
+            SELECT i.product_id, COALESCE(i.product_code, p.code), p.barcode,
+                   i.system_stock, i.counted_stock, i.notes
+            FROM stock_inventaire_item i
+            LEFT JOIN core_products p ON p.id = i.product_id
+            WHERE i.inventory_id = :inventory_id
+        """), {'inventory_id': inventory_id}).fetchall()
+        items = {row[0]: row for row in lignes}
+        comptes, rapport = self.read_counts(file_path, build_code_index((row[0], row[1], row[2]) for row in lignes))
+
+        comptages = []
+        for product_id, compte in comptes.items():
+            item = items[product_id]
+            quantite = compte['quantity'] + (float(item[4] or 0) if cumulative else 0.0)
+            comptages.append({
+                'product_id': product_id,
+                'counted_stock': quantite,
+                'variance': quantite - float(item[3] or 0),
+                'notes': item[5] or '',
+                'location': compte['location'],
+            })
+        for debut in range(0, len(comptages), chunk_size):
+            if not self.inventaire_controller.save_inventory_counts(session, inventory_id, comptages[debut:debut + chunk_size]):
+                raise ValueError("Erreur lors de l'enregistrement des comptages importés")
+
+        if comptages and inventory.status == 'DRAFT':
+            inventory.status = 'IN_PROGRESS'
+            inventory.started_date = datetime.now()
+        rapport['applied'] = len(comptages)
+        print(f"📥 Import inventaire {inventory.reference}: {len(comptages)} produits, "
+              f"{len(rapport['unmatched'])} codes inconnus, {rapport['invalid_count']} lignes invalides")
+        return rapport
+
+    def batch_correction(self, session: Session, warehouse_id: int, file_path: str,
+                         performed_by: str = "system", session_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Correction en lot : crée une session d'inventaire partielle limitée aux produits
+        du fichier, y applique les quantités comptées puis la finalise (ajustements de stock).
+        Commit laissé à l'appelant.
+
+        Returns:
+            dict: rapport d'import complété de 'inventory_reference' et 'warning'
+        """
+        catalogue = get_catalogue_cache(self.entreprise_id).search(active_only=True)
+        index = build_code_index((p.id, p.code, p.barcode) for p in catalogue)
+        comptes, rapport = self.read_counts(file_path, index)
+        if not comptes:
+            rapport.update(applied=0, inventory_reference=None, warning=None)
+            return rapport
+
+        inventory = self.inventaire_controller.create_inventory_session(session, {
+            'session_name': session_name or f"Correction en lot {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+            'warehouse_id': warehouse_id,
+            'inventory_type': 'Inventaire Partiel',
+            'product_ids': list(comptes),
+            'notes': f"Import du fichier {file_path}",
+        })
+        if inventory is None:
+            raise ValueError("Impossible de créer la session de correction")
+        session.flush()
+
+        items = dict(session.execute(text("""
+            SELECT product_id, system_stock FROM stock_inventaire_item WHERE inventory_id = :inventory_id
+        """), {'inventory_id': inventory.id}).fetchall())
+        comptages = [{
+            'product_id': product_id,
+            'counted_stock': compte['quantity'],
+            'variance': compte['quantity'] - float(items[product_id] or 0),
+            'location': compte['location'],
+        } for product_id, compte in comptes.items() if product_id in items]
+        if not self.inventaire_controller.save_inventory_counts(session, inventory.id, comptages):
+            raise ValueError("Erreur lors de l'enregistrement des comptages importés")
+
+        inventory.status = 'IN_PROGRESS'
+        inventory.started_date = datetime.now()
+        succes, warning = self.inventaire_controller.complete_inventory(session, inventory.id, performed_by)
+        if not succes:
+            raise ValueError(warning or "Erreur lors de la finalisation de la correction")
+
+        rapport.update(applied=len(comptages), inventory_reference=inventory.reference, warning=warning)
+        print(f"🔧 Correction en lot {inventory.reference}: {len(comptages)} produits ajustés")
+        return rapport
+
+    def export_counts(self, session: Session, inventory_id: int, file_path: str) -> int:
+        """
+        Exporte les lignes d'une session d'inventaire en CSV (séparateur ';', lisible par
+        Excel), écrites au fil de la lecture.
+
+        Returns:
+            int: nombre de lignes exportées
+        """
+        resultat = session.execute(text("""
+            SELECT COALESCE(i.product_code, p.code), p.barcode, i.product_name, i.location,
+                   i.system_stock, i.counted_stock, i.variance, i.unit_cost, i.variance_value
+            FROM stock_inventaire_item i
+            LEFT JOIN core_products p ON p.id = i.product_id
+            WHERE i.inventory_id = :inventory_id
+            ORDER BY i.product_name
+        """).execution_options(stream_results=True), {'inventory_id': inventory_id})
+
+        nb = 0
+        with open(file_path, 'w', newline='', encoding='utf-8-sig') as fichier:
+            writer = csv.writer(fichier, delimiter=';')
+            writer.writerow(EXPORT_COLUMNS)
+            for code, code_barre, nom, emplacement, systeme, compte, ecart, cout, valeur in resultat:
+                writer.writerow([
+                    code or '', code_barre or '', nom or '', emplacement or '',
+                    f"{float(systeme or 0):.3f}", f"{float(compte or 0):.3f}", f"{float(ecart or 0):.3f}",
+                    f"{float(cout or 0):.2f}", f"{float(valeur or 0):.2f}",
+                ])
+                nb += 1
+        return nb
@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, text
 
 from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
+from ayanna_erp.modules.stock.controllers.stock_valuation_controller import StockValuationController
 
 
 class StockController:
@@ -18,8 +20,16 @@ class StockController:
         self.entreprise_id = entreprise_id
         self.db_manager = DatabaseManager()
     
-    def get_stock_overview(self, session: Session, warehouse_id: Optional[int] = None) -> Dict[str, Any]:
-        """Obtenir une vue d'ensemble des stocks"""
+    def get_stock_overview(self, session: Session, warehouse_id: Optional[int] = None,
+                           as_of=None, valuation: str = 'average') -> Dict[str, Any]:
+        """
+        Obtenir une vue d'ensemble des stocks
+
+        Args:
+            as_of: date de valorisation (None = stock actuel) ; quantités et coûts sont
+                alors recalculés depuis le journal des mouvements
+            valuation: 'average' (coût moyen pondéré) ou 'fifo', utilisé avec as_of
+        """
         if warehouse_id:
             # Stock pour un entrepôt spécifique avec informations produit
             result = session.execute(text("""
@@ -64,6 +74,9 @@ class StockController:
                 ORDER BY total_quantity DESC
             """), {"entreprise_id": self.entreprise_id})
         
+        if as_of is not None:
+            result = self._rows_as_of(session, result.fetchall(), warehouse_id, as_of, valuation)
+        
         stocks = []
         for row in result:
             if warehouse_id:
@@ -159,9 +172,42 @@ class StockController:
             'stocks': stocks,
             'summary': summary,
             'total_items': len(stocks),
-            'warehouse_id': warehouse_id
+            'warehouse_id': warehouse_id,
+            'as_of': as_of
         }
     
+    def _rows_as_of(self, session: Session, rows: List[Tuple], warehouse_id: Optional[int],
+                    as_of, valuation: str) -> List[Tuple]:
+        """Remplace quantités et coûts des lignes de get_stock_overview par le stock à la date"""
+        if warehouse_id:
+            warehouse_ids = [warehouse_id]
+        else:
+            warehouse_ids = [row[0] for row in session.execute(text("""
+                SELECT id FROM stock_warehouses WHERE entreprise_id = :entreprise_id AND is_active = 1
+            """), {"entreprise_id": self.entreprise_id})]
+        historique = StockValuationController().stock_as_of(session, as_of, warehouse_ids, valuation)
+        
+        # Vue globale : cumul des entrepôts par produit
+        par_produit = {}
+        for (product_id, wid), ligne in historique.items():
+            if warehouse_id and wid != warehouse_id:
+                continue
+            cumul = par_produit.setdefault(product_id, [0.0, 0.0])
+            cumul[0] += ligne['quantity']
+            cumul[1] += ligne['value']
+        
+        lignes = []
+        for row in rows:
+            row = list(row)
+            quantite, valeur = par_produit.get(row[0], (0.0, 0.0))
+            row[3] = quantite
+            row[4] = valeur / quantite if quantite else 0
+            row[5] = valeur
+            row[7] = 0  # Les réservations ne sont pas historisées
+            lignes.append(row)
+        lignes.sort(key=lambda row: row[3], reverse=True)
+        return lignes
+    
     def get_product_stock_details(self, session: Session, product_id: int) -> Dict[str, Any]:
         """Obtenir les détails de stock d'un produit dans tous les entrepôts"""
         result = session.execute(text("""
@@ -281,57 +327,27 @@ class StockController:
     def update_stock(self, session: Session, product_id: int, warehouse_id: int, 
                     new_quantity: Decimal, unit_cost: Decimal, 
                     reference: Optional[str] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
-        """Mettre à jour le stock d'un produit dans un entrepôt"""
+        """Mettre à jour le stock d'un produit dans un entrepôt (ajustement journalisé de l'écart)"""
         # Récupérer l'ancien stock
         old_stock = session.execute(text("""
-            SELECT quantity, unit_cost, total_cost 
+            SELECT quantity 
             FROM stock_produits_entrepot 
             WHERE product_id = :product_id AND warehouse_id = :warehouse_id
         """), {"product_id": product_id, "warehouse_id": warehouse_id}).first()
         
         old_quantity = float(old_stock[0]) if old_stock and old_stock[0] else 0
-        old_unit_cost = float(old_stock[1]) if old_stock and old_stock[1] else 0
-        
         new_total_cost = float(new_quantity) * float(unit_cost)
         
-        # Mettre à jour ou créer le stock
-        if old_stock:
-            session.execute(text("""
-                UPDATE stock_produits_entrepot 
-                SET quantity = :quantity, 
-                    unit_cost = :unit_cost, 
-                    total_cost = :total_cost,
-                    last_movement_date = CURRENT_TIMESTAMP,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-            """), {
-                "quantity": float(new_quantity),
-                "unit_cost": float(unit_cost),
-                "total_cost": new_total_cost,
-                "product_id": product_id,
-                "warehouse_id": warehouse_id
-            })
-        else:
-            session.execute(text("""
-                INSERT INTO stock_produits_entrepot 
-                (product_id, warehouse_id, quantity, unit_cost, total_cost, 
-                 last_movement_date, created_at, updated_at)
-                VALUES (:product_id, :warehouse_id, :quantity, :unit_cost, :total_cost,
-                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            """), {
-                "product_id": product_id,
-                "warehouse_id": warehouse_id,
-                "quantity": float(new_quantity),
-                "unit_cost": float(unit_cost),
-                "total_cost": new_total_cost
-            })
-        
-        # Enregistrer le mouvement de stock
-        self._record_stock_movement(
-            session, product_id, warehouse_id, warehouse_id,
-            float(new_quantity) - old_quantity, float(unit_cost),
-            old_quantity, float(new_quantity), reference, user_id
-        )
+        # Écart posté comme ajustement : journal + projection (le coût moyen n'est pas modifié)
+        StockLedgerController().post_movements(session, [{
+            'product_id': product_id,
+            'warehouse_id': warehouse_id,
+            'movement_type': 'AJUSTEMENT',
+            'quantity': float(new_quantity) - old_quantity,
+            'unit_cost': float(unit_cost),
+            'reference': reference,
+            'user_id': user_id,
+        }])
         
         session.commit()
         
@@ -372,7 +388,7 @@ class StockController:
                       warehouse_from_id: int, warehouse_to_id: int,
                       quantity: Decimal, reference: Optional[str] = None,
                       user_id: Optional[int] = None) -> Dict[str, Any]:
-        """Transférer du stock entre entrepôts"""
+        """Transférer du stock entre entrepôts (deux mouvements signés via le journal de stock)"""
         # Vérifier le stock source
         source_stock = session.execute(text("""
             SELECT quantity, unit_cost 
@@ -384,68 +400,20 @@ class StockController:
             raise ValueError("Stock insuffisant dans l'entrepôt source")
         
         source_quantity = float(source_stock[0])
-        unit_cost = float(source_stock[1])
-        
-        # Réduire le stock source
-        new_source_quantity = source_quantity - float(quantity)
-        session.execute(text("""
-            UPDATE stock_produits_entrepot 
-            SET quantity = :quantity, 
-                total_cost = :total_cost,
-                last_movement_date = CURRENT_TIMESTAMP,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-        """), {
-            "quantity": new_source_quantity,
-            "total_cost": new_source_quantity * unit_cost,
-            "product_id": product_id,
-            "warehouse_id": warehouse_from_id
-        })
-        
-        # Augmenter le stock destination
-        dest_stock = session.execute(text("""
+        unit_cost = float(source_stock[1] or 0)
+        
+        # Sortie source / entrée destination : deltas appliqués à la projection
+        if not StockLedgerController().transfer(
+            session, product_id, warehouse_from_id, warehouse_to_id, quantity,
+            reference=reference, user_id=user_id
+        ):
+            session.rollback()
+            raise ValueError("Stock insuffisant dans l'entrepôt source")
+        
+        dest_quantity = session.execute(text("""
             SELECT quantity FROM stock_produits_entrepot 
             WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-        """), {"product_id": product_id, "warehouse_id": warehouse_to_id}).first()
-        
-        dest_quantity = float(dest_stock[0]) if dest_stock else 0
-        new_dest_quantity = dest_quantity + float(quantity)
-        
-        if dest_stock:
-            session.execute(text("""
-                UPDATE stock_produits_entrepot 
-                SET quantity = :quantity, 
-                    total_cost = :total_cost,
-                    last_movement_date = CURRENT_TIMESTAMP,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-            """), {
-                "quantity": new_dest_quantity,
-                "total_cost": new_dest_quantity * unit_cost,
-                "product_id": product_id,
-                "warehouse_id": warehouse_to_id
-            })
-        else:
-            session.execute(text("""
-                INSERT INTO stock_produits_entrepot 
-                (product_id, warehouse_id, quantity, unit_cost, total_cost,
-                 last_movement_date, created_at, updated_at)
-                VALUES (:product_id, :warehouse_id, :quantity, :unit_cost, :total_cost,
-                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            """), {
-                "product_id": product_id,
-                "warehouse_id": warehouse_to_id,
-                "quantity": new_dest_quantity,
-                "unit_cost": unit_cost,
-                "total_cost": new_dest_quantity * unit_cost
-            })
-        
-        # Enregistrer le mouvement
-        self._record_stock_movement(
-            session, product_id, warehouse_from_id, warehouse_to_id,
-            float(quantity), unit_cost, source_quantity, new_source_quantity,
-            reference, user_id
-        )
+        """), {"product_id": product_id, "warehouse_id": warehouse_to_id}).scalar()
         
         session.commit()
         
@@ -455,8 +423,8 @@ class StockController:
             'warehouse_to_id': warehouse_to_id,
             'quantity_transferred': float(quantity),
             'unit_cost': unit_cost,
-            'source_new_quantity': new_source_quantity,
-            'dest_new_quantity': new_dest_quantity
+            'source_new_quantity': source_quantity - float(quantity),
+            'dest_new_quantity': float(dest_quantity or 0)
         }
     
     def get_stock_movements(self, session: Session, product_id: Optional[int] = None,
@@ -515,34 +483,6 @@ class StockController:
         
         return movements
     
-    def _record_stock_movement(self, session: Session, product_id: int,
-                              warehouse_from_id: int, warehouse_to_id: int,
-                              quantity: float, unit_cost: float,
-                              quantity_before: float, quantity_after: float,
-                              reference: Optional[str] = None,
-                              user_id: Optional[int] = None):
-        """Enregistrer un mouvement de stock"""
-        session.execute(text("""
-            INSERT INTO stock_mouvements 
-            (warehouse_id_depart, warehouse_id_destination, product_id, quantity,
-             unit_cost, total_cost, quantity_before, quantity_after,
-             reference_document, user_id, mouvement_date, created_at)
-            VALUES (:warehouse_from, :warehouse_to, :product_id, :quantity,
-                    :unit_cost, :total_cost, :quantity_before, :quantity_after,
-                    :reference, :user_id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """), {
-            "warehouse_from": str(warehouse_from_id),
-            "warehouse_to": str(warehouse_to_id),
-            "product_id": product_id,
-            "quantity": quantity,
-            "unit_cost": unit_cost,
-            "total_cost": quantity * unit_cost,
-            "quantity_before": quantity_before,
-            "quantity_after": quantity_after,
-            "reference": reference,
-            "user_id": user_id
-        })
-    
     def get_low_stock_alerts(self, session: Session, warehouse_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Récupérer les alertes de stock faible"""
         conditions = ["sw.entreprise_id = :entreprise_id", "sw.is_active = 1"]
@@ -0,0 +1,298 @@
+"""
+Journal des mouvements de stock (stock_mouvements) et projection des quantités
+(stock_produits_entrepot)
+
+Toutes les écritures de stock passent par `post_movements` : chaque mouvement porte
+une quantité signée pour son entrepôt (`warehouse_id`), il est ajouté au journal et
+la projection est mise à jour par delta (quantity = quantity + :delta) dans la même
+transaction. Le coût moyen pondéré n'évolue qu'avec les entrées valorisées
+(achats, transferts reçus, soldes d'ouverture).
+
+Conventions de stockage de `stock_mouvements.quantity` (lues par les rapports) :
+ENTREE, SORTIE et ANNULATION sont enregistrées en valeur absolue, le type donnant le
+sens ; les autres types (AJUSTEMENT, TRANSFERT, OUVERTURE...) sont signés.
+`SIGNED_QUANTITY_SQL` ramène chaque ligne, historiques comprises, à sa quantité
+signée ; `rebuild_stock_projection` s'en sert pour recalculer la projection.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+
+# Types enregistrés en valeur absolue (le type porte le sens)
+_SENS_PAR_TYPE = {'ENTREE': 1, 'ANNULATION': 1, 'SORTIE': -1}
+
+# Types dont les entrées modifient le coût moyen pondéré
+COST_MOVEMENT_TYPES = ('ENTREE', 'TRANSFERT', 'OUVERTURE')
+
+SIGNED_QUANTITY_SQL = """CASE
+    WHEN movement_type = 'SORTIE' THEN -ABS(quantity)
+    WHEN movement_type IN ('ENTREE', 'ANNULATION') THEN ABS(quantity)
+    ELSE quantity
+END"""
+
+_QTE = "COALESCE(quantity, 0)"
+_BASE = f"(CASE WHEN {_QTE} > 0 THEN {_QTE} ELSE 0 END)"
+_COUT_MOYEN = (
+    f"(CASE WHEN :qty_in > 0 AND {_BASE} + :qty_in > 0 "
+    f"THEN ({_BASE} * COALESCE(unit_cost, 0) + :value_in) / ({_BASE} + :qty_in) "
+    f"ELSE COALESCE(unit_cost, 0) END)"
+)
+
+
+def apply_movement(etat, movement_type, quantite, cout):
+    """
+    Applique un mouvement (quantité signée) à un état [quantité, coût moyen pondéré] ;
+    même règle que la mise à jour SQL de post_movements.
+    """
+    if quantite > 0 and movement_type in COST_MOVEMENT_TYPES:
+        base = max(etat[0], 0.0)
+        if base + quantite > 0:
+            etat[1] = (base * etat[1] + quantite * float(cout or 0)) / (base + quantite)
+    etat[0] += quantite
+
+
+class StockLedgerController:
+    """Écritures de stock : journal des mouvements + projection des quantités par entrepôt"""
+
+    def post_movements(self, session: Session, movements: List[Dict[str, Any]],
+                       check_available: bool = False, default_min_stock_level: float = 0) -> bool:
+        """
+        Journalise des mouvements et applique leurs deltas à la projection.
+
+        Args:
+            movements: dicts {product_id, warehouse_id, movement_type, quantity (signée),
+                unit_cost, total_cost, destination_warehouse_id, reference, description,
+                user_id, user_name, movement_date} ; seuls les trois premiers sont obligatoires
+            check_available: refuser tout décrément qui rendrait un stock négatif
+            default_min_stock_level: seuil minimum des lignes produit-entrepôt créées
+
+        Returns:
+            bool: False si un décrément a été refusé ; la projection peut alors être
+            partiellement modifiée et l'appelant doit annuler la transaction.
+        """
+        if not movements:
+            return True
+        now = datetime.now()
+
+        # Deltas par (produit, entrepôt) ; quantité et valeur des entrées valorisées
+        deltas = {}
+        for mouvement in movements:
+            quantite = float(mouvement['quantity'] or 0)
+            sens = _SENS_PAR_TYPE.get(mouvement['movement_type'])
+            if sens is not None and quantite * sens < 0:
+                raise ValueError(f"Quantité de signe incohérent pour un mouvement {mouvement['movement_type']}")
+            cle = (mouvement['product_id'], mouvement['warehouse_id'])
+            delta = deltas.setdefault(cle, {'delta': 0.0, 'qty_in': 0.0, 'value_in': 0.0})
+            delta['delta'] += quantite
+            if quantite > 0 and mouvement['movement_type'] in COST_MOVEMENT_TYPES:
+                delta['qty_in'] += quantite
+                delta['value_in'] += quantite * float(mouvement.get('unit_cost') or 0)
+
+        lignes = self._product_warehouse_ids(session, deltas)
+        manquantes = [cle for cle in deltas if cle not in lignes]
+        if manquantes:
+            if check_available and any(deltas[cle]['delta'] < 0 for cle in manquantes):
+                return False
+            session.execute(text("""
+                INSERT INTO stock_produits_entrepot
+                (product_id, warehouse_id, quantity, reserved_quantity, unit_cost, total_cost,
+                 min_stock_level, created_at, updated_at)
+                VALUES (:product_id, :warehouse_id, 0, 0, 0, 0, :min_stock_level, :now, :now)
+            """), [
+                {'product_id': pid, 'warehouse_id': wid, 'min_stock_level': default_min_stock_level, 'now': now}
+                for pid, wid in manquantes
+            ])
+            lignes.update(self._product_warehouse_ids(session, manquantes))
+
+        result = session.execute(text(f"""
+            UPDATE stock_produits_entrepot
+            SET quantity = {_QTE} + :delta,
+                unit_cost = {_COUT_MOYEN},
+                total_cost = ({_QTE} + :delta) * {_COUT_MOYEN},
+                last_movement_date = :now,
+                updated_at = :now
+            WHERE id = :id AND (:guard = 0 OR {_QTE} + :delta >= 0)
+        """), [
+            {'id': lignes[cle], 'delta': d['delta'], 'qty_in': d['qty_in'], 'value_in': d['value_in'],
+             'guard': 1 if check_available and d['delta'] < 0 else 0, 'now': now}
+            for cle, d in deltas.items()
+        ])
+        if result.rowcount != len(deltas):
+            return False
+
+        session.execute(text("""
+            INSERT INTO stock_mouvements (
+                product_id, warehouse_id, product_warehouse_id, movement_type, quantity, unit_cost, total_cost,
+                destination_warehouse_id, reference, description, user_id, user_name, movement_date, created_at
+            ) VALUES (
+                :product_id, :warehouse_id, :product_warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
+                :destination_warehouse_id, :reference, :description, :user_id, :user_name, :movement_date, :created_at
+            )
+        """), [self._movement_row(m, lignes, now) for m in movements])
+        return True
+
+    def transfer(self, session: Session, product_id: int, warehouse_from_id: int, warehouse_to_id: int,
+                 quantity: float, reference: Optional[str] = None, description: Optional[str] = None,
+                 user_id: Optional[int] = None, user_name: Optional[str] = None) -> bool:
+        """
+        Transfert entre entrepôts : une sortie signée à la source et une entrée valorisée
+        au coût moyen de la source à la destination (stock source vérifié).
+
+        Returns:
+            bool: False si le stock source est insuffisant (transaction à annuler par l'appelant)
+        """
+        quantity = float(quantity)
+        unit_cost = session.execute(text("""
+            SELECT COALESCE(unit_cost, 0) FROM stock_produits_entrepot
+            WHERE product_id = :product_id AND warehouse_id = :warehouse_id
+        """), {'product_id': product_id, 'warehouse_id': warehouse_from_id}).scalar() or 0
+        commun = {
+            'product_id': product_id, 'movement_type': 'TRANSFERT', 'unit_cost': float(unit_cost),
+            'reference': reference, 'user_id': user_id, 'user_name': user_name,
+        }
+        return self.post_movements(session, [
+            dict(commun, warehouse_id=warehouse_from_id, destination_warehouse_id=warehouse_to_id,
+                 quantity=-quantity, description=description or f"Transfert vers entrepôt {warehouse_to_id}"),
+            dict(commun, warehouse_id=warehouse_to_id, destination_warehouse_id=None,
+                 quantity=quantity, description=description or f"Transfert depuis entrepôt {warehouse_from_id}"),
+        ], check_available=True)
+
+    def rebuild_stock_projection(self, session: Session, warehouse_id: Optional[int] = None) -> int:
+        """
+        Recalcule quantités et coût moyen pondéré de stock_produits_entrepot à partir du
+        journal, en un seul parcours ordonné des mouvements (commit laissé à l'appelant).
+        Les lignes sans aucun mouvement sont remises à zéro.
+
+        Returns:
+            int: nombre de lignes produit-entrepôt recalculées
+        """
+        filtre = "WHERE warehouse_id = :warehouse_id" if warehouse_id is not None else "WHERE warehouse_id IS NOT NULL"
+        params = {'warehouse_id': warehouse_id} if warehouse_id is not None else {}
+        rows = session.execute(text(f"""
+            SELECT product_id, warehouse_id, movement_type, {SIGNED_QUANTITY_SQL}, COALESCE(unit_cost, 0)
+            FROM stock_mouvements
+            {filtre}
+            ORDER BY product_id, warehouse_id, movement_date, id
+        """), params)
+
+        projection = {}
+        for product_id, wid, movement_type, quantite, cout in rows:
+            apply_movement(projection.setdefault((product_id, wid), [0.0, 0.0]), movement_type, float(quantite or 0), cout)
+
+        now = datetime.now()
+        session.execute(text(f"""
+            UPDATE stock_produits_entrepot SET quantity = 0, total_cost = 0, updated_at = :now
+            {"WHERE warehouse_id = :warehouse_id" if warehouse_id is not None else ""}
+        """), dict(params, now=now))
+        if projection:
+            lignes = self._product_warehouse_ids(session, projection)
+            manquantes = [cle for cle in projection if cle not in lignes]
+            if manquantes:
+                session.execute(text("""
+                    INSERT INTO stock_produits_entrepot
+                    (product_id, warehouse_id, quantity, reserved_quantity, unit_cost, total_cost,
+                     min_stock_level, created_at, updated_at)
+                    VALUES (:product_id, :warehouse_id, 0, 0, 0, 0, 0, :now, :now)
+                """), [{'product_id': pid, 'warehouse_id': wid, 'now': now} for pid, wid in manquantes])
+                lignes.update(self._product_warehouse_ids(session, manquantes))
+            session.execute(text("""
+                UPDATE stock_produits_entrepot
+                SET quantity = :quantity, unit_cost = :unit_cost, total_cost = :total_cost, updated_at = :now
+                WHERE id = :id
+            """), [
+                {'id': lignes[cle], 'quantity': qte, 'unit_cost': cout, 'total_cost': qte * cout, 'now': now}
+                for cle, (qte, cout) in projection.items()
+            ])
+        print(f"📦 Projection de stock reconstruite : {len(projection)} lignes produit-entrepôt")
+        return len(projection)
+
+    def record_opening_balances(self, session: Session, warehouse_id: Optional[int] = None) -> int:
+        """
+        Aligne le journal sur la projection actuelle par des mouvements OUVERTURE
+        (écart entre stock_produits_entrepot et la somme des mouvements), valorisés au coût
+        moyen de la ligne. À exécuter une fois sur une base antérieure au journal, avant
+        tout `rebuild_stock_projection`.
+
+        Returns:
+            int: nombre de mouvements d'ouverture créés
+        """
+        filtre = "AND spe.warehouse_id = :warehouse_id" if warehouse_id is not None else ""
+        ecarts = session.execute(text(f"""
+            SELECT spe.product_id, spe.warehouse_id, spe.id,
+                   COALESCE(spe.quantity, 0) - COALESCE(m.total, 0), COALESCE(spe.unit_cost, 0)
+            FROM stock_produits_entrepot spe
+            LEFT JOIN (
+                SELECT product_id, warehouse_id, SUM({SIGNED_QUANTITY_SQL}) AS total
+                FROM stock_mouvements GROUP BY product_id, warehouse_id
+            ) m ON m.product_id = spe.product_id AND m.warehouse_id = spe.warehouse_id
+            WHERE ABS(COALESCE(spe.quantity, 0) - COALESCE(m.total, 0)) > 0.0005 {filtre}
+        """), {'warehouse_id': warehouse_id} if warehouse_id is not None else {}).fetchall()
+        if not ecarts:
+            return 0
+
+        # Journal seul : la projection porte déjà ces quantités
+        now = datetime.now()
+        lignes = {(row[0], row[1]): row[2] for row in ecarts}
+        session.execute(text("""
+            INSERT INTO stock_mouvements (
+                product_id, warehouse_id, product_warehouse_id, movement_type, quantity, unit_cost, total_cost,
+                destination_warehouse_id, reference, description, user_id, user_name, movement_date, created_at
+            ) VALUES (
+                :product_id, :warehouse_id, :product_warehouse_id, :movement_type, :quantity, :unit_cost, :total_cost,
+                :destination_warehouse_id, :reference, :description, :user_id, :user_name, :movement_date, :created_at
+            )
+        """), [
+            self._movement_row({
+                'product_id': product_id, 'warehouse_id': wid, 'movement_type': 'OUVERTURE',
+                'quantity': float(ecart), 'unit_cost': float(cout), 'reference': 'OUVERTURE',
+                'description': "Solde d'ouverture du journal de stock", 'user_name': 'Système',
+            }, lignes, now)
+            for product_id, wid, _, ecart, cout in ecarts
+        ])
+        print(f"📦 {len(ecarts)} mouvements d'ouverture enregistrés")
+        return len(ecarts)
+
+    def _product_warehouse_ids(self, session: Session, keys) -> Dict[tuple, int]:
+        """Ids des lignes stock_produits_entrepot existantes pour des clés (produit, entrepôt)"""
+        keys = set(keys)
+        rows = session.execute(text("""
+            SELECT id, product_id, warehouse_id FROM stock_produits_entrepot
+            WHERE product_id IN :product_ids AND warehouse_id IN :warehouse_ids
+            ORDER BY id
+        """).bindparams(bindparam('product_ids', expanding=True), bindparam('warehouse_ids', expanding=True)), {
+            'product_ids': sorted({pid for pid, _ in keys}),
+            'warehouse_ids': sorted({wid for _, wid in keys}),
+        })
+        lignes = {}
+        for row_id, product_id, wid in rows:
+            if (product_id, wid) in keys:
+                lignes.setdefault((product_id, wid), row_id)
+        return lignes
+
+    @staticmethod
+    def _movement_row(mouvement: Dict[str, Any], lignes: Dict[tuple, int], now: datetime) -> Dict[str, Any]:
+        """Paramètres d'insertion d'un mouvement selon les conventions de stockage"""
+        quantite = float(mouvement['quantity'] or 0)
+        stockee = abs(quantite) if mouvement['movement_type'] in _SENS_PAR_TYPE else quantite
+        unit_cost = float(mouvement.get('unit_cost') or 0)
+        total_cost = mouvement.get('total_cost')
+        return {
+            'product_id': mouvement['product_id'],
+            'warehouse_id': mouvement['warehouse_id'],
+            'product_warehouse_id': lignes.get((mouvement['product_id'], mouvement['warehouse_id'])),
+            'movement_type': mouvement['movement_type'],
+            'quantity': stockee,
+            'unit_cost': unit_cost,
+            'total_cost': float(total_cost) if total_cost is not None else stockee * unit_cost,
+            'destination_warehouse_id': mouvement.get('destination_warehouse_id'),
+            'reference': mouvement.get('reference'),
+            'description': mouvement.get('description'),
+            'user_id': mouvement.get('user_id'),
+            'user_name': mouvement.get('user_name'),
+            'movement_date': mouvement.get('movement_date') or now,
+            'created_at': now,
+        }
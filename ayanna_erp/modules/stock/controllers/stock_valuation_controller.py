@@ -0,0 +1,310 @@
+"""
+Valorisation du stock à une date passée (journal stock_mouvements + soldes mensuels)
+
+`stock_as_of` calcule, par produit et entrepôt, la quantité et la valeur du stock à
+une date donnée. Le stock de fin de chaque mois clôturé est conservé dans
+stock_soldes (une ligne par produit-entrepôt mouvementé dans le mois) : seuls les
+mouvements postérieurs au dernier mois clôturé avant la date sont rejoués, jamais
+l'historique complet.
+
+Un mouvement inséré, modifié ou supprimé dans un mois déjà clôturé invalide par
+trigger les soldes de ce mois et des suivants ; `refresh_checkpoints` calcule les
+mois clôturés manquants (au démarrage via DatabaseManager.initialize_database, ou
+par scripts/rebuild_stock_soldes.py).
+
+Méthodes de valorisation :
+- 'average' : coût moyen pondéré, même règle que StockLedgerController ;
+- 'fifo' : le stock restant est constitué des dernières entrées valorisées, prises de
+  la plus récente à la plus ancienne jusqu'à couvrir la quantité ; seules ces entrées
+  sont lues (parcours de l'index produit-entrepôt-date arrêté dès la quantité couverte).
+"""
+
+import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import (
+    COST_MOVEMENT_TYPES, SIGNED_QUANTITY_SQL, apply_movement
+)
+
+
+# Triggers d'invalidation de stock_soldes (SQLite)
+_INVALIDATION = """
+    DELETE FROM stock_soldes WHERE periode >= {periode};
+"""
+
+STOCK_SOLDES_TRIGGERS = {
+    "trg_stock_soldes_mouvement_insert": (
+        "AFTER INSERT ON stock_mouvements "
+        "WHEN substr(NEW.movement_date, 1, 7) <= (SELECT MAX(periode) FROM stock_soldes)",
+        _INVALIDATION.format(periode="substr(NEW.movement_date, 1, 7)"),
+    ),
+    "trg_stock_soldes_mouvement_delete": (
+        "AFTER DELETE ON stock_mouvements "
+        "WHEN substr(OLD.movement_date, 1, 7) <= (SELECT MAX(periode) FROM stock_soldes)",
+        _INVALIDATION.format(periode="substr(OLD.movement_date, 1, 7)"),
+    ),
+    "trg_stock_soldes_mouvement_update": (
+        "AFTER UPDATE OF product_id, warehouse_id, movement_type, quantity, unit_cost, movement_date "
+        "ON stock_mouvements",
+        _INVALIDATION.format(periode="min(substr(OLD.movement_date, 1, 7), substr(NEW.movement_date, 1, 7))"),
+    ),
+}
+
+VALUATION_METHODS = ('average', 'fifo')
+
+# Bases (URL d'engine) dont les triggers ont été vérifiés
+_snapshot_actif_cache = set()
+
+
+def _fin_de_journee(d):
+    if isinstance(d, datetime.datetime):
+        return d
+    return datetime.datetime.combine(d, datetime.time.max)
+
+
+def _sql_datetime(d):
+    # Même format que le type DateTime de SQLAlchemy sous SQLite (comparaison de chaînes)
+    return d.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _periode_suivante(periode):
+    annee, mois = (int(x) for x in periode.split('-'))
+    return f"{annee + 1}-01" if mois == 12 else f"{annee}-{mois + 1:02d}"
+
+
+class StockValuationController:
+    """Stock et valeur à une date : soldes mensuels (stock_soldes) + mouvements récents"""
+
+    def ensure_snapshot(self, engine):
+        """
+        Crée les triggers d'invalidation de stock_soldes s'ils manquent, puis calcule
+        les soldes des mois clôturés manquants.
+
+        Returns:
+            bool: True si les soldes mensuels sont actifs sur cette base
+        """
+        if engine.dialect.name != "sqlite":
+            return False
+
+        with engine.begin() as conn:
+            tables = {row[0] for row in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('stock_soldes', 'stock_mouvements')"
+            ))}
+            if len(tables) < 2:
+                return False
+
+            existants = {row[0] for row in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stock_soldes_%'"
+            ))}
+            if any(nom not in existants for nom in STOCK_SOLDES_TRIGGERS):
+                for nom, (evenement, corps) in STOCK_SOLDES_TRIGGERS.items():
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nom}")
+                    conn.exec_driver_sql(f"CREATE TRIGGER {nom} {evenement}\nBEGIN{corps}END")
+                # Soldes calculés sans triggers : non fiables
+                conn.execute(text("DELETE FROM stock_soldes"))
+            nb = self._completer(conn)
+            if nb:
+                print(f"✅ Soldes de stock mensuels mis à jour ({nb} lignes)")
+
+        _snapshot_actif_cache.add(str(engine.url))
+        return True
+
+    def refresh_checkpoints(self, session: Session) -> int:
+        """
+        Calcule les soldes des mois clôturés qui manquent dans stock_soldes
+        (commit laissé à l'appelant).
+
+        Returns:
+            int: nombre de lignes (produit, entrepôt, mois) écrites
+        """
+        return self._completer(session)
+
+    def rebuild(self, session: Session) -> int:
+        """Recalcule stock_soldes depuis le journal (commande de maintenance, commit laissé à l'appelant)"""
+        session.execute(text("DELETE FROM stock_soldes"))
+        return self._completer(session)
+
+    def _completer(self, conn) -> int:
+        derniere = conn.execute(text("SELECT MAX(periode) FROM stock_soldes")).scalar()
+        limite = datetime.date.today().strftime("%Y-%m")
+        debut = _periode_suivante(derniere) if derniere else None
+        if debut is not None and debut >= limite:
+            return 0
+
+        # Stock en fin du dernier mois calculé, puis mouvements des mois clôturés suivants
+        etats = {}
+        if derniere:
+            for product_id, wid, quantite, cout in conn.execute(text("""
+                SELECT s.product_id, s.warehouse_id, s.quantity, s.unit_cost
+                FROM stock_soldes s
+                JOIN (
+                    SELECT product_id, warehouse_id, MAX(periode) AS periode
+                    FROM stock_soldes GROUP BY product_id, warehouse_id
+                ) d ON d.product_id = s.product_id AND d.warehouse_id = s.warehouse_id AND d.periode = s.periode
+            """)):
+                etats[(product_id, wid)] = [float(quantite or 0), float(cout or 0)]
+
+        rows = conn.execute(text(f"""
+            SELECT product_id, warehouse_id, movement_type, {SIGNED_QUANTITY_SQL}, unit_cost,
+                   substr(movement_date, 1, 7)
+            FROM stock_mouvements
+            WHERE warehouse_id IS NOT NULL AND movement_date < :limite
+            {"AND movement_date >= :debut" if debut else ""}
+            ORDER BY movement_date, id
+        """), {'limite': limite, 'debut': debut}).fetchall()
+
+        lignes = []
+        periode_courante = None
+        touches = set()
+        for product_id, wid, movement_type, quantite, cout, periode in rows:
+            if periode != periode_courante:
+                lignes.extend(self._soldes(etats, touches, periode_courante))
+                periode_courante = periode
+                touches = set()
+            cle = (product_id, wid)
+            apply_movement(etats.setdefault(cle, [0.0, 0.0]), movement_type, float(quantite or 0), cout)
+            touches.add(cle)
+        lignes.extend(self._soldes(etats, touches, periode_courante))
+
+        if lignes:
+            conn.execute(text("""
+                INSERT INTO stock_soldes (product_id, warehouse_id, periode, quantity, unit_cost)
+                VALUES (:product_id, :warehouse_id, :periode, :quantity, :unit_cost)
+            """), lignes)
+        return len(lignes)
+
+    @staticmethod
+    def _soldes(etats, cles, periode):
+        return [
+            {'product_id': cle[0], 'warehouse_id': cle[1], 'periode': periode,
+             'quantity': etats[cle][0], 'unit_cost': etats[cle][1]}
+            for cle in cles
+        ]
+
+    def snapshot_actif(self, session: Session) -> bool:
+        """Indique si les triggers des soldes mensuels sont en place sur la base de la session"""
+        bind = session.get_bind()
+        cle = str(bind.url)
+        if cle in _snapshot_actif_cache:
+            return True
+        if bind.dialect.name != "sqlite":
+            return False
+        nb = session.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stock_soldes_%'"
+        )).scalar()
+        if nb == len(STOCK_SOLDES_TRIGGERS):
+            _snapshot_actif_cache.add(cle)
+            return True
+        return False
+
+    def stock_as_of(self, session: Session, as_of, warehouse_ids: Optional[Iterable[int]] = None,
+                    valuation: str = 'average') -> Dict[tuple, Dict[str, float]]:
+        """
+        Stock par produit et entrepôt à une date (incluse ; une date seule vaut fin de journée).
+
+        Args:
+            as_of: date ou datetime
+            warehouse_ids: entrepôts à valoriser (None = tous)
+            valuation: 'average' (coût moyen pondéré) ou 'fifo'
+
+        Returns:
+            dict: {(product_id, warehouse_id): {'quantity', 'unit_cost', 'value'}}
+        """
+        if valuation not in VALUATION_METHODS:
+            raise ValueError(f"Méthode de valorisation inconnue: {valuation}")
+        as_of = _fin_de_journee(as_of)
+        if warehouse_ids is not None:
+            warehouse_ids = [int(w) for w in warehouse_ids]
+            if not warehouse_ids:
+                return {}
+        filtre = "AND warehouse_id IN :warehouse_ids" if warehouse_ids is not None else ""
+        params = {'warehouse_ids': warehouse_ids, 'as_of': _sql_datetime(as_of)}
+
+        def _requete(sql):
+            requete = text(sql)
+            if warehouse_ids is not None:
+                requete = requete.bindparams(bindparam('warehouse_ids', expanding=True))
+            return requete
+
+        # Point de reprise : dernier mois clôturé avant le mois de la date
+        etats = {}
+        debut = None
+        if self.snapshot_actif(session):
+            periode = session.execute(text(
+                "SELECT MAX(periode) FROM stock_soldes WHERE periode < :mois"
+            ), {'mois': as_of.strftime("%Y-%m")}).scalar()
+            if periode:
+                for product_id, wid, quantite, cout in session.execute(_requete(f"""
+                    SELECT product_id, warehouse_id, quantity, unit_cost
+                    FROM stock_soldes s
+                    WHERE periode = (
+                        SELECT MAX(x.periode) FROM stock_soldes x
+                        WHERE x.product_id = s.product_id AND x.warehouse_id = s.warehouse_id
+                        AND x.periode <= :periode
+                    ) {filtre}
+                """), dict(params, periode=periode)):
+                    etats[(product_id, wid)] = [float(quantite or 0), float(cout or 0)]
+                debut = _periode_suivante(periode)
+
+        for product_id, wid, movement_type, quantite, cout in session.execute(_requete(f"""
+            SELECT product_id, warehouse_id, movement_type, {SIGNED_QUANTITY_SQL}, unit_cost
+            FROM stock_mouvements
+            WHERE warehouse_id IS NOT NULL AND movement_date <= :as_of
+            {"AND movement_date >= :debut" if debut else ""} {filtre}
+            ORDER BY movement_date, id
+        """), dict(params, debut=debut)):
+            apply_movement(etats.setdefault((product_id, wid), [0.0, 0.0]), movement_type, float(quantite or 0), cout)
+
+        stock = {
+            cle: {'quantity': quantite, 'unit_cost': cout, 'value': quantite * cout}
+            for cle, (quantite, cout) in etats.items()
+        }
+        if valuation == 'fifo':
+            self._valoriser_fifo(session, stock, params)
+        return stock
+
+    def _valoriser_fifo(self, session, stock, params):
+        """
+        Remplace la valeur des stocks positifs par celle des dernières entrées valorisées.
+
+        Les entrées de chaque produit-entrepôt sont lues de la plus récente à la plus
+        ancienne par l'index (product_id, warehouse_id, movement_date), et la lecture
+        s'arrête dès que la quantité en stock est couverte.
+        """
+        restant = {cle: ligne['quantity'] for cle, ligne in stock.items() if ligne['quantity'] > 0}
+        if not restant:
+            return
+        valeurs = dict.fromkeys(restant, 0.0)
+        types = ", ".join(f"'{t}'" for t in COST_MOVEMENT_TYPES)
+        requete = text(f"""
+            SELECT {SIGNED_QUANTITY_SQL}, COALESCE(unit_cost, 0)
+            FROM stock_mouvements
+            WHERE product_id = :product_id AND warehouse_id = :warehouse_id
+            AND movement_date <= :as_of
+            AND movement_type IN ({types}) AND {SIGNED_QUANTITY_SQL} > 0
+            ORDER BY movement_date DESC, id DESC
+        """)
+        for cle in restant:
+            resultat = session.execute(requete, {
+                'product_id': cle[0], 'warehouse_id': cle[1], 'as_of': params['as_of']
+            })
+            try:
+                for quantite, cout in resultat:
+                    prise = min(float(quantite), restant[cle])
+                    valeurs[cle] += prise * float(cout)
+                    restant[cle] -= prise
+                    if restant[cle] <= 0:
+                        break
+            finally:
+                resultat.close()
+
+        for cle, valeur in valeurs.items():
+            ligne = stock[cle]
+            # Unités sans entrée valorisée retrouvée (ajustements positifs) : coût moyen
+            valeur += restant[cle] * ligne['unit_cost']
+            ligne['value'] = valeur
+            ligne['unit_cost'] = valeur / ligne['quantity']
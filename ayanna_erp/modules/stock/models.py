@@ -3,7 +3,7 @@ Modèles de données pour le module Stock - Architecture Simplifiée
 4 tables optimisées : stock_warehouses, stock_config, stock_produits_entrepot, stock_mouvements
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Numeric, Text, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -60,7 +60,11 @@ class StockConfig(Base):
 class StockProduitEntrepot(Base):
     """Table de liaison produits-entrepôts avec stock"""
     __tablename__ = 'stock_produits_entrepot'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_stock_produits_entrepot_product_wh', 'product_id', 'warehouse_id'),
+        Index('idx_stock_produits_entrepot_warehouse', 'warehouse_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     product_id = Column(Integer, nullable=False)  # Référence au produit
@@ -83,7 +87,11 @@ class StockProduitEntrepot(Base):
 class StockMovement(Base):
     """Table des mouvements de stock - Architecture simplifiée"""
     __tablename__ = 'stock_mouvements'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_stock_mouvements_product_wh_date', 'product_id', 'warehouse_id', 'movement_date'),
+        Index('idx_stock_mouvements_date', 'movement_date'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     product_id = Column(Integer, nullable=False)  # Référence au produit
@@ -118,6 +126,23 @@ class StockMovement(Base):
     product_warehouse = relationship("StockProduitEntrepot", back_populates="movements")
 
 
+class StockSoldes(Base):
+    """Stock de fin de mois par produit et entrepôt (points de reprise de la valorisation, voir StockValuationController)"""
+    __tablename__ = 'stock_soldes'
+    __table_args__ = (
+        UniqueConstraint('product_id', 'warehouse_id', 'periode', name='uq_stock_soldes_produit_periode'),
+        Index('idx_stock_soldes_periode', 'periode'),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, nullable=False)  # Référence au produit
+    warehouse_id = Column(Integer, ForeignKey('stock_warehouses.id'), nullable=False)  # Référence à l'entrepôt
+    periode = Column(String(7), nullable=False)  # Mois 'AAAA-MM' clôturé (stock à la fin du mois)
+    quantity = Column(Numeric(15, 3), nullable=False, default=0)  # Quantité en fin de mois
+    unit_cost = Column(Numeric(15, 4), nullable=False, default=0)  # Coût moyen pondéré en fin de mois
+
+
 class StockInventaire(Base):
     """Table des sessions d'inventaire"""
     __tablename__ = 'stock_inventaire'
@@ -145,6 +170,7 @@ class StockInventaire(Base):
     include_zero_stock = Column(Boolean, default=True)  # Inclure produits à stock zéro
     auto_freeze_stock = Column(Boolean, default=False)  # Geler mouvements pendant inventaire
     send_notifications = Column(Boolean, default=True)  # Envoyer notifications
+    freeze_movement_id = Column(Integer)  # Dernier mouvement de stock au gel (auto_freeze_stock)
     
     # Traçabilité
     created_by = Column(Integer)  # Utilisateur créateur
@@ -164,7 +190,10 @@ class StockInventaire(Base):
 class StockInventaireItem(Base):
     """Table des éléments d'inventaire (comptages par produit)"""
     __tablename__ = 'stock_inventaire_item'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('idx_stock_inventaire_item_inventaire_produit', 'inventory_id', 'product_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     inventory_id = Column(Integer, ForeignKey('stock_inventaire.id'), nullable=False)  # Session d'inventaire
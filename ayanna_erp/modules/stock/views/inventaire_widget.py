@@ -28,8 +28,10 @@ from PyQt6.QtGui import QFont, QColor, QPixmap, QIcon
 
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.modules.stock.controllers.inventaire_controller import InventaireController
+from ayanna_erp.modules.stock.controllers.inventaire_import_controller import InventaireImportController
 from ayanna_erp.modules.stock.models import StockWarehouse, StockInventaire
 from ayanna_erp.core.entreprise_controller import EntrepriseController
+from ayanna_erp.core.utils.query_executor import QueryExecutor, BusyIndicator
 
 
 class InventorySessionDialog(QDialog):
@@ -1270,8 +1272,23 @@ class InventoryDetailsDialog(QDialog):
             QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export PDF:\n{str(e)}")
 
     def export_excel(self):
-        """Exporter les détails en Excel"""
-        QMessageBox.information(self, "Export Excel", "Fonctionnalité d'export Excel à implémenter.")
+        """Exporter les détails en CSV (séparateur ';', ouvert directement par Excel)"""
+        try:
+            file_path, _ = QFileDialog.getSaveFileName(
+                self, "Exporter vers Excel",
+                f"inventaire_{self.inventory_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                "Fichiers CSV (*.csv)"
+            )
+            if not file_path:
+                return
+
+            with self.db_manager.get_session() as session:
+                nb = InventaireImportController(self.entreprise_id).export_counts(session, self.inventory_id, file_path)
+
+            QMessageBox.information(self, "Succès", f"{nb} lignes exportées:\n{file_path}")
+
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export:\n{str(e)}")
 
     def get_enterprise_info(self) -> Dict[str, Any]:
         """Récupérer les informations de l'entreprise"""
@@ -1461,6 +1478,172 @@ class InventoryDetailsDialog(QDialog):
         doc.build(story)
 
 
+class CountImportDialog(QDialog):
+    """Import d'un fichier de comptages (CSV, vidage de terminal) dans une session, ou correction en lot"""
+
+    def __init__(self, parent, entreprise_id: int, batch: bool = False, performed_by: str = "system"):
+        super().__init__(parent)
+        self.entreprise_id = entreprise_id
+        self.batch = batch
+        self.performed_by = performed_by
+        self.imported = False
+        self.db_manager = DatabaseManager()
+        self.import_controller = InventaireImportController(entreprise_id)
+
+        self.setWindowTitle("Correction en Lot" if batch else "Import des Comptages")
+        self.setModal(True)
+        self.resize(650, 500)
+
+        self.setup_ui()
+        self.load_targets()
+
+    def setup_ui(self):
+        """Configuration de l'interface"""
+        layout = QVBoxLayout(self)
+
+        title = QLabel("🔧 Correction en Lot" if self.batch else "📥 Import des Comptages")
+        title.setFont(QFont("Arial", 14, QFont.Weight.Bold))
+        layout.addWidget(title)
+
+        form = QFormLayout()
+        self.target_combo = QComboBox()
+        form.addRow("Entrepôt*:" if self.batch else "Session d'inventaire*:", self.target_combo)
+
+        file_layout = QHBoxLayout()
+        self.file_edit = QLineEdit()
+        self.file_edit.setPlaceholderText("Fichier CSV ou export du terminal de saisie")
+        file_layout.addWidget(self.file_edit)
+        browse_btn = QPushButton("📂 Parcourir")
+        browse_btn.clicked.connect(self.choose_file)
+        file_layout.addWidget(browse_btn)
+        form.addRow("Fichier*:", file_layout)
+
+        self.cumulative_check = QCheckBox("Ajouter aux comptages déjà saisis (plusieurs terminaux)")
+        if not self.batch:
+            form.addRow("", self.cumulative_check)
+        layout.addLayout(form)
+
+        help_label = QLabel(
+            "Une ligne par produit ou par lecture : code ou code-barres ; quantité (1 si absente) ; emplacement.\n"
+            "En-tête facultatif (code, code_barre, quantite, emplacement). Séparateurs ; , tabulation."
+            + ("\nLes stocks des produits du fichier sont ajustés immédiatement dans l'entrepôt choisi." if self.batch else "")
+        )
+        help_label.setStyleSheet("color: #666;")
+        help_label.setWordWrap(True)
+        layout.addWidget(help_label)
+
+        self.report_text = QTextEdit()
+        self.report_text.setReadOnly(True)
+        self.report_text.setPlaceholderText("Le rapport d'import s'affichera ici.")
+        layout.addWidget(self.report_text)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        close_btn = QPushButton("Fermer")
+        close_btn.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_btn)
+        self.import_btn = QPushButton("🔧 Appliquer les corrections" if self.batch else "📥 Importer")
+        self.import_btn.setStyleSheet("background-color: #27ae60; color: white; padding: 8px 16px; font-weight: bold;")
+        self.import_btn.clicked.connect(self.run_import)
+        buttons_layout.addWidget(self.import_btn)
+        layout.addLayout(buttons_layout)
+
+    def load_targets(self):
+        """Charger les entrepôts (correction en lot) ou les sessions d'inventaire ouvertes"""
+        try:
+            with self.db_manager.get_session() as session:
+                self.target_combo.clear()
+                if self.batch:
+                    warehouses = session.query(StockWarehouse).filter(
+                        StockWarehouse.entreprise_id == self.entreprise_id,
+                        StockWarehouse.is_active == True
+                    ).order_by(StockWarehouse.name).all()
+                    for warehouse in warehouses:
+                        self.target_combo.addItem(f"{warehouse.name} ({warehouse.code})", warehouse.id)
+                else:
+                    inventories = session.query(StockInventaire).filter(
+                        StockInventaire.entreprise_id == self.entreprise_id,
+                        StockInventaire.status.in_(['DRAFT', 'IN_PROGRESS'])
+                    ).order_by(StockInventaire.created_at.desc()).all()
+                    for inventory in inventories:
+                        self.target_combo.addItem(f"{inventory.reference} - {inventory.session_name}", inventory.id)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors du chargement:\n{str(e)}")
+
+    def choose_file(self):
+        """Choisir le fichier de comptages"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Fichier de comptages", "", "Fichiers de comptage (*.csv *.txt);;Tous les fichiers (*)"
+        )
+        if file_path:
+            self.file_edit.setText(file_path)
+
+    def run_import(self):
+        """Lire le fichier et appliquer les comptages"""
+        target_id = self.target_combo.currentData()
+        file_path = self.file_edit.text().strip()
+        if not target_id:
+            QMessageBox.warning(self, "Validation", "Veuillez sélectionner un entrepôt." if self.batch
+                                else "Aucune session d'inventaire en cours sélectionnée.")
+            return
+        if not file_path or not os.path.isfile(file_path):
+            QMessageBox.warning(self, "Validation", "Veuillez choisir un fichier de comptages.")
+            return
+        if self.batch:
+            reply = QMessageBox.question(
+                self, "Confirmation",
+                "Les stocks des produits du fichier seront ajustés immédiatement.\nContinuer ?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+
+        try:
+            with self.db_manager.get_session() as session:
+                try:
+                    if self.batch:
+                        report = self.import_controller.batch_correction(session, target_id, file_path, self.performed_by)
+                    else:
+                        report = self.import_controller.import_counts(
+                            session, target_id, file_path, cumulative=self.cumulative_check.isChecked()
+                        )
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'import:\n{str(e)}")
+            return
+
+        self.imported = self.imported or bool(report.get('applied'))
+        self.show_report(report)
+        if report.get('warning'):
+            QMessageBox.warning(self, "Attention", report['warning'])
+
+    def show_report(self, report: Dict[str, Any]):
+        """Afficher le rapport d'import (codes non reconnus et lignes rejetées)"""
+        lines = [
+            f"Lignes lues : {report['lines']}",
+            f"Produits mis à jour : {report.get('applied', 0)}",
+        ]
+        if report.get('inventory_reference'):
+            lines.append(f"Session de correction : {report['inventory_reference']}")
+        unmatched = report['unmatched']
+        if unmatched:
+            lines.append("")
+            lines.append(f"⚠️ Codes non reconnus ({len(unmatched)}) :")
+            for code, count in sorted(unmatched.items()):
+                lines.append(f"  {code}" + (f" (x{count})" if count > 1 else ""))
+        if report['invalid_count']:
+            lines.append("")
+            lines.append(f"❌ Lignes rejetées ({report['invalid_count']}) :")
+            for line_number, reason in report['invalid']:
+                lines.append(f"  ligne {line_number} : {reason}")
+            if report['invalid_count'] > len(report['invalid']):
+                lines.append(f"  ... et {report['invalid_count'] - len(report['invalid'])} autres")
+        self.report_text.setPlainText("\n".join(lines))
+
+
 class InventaireWidget(QWidget):
     """Widget principal pour la gestion des inventaires"""
     
@@ -1904,12 +2087,20 @@ class InventaireWidget(QWidget):
         QMessageBox.information(self, "Correction Manuelle", "Fonctionnalité de correction manuelle à implémenter.")
     
     def import_corrections(self):
-        """Importer des corrections depuis un fichier"""
-        QMessageBox.information(self, "Import Corrections", "Fonctionnalité d'import de corrections à implémenter.")
+        """Importer des comptages (CSV, terminal de saisie) dans une session d'inventaire"""
+        dialog = CountImportDialog(self, self.entreprise_id,
+                                   performed_by=getattr(self.current_user, 'name', None) or "system")
+        dialog.exec()
+        if dialog.imported:
+            self.load_data()
     
     def open_batch_correction(self):
-        """Ouvrir la correction en lot"""
-        QMessageBox.information(self, "Correction en Lot", "Fonctionnalité de correction en lot à implémenter.")
+        """Correction en lot : ajuster les stocks d'un entrepôt depuis un fichier de comptages"""
+        dialog = CountImportDialog(self, self.entreprise_id, batch=True,
+                                   performed_by=getattr(self.current_user, 'name', None) or "system")
+        dialog.exec()
+        if dialog.imported:
+            self.load_data()
     
     def load_recent_corrections(self):
         """Charger les corrections récentes"""
@@ -1932,6 +2123,8 @@ class InventaireWidget(QWidget):
         # Récupérer entreprise_id depuis pos_id
         self.entreprise_id = self.get_entreprise_id_from_pos(pos_id)
         self.controller = InventaireController(self.entreprise_id)
+        # Chargement des inventaires en arrière-plan
+        self.executor = QueryExecutor(self)
         
         self.setup_ui()
         self.load_data()
@@ -1968,6 +2161,10 @@ class InventaireWidget(QWidget):
         
         layout.addLayout(header_layout)
         
+        self.busy_indicator = BusyIndicator(self)
+        self.busy_indicator.track(self.executor)
+        layout.addWidget(self.busy_indicator)
+        
         # Onglets pour organiser les fonctionnalités
         tabs = QTabWidget()
         
@@ -2072,15 +2269,25 @@ class InventaireWidget(QWidget):
 
     def load_data(self):
         """Charger les données"""
-        self.load_sessions()
         self.load_corrections()
-        self.load_history()
+        self.load_inventories()
+
+    def load_inventories(self):
+        """Charger les inventaires en arrière-plan (une requête pour les sessions et l'historique)"""
+        self.executor.submit(
+            'inventaires',
+            lambda session: self.controller.get_inventories(session=session),
+            with_session=True,
+            on_result=self.on_inventories_loaded
+        )
+
+    def on_inventories_loaded(self, inventories):
+        self.load_sessions(inventories)
+        self.load_history(inventories)
 
-    def load_sessions(self):
-        """Charger la liste des sessions d'inventaire"""
+    def load_sessions(self, inventories):
+        """Remplir la liste des sessions d'inventaire"""
         try:
-            inventories = self.controller.get_inventories()
-            
             self.sessions_table.setRowCount(len(inventories))
             
             for row, inv in enumerate(inventories):
@@ -2147,12 +2354,10 @@ class InventaireWidget(QWidget):
         # TODO: Implémenter le chargement des corrections
         self.corrections_table.setRowCount(0)
 
-    def load_history(self):
-        """Charger l'historique des inventaires"""
+    def load_history(self, inventories):
+        """Remplir l'historique des inventaires"""
         try:
-            # Pour l'instant, charger tous les inventaires comme historique
-            inventories = self.controller.get_inventories()
-            
+            # Pour l'instant, tous les inventaires servent d'historique
             self.history_table.setRowCount(len(inventories))
             
             for row, inv in enumerate(inventories):
@@ -2255,19 +2460,22 @@ class InventaireWidget(QWidget):
         QMessageBox.information(self, "Correction Manuelle", "Fonctionnalité de correction manuelle à implémenter.")
 
     def open_import_correction(self):
-        """Ouvrir l'import de corrections"""
-        QMessageBox.information(self, "Import Corrections", "Fonctionnalité d'import de corrections à implémenter.")
+        """Importer des comptages (CSV, terminal de saisie) dans une session d'inventaire"""
+        dialog = CountImportDialog(self, self.entreprise_id,
+                                   performed_by=getattr(self.current_user, 'name', None) or "system")
+        dialog.exec()
+        if dialog.imported:
+            self.load_data()
 
     def open_batch_correction(self):
-        """Ouvrir la correction en lot"""
-        QMessageBox.information(self, "Correction en Lot", "Fonctionnalité de correction en lot à implémenter.")
+        """Correction en lot : ajuster les stocks d'un entrepôt depuis un fichier de comptages"""
+        dialog = CountImportDialog(self, self.entreprise_id, batch=True,
+                                   performed_by=getattr(self.current_user, 'name', None) or "system")
+        dialog.exec()
+        if dialog.imported:
+            self.load_data()
 
     def load_recent_corrections(self):
         """Charger les corrections récentes"""
         # TODO: Implémenter le chargement des corrections récentes
         self.corrections_table.setRowCount(0)
-    
-    def load_history(self):
-        """Charger l'historique"""
-        # TODO: Implémenter le chargement de l'historique
-        self.history_table.setRowCount(0)
\ No newline at end of file
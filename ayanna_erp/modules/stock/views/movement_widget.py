@@ -19,6 +19,7 @@ from PyQt6.QtGui import QFont, QColor, QPixmap, QIcon
 
 from ayanna_erp.database.database_manager import DatabaseManager
 from ayanna_erp.modules.stock.controllers.stock_controller import StockController
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
 from ayanna_erp.modules.stock.models import StockWarehouse
 
 
@@ -334,102 +335,23 @@ class MovementWidget(QWidget):
                                       f"Quantité insuffisante. Disponible: {available_qty:.2f}")
                     return
                 
-                # Décrémenter le stock source
-                new_source_qty = available_qty - float(transfer_data['quantity'])
-                session.execute(text("""
-                    UPDATE stock_produits_entrepot 
-                    SET quantity = :quantity, last_movement_date = CURRENT_TIMESTAMP
-                    WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                """), {
-                    "quantity": new_source_qty,
-                    "product_id": transfer_data['product_id'],
-                    "warehouse_id": transfer_data['source_warehouse_id']
-                })
-                
-                # Incrémenter le stock destination (ou créer l'entrée)
-                dest_result = session.execute(text("""
-                    SELECT quantity, unit_cost FROM stock_produits_entrepot
-                    WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                """), {
-                    "product_id": transfer_data['product_id'],
-                    "warehouse_id": transfer_data['dest_warehouse_id']
-                })
-                
-                dest_row = dest_result.first()
-                if dest_row:
-                    # Mettre à jour le stock existant
-                    new_dest_qty = float(dest_row[0]) + float(transfer_data['quantity'])
-                    session.execute(text("""
-                        UPDATE stock_produits_entrepot 
-                        SET quantity = :quantity, last_movement_date = CURRENT_TIMESTAMP
-                        WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                    """), {
-                        "quantity": new_dest_qty,
-                        "product_id": transfer_data['product_id'],
-                        "warehouse_id": transfer_data['dest_warehouse_id']
-                    })
-                    unit_cost = float(dest_row[1]) if dest_row[1] else 0
-                else:
-                    # Créer une nouvelle entrée (récupérer le coût depuis la source)
-                    source_cost_result = session.execute(text("""
-                        SELECT unit_cost FROM stock_produits_entrepot
-                        WHERE product_id = :product_id AND warehouse_id = :warehouse_id
-                    """), {
-                        "product_id": transfer_data['product_id'],
-                        "warehouse_id": transfer_data['source_warehouse_id']
-                    })
-                    
-                    source_cost_row = source_cost_result.first()
-                    unit_cost = float(source_cost_row[0]) if source_cost_row and source_cost_row[0] else 0
-                    
-                    session.execute(text("""
-                        INSERT INTO stock_produits_entrepot 
-                        (product_id, warehouse_id, quantity, unit_cost, total_cost, last_movement_date)
-                        VALUES (:product_id, :warehouse_id, :quantity, :unit_cost, :total_cost, CURRENT_TIMESTAMP)
-                    """), {
-                        "product_id": transfer_data['product_id'],
-                        "warehouse_id": transfer_data['dest_warehouse_id'],
-                        "quantity": float(transfer_data['quantity']),
-                        "unit_cost": unit_cost,
-                        "total_cost": float(transfer_data['quantity']) * unit_cost
-                    })
-                
-                # Enregistrer le mouvement de sortie (source)
-                session.execute(text("""
-                    INSERT INTO stock_mouvements 
-                    (product_id, warehouse_id, destination_warehouse_id, movement_type, quantity, 
-                     unit_cost, total_cost, reference, description, movement_date, user_id)
-                    VALUES (:product_id, :warehouse_id, :dest_warehouse_id, 'TRANSFERT', :quantity,
-                            :unit_cost, :total_cost, :reference, :description, CURRENT_TIMESTAMP, :user_id)
-                """), {
-                    "product_id": transfer_data['product_id'],
-                    "warehouse_id": transfer_data['source_warehouse_id'],
-                    "dest_warehouse_id": transfer_data['dest_warehouse_id'],
-                    "quantity": -float(transfer_data['quantity']),  # Négatif pour sortie
-                    "unit_cost": unit_cost,
-                    "total_cost": -float(transfer_data['quantity']) * unit_cost,
-                    "reference": transfer_data['reference'],
-                    "description": f"Transfert vers entrepôt {transfer_data['dest_warehouse_id']}. {transfer_data['notes'] or ''}",
-                    "user_id": self.current_user['id']
-                })
-                
-                # Enregistrer le mouvement d'entrée (destination)
-                session.execute(text("""
-                    INSERT INTO stock_mouvements 
-                    (product_id, warehouse_id, destination_warehouse_id, movement_type, quantity, 
-                     unit_cost, total_cost, reference, description, movement_date, user_id)
-                    VALUES (:product_id, :dest_warehouse_id, NULL, 'TRANSFERT', :quantity,
-                            :unit_cost, :total_cost, :reference, :description, CURRENT_TIMESTAMP, :user_id)
-                """), {
-                    "product_id": transfer_data['product_id'],
-                    "dest_warehouse_id": transfer_data['dest_warehouse_id'],
-                    "quantity": float(transfer_data['quantity']),  # Positif pour entrée
-                    "unit_cost": unit_cost,
-                    "total_cost": float(transfer_data['quantity']) * unit_cost,
-                    "reference": transfer_data['reference'],
-                    "description": f"Transfert depuis entrepôt {transfer_data['source_warehouse_id']}. {transfer_data['notes'] or ''}",
-                    "user_id": self.current_user['id']
-                })
+                # Sortie source + entrée destination au coût moyen source (journal + projection)
+                notes = transfer_data['notes'] or ''
+                ok = StockLedgerController().transfer(
+                    session,
+                    transfer_data['product_id'],
+                    transfer_data['source_warehouse_id'],
+                    transfer_data['dest_warehouse_id'],
+                    float(transfer_data['quantity']),
+                    reference=transfer_data['reference'],
+                    description=(f"Transfert entrepôt {transfer_data['source_warehouse_id']} → "
+                                 f"{transfer_data['dest_warehouse_id']}. {notes}") if notes else None,
+                    user_id=self.current_user['id']
+                )
+                if not ok:
+                    session.rollback()
+                    QMessageBox.warning(self, "Erreur", "Quantité insuffisante (stock modifié entre-temps).")
+                    return
                 
                 session.commit()
                 
@@ -0,0 +1,30 @@
+-- Migration: index sur les clés étrangères et colonnes de date les plus sollicitées
+-- Usage:
+--  - SQLite: use sqlite3 CLI or your DB tool to run this file
+--  - Equivalent au démarrage : DatabaseManager.ensure_indexes() crée les index manquants
+--    à partir des déclarations `Index(...)` des modèles.
+
+CREATE INDEX IF NOT EXISTS idx_shop_paniers_created_at ON shop_paniers (created_at);
+CREATE INDEX IF NOT EXISTS idx_shop_paniers_status ON shop_paniers (status);
+CREATE INDEX IF NOT EXISTS idx_shop_paniers_pos_created ON shop_paniers (pos_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_shop_paniers_products_panier ON shop_paniers_products (panier_id);
+CREATE INDEX IF NOT EXISTS idx_shop_paniers_services_panier ON shop_paniers_services (panier_id);
+CREATE INDEX IF NOT EXISTS idx_shop_payments_panier ON shop_payments (panier_id);
+
+CREATE INDEX IF NOT EXISTS idx_restau_paniers_created_at ON restau_paniers (created_at);
+CREATE INDEX IF NOT EXISTS idx_restau_paniers_table_status ON restau_paniers (table_id, status);
+CREATE INDEX IF NOT EXISTS idx_restau_produit_panier_panier ON restau_produit_panier (panier_id);
+CREATE INDEX IF NOT EXISTS idx_restau_payments_panier ON restau_payments (panier_id);
+
+CREATE INDEX IF NOT EXISTS idx_compta_journaux_enterprise_date ON compta_journaux (enterprise_id, date_operation);
+CREATE INDEX IF NOT EXISTS idx_compta_ecritures_compte ON compta_ecritures (compte_comptable_id);
+CREATE INDEX IF NOT EXISTS idx_compta_ecritures_journal ON compta_ecritures (journal_id);
+
+CREATE INDEX IF NOT EXISTS idx_event_reservations_pos_date ON event_reservations (pos_id, event_date);
+CREATE INDEX IF NOT EXISTS idx_event_payments_reservation ON event_payments (reservation_id);
+
+CREATE INDEX IF NOT EXISTS idx_stock_produits_entrepot_product_wh ON stock_produits_entrepot (product_id, warehouse_id);
+CREATE INDEX IF NOT EXISTS idx_stock_produits_entrepot_warehouse ON stock_produits_entrepot (warehouse_id);
+CREATE INDEX IF NOT EXISTS idx_stock_mouvements_product_wh_date ON stock_mouvements (product_id, warehouse_id, movement_date);
+
+ANALYZE;
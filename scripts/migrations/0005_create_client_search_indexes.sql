@@ -0,0 +1,14 @@
+-- Migration: index de la recherche client de la boutique (téléphone normalisé, préfixe de nom)
+-- Usage:
+--  - SQLite: use sqlite3 CLI or your DB tool to run this file
+--  - Equivalent au démarrage : DatabaseManager.ensure_indexes() crée les index manquants
+--    à partir des déclarations `Index(...)` des modèles.
+--  - Les expressions doivent rester identiques à CLIENT_PHONE_NORM_SQL / CLIENT_NOM_LOWER_SQL /
+--    CLIENT_PRENOM_LOWER_SQL (ayanna_erp/modules/boutique/model/models.py).
+
+CREATE INDEX IF NOT EXISTS idx_shop_clients_telephone_norm
+    ON shop_clients (replace(replace(replace(replace(telephone, ' ', ''), '-', ''), '.', ''), '+', ''));
+CREATE INDEX IF NOT EXISTS idx_shop_clients_nom_lower ON shop_clients (lower(nom));
+CREATE INDEX IF NOT EXISTS idx_shop_clients_prenom_lower ON shop_clients (lower(prenom));
+
+ANALYZE;
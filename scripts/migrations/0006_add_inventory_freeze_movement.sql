@@ -0,0 +1,8 @@
+-- Migration: point de gel des sessions d'inventaire (id du dernier mouvement de stock
+-- à la création d'une session avec auto_freeze_stock)
+-- Usage:
+--  - SQLite: use sqlite3 CLI or your DB tool to run this file
+--  - Equivalent au démarrage : DatabaseManager.ensure_columns() ajoute les colonnes
+--    nullables déclarées dans les modèles et absentes de la base.
+
+ALTER TABLE stock_inventaire ADD COLUMN freeze_movement_id INTEGER;
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script de maintenance : reconstruit l'instantané mensuel des soldes (`compta_soldes`)
+à partir de `compta_ecritures`.
+Usage:
+  py -3.12 scripts\\rebuild_compta_soldes.py [enterprise_id]
+
+Les triggers de maintien sont (re)créés si nécessaire, puis les totaux par compte
+et par mois sont recalculés en une seule requête groupée.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.database.base import Base
+from ayanna_erp.modules.comptabilite.model.comptabilite import ComptaSoldes
+from ayanna_erp.modules.comptabilite.controller.soldes_controller import SoldesController
+
+entreprise_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+db_manager = DatabaseManager()
+Base.metadata.create_all(bind=db_manager.engine, tables=[ComptaSoldes.__table__], checkfirst=True)
+
+soldes = SoldesController()
+if not soldes.ensure_snapshot(db_manager.engine):
+    print("ℹ️ Instantané non disponible sur cette base (SQLite requis) : soldes calculés sur les écritures.")
+    sys.exit(0)
+
+with db_manager.session_scope() as session:
+    nb = soldes.rebuild(session, entreprise_id)
+
+cible = f"l'entreprise {entreprise_id}" if entreprise_id is not None else "toutes les entreprises"
+print(f"✅ compta_soldes reconstruit pour {cible} : {nb} lignes (compte, mois)")
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Script de maintenance : reconstruit les quantités et coûts moyens de
+`stock_produits_entrepot` à partir du journal `stock_mouvements`.
+Usage:
+  py -3.12 scripts\\rebuild_stock_projection.py [warehouse_id] [--ouverture]
+
+--ouverture : sur une base antérieure au journal, enregistre d'abord des mouvements
+OUVERTURE pour les écarts entre les stocks actuels et le journal (à faire une seule
+fois, avant la première reconstruction).
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.modules.stock.controllers.stock_ledger_controller import StockLedgerController
+
+args = [a for a in sys.argv[1:] if not a.startswith('--')]
+warehouse_id = int(args[0]) if args else None
+ouverture = '--ouverture' in sys.argv
+
+db_manager = DatabaseManager()
+ledger = StockLedgerController()
+
+with db_manager.session_scope() as session:
+    if ouverture:
+        ledger.record_opening_balances(session, warehouse_id)
+    nb = ledger.rebuild_stock_projection(session, warehouse_id)
+
+cible = f"l'entrepôt {warehouse_id}" if warehouse_id is not None else "tous les entrepôts"
+print(f"✅ stock_produits_entrepot reconstruit pour {cible} : {nb} lignes (produit, entrepôt)")
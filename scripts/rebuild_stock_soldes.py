@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Script de maintenance : recalcule les soldes de stock mensuels (`stock_soldes`)
+à partir de `stock_mouvements`.
+Usage:
+  py -3.12 scripts\\rebuild_stock_soldes.py
+
+Les triggers d'invalidation sont (re)créés si nécessaire, puis le stock de fin de
+chaque mois clôturé est recalculé en un seul parcours du journal.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ayanna_erp.database.database_manager import DatabaseManager
+from ayanna_erp.database.base import Base
+from ayanna_erp.modules.stock.models import StockSoldes
+from ayanna_erp.modules.stock.controllers.stock_valuation_controller import StockValuationController
+
+db_manager = DatabaseManager()
+Base.metadata.create_all(bind=db_manager.engine, tables=[StockSoldes.__table__], checkfirst=True)
+
+valuation = StockValuationController()
+if not valuation.ensure_snapshot(db_manager.engine):
+    print("ℹ️ Soldes mensuels non disponibles sur cette base (SQLite requis) : stock à date calculé sur tout le journal.")
+    sys.exit(0)
+
+with db_manager.session_scope() as session:
+    nb = valuation.rebuild(session)
+
+print(f"✅ stock_soldes reconstruit : {nb} lignes (produit, entrepôt, mois)")